@@ -1,7 +1,9 @@
 import streamlit as st
 import os
+import uuid
 from logic import load_config, Randomizer, StoryLLM, HistoryManager
 from utils.novel_length_config import get_display_options, get_category_by_name
+from utils.job_view import follow_job, submit_job
 # CrewAI imports only loaded when needed to save startup time
 # from crew_agents import StoryAgents
 # from crew_tasks import StoryTasks
@@ -19,6 +21,13 @@ CONFIG_PATH = "config.yaml"
 config = load_config(CONFIG_PATH)
 history_manager = HistoryManager()
 
+@st.cache_resource
+def get_job_service():
+    from services import JobService
+    return JobService()
+
+job_service = get_job_service()
+
 def init_session_state():
     if 'elements' not in st.session_state:
         st.session_state.elements = {}
@@ -28,6 +37,10 @@ def init_session_state():
         st.session_state.crew_topic_input = ""
     if 'crew_novel_result' not in st.session_state:
         st.session_state.crew_novel_result = ""
+    if 'job_session' not in st.session_state:
+        # 会话 ID 记在地址栏参数中，刷新页面后仍能找回本会话提交的后台任务
+        st.session_state.job_session = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.job_session
 
 init_session_state()
 
@@ -44,6 +57,17 @@ with st.sidebar:
             masked_key = f"{key[:3]}...{key[-3:]}" if len(key) > 6 else "******"
             st.write(f"**API Key**: {masked_key}")
 
+        # LLM 响应缓存统计（config.yaml 中开启 llm_cache 后显示）
+        from llm_cache import LLMCache
+        llm_cache = LLMCache(config)
+        if llm_cache.enabled:
+            with st.expander("💾 LLM 响应缓存"):
+                cache_stats = llm_cache.stats()
+                st.write(f"**命中率**: {cache_stats['hit_rate']:.0%}（命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}）")
+                st.write(f"**缓存条目**: {cache_stats['entries']}（{cache_stats['total_bytes'] / 1024 / 1024:.1f} MB）")
+                if llm_cache.bypass:
+                    st.caption("当前已设置跳过读取缓存（bypass）")
+
         # 骰子选项管理
         with st.expander("🎲 骰子选项管理"):
             st.caption("使用 LLM 生成新的骰子选项（超过 20 个会自动分批请求并去重）")
@@ -202,30 +226,31 @@ with col_words:
         help="指导企划书中每一幕的大致字数规划"
     )
 
-# 生成企划书
+# 生成企划书（后台执行，刷新页面不会中断；任务按会话区分，不同用户互不影响）
+proposal_scope = f"session:{st.session_state.job_session}:proposal"
 if st.button("🚀 生成企划书", type="primary", use_container_width=True):
     if not config:
         st.error("请先配置 config.yaml")
     elif not crew_topic.strip():
         st.warning("请先输入创意或投掷骰子")
-    else:
-        from services import ProposalService
-        proposal_service = ProposalService()
-
-        with st.spinner("AI 写作团队正在协作创作企划书... (这可能需要几分钟)"):
-            result = proposal_service.generate_proposal(
-                topic=crew_topic,
-                target_word_count=target_word_count,
-                brainstorm_rounds=brainstorm_rounds
-            )
-
-            if result['success']:
-                st.session_state.crew_result = result['content']
-                st.session_state.crew_story_id = result['story_id']
-                st.success("✅ 企划书生成成功！")
-                st.rerun()
-            else:
-                st.error(f"生成失败: {result['error']}")
+    elif submit_job(
+        job_service,
+        'generate_proposal',
+        scope=proposal_scope,
+        topic=crew_topic,
+        target_word_count=target_word_count,
+        brainstorm_rounds=brainstorm_rounds
+    ):
+        st.rerun()
+
+finished = follow_job(job_service, proposal_scope, label="AI 写作团队正在协作创作企划书")
+if finished:
+    if finished['status'] == 'succeeded':
+        st.session_state.crew_result = finished['result']['content']
+        st.session_state.crew_story_id = finished['result']['story_id']
+        st.success("✅ 企划书生成成功！")
+    elif finished['status'] == 'failed':
+        st.error(f"生成失败: {finished['error']}")
 
 # 显示企划书结果
 if st.session_state.crew_result:
@@ -295,8 +320,7 @@ if st.session_state.crew_result:
 
     # 检查是否可以生成大纲
     if st.session_state.get('crew_story_id'):
-        from services import OutlineService, CrewOrchestrationService
-        outline_service = OutlineService()
+        from services import CrewOrchestrationService
         orchestration = CrewOrchestrationService()
 
         # 检查是否可以生成大纲
@@ -318,20 +342,24 @@ if st.session_state.crew_result:
                 st.markdown("<div style='padding-top: 28px;'></div>", unsafe_allow_html=True)
 
                 if st.button("📋 生成大纲", type="primary", key="btn_generate_outline"):
-                    with st.spinner("正在生成大纲... (这可能需要几分钟)"):
-                        result = outline_service.generate_outline_from_proposal(
-                            story_id=st.session_state.crew_story_id,
-                            target_word_count=outline_length
-                        )
-
-                        if result['success']:
-                            st.session_state.current_novel_id = result['novel_id']
-                            st.session_state.current_outline = result['outline_content']
-                            st.success(f"✅ 大纲生成成功！小说 ID: {result['novel_id']}")
-                            st.info("可以继续生成细纲或前往小说管理页面")
-                            st.rerun()
-                        else:
-                            st.error(f"生成失败: {result['error']}")
+                    if submit_job(
+                        job_service,
+                        'generate_outline',
+                        scope=f"story:{st.session_state.crew_story_id}:outline",
+                        story_id=st.session_state.crew_story_id,
+                        target_word_count=outline_length
+                    ):
+                        st.rerun()
+
+        finished = follow_job(job_service, f"story:{st.session_state.crew_story_id}:outline", label="正在生成大纲")
+        if finished:
+            if finished['status'] == 'succeeded':
+                st.session_state.current_novel_id = finished['result']['novel_id']
+                st.session_state.current_outline = finished['result']['outline_content']
+                st.success(f"✅ 大纲生成成功！小说 ID: {finished['result']['novel_id']}")
+                st.info("可以继续生成细纲或前往小说管理页面")
+            elif finished['status'] == 'failed':
+                st.error(f"生成失败: {finished['error']}")
 
         # 显示大纲（如果已生成）
         if st.session_state.get('current_outline'):
@@ -345,9 +373,6 @@ if st.session_state.crew_result:
             st.subheader("📝 生成细纲")
 
             if st.session_state.get('current_novel_id'):
-                from services import DetailedOutlineService
-                detailed_outline_service = DetailedOutlineService()
-
                 can_generate_detailed = orchestration.can_generate_detailed_outline(st.session_state.current_novel_id)
 
                 if can_generate_detailed:
@@ -368,17 +393,24 @@ if st.session_state.crew_result:
                             if start_ch > end_ch:
                                 st.error("起始章节不能大于结束章节")
                             else:
-                                with st.spinner(f"正在生成第 {start_ch}-{end_ch} 章的细纲... (这可能需要几分钟)"):
-                                    result = detailed_outline_service.generate_detailed_outline(
-                                        novel_id=st.session_state.current_novel_id,
-                                        chapter_range=(start_ch, end_ch)
-                                    )
-
-                                    if result['success']:
-                                        st.success(f"✅ 细纲生成成功！共生成 {result['segments_created']} 个段")
-                                        st.info("可以前往小说管理页面撰写正文")
-                                    else:
-                                        st.error(f"生成失败: {result['error']}")
+                                if submit_job(
+                                    job_service,
+                                    'generate_detailed_outline',
+                                    scope=f"novel:{st.session_state.current_novel_id}:detailed_outline",
+                                    novel_id=st.session_state.current_novel_id,
+                                    chapter_range=[start_ch, end_ch]
+                                ):
+                                    st.rerun()
+
+                finished = follow_job(
+                    job_service, f"novel:{st.session_state.current_novel_id}:detailed_outline", label="正在生成细纲"
+                )
+                if finished:
+                    if finished['status'] == 'succeeded':
+                        st.success(f"✅ 细纲生成成功！共生成 {finished['result']['segments_created']} 个段")
+                        st.info("可以前往小说管理页面撰写正文")
+                    elif finished['status'] == 'failed':
+                        st.error(f"生成失败: {finished['error']}")
 
     st.markdown("---")
     st.subheader("📚 创建小说记录")
@@ -452,7 +484,9 @@ if st.session_state.crew_result:
                             'source_type': story.get('type', 'crew_ai') if story else 'crew_ai',
                             'is_outline_only': True,
                             'category_key': category.key if category else 'unknown'
-                        }
+                        },
+                        unique_title=True,
+                        title_suffix=f" ({novel_length})"
                     )
 
                     st.success(f"✅ 小说记录创建成功！ID: {novel_id}")
@@ -1,15 +1,23 @@
 import os
+import threading
 from crewai import Agent, Task, Crew, Process, LLM
 # from langchain_openai import ChatOpenAI
 from logic import load_config
+from llm_cache import LLMCache
+from llm_clients import reusable_agent
 
 # 加载配置
 CONFIG_PATH = "config.yaml"
 config = load_config(CONFIG_PATH)
+llm_cache = LLMCache(config)
+
+# 进程内共享的 LLM 实例，按 (base_url, api_key, model) 区分
+_llm_pool = {}
+_llm_pool_lock = threading.Lock()
 
 def get_llm(model_name=None):
     """
-    配置 CrewAI 使用的 LLM
+    配置 CrewAI 使用的 LLM（相同配置复用同一实例及其连接池）
     
     Args:
         model_name: 模型名称，如果为 None 则使用默认模型
@@ -21,14 +29,20 @@ def get_llm(model_name=None):
         raise ValueError("Config not loaded")
     
     llm_conf = config.get("llm", {})
-    # 使用 CrewAI 原生 LLM 类
-    # 显式指定 provider="openai" 以避免 CrewAI 尝试加载 Google GenAI 等其他未安装的 provider
-    return LLM(
-        model=model_name or llm_conf.get("model", "gpt-3.5-turbo"),
-        base_url=llm_conf.get("base_url"),
-        api_key=llm_conf.get("api_key"),
-        provider="openai"
-    )
+    key = (llm_conf.get("base_url"), llm_conf.get("api_key"), model_name or llm_conf.get("model", "gpt-3.5-turbo"))
+    with _llm_pool_lock:
+        if key not in _llm_pool:
+            # 使用 CrewAI 原生 LLM 类
+            # 显式指定 provider="openai" 以避免 CrewAI 尝试加载 Google GenAI 等其他未安装的 provider
+            llm = LLM(
+                model=key[2],
+                base_url=key[0],
+                api_key=key[1],
+                provider="openai"
+            )
+            # 开启 llm_cache 时相同请求直接返回缓存结果
+            _llm_pool[key] = llm_cache.wrap_crewai_llm(llm)
+        return _llm_pool[key]
 
 def get_agent_model(agent_name):
     """
@@ -56,6 +70,7 @@ class StoryAgents:
     def __init__(self):
         pass
 
+    @reusable_agent
     def chief_editor(self):
         return Agent(
             role='总编代理 (Chief Editor)',
@@ -66,6 +81,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def idea_stormer(self):
         return Agent(
             role='脑洞代理 (Idea Stormer)',
@@ -75,6 +91,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def plot_weaver(self):
         return Agent(
             role='剧情代理 (Plot Weaver)',
@@ -84,6 +101,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def character_builder(self):
         return Agent(
             role='角色代理 (Character Builder)',
@@ -93,6 +111,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def scene_painter(self):
         return Agent(
             role='场景代理 (Scene Painter)',
@@ -102,6 +121,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def climax_optimizer(self):
         return Agent(
             role='爽点代理 (Climax Optimizer)',
@@ -111,6 +131,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def punchline_king(self):
         return Agent(
             role='爆梗王 (Punchline King)',
@@ -120,6 +141,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def consistency_checker(self):
         return Agent(
             role='编辑代理 (Consistency Checker)',
@@ -129,6 +151,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def story_writer(self):
         return Agent(
             role='核心写手 (Lead Writer)',
@@ -138,6 +161,7 @@ class StoryAgents:
             verbose=True
         )
 
+    @reusable_agent
     def outline_architect(self):
         return Agent(
             role='大纲架构师 (Outline Architect)',
@@ -148,6 +172,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def format_editor(self):
         return Agent(
             role='格式编辑专家 (Format Editor)',
@@ -160,6 +185,7 @@ class StoryAgents:
 
     # ==================== 企划书 Crew Agents ====================
     
+    @reusable_agent
     def market_analyst(self):
         return Agent(
             role='市场趋势分析师 (Market Analyst)',
@@ -170,6 +196,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def creative_director(self):
         return Agent(
             role='创意总监 (Creative Director)',
@@ -180,6 +207,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def world_builder(self):
         return Agent(
             role='世界观架构师 (World Builder)',
@@ -190,6 +218,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def naming_expert(self):
         return Agent(
             role='命名专家 (Naming Expert)',
@@ -202,6 +231,7 @@ class StoryAgents:
 
     # ==================== 大纲生成 Crew Agents ====================
     
+    @reusable_agent
     def lead_outliner(self):
         return Agent(
             role='首席大纲师 (Lead Outliner)',
@@ -212,6 +242,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def character_arc_designer(self):
         return Agent(
             role='人物弧光设计师 (Character Arc Designer)',
@@ -222,6 +253,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def logic_validator(self):
         return Agent(
             role='逻辑校验员 (Logic Validator)',
@@ -234,6 +266,7 @@ class StoryAgents:
 
     # ==================== 细纲生成 Crew Agents ====================
     
+    @reusable_agent
     def narrative_planner(self):
         return Agent(
             role='叙事规划师 (Narrative Planner)',
@@ -244,6 +277,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def scene_weaver(self):
         return Agent(
             role='场景设计师 (Scene Weaver)',
@@ -256,6 +290,7 @@ class StoryAgents:
 
     # ==================== 正文撰写 Crew Agents ====================
     
+    @reusable_agent
     def continuity_coordinator(self):
         return Agent(
             role='连续性协调员 (Continuity Coordinator)',
@@ -266,6 +301,7 @@ class StoryAgents:
             allow_delegation=False
         )
 
+    @reusable_agent
     def creative_critic(self):
         return Agent(
             role='创意批判专家 (Creative Critic)',
@@ -1,6 +1,8 @@
 from crewai import Task
 from textwrap import dedent
+from utils.context_budget import truncate_tokens
 from utils.novel_length_config import get_category_by_name, get_chapter_planning_guide
+from utils.text_patch import patch_guardrail
 
 class StoryTasks:
     @staticmethod
@@ -30,6 +32,22 @@ class StoryTasks:
         else:
             return str(num)
 
+    @staticmethod
+    def _patch_output_requirements(draft_name):
+        """补丁模式的输出要求：只输出修改处，由本地应用到正文"""
+        return dedent(f"""
+            **输出要求（补丁模式，必须严格执行）**：
+            1. **不要输出完整正文**，只输出需要修改的地方，每处修改是一个编辑操作：
+               - anchor：从{draft_name}中**逐字复制**的一段连续原文（一到三句，必须在全文中唯一，不要跨越章节标题）
+               - replacement：替换后的文本（保留不改的部分也要写出；删除时为空字符串）
+            2. 修改处互不重叠，按在原文中出现的顺序排列；不要修改章节标题
+            3. 没有需要修改的地方时输出 {{"edits": []}}
+            4. 只输出一个 JSON 代码块，不要输出任何说明，格式如下：
+            ```json
+            {{"edits": [{{"anchor": "原文片段", "replacement": "修改后的片段"}}]}}
+            ```
+        """)
+
     def brainstorm_task(self, agent, topic, rounds=3):
         return Task(
             description=dedent(f"""
@@ -200,7 +218,8 @@ class StoryTasks:
             expected_output="一份包含所有章节详情的结构化大纲列表。"
         )
 
-    def outline_analysis_task(self, agent, outline_content, previous_chapter_content, num_chapters, story_context=""):
+    def outline_analysis_task(self, agent, outline_content, previous_chapter_content, num_chapters, story_context="",
+                              story_so_far="", related_passages=""):
         """
         大纲分析任务 - 分析已有大纲，为后续写作提供指导
         
@@ -210,6 +229,10 @@ class StoryTasks:
             previous_chapter_content: 上一章内容（用于衔接）
             num_chapters: 要生成的章节数量
             story_context: 企划书/故事背景（可选）
+            story_so_far: 前情提要（已写章节的摘要汇总，可选）
+            related_passages: 按大纲检索到的相关前文片段（可选）
+
+        各段内容由调用方按 token 预算裁剪后传入（见 utils/context_budget.py）
         """
         return Task(
             description=dedent(f"""
@@ -218,8 +241,14 @@ class StoryTasks:
                 **已有大纲**：
                 {outline_content}
 
+                **前情提要**（已写章节的剧情摘要）：
+                {story_so_far if story_so_far else "（暂无）"}
+
                 **上一章内容**（用于衔接）：
-                {previous_chapter_content[:500] if previous_chapter_content else "（这是开篇，无上一章）"}
+                {previous_chapter_content if previous_chapter_content else "（这是开篇，无上一章）"}
+
+                **相关前文片段**（检索自已写章节，用于回收伏笔、保持人物与道具设定一致）：
+                {related_passages if related_passages else "（无）"}
 
                 **故事背景**（企划书）：
                 {story_context if story_context else "（无企划书）"}
@@ -239,6 +268,7 @@ class StoryTasks:
                 4. **确保一致性**：
                    - 与企划书的世界观、人物设定保持一致
                    - 与上一章的内容和风格保持连贯
+                   - 不与前情提要中已发生的事件、人物状态和伏笔冲突
                    - 确保剧情逻辑合理
 
                 **重要**：
@@ -617,7 +647,8 @@ class StoryTasks:
             expected_output=f"创意批判意见报告（Markdown格式），包含对{num_chapters}章的详细评审意见和改进建议，但绝不包含修改后的正文内容。"
         )
 
-    def story_revision_task(self, agent, context_draft=None, context_critique=None, num_chapters=1, chapter_start_num=1, use_chinese_numerals=True):
+    def story_revision_task(self, agent, context_draft=None, context_critique=None, num_chapters=1, chapter_start_num=1, use_chinese_numerals=True,
+                            edit_mode="full"):
         """
         故事修订任务 - 写手根据批判意见自行修改
         
@@ -628,6 +659,7 @@ class StoryTasks:
             num_chapters: 章节数量（默认1）
             chapter_start_num: 起始章节号（默认1）
             use_chinese_numerals: 是否使用汉字数字（默认True）
+            edit_mode: full 输出完整正文；patch 只输出修改处，应用到初稿后作为任务结果
         """
         context_list = self._ensure_context_list([context_draft, context_critique])
         
@@ -639,8 +671,8 @@ class StoryTasks:
             chapter_format_example = f"## 第{chapter_start_num}章 标题"
             chapter_format_note = f"使用阿拉伯数字，例如：{chapter_format_example}"
         
-        return Task(
-            description=dedent(f"""
+        patch_mode = edit_mode == "patch" and context_draft is not None
+        description = dedent(f"""
                 作为核心写手，根据创意批判专家的意见，对初稿进行修订。
 
                 **上下文说明**：
@@ -661,6 +693,25 @@ class StoryTasks:
                 4. 提升画面感和细节描写，但保持你的描写风格
                 5. 优化创意独特性，避免套路化，但不要为了反套路而反套路
 
+                **修订策略**：
+                - 如果批判意见指出某处有问题，仔细思考如何改进
+                - 可以调整情节、描写、对话，但要保持整体风格一致
+                - 如果批判意见提到某个优点，确保在修订中保留
+                - 不要为了迎合意见而失去自己的创作特色
+            """)
+
+        if patch_mode:
+            return Task(
+                description=description + self._patch_output_requirements("初稿"),
+                agent=agent,
+                context=context_list,
+                expected_output="修订补丁（JSON 代码块，edits 列表中每项为 anchor 原文片段与 replacement 修改后的片段），禁止输出完整正文和修订说明。",
+                guardrail=patch_guardrail(context_draft),
+                guardrail_max_retries=1
+            )
+
+        return Task(
+            description=description + dedent(f"""
                 **章节编号格式**：{chapter_format_note}
 
                 **输出要求**：
@@ -668,19 +719,14 @@ class StoryTasks:
                 2. 每章以 ## 第X章 [标题] 开头
                 3. 直接输出正文，不要输出修订说明或总结
                 4. 保持原有的章节结构和字数要求（每章2500-3000字）
-
-                **修订策略**：
-                - 如果批判意见指出某处有问题，仔细思考如何改进
-                - 可以调整情节、描写、对话，但要保持整体风格一致
-                - 如果批判意见提到某个优点，确保在修订中保留
-                - 不要为了迎合意见而失去自己的创作特色
             """),
             agent=agent,
             context=context_list,
             expected_output=f"包含 {num_chapters} 章的修订后小说正文（Markdown格式），每章约2500-3000字，使用汉字数字编号。必须直接输出正文内容，禁止输出修订说明。"
         )
 
-    def copy_editing_task(self, agent, context_draft=None, num_chapters=1, chapter_start_num=1, use_chinese_numerals=True):
+    def copy_editing_task(self, agent, context_draft=None, num_chapters=1, chapter_start_num=1, use_chinese_numerals=True,
+                          edit_mode="full"):
         """
         编辑润色任务
 
@@ -690,6 +736,7 @@ class StoryTasks:
             num_chapters: 章节数量（默认1）
             chapter_start_num: 起始章节号（默认1）
             use_chinese_numerals: 是否使用汉字数字（默认True）
+            edit_mode: full 输出完整正文；patch 只输出修改处，应用到初稿后作为任务结果
         """
         context_list = self._ensure_context_list(context_draft)
 
@@ -706,8 +753,8 @@ class StoryTasks:
                 chapter_format_example += f"\n## 第{chapter_start_num + 1}章 标题"
             chapter_format_note = f"使用阿拉伯数字，例如：{chapter_format_example}"
 
-        return Task(
-            description=dedent(f"""
+        patch_mode = edit_mode == "patch" and context_draft is not None
+        description = dedent(f"""
                 你现在是一位起点/晋江签约级资深责编，对上下文中的小说初稿进行精细打磨与润色。
 
                 **最高优先级 - 必须完整获取初稿**：
@@ -729,7 +776,20 @@ class StoryTasks:
                 6. 保持原作爽点、爆点、钩子位置不变，但可增强张力与代入感。
                 7. 保留 Markdown 格式，每章以 ## 第X章 开头，段落分明，阅读体验舒适。
                 8. **禁止**添加新剧情、删除原有情节、擅自更改大纲走向。
+            """)
+
+        if patch_mode:
+            return Task(
+                description=description + self._patch_output_requirements("小说初稿"),
+                agent=agent,
+                context=context_list,
+                expected_output="润色补丁（JSON 代码块，edits 列表中每项为 anchor 原文片段与 replacement 修改后的片段），禁止输出完整正文和任何说明。",
+                guardrail=patch_guardrail(context_draft),
+                guardrail_max_retries=1
+            )
 
+        return Task(
+            description=description + dedent(f"""
                 **输出要求**（必须严格执行）：
                 - 直接输出完整润色后的小说正文，从第一章开始到最后一章。
                 - 每章以 ## 第X章 [章节标题] 开头（标题保持原样或微调更吸引人，但不得大幅改动）。
@@ -881,7 +941,7 @@ class StoryTasks:
                 {outline_segment}
                 
                 上一章内容（用于衔接）：
-                {previous_chapter_content[-2000:]} (节选)
+                {truncate_tokens(previous_chapter_content, 1500, keep="tail")}
                 
                 任务要求：
                 1. 严格按照大纲片段的剧情进行撰写。
@@ -1220,10 +1280,10 @@ class StoryTasks:
                 为第 {start_chapter}-{end_chapter} 章生成详细细纲（场景节拍表）。
                 
                 **章节大纲**：
-                {outline_content[:1500]}{'...(内容已截断)' if len(outline_content) > 1500 else ''}
+                {outline_content}
                 
                 **企划书参考**（必须严格遵循）：
-                {proposal_content[:3000] if proposal_content else '（无企划书）'}{custom_prompt_section}
+                {proposal_content if proposal_content else '（无企划书）'}{custom_prompt_section}
                 
                 **极其重要 - 企划书约束**：
                 1. **世界观设定**：必须严格遵循企划书中的世界观、规则、系统设定，不得偏离或添加企划书中没有的设定。
@@ -1270,8 +1330,8 @@ class StoryTasks:
             description=dedent(f"""
                 将第 {chapter_number} 章的内容压缩成简洁摘要。
                 
-                **章节内容**（节选）：
-                {chapter_content[:1000]}{'...(内容已截断)' if len(chapter_content) > 1000 else ''}
+                **章节内容**：
+                {truncate_tokens(chapter_content, 4000)}
                 
                 任务要求：
                 1. **字数控制**：摘要控制在 150-200 字。
@@ -1294,3 +1354,38 @@ class StoryTasks:
             agent=agent,
             expected_output=f"第{chapter_number}章的简洁摘要（150-200字），为后续章节提供上下文。"
         )
+
+    def summary_rollup_task(self, agent, summaries, start_chapter, end_chapter, level_name="段落"):
+        """
+        摘要汇总任务 - 把若干章节（或段落）的摘要合并为更高一级的摘要
+
+        Args:
+            agent: 连续性协调员智能体
+            summaries: 下级摘要（按章节顺序拼接）
+            start_chapter: 覆盖的起始章节
+            end_chapter: 覆盖的结束章节
+            level_name: 汇总层级名称（段落 / 卷）
+        """
+        return Task(
+            description=dedent(f"""
+                将第 {start_chapter}-{end_chapter} 章的剧情摘要合并为一份{level_name}摘要。
+
+                **各部分摘要**：
+                {summaries}
+
+                任务要求：
+                1. **字数控制**：摘要控制在 200-300 字。
+                2. **保留主线**：核心事件的因果链、主要人物的状态与关系变化。
+                3. **保留伏笔**：尚未回收的伏笔与悬念必须保留，已回收的可以省略。
+                4. **舍弃细节**：次要场景、对话与描写一概省略。
+
+                输出格式：
+                ```
+                ## 第{start_chapter}-{end_chapter}章{level_name}摘要
+
+                [200-300字的摘要]
+                ```
+            """),
+            agent=agent,
+            expected_output=f"第{start_chapter}-{end_chapter}章的{level_name}摘要（200-300字）。"
+        )
@@ -1,27 +1,400 @@
 import sqlite3
 import json
+import hashlib
+import os
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 import re
 
+from utils.compression import (
+    compress_text, decompress_text, get_codec, zstd_available, ZstdCodec
+)
 
-class DatabaseManager:
-    """数据库管理器 - 管理故事记录的核心 CRUD 操作"""
-    
-    def __init__(self, db_path: str = "stories.db"):
+
+# 正文分表：主表 -> (正文表, 外键列)
+# 列表、计数、统计只扫描体积很小的主表行，正文只在查看详情/导出时按主键读取
+CONTENT_TABLES = {
+    'stories': ('story_contents', 'story_id'),
+    'novels': ('novel_contents', 'novel_id'),
+    'chapters': ('chapter_contents', 'chapter_id'),
+}
+
+# 主表中预先计算的正文预览长度
+PREVIEW_LENGTH = 200
+
+# 压缩列配置：(表, 列) -> 编码（zlib / zstd / none / auto）
+# auto：已训练 zstd 字典且安装了 zstandard 时使用 zstd，否则使用 zlib
+# 读取时统一经 decompress() 解压，旧的未压缩数据原样返回，修改配置不影响已有数据
+# 注意：decompress() 是连接级的自定义函数（见 ConnectionPool.create_connection），压缩正文表的
+# 全文索引触发器也依赖它，因此修改这些表（及其主表）必须使用连接池创建的连接；
+# sqlite3 命令行或直接 sqlite3.connect 的连接写入时会报 "no such function: decompress"
+COMPRESSED_COLUMNS = {
+    ('chapter_contents', 'content'): 'auto',
+    ('novel_versions', 'snapshot_data'): 'auto',
+    ('snapshot_blobs', 'content'): 'auto',
+    ('chapter_html_cache', 'html'): 'auto',
+    ('llm_cache', 'response'): 'auto',
+}
+
+# 旧库需要补充的列：表 -> {列名: 列定义}
+ADDED_COLUMNS = {
+    'chapters': {'content_hash': 'TEXT'},
+    'novel_versions': {'snapshot_format': "TEXT DEFAULT 'json'", 'content_hash': 'TEXT'},
+}
+
+# 全文索引定义：FTS 表名 -> (主表, 主表中的索引列)，正文列 content 来自对应的正文表
+# 使用 trigram 分词器，中文无需分词即可做任意子串匹配（查询词需至少 3 个字符）
+FTS_TABLES = {
+    'stories_fts': ('stories', ('title', 'topic')),
+    'novels_fts': ('novels', ('title', 'topic')),
+    'chapters_fts': ('chapters', ('chapter_title',)),
+}
+
+FTS_MIN_TERM_LENGTH = 3
+
+
+def build_fts_query(search_query: str) -> Optional[str]:
+    """将用户输入转换为 FTS5 查询表达式
+
+    按空白切分为多个词，每个词作为短语精确匹配，词之间为 AND 关系。
+    trigram 索引无法匹配少于 3 个字符的词，此时返回 None，由调用方回退到 LIKE。
+    """
+    terms = search_query.split() if search_query else []
+    if not terms or any(len(term) < FTS_MIN_TERM_LENGTH for term in terms):
+        return None
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def content_hash(content: Optional[str]) -> str:
+    """正文内容哈希（版本快照按哈希去重存储正文）"""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def make_preview(content: Optional[str]) -> str:
+    """截取正文预览（写入主表的 preview 列）"""
+    return (content or "")[:PREVIEW_LENGTH]
+
+
+def make_snippet(text: Optional[str], search_query: str, width: int = 60,
+                 mark: str = "**") -> str:
+    """在 Python 侧截取关键词附近的片段（LIKE 回退时使用）"""
+    if not text:
+        return ""
+    pos = text.find(search_query)
+    if pos < 0:
+        return text[:width]
+    start = max(0, pos - width // 2)
+    end = min(len(text), pos + len(search_query) + width // 2)
+    snippet = (text[start:pos] + mark + search_query + mark
+               + text[pos + len(search_query):end])
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet += "…"
+    return snippet
+
+
+class _ThreadConnection:
+    """线程持有的池化连接及其事务嵌套深度"""
+
+    __slots__ = ("conn", "depth", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.depth = 0
+
+
+class ConnectionPool:
+    """进程级 SQLite 连接池
+
+    每个数据库文件对应一个连接池，每个线程复用自己的长连接（sqlite3 连接不能跨线程并发使用），
+    连接创建时统一开启 WAL 并设置性能相关的 PRAGMA。读操作不会被长时间运行的写事务阻塞。
+    """
+
+    # 连接级 PRAGMA（journal_mode=WAL 会持久化到数据库文件）
+    PRAGMAS = (
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),   # WAL 模式下 NORMAL 已足够安全，且提交时无需每次 fsync
+        ("cache_size", "-20000"),    # 负数表示 KiB，约 20MB 页缓存
+        ("mmap_size", "268435456"),  # 256MB 内存映射读
+        ("busy_timeout", "5000"),    # 写锁冲突时最多等待 5 秒
+        ("temp_store", "MEMORY"),
+    )
+
+    _pools: Dict[str, "ConnectionPool"] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_path: str):
         self.db_path = db_path
-        self.init_db()
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.fts_tables = set()  # 已确认存在的全文索引表
+        self.zstd_dict_loaded = False  # 是否已加载数据库中的 zstd 字典
+        self.schema_ready = False  # 本进程是否已确认数据库结构为最新版本
+        self.schema_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, db_path: str = "stories.db") -> "ConnectionPool":
+        """获取指定数据库的连接池（同一路径全进程共享）"""
+        key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+        pool = cls._pools.get(key)
+        if pool is None:
+            with cls._pools_lock:
+                pool = cls._pools.get(key)
+                if pool is None:
+                    pool = cls(db_path)
+                    cls._pools[key] = pool
+        return pool
+
+    @classmethod
+    def close_all_pools(cls):
+        """关闭所有连接池（测试或进程退出时使用）"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close_all()
+
+    def create_connection(self) -> sqlite3.Connection:
+        """创建一个已配置 PRAGMA 的新连接（调用方负责关闭）"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
+        for name, value in self.PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        # 压缩列的透明解压（视图、全文索引触发器和查询中使用）
+        conn.create_function("decompress", 1, decompress_text, deterministic=True)
+        if not self.zstd_dict_loaded:
+            self.load_zstd_dictionaries(conn)
         return conn
+
+    def load_zstd_dictionaries(self, conn: sqlite3.Connection):
+        """加载数据库中保存的 zstd 训练字典"""
+        codec = get_codec('zstd')
+        try:
+            rows = conn.execute(
+                "SELECT id, data FROM compression_dicts WHERE codec = 'zstd' ORDER BY id"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return  # 表尚未创建
+        if isinstance(codec, ZstdCodec):
+            for row in rows:
+                codec.add_dictionary(row['id'], row['data'])
+        self.zstd_dict_loaded = True
+
+    def _thread_connection(self) -> "_ThreadConnection":
+        """获取当前线程复用的连接
+
+        连接由线程局部的句柄持有：线程结束时其线程局部数据被释放，句柄回收后关闭连接并移出池，
+        因此页面重跑、任务线程池等短生命周期线程不会累积连接。
+        """
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = _ThreadConnection(self.create_connection())
+            with self._lock:
+                self._connections.append(holder.conn)
+            weakref.finalize(holder, self._release, holder.conn)
+            self._local.holder = holder
+        return holder
+
+    def _release(self, conn: sqlite3.Connection):
+        """关闭已结束线程的连接"""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def open_connections(self) -> int:
+        """池中当前打开的连接数"""
+        with self._lock:
+            return len(self._connections)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """获取连接的上下文管理器
+
+        最外层退出时提交事务，发生异常则回滚；嵌套使用时共享同一事务，
+        因此多个 Manager 方法可以组合成一个原子操作。
+        """
+        holder = self._thread_connection()
+        conn = holder.conn
+        holder.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            holder.depth -= 1
+            if holder.depth == 0 and conn.in_transaction:
+                conn.rollback()
+            raise
+        else:
+            holder.depth -= 1
+            if holder.depth == 0 and conn.in_transaction:
+                conn.commit()
+
+    def close_all(self):
+        """关闭池中所有连接"""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+class BaseManager:
+    """Manager 基类 - 统一通过连接池访问数据库"""
+
+    def __init__(self, db_path: str = "stories.db"):
+        self.db_path = db_path
+        self.pool = ensure_schema(db_path)
+
+    def get_connection(self) -> sqlite3.Connection:
+        """获取一个独立的数据库连接（调用方负责关闭，推荐改用 connection()）"""
+        return self.pool.create_connection()
+
+    def connection(self):
+        """获取池化连接的上下文管理器（自动提交/回滚）"""
+        return self.pool.connection()
+
+    def has_fts(self, conn: sqlite3.Connection, fts_table: str) -> bool:
+        """检查全文索引表是否可用（FTS5 不可用时搜索回退到 LIKE）"""
+        if fts_table in self.pool.fts_tables:
+            return True
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone()
+        if row:
+            self.pool.fts_tables.add(fts_table)
+        return bool(row)
+
+    def _save_content(self, conn: sqlite3.Connection, table: str, row_id: int,
+                      content: Optional[str]):
+        """写入正文表（已存在则覆盖），调用方同时负责更新主表的 preview 列"""
+        content_table, key_column = CONTENT_TABLES[table]
+        conn.execute(f"""
+            INSERT INTO {content_table} ({key_column}, content) VALUES (?, ?)
+            ON CONFLICT({key_column}) DO UPDATE SET content = excluded.content
+        """, (row_id, self.encode_column(content_table, 'content', content)))
+
+    def codec_for(self, table: str, column: str) -> str:
+        """获取压缩列当前使用的编码名（未配置压缩的列返回 'none'）"""
+        codec = COMPRESSED_COLUMNS.get((table, column), 'none')
+        if codec == 'auto':
+            zstd = get_codec('zstd')
+            codec = 'zstd' if zstd_available() and zstd.default_dict_id else 'zlib'
+        return codec
+
+    def encode_column(self, table: str, column: str, text: Optional[str]):
+        """按列配置压缩文本，写入数据库前调用"""
+        return compress_text(text, self.codec_for(table, column))
+
+    def add_zstd_dictionary(self, data: bytes) -> int:
+        """保存训练好的 zstd 字典，此后 auto 列的新写入使用该字典"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO compression_dicts (codec, data) VALUES ('zstd', ?)", (data,)
+            )
+            dict_id = cursor.lastrowid
+        get_codec('zstd').add_dictionary(dict_id, data)
+        return dict_id
     
-    def init_db(self):
-        """初始化数据库表结构"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _rebuild_novel_stats(self, cursor, novel_id: Optional[int] = None):
+        """按章节表重新聚合小说统计（首次建表或手动校准时使用）"""
+        novel_filter = "AND novel_id = ?" if novel_id is not None else ""
+        params = (novel_id,) if novel_id is not None else ()
+        
+        cursor.execute(f"""
+            INSERT INTO novel_metadata (novel_id, total_chapters, total_words, last_updated)
+            SELECT novel_id, COUNT(*), COALESCE(SUM(word_count), 0), ?
+            FROM chapters WHERE is_deleted = 0 {novel_filter}
+            GROUP BY novel_id
+            ON CONFLICT(novel_id) DO UPDATE SET
+                total_chapters = excluded.total_chapters,
+                total_words = excluded.total_words,
+                last_updated = excluded.last_updated
+        """, (datetime.now(),) + params)
+        # 已没有有效章节的小说归零
+        cursor.execute(f"""
+            UPDATE novel_metadata SET total_chapters = 0, total_words = 0
+            WHERE novel_id NOT IN (SELECT novel_id FROM chapters WHERE is_deleted = 0) {novel_filter}
+        """, params)
+        cursor.execute(f"DELETE FROM novel_status_counts WHERE 1 = 1 {novel_filter}", params)
+        cursor.execute(f"""
+            INSERT INTO novel_status_counts (novel_id, status, total)
+            SELECT novel_id, COALESCE(status, 'draft'), COUNT(*)
+            FROM chapters WHERE is_deleted = 0 {novel_filter}
+            GROUP BY novel_id, COALESCE(status, 'draft')
+        """, params)
+
+
+class SchemaManager(BaseManager):
+    """数据库结构迁移 - 按 PRAGMA user_version 顺序执行未应用的迁移步骤
+
+    每个进程对每个数据库只检查一次（见 ensure_schema），之后创建 Manager 不再执行任何 DDL。
+    每个版本在一个事务中执行并同时写入 user_version，中途失败不会留下半完成的版本；
+    多进程同时启动时以 BEGIN IMMEDIATE 串行化，后到者重新读取版本号后跳过已完成的步骤。
+    结构变更请在 MIGRATIONS 末尾追加新版本，不要修改已发布的步骤。
+    """
+
+    # (版本号, 说明, 迁移方法名)
+    MIGRATIONS = (
+        (1, "基础表结构、正文分表、全文索引与统计触发器", "_migrate_base_schema"),
+        (2, "骰子选项表", "_migrate_dice_options"),
+        (3, "小说标题索引", "_migrate_novel_title_index"),
+        (4, "章节 HTML 渲染缓存", "_migrate_chapter_html_cache"),
+        (5, "导出文件缓存", "_migrate_export_artifacts"),
+        (6, "后台任务队列", "_migrate_jobs"),
+        (7, "LLM 响应缓存", "_migrate_llm_cache"),
+        (8, "章节摘要与逐级汇总", "_migrate_chapter_summaries"),
+        (9, "版本清单记录章节状态与大纲", "_migrate_version_chapter_meta"),
+    )
+
+    def __init__(self, db_path: str = "stories.db"):
+        # 不经过 BaseManager.__init__，避免递归触发迁移
+        self.db_path = db_path
+        self.pool = ConnectionPool.get(db_path)
+
+    @classmethod
+    def latest_version(cls) -> int:
+        """代码所需的最新结构版本"""
+        return cls.MIGRATIONS[-1][0]
+
+    def current_version(self) -> int:
+        """数据库当前的结构版本"""
+        with self.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self) -> List[int]:
+        """执行所有未应用的迁移
+
+        Returns:
+            本次执行的版本号列表（已是最新时为空）
+        """
+        applied = []
+        with self.pool.schema_lock:
+            for version, description, method in self.MIGRATIONS:
+                with self.connection() as conn:
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN IMMEDIATE")
+                    if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                        continue
+                    getattr(self, method)(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                applied.append(version)
+            self.pool.schema_ready = True
+        return applied
+
+    def _migrate_base_schema(self, cursor):
+        """v1：基础表结构（兼容此前各版本 init_db 创建的旧库）"""
         
         # stories 表
         cursor.execute("""
@@ -30,7 +403,7 @@ class DatabaseManager:
                 type TEXT NOT NULL,
                 title TEXT,
                 topic TEXT,
-                content TEXT,
+                preview TEXT,
                 metadata TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP,
@@ -56,7 +429,7 @@ class DatabaseManager:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT,
                 topic TEXT,
-                content TEXT,
+                preview TEXT,
                 metadata TEXT,
                 source_story_id INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -73,7 +446,8 @@ class DatabaseManager:
                 novel_id INTEGER NOT NULL,
                 chapter_number INTEGER NOT NULL,
                 chapter_title TEXT,
-                content TEXT,
+                preview TEXT,
+                content_hash TEXT,
                 word_count INTEGER DEFAULT 0,
                 outline TEXT,
                 status TEXT DEFAULT 'draft',
@@ -84,6 +458,34 @@ class DatabaseManager:
             )
         """)
         
+        # 正文表（与主表一对一，主表只保留 preview）
+        for table, (content_table, key_column) in CONTENT_TABLES.items():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {content_table} (
+                    {key_column} INTEGER PRIMARY KEY,
+                    content TEXT NOT NULL DEFAULT '',
+                    FOREIGN KEY ({key_column}) REFERENCES {table}(id)
+                )
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_content_ad AFTER DELETE ON {table} BEGIN
+                    DELETE FROM {content_table} WHERE {key_column} = old.id;
+                END
+            """)
+        
+        # 旧版数据库：把主表中的 content 列迁移到正文表
+        self._split_content_tables(cursor)
+        
+        # zstd 训练字典（压缩数据依赖字典解压，只增不删）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS compression_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
         # novel_versions 表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS novel_versions (
@@ -92,12 +494,42 @@ class DatabaseManager:
                 version_name TEXT NOT NULL,
                 version_note TEXT,
                 snapshot_data TEXT NOT NULL,
+                snapshot_format TEXT DEFAULT 'json',
+                content_hash TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 created_by TEXT,
                 FOREIGN KEY (novel_id) REFERENCES novels(id)
             )
         """)
         
+        # 版本快照清单：每个版本只记录章节元数据与正文哈希
+        # snapshot_format = 'manifest' 的版本使用该表，旧的 'json' 版本仍将全文存于 snapshot_data
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS novel_version_chapters (
+                version_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                chapter_id INTEGER,
+                chapter_number INTEGER NOT NULL,
+                chapter_title TEXT,
+                word_count INTEGER DEFAULT 0,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (version_id, position),
+                FOREIGN KEY (version_id) REFERENCES novel_versions(id)
+            )
+        """)
+        
+        # 按内容哈希去重的快照正文，未修改的章节在各版本间共享
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_blobs (
+                content_hash TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        self._add_missing_columns(cursor)
+        
         # novel_metadata 表
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS novel_metadata (
@@ -155,45 +587,475 @@ class DatabaseManager:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_novel_id ON chapters(novel_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_number ON chapters(chapter_number)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_versions_novel_id ON novel_versions(novel_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_version_chapters_hash ON novel_version_chapters(content_hash)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_chapters_novel_number ON chapters(novel_id, chapter_number)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_outlines_novel_id ON novel_outlines(novel_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_outline_segments_novel_id ON outline_segments(novel_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_outline_segments_order ON outline_segments(novel_id, segment_order)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_outline_segments_chapters ON outline_segments(novel_id, start_chapter, end_chapter)")
         
-        conn.commit()
-        conn.close()
+        # 游标分页索引：(created_at, id) 作为唯一排序键
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stories_keyset ON stories(created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stories_type_keyset ON stories(type, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_novels_keyset ON novels(created_at, id)")
+        
+        # 章节列表/统计的覆盖索引：计数、字数、状态分布无需回表
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chapters_listing
+            ON chapters(novel_id, is_deleted, chapter_number, word_count, status, chapter_title)
+        """)
+        
+        # 全文索引
+        self._init_fts(cursor)
+        
+        # 记录数缓存
+        self._init_record_counts(cursor)
+        
+        # 小说统计
+        self._init_novel_stats(cursor)
+    
+    def _migrate_dice_options(self, cursor):
+        """v2：骰子选项表（原由 DiceOptionsManager 初始化时创建）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dice_options (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL UNIQUE,
+                options TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    def _migrate_novel_title_index(self, cursor):
+        """v3：小说标题索引（分配不重名标题时按前缀范围查询）"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_novels_title ON novels(title)")
+    
+    def _migrate_chapter_html_cache(self, cursor):
+        """v4：章节 HTML 渲染缓存（EPUB/PDF 导出按正文哈希复用已渲染的章节）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chapter_html_cache (
+                content_hash TEXT NOT NULL,
+                renderer TEXT NOT NULL,
+                html BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, renderer)
+            )
+        """)
+    
+    def _migrate_export_artifacts(self, cursor):
+        """v5：导出文件缓存索引（文件本身保存在 export_cache 目录）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_artifacts (
+                fingerprint TEXT PRIMARY KEY,
+                novel_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_export_artifacts_novel ON export_artifacts(novel_id, kind)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_export_artifacts_lru ON export_artifacts(last_accessed)")
+    
+    def _migrate_jobs(self, cursor):
+        """v6：后台任务队列（Crew 生成等耗时操作由独立进程执行）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                scope TEXT,
+                params TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                progress REAL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                heartbeat_at TIMESTAMP,
+                seen_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_scope ON jobs(scope, id)")
+    
+    def _migrate_llm_cache(self, cursor):
+        """v7：LLM 响应缓存（按模型、消息与参数的哈希保存响应，开发调试与重放时复用）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                hit_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(last_accessed)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                hits INTEGER DEFAULT 0,
+                misses INTEGER DEFAULT 0
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO llm_cache_stats (id, hits, misses) VALUES (1, 0, 0)")
+
+    def _migrate_chapter_summaries(self, cursor):
+        """v8：章节摘要（每章一条，并逐级汇总为段落与卷，续写时提供前情提要）"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chapter_summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                novel_id INTEGER NOT NULL,
+                level TEXT NOT NULL,
+                start_chapter INTEGER NOT NULL,
+                end_chapter INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP,
+                UNIQUE (novel_id, level, start_chapter),
+                FOREIGN KEY (novel_id) REFERENCES novels(id)
+            )
+        """)
+    
+    def _migrate_version_chapter_meta(self, cursor):
+        """v9：版本清单记录章节状态与大纲，恢复版本时一并还原（旧清单为 NULL，恢复时保留当前值）"""
+        cursor.execute("PRAGMA table_info(novel_version_chapters)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column in ("status", "outline"):
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE novel_version_chapters ADD COLUMN {column} TEXT")
+
+    def _add_missing_columns(self, cursor):
+        """为旧库补充新增的列"""
+        for table, columns in ADDED_COLUMNS.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            existing = {row[1] for row in cursor.fetchall()}
+            for column, definition in columns.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def _split_content_tables(self, cursor):
+        """将旧版主表中的 content 列拆分到正文表，并填充 preview 列
+
+        旧的全文索引以主表为外部内容表，依赖 content 列，需要先删除，随后由 _init_fts 重建。
+        """
+        for table, (content_table, key_column) in CONTENT_TABLES.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = {row[1] for row in cursor.fetchall()}
+            if 'content' not in columns:
+                continue
+            
+            print(f"迁移 {table}.content 到 {content_table}...")
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {content_table} ({key_column}, content)
+                SELECT id, COALESCE(content, '') FROM {table}
+            """)
+            if 'preview' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN preview TEXT")
+            cursor.execute(f"UPDATE {table} SET preview = substr(COALESCE(content, ''), 1, ?)",
+                           (PREVIEW_LENGTH,))
+            
+            for fts_table, (source_table, _) in FTS_TABLES.items():
+                if source_table != table:
+                    continue
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {fts_table}")
+                self.pool.fts_tables.discard(fts_table)
+            
+            try:
+                cursor.execute(f"ALTER TABLE {table} DROP COLUMN content")
+            except sqlite3.OperationalError:
+                # SQLite < 3.35 不支持 DROP COLUMN：清空旧列以释放溢出页，并改名避免重复迁移
+                cursor.execute(f"UPDATE {table} SET content = NULL")
+                cursor.execute(f"ALTER TABLE {table} RENAME COLUMN content TO legacy_content")
+    
+    def _init_record_counts(self, cursor):
+        """创建由触发器维护的记录数表，翻页时无需 COUNT(*) 全表扫描"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'record_counts'")
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS record_counts (
+                table_name TEXT NOT NULL,
+                record_type TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, record_type)
+            )
+        """)
+        
+        # (表名, 类型表达式, 影响计数的列)：stories 按 type 分类，novels 统一记为 full_novel
+        count_specs = (
+            ('stories', '{row}.type', 'is_deleted, type'),
+            ('novels', "'full_novel'", 'is_deleted'),
+        )
+        for table, type_expr, watched_columns in count_specs:
+            new_type = type_expr.format(row='new')
+            old_type = type_expr.format(row='old')
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_ai AFTER INSERT ON {table}
+                WHEN new.is_deleted = 0 BEGIN
+                    INSERT INTO record_counts (table_name, record_type, total)
+                    VALUES ('{table}', {new_type}, 1)
+                    ON CONFLICT(table_name, record_type) DO UPDATE SET total = total + 1;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_ad AFTER DELETE ON {table}
+                WHEN old.is_deleted = 0 BEGIN
+                    UPDATE record_counts SET total = total - 1
+                    WHERE table_name = '{table}' AND record_type = {old_type};
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_count_au AFTER UPDATE OF {watched_columns} ON {table}
+                BEGIN
+                    UPDATE record_counts SET total = total - 1
+                    WHERE old.is_deleted = 0
+                      AND table_name = '{table}' AND record_type = {old_type};
+                    INSERT INTO record_counts (table_name, record_type, total)
+                    SELECT '{table}', {new_type}, 1 WHERE new.is_deleted = 0
+                    ON CONFLICT(table_name, record_type) DO UPDATE SET total = total + 1;
+                END
+            """)
+        
+        # 首次创建时统计已有数据
+        if not exists:
+            cursor.execute("""
+                INSERT INTO record_counts (table_name, record_type, total)
+                SELECT 'stories', type, COUNT(*) FROM stories WHERE is_deleted = 0 GROUP BY type
+            """)
+            cursor.execute("""
+                INSERT INTO record_counts (table_name, record_type, total)
+                SELECT 'novels', 'full_novel', COUNT(*) FROM novels WHERE is_deleted = 0
+            """)
+    
+    def _init_novel_stats(self, cursor):
+        """创建由触发器维护的小说统计（novel_metadata 总章节数/总字数与各状态章节数）
+        
+        章节增删改时按差值更新，统计读取只需按 novel_id 查一行，与小说长度无关。
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'novel_status_counts'")
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS novel_status_counts (
+                novel_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (novel_id, status)
+            )
+        """)
+        
+        now = "datetime('now', 'localtime')"
+        # 把一行章节计入（sign = 1）或移出（sign = -1）统计
+        add_new = f"""
+            INSERT INTO novel_metadata (novel_id, total_chapters, total_words, last_updated)
+            SELECT new.novel_id, 1, COALESCE(new.word_count, 0), {now} WHERE new.is_deleted = 0
+            ON CONFLICT(novel_id) DO UPDATE SET
+                total_chapters = total_chapters + 1,
+                total_words = total_words + excluded.total_words,
+                last_updated = excluded.last_updated;
+            INSERT INTO novel_status_counts (novel_id, status, total)
+            SELECT new.novel_id, COALESCE(new.status, 'draft'), 1 WHERE new.is_deleted = 0
+            ON CONFLICT(novel_id, status) DO UPDATE SET total = total + 1;
+        """
+        remove_old = f"""
+            UPDATE novel_metadata SET
+                total_chapters = total_chapters - 1,
+                total_words = total_words - COALESCE(old.word_count, 0),
+                last_updated = {now}
+            WHERE novel_id = old.novel_id AND old.is_deleted = 0;
+            UPDATE novel_status_counts SET total = total - 1
+            WHERE novel_id = old.novel_id AND status = COALESCE(old.status, 'draft') AND old.is_deleted = 0;
+        """
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS chapters_stats_ai AFTER INSERT ON chapters
+            WHEN new.is_deleted = 0 BEGIN
+                {add_new}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS chapters_stats_ad AFTER DELETE ON chapters
+            WHEN old.is_deleted = 0 BEGIN
+                {remove_old}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS chapters_stats_au
+            AFTER UPDATE OF novel_id, word_count, status, is_deleted, updated_at ON chapters
+            BEGIN
+                {remove_old}
+                {add_new}
+            END
+        """)
+        
+        # 首次创建时统计已有数据
+        if not exists:
+            self._rebuild_novel_stats(cursor)
+    
+    def _init_fts(self, cursor):
+        """创建 FTS5 全文索引及同步触发器（外部内容表模式，不重复存储正文）
+
+        外部内容为主表与正文表联结的视图 {主表}_search。主表只监听元数据列的更新与删除，
+        正文表监听正文的插入、更新、删除。正文压缩存储的表，其视图与触发器调用 decompress()，
+        只能通过 ConnectionPool 创建的连接写入（见 COMPRESSED_COLUMNS 的说明）。
+        """
+        for fts_table, (source_table, meta_columns) in FTS_TABLES.items():
+            content_table, key_column = CONTENT_TABLES[source_table]
+            search_view = f"{source_table}_search"
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+            )
+            exists = cursor.fetchone() is not None
+            
+            columns = meta_columns + ('content',)
+            column_list = ", ".join(columns)
+            meta_list = ", ".join(meta_columns)
+            
+            # 压缩列经 decompress() 还原为文本后再建索引
+            compressed = (content_table, 'content') in COMPRESSED_COLUMNS
+            
+            def content_value(row):
+                return f"decompress({row}.content)" if compressed else f"{row}.content"
+            
+            def row_values(meta_row, content_row):
+                return ", ".join([f"{meta_row}.{col}" for col in meta_columns]
+                                 + [content_value(content_row)])
+            
+            # 压缩配置变化后视图与正文表触发器需要重建（索引内容是解压后的文本，无需 rebuild）
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (search_view,)
+            )
+            view_row = cursor.fetchone()
+            if view_row and ('decompress(' in view_row[0]) != compressed:
+                cursor.execute(f"DROP VIEW {search_view}")
+                for suffix in ('ai', 'au', 'ad'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+            
+            cursor.execute(f"""
+                CREATE VIEW IF NOT EXISTS {search_view} AS
+                SELECT t.id, {', '.join('t.' + col for col in meta_columns)},
+                       {content_value('c')} AS content
+                FROM {source_table} t JOIN {content_table} c ON c.{key_column} = t.id
+            """)
+            
+            try:
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                        {column_list},
+                        content='{search_view}', content_rowid='id',
+                        tokenize='trigram'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                # 当前 SQLite 未编译 FTS5 或不支持 trigram，搜索回退到 LIKE
+                print(f"全文索引不可用，搜索将使用 LIKE: {e}")
+                return
+            
+            # 正文表：写入正文时建立索引（主表行总是先于正文行写入）
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN
+                    INSERT INTO {fts_table}(rowid, {column_list})
+                    SELECT t.id, {row_values('t', 'new')}
+                    FROM {source_table} t WHERE t.id = new.{key_column};
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF content ON {content_table}
+                WHEN old.content IS NOT new.content BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                    SELECT 'delete', t.id, {row_values('t', 'old')}
+                    FROM {source_table} t WHERE t.id = old.{key_column};
+                    INSERT INTO {fts_table}(rowid, {column_list})
+                    SELECT t.id, {row_values('t', 'new')}
+                    FROM {source_table} t WHERE t.id = new.{key_column};
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                    SELECT 'delete', t.id, {row_values('t', 'old')}
+                    FROM {source_table} t WHERE t.id = old.{key_column};
+                END
+            """)
+            
+            # 主表：元数据列更新时重建该行索引；删除前清理索引（正文行随后由 {主表}_content_ad 删除）
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_meta_au AFTER UPDATE OF {meta_list} ON {source_table}
+                WHEN {' OR '.join(f'old.{col} IS NOT new.{col}' for col in meta_columns)} BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                    SELECT 'delete', old.id, {row_values('old', 'c')}
+                    FROM {content_table} c WHERE c.{key_column} = old.id;
+                    INSERT INTO {fts_table}(rowid, {column_list})
+                    SELECT new.id, {row_values('new', 'c')}
+                    FROM {content_table} c WHERE c.{key_column} = new.id;
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_meta_bd BEFORE DELETE ON {source_table} BEGIN
+                    INSERT INTO {fts_table}({fts_table}, rowid, {column_list})
+                    SELECT 'delete', old.id, {row_values('old', 'c')}
+                    FROM {content_table} c WHERE c.{key_column} = old.id;
+                END
+            """)
+            
+            # 首次创建时为已有数据建立索引
+            if not exists:
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def ensure_schema(db_path: str = "stories.db") -> ConnectionPool:
+    """确保数据库结构为最新版本（每个进程每个数据库只实际检查一次）"""
+    pool = ConnectionPool.get(db_path)
+    if not pool.schema_ready:
+        SchemaManager(db_path).migrate()
+    return pool
+
+
+class DatabaseManager(BaseManager):
+    """数据库管理器 - 管理故事记录的核心 CRUD 操作"""
+    
+    def init_db(self):
+        """执行未应用的结构迁移（应用启动时已自动完成，供脚本显式调用）"""
+        SchemaManager(self.db_path).migrate()
     
     def save_story(self, story_type: str, title: str, topic: str, content: str, 
                    metadata: Optional[Dict] = None) -> int:
         """保存新故事记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
+            metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
         
-        cursor.execute("""
-            INSERT INTO stories (type, title, topic, content, metadata, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (story_type, title, topic, content, metadata_json, datetime.now()))
+            cursor.execute("""
+                INSERT INTO stories (type, title, topic, preview, metadata, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (story_type, title, topic, make_preview(content), metadata_json, datetime.now()))
         
-        story_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            story_id = cursor.lastrowid
+            self._save_content(conn, 'stories', story_id, content)
         
         return story_id
     
     def get_story(self, story_id: int) -> Optional[Dict]:
         """获取单条故事记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM stories WHERE id = ? AND is_deleted = 0
-        """, (story_id,))
+            cursor.execute("""
+                SELECT s.*, COALESCE(c.content, '') AS content
+                FROM stories s LEFT JOIN story_contents c ON c.story_id = s.id
+                WHERE s.id = ? AND s.is_deleted = 0
+            """, (story_id,))
         
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
         
         if row:
             story = dict(row)
@@ -207,64 +1069,189 @@ class DatabaseManager:
                     page: int = 1, page_size: int = 20,
                     order_by: str = 'created_at DESC') -> Tuple[List[Dict], int]:
         """列表查询故事记录（支持分页、筛选、搜索）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+        
+            # 构建查询条件
+            conditions = ["is_deleted = 0"]
+            params = []
+        
+            if story_type:
+                conditions.append("type = ?")
+                params.append(story_type)
+        
+            if search_query:
+                fts_query = build_fts_query(search_query)
+                if fts_query and self.has_fts(conn, 'stories_fts'):
+                    conditions.append("id IN (SELECT rowid FROM stories_fts WHERE stories_fts MATCH ?)")
+                    params.append(fts_query)
+                else:
+                    conditions.append("""(title LIKE ? OR topic LIKE ? OR id IN (
+                        SELECT story_id FROM story_contents WHERE content LIKE ?))""")
+                    search_pattern = f"%{search_query}%"
+                    params.extend([search_pattern, search_pattern, search_pattern])
+        
+            where_clause = " AND ".join(conditions)
+        
+            # 查询总数
+            cursor.execute(f"SELECT COUNT(*) FROM stories WHERE {where_clause}", params)
+            total_count = cursor.fetchone()[0]
+        
+            # 查询数据
+            offset = (page - 1) * page_size
+            query = f"""
+                SELECT id, type, title, topic, 
+                       preview AS content_preview,
+                       created_at, updated_at
+                FROM stories 
+                WHERE {where_clause}
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            """
+            params.extend([page_size, offset])
+        
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        
+        stories = [dict(row) for row in rows]
+        return stories, total_count
+    
+    def list_stories_after(self, story_type: Optional[str] = None,
+                           cursor: Optional[Tuple[str, int]] = None,
+                           page_size: int = 20, ascending: bool = False) -> List[Dict]:
+        """游标分页查询故事记录（按 created_at, id 排序）
+        
+        Args:
+            story_type: 类型筛选
+            cursor: 上一页最后一条记录的 (created_at, id)，为 None 时返回第一页
+            page_size: 每页数量
+            ascending: 是否按时间正序
         
-        # 构建查询条件
+        Returns:
+            故事列表。无论翻到第几页，查询代价都只与 page_size 有关
+        """
         conditions = ["is_deleted = 0"]
-        params = []
+        params: List[Any] = []
         
         if story_type:
             conditions.append("type = ?")
             params.append(story_type)
         
-        if search_query:
-            conditions.append("(title LIKE ? OR topic LIKE ? OR content LIKE ?)")
-            search_pattern = f"%{search_query}%"
-            params.extend([search_pattern, search_pattern, search_pattern])
-        
-        where_clause = " AND ".join(conditions)
+        if cursor is not None:
+            conditions.append(f"(created_at, id) {'>' if ascending else '<'} (?, ?)")
+            params.extend(cursor)
+        
+        direction = "ASC" if ascending else "DESC"
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, type, title, topic, 
+                       preview AS content_preview,
+                       created_at, updated_at
+                FROM stories 
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at {direction}, id {direction}
+                LIMIT ?
+            """, params + [page_size]).fetchall()
         
-        # 查询总数
-        cursor.execute(f"SELECT COUNT(*) FROM stories WHERE {where_clause}", params)
-        total_count = cursor.fetchone()[0]
-        
-        # 查询数据
-        offset = (page - 1) * page_size
-        query = f"""
-            SELECT id, type, title, topic, 
-                   substr(content, 1, 200) as content_preview,
-                   created_at, updated_at
-            FROM stories 
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT ? OFFSET ?
-        """
-        params.extend([page_size, offset])
+        return [dict(row) for row in rows]
+    
+    def count_stories(self, story_type: Optional[str] = None) -> int:
+        """获取故事记录数（读取触发器维护的 record_counts，O(1)）"""
+        with self.connection() as conn:
+            if story_type:
+                row = conn.execute("""
+                    SELECT total FROM record_counts
+                    WHERE table_name = 'stories' AND record_type = ?
+                """, (story_type,)).fetchone()
+            else:
+                row = conn.execute("""
+                    SELECT SUM(total) FROM record_counts WHERE table_name = 'stories'
+                """).fetchone()
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        return int(row[0] or 0) if row else 0
+    
+    def search_stories(self, search_query: str, story_type: Optional[str] = None,
+                       limit: int = 20, offset: int = 0) -> Tuple[List[Dict], int]:
+        """全文搜索故事记录，按相关度排序并返回高亮片段
         
-        stories = [dict(row) for row in rows]
-        return stories, total_count
+        Returns:
+            (hits, total_count)，hit 中的 snippet 字段用 ** 标记命中词
+        """
+        with self.connection() as conn:
+            fts_query = build_fts_query(search_query)
+            if not fts_query or not self.has_fts(conn, 'stories_fts'):
+                return self._search_stories_like(conn, search_query, story_type, limit, offset)
+            
+            conditions = ["stories_fts MATCH ?", "s.is_deleted = 0"]
+            params: List[Any] = [fts_query]
+            if story_type:
+                conditions.append("s.type = ?")
+                params.append(story_type)
+            where_clause = " AND ".join(conditions)
+            
+            total_count = conn.execute(f"""
+                SELECT COUNT(*) FROM stories_fts
+                JOIN stories s ON s.id = stories_fts.rowid
+                WHERE {where_clause}
+            """, params).fetchone()[0]
+            
+            rows = conn.execute(f"""
+                SELECT s.id, s.type, s.title, s.topic, s.created_at, s.updated_at,
+                       snippet(stories_fts, -1, '**', '**', '…', 24) AS snippet,
+                       bm25(stories_fts, 10.0, 5.0, 1.0) AS rank
+                FROM stories_fts
+                JOIN stories s ON s.id = stories_fts.rowid
+                WHERE {where_clause}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, params + [limit, offset]).fetchall()
+        
+        return [dict(row) for row in rows], total_count
+    
+    def _search_stories_like(self, conn, search_query, story_type, limit, offset):
+        """短关键词或无 FTS5 时的 LIKE 搜索"""
+        conditions = ["s.is_deleted = 0", "(s.title LIKE ? OR s.topic LIKE ? OR c.content LIKE ?)"]
+        search_pattern = f"%{search_query}%"
+        params: List[Any] = [search_pattern, search_pattern, search_pattern]
+        if story_type:
+            conditions.append("s.type = ?")
+            params.append(story_type)
+        where_clause = " AND ".join(conditions)
+        from_clause = "stories s LEFT JOIN story_contents c ON c.story_id = s.id"
+        
+        total_count = conn.execute(
+            f"SELECT COUNT(*) FROM {from_clause} WHERE {where_clause}", params
+        ).fetchone()[0]
+        rows = conn.execute(f"""
+            SELECT s.id, s.type, s.title, s.topic, c.content, s.created_at, s.updated_at
+            FROM {from_clause} WHERE {where_clause}
+            ORDER BY s.created_at DESC
+            LIMIT ? OFFSET ?
+        """, params + [limit, offset]).fetchall()
+        
+        hits = []
+        for row in rows:
+            hit = dict(row)
+            content = hit.pop('content')
+            hit['snippet'] = make_snippet(content, search_query)
+            hit['rank'] = 0.0
+            hits.append(hit)
+        return hits, total_count
     
     def delete_story(self, story_id: int, soft: bool = True) -> bool:
         """删除故事记录（默认软删除）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        if soft:
-            cursor.execute("""
-                UPDATE stories SET is_deleted = 1, updated_at = ?
-                WHERE id = ?
-            """, (datetime.now(), story_id))
-        else:
-            cursor.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+            if soft:
+                cursor.execute("""
+                    UPDATE stories SET is_deleted = 1, updated_at = ?
+                    WHERE id = ?
+                """, (datetime.now(), story_id))
+            else:
+                cursor.execute("DELETE FROM stories WHERE id = ?", (story_id,))
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
         
         return success
     
@@ -275,79 +1262,75 @@ class DatabaseManager:
     def update_story(self, story_id: int, title: Optional[str] = None,
                     content: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
         """更新故事记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        updates = []
-        params = []
+            updates = []
+            params = []
         
-        if title is not None:
-            updates.append("title = ?")
-            params.append(title)
+            if title is not None:
+                updates.append("title = ?")
+                params.append(title)
         
-        if content is not None:
-            updates.append("content = ?")
-            params.append(content)
+            if content is not None:
+                updates.append("preview = ?")
+                params.append(make_preview(content))
         
-        if metadata is not None:
-            updates.append("metadata = ?")
-            params.append(json.dumps(metadata, ensure_ascii=False))
+            if metadata is not None:
+                updates.append("metadata = ?")
+                params.append(json.dumps(metadata, ensure_ascii=False))
         
-        if not updates:
-            return False
+            if not updates:
+                return False
         
-        updates.append("updated_at = ?")
-        params.append(datetime.now())
-        params.append(story_id)
+            updates.append("updated_at = ?")
+            params.append(datetime.now())
+            params.append(story_id)
         
-        query = f"UPDATE stories SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+            query = f"UPDATE stories SET {', '.join(updates)} WHERE id = ?"
+            cursor.execute(query, params)
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
+            if success and content is not None:
+                self._save_content(conn, 'stories', story_id, content)
         
         return success
     
     def create_relation(self, parent_id: int, child_id: int) -> int:
         """创建父子关联关系"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO story_relations (parent_id, child_id)
-            VALUES (?, ?)
-        """, (parent_id, child_id))
+            cursor.execute("""
+                INSERT INTO story_relations (parent_id, child_id)
+                VALUES (?, ?)
+            """, (parent_id, child_id))
         
-        relation_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            relation_id = cursor.lastrowid
         
         return relation_id
     
     def get_story_history(self, story_id: int) -> List[Dict]:
         """获取故事的重新生成历史链"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 1. 查找所有子记录 (stories表中的crew_ai等)
-        cursor.execute("""
-            SELECT s.*, sr.created_at as relation_created_at
-            FROM story_relations sr
-            JOIN stories s ON s.id = sr.child_id
-            WHERE sr.parent_id = ? AND s.is_deleted = 0
-        """, (story_id,))
-        story_rows = cursor.fetchall()
-        
-        # 2. 查找关联的小说 (novels表)
-        cursor.execute("""
-            SELECT n.*, n.created_at as relation_created_at, 'full_novel' as type
-            FROM novels n
-            WHERE n.source_story_id = ? AND n.is_deleted = 0
-        """, (story_id,))
-        novel_rows = cursor.fetchall()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        conn.close()
+            # 1. 查找所有子记录 (stories表中的crew_ai等)
+            cursor.execute("""
+                SELECT s.*, sr.created_at as relation_created_at
+                FROM story_relations sr
+                JOIN stories s ON s.id = sr.child_id
+                WHERE sr.parent_id = ? AND s.is_deleted = 0
+            """, (story_id,))
+            story_rows = cursor.fetchall()
+        
+            # 2. 查找关联的小说 (novels表)
+            cursor.execute("""
+                SELECT n.*, n.created_at as relation_created_at, 'full_novel' as type
+                FROM novels n
+                WHERE n.source_story_id = ? AND n.is_deleted = 0
+            """, (story_id,))
+            novel_rows = cursor.fetchall()
         
         history = []
         for row in story_rows:
@@ -369,20 +1352,12 @@ class DatabaseManager:
         return history
 
 
-class NovelManager:
+class NovelManager(BaseManager):
     """小说管理器 - 管理完整小说记录"""
-    
-    def __init__(self, db_path: str = "stories.db"):
-        self.db_path = db_path
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
 
     def save_novel(self, title: str, topic: str, content: str,
-                   source_story_id: Optional[int] = None, metadata: Optional[Dict] = None) -> int:
+                   source_story_id: Optional[int] = None, metadata: Optional[Dict] = None,
+                   unique_title: bool = False, title_suffix: str = "") -> int:
         """保存新小说记录
 
         Args:
@@ -391,37 +1366,45 @@ class NovelManager:
             content: 小说内容
             source_story_id: 关联的企划书 ID（可选，如果为 None 则小说独立存在）
             metadata: 元数据字典
+            unique_title: 是否在写事务内为标题分配序号以保证不重名（见 allocate_title）
+            title_suffix: 序号插入位置之后的固定后缀，如 " (长篇)"
 
         Returns:
             新创建的小说 ID
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            if unique_title:
+                # 先取得写锁再分配，两个同时完成的生成任务不会拿到同一个标题
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                title = self.allocate_title(title, title_suffix=title_suffix)
         
-        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
+            metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
         
-        cursor.execute("""
-            INSERT INTO novels (title, topic, content, metadata, source_story_id, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (title, topic, content, metadata_json, source_story_id, datetime.now()))
+            cursor.execute("""
+                INSERT INTO novels (title, topic, preview, metadata, source_story_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (title, topic, make_preview(content), metadata_json, source_story_id, datetime.now()))
         
-        novel_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            novel_id = cursor.lastrowid
+            self._save_content(conn, 'novels', novel_id, content)
         
         return novel_id
 
     def get_novel(self, novel_id: int) -> Optional[Dict]:
         """获取单条小说记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT *, 'full_novel' as type FROM novels WHERE id = ? AND is_deleted = 0
-        """, (novel_id,))
+            cursor.execute("""
+                SELECT n.*, COALESCE(c.content, '') AS content, 'full_novel' as type
+                FROM novels n LEFT JOIN novel_contents c ON c.novel_id = n.id
+                WHERE n.id = ? AND n.is_deleted = 0
+            """, (novel_id,))
         
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
         
         if row:
             novel = dict(row)
@@ -434,252 +1417,518 @@ class NovelManager:
                    page: int = 1, page_size: int = 20,
                    order_by: str = 'created_at DESC') -> Tuple[List[Dict], int]:
         """列表查询小说记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 构建查询条件
-        conditions = ["is_deleted = 0"]
-        params = []
-        
-        if search_query:
-            conditions.append("(title LIKE ? OR topic LIKE ? OR content LIKE ?)")
-            search_pattern = f"%{search_query}%"
-            params.extend([search_pattern, search_pattern, search_pattern])
-        
-        where_clause = " AND ".join(conditions)
-        
-        # 查询总数
-        cursor.execute(f"SELECT COUNT(*) FROM novels WHERE {where_clause}", params)
-        total_count = cursor.fetchone()[0]
-        
-        # 查询数据
-        offset = (page - 1) * page_size
-        query = f"""
-            SELECT id, title, topic, 
-                   substr(content, 1, 200) as content_preview,
-                   created_at, updated_at, 'full_novel' as type
-            FROM novels 
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT ? OFFSET ?
-        """
-        params.extend([page_size, offset])
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+        
+            # 构建查询条件
+            conditions = ["is_deleted = 0"]
+            params = []
+        
+            if search_query:
+                fts_query = build_fts_query(search_query)
+                if fts_query and self.has_fts(conn, 'novels_fts'):
+                    conditions.append("id IN (SELECT rowid FROM novels_fts WHERE novels_fts MATCH ?)")
+                    params.append(fts_query)
+                else:
+                    conditions.append("""(title LIKE ? OR topic LIKE ? OR id IN (
+                        SELECT novel_id FROM novel_contents WHERE content LIKE ?))""")
+                    search_pattern = f"%{search_query}%"
+                    params.extend([search_pattern, search_pattern, search_pattern])
+        
+            where_clause = " AND ".join(conditions)
+        
+            # 查询总数
+            cursor.execute(f"SELECT COUNT(*) FROM novels WHERE {where_clause}", params)
+            total_count = cursor.fetchone()[0]
+        
+            # 查询数据
+            offset = (page - 1) * page_size
+            query = f"""
+                SELECT id, title, topic, 
+                       preview AS content_preview,
+                       created_at, updated_at, 'full_novel' as type
+                FROM novels 
+                WHERE {where_clause}
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            """
+            params.extend([page_size, offset])
+        
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         
         novels = [dict(row) for row in rows]
         return novels, total_count
+
+    def list_novels_after(self, cursor: Optional[Tuple[str, int]] = None,
+                          page_size: int = 20, ascending: bool = False) -> List[Dict]:
+        """游标分页查询小说记录（按 created_at, id 排序）"""
+        conditions = ["is_deleted = 0"]
+        params: List[Any] = []
+        
+        if cursor is not None:
+            conditions.append(f"(created_at, id) {'>' if ascending else '<'} (?, ?)")
+            params.extend(cursor)
+        
+        direction = "ASC" if ascending else "DESC"
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, title, topic, 
+                       preview AS content_preview,
+                       created_at, updated_at, 'full_novel' as type
+                FROM novels 
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at {direction}, id {direction}
+                LIMIT ?
+            """, params + [page_size]).fetchall()
+        
+        return [dict(row) for row in rows]
+    
+    def count_novels(self) -> int:
+        """获取小说记录数（读取触发器维护的 record_counts，O(1)）"""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT total FROM record_counts
+                WHERE table_name = 'novels' AND record_type = 'full_novel'
+            """).fetchone()
+        
+        return int(row[0] or 0) if row else 0
+
+    def search_novels(self, search_query: str, limit: int = 20,
+                      offset: int = 0) -> Tuple[List[Dict], int]:
+        """全文搜索小说记录，按相关度排序并返回高亮片段"""
+        with self.connection() as conn:
+            fts_query = build_fts_query(search_query)
+            if not fts_query or not self.has_fts(conn, 'novels_fts'):
+                search_pattern = f"%{search_query}%"
+                where_clause = "n.is_deleted = 0 AND (n.title LIKE ? OR n.topic LIKE ? OR c.content LIKE ?)"
+                from_clause = "novels n LEFT JOIN novel_contents c ON c.novel_id = n.id"
+                params = [search_pattern, search_pattern, search_pattern]
+                total_count = conn.execute(
+                    f"SELECT COUNT(*) FROM {from_clause} WHERE {where_clause}", params
+                ).fetchone()[0]
+                rows = conn.execute(f"""
+                    SELECT n.id, n.title, n.topic, c.content, n.created_at, n.updated_at
+                    FROM {from_clause} WHERE {where_clause}
+                    ORDER BY n.created_at DESC
+                    LIMIT ? OFFSET ?
+                """, params + [limit, offset]).fetchall()
+                hits = []
+                for row in rows:
+                    hit = dict(row)
+                    hit['snippet'] = make_snippet(hit.pop('content'), search_query)
+                    hit['rank'] = 0.0
+                    hit['type'] = 'full_novel'
+                    hits.append(hit)
+                return hits, total_count
+            
+            total_count = conn.execute("""
+                SELECT COUNT(*) FROM novels_fts
+                JOIN novels n ON n.id = novels_fts.rowid
+                WHERE novels_fts MATCH ? AND n.is_deleted = 0
+            """, (fts_query,)).fetchone()[0]
+            
+            rows = conn.execute("""
+                SELECT n.id, n.title, n.topic, n.created_at, n.updated_at,
+                       'full_novel' AS type,
+                       snippet(novels_fts, -1, '**', '**', '…', 24) AS snippet,
+                       bm25(novels_fts, 10.0, 5.0, 1.0) AS rank
+                FROM novels_fts
+                JOIN novels n ON n.id = novels_fts.rowid
+                WHERE novels_fts MATCH ? AND n.is_deleted = 0
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, (fts_query, limit, offset)).fetchall()
+        
+        return [dict(row) for row in rows], total_count
         
     def update_novel(self, novel_id: int, title: Optional[str] = None,
                     content: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
         """更新小说记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        updates = []
-        params = []
+            updates = []
+            params = []
         
-        if title is not None:
-            updates.append("title = ?")
-            params.append(title)
+            if title is not None:
+                updates.append("title = ?")
+                params.append(title)
         
-        if content is not None:
-            updates.append("content = ?")
-            params.append(content)
+            if content is not None:
+                updates.append("preview = ?")
+                params.append(make_preview(content))
         
-        if metadata is not None:
-            updates.append("metadata = ?")
-            params.append(json.dumps(metadata, ensure_ascii=False))
+            if metadata is not None:
+                updates.append("metadata = ?")
+                params.append(json.dumps(metadata, ensure_ascii=False))
         
-        if not updates:
-            return False
+            if not updates:
+                return False
         
-        updates.append("updated_at = ?")
-        params.append(datetime.now())
-        params.append(novel_id)
+            updates.append("updated_at = ?")
+            params.append(datetime.now())
+            params.append(novel_id)
         
-        query = f"UPDATE novels SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+            query = f"UPDATE novels SET {', '.join(updates)} WHERE id = ?"
+            cursor.execute(query, params)
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
+            if success and content is not None:
+                self._save_content(conn, 'novels', novel_id, content)
         
         return success
 
+    def allocate_title(self, title: str, title_suffix: str = "",
+                       exclude_novel_id: Optional[int] = None) -> str:
+        """分配未被占用的小说标题
+        
+        重名时在 title_suffix 之前插入 " (n)"（如 "书名 (2) (长篇)"），n 为已占用的最大序号加一。
+        借助 idx_novels_title 只做一次前缀范围查询。单独调用不保证并发安全，
+        需要与插入组合时使用 save_novel(unique_title=True)。
+        
+        Args:
+            title: 期望的标题（已带序号时按其去掉序号后的标题分配）
+            title_suffix: 序号之后的固定后缀
+            exclude_novel_id: 不参与比较的小说 ID（更新自身标题时使用）
+        
+        Returns:
+            可用的标题
+        """
+        if not title_suffix or not title.endswith(title_suffix):
+            title_suffix = ""
+        stem = title[:len(title) - len(title_suffix)]
+        numbered = re.compile(r"(.*) \((\d+)\)" + re.escape(title_suffix))
+        match = numbered.fullmatch(title)
+        if match:
+            stem = match.group(1)
+        
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT title FROM novels
+                WHERE title >= ? AND title < ? AND is_deleted = 0 AND id IS NOT ?
+            """, (stem, stem + "\U0010ffff", exclude_novel_id)).fetchall()
+        
+        taken = {row['title'] for row in rows}
+        if title not in taken:
+            return title
+        
+        numbers = [1]
+        for existing in taken:
+            match = numbered.fullmatch(existing)
+            if match and match.group(1) == stem:
+                numbers.append(int(match.group(2)))
+        return f"{stem} ({max(numbers) + 1}){title_suffix}"
+    
     def delete_novel(self, novel_id: int, soft: bool = True) -> bool:
         """删除小说记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        if soft:
-            cursor.execute("""
-                UPDATE novels SET is_deleted = 1, updated_at = ?
-                WHERE id = ?
-            """, (datetime.now(), novel_id))
-        else:
-            cursor.execute("DELETE FROM novels WHERE id = ?", (novel_id,))
+            if soft:
+                cursor.execute("""
+                    UPDATE novels SET is_deleted = 1, updated_at = ?
+                    WHERE id = ?
+                """, (datetime.now(), novel_id))
+            else:
+                cursor.execute("DELETE FROM novels WHERE id = ?", (novel_id,))
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
         
         return success
 
 
-class ChapterManager:
+class ChapterManager(BaseManager):
     """章节管理器 - 管理长篇小说的章节"""
     
-    def __init__(self, db_path: str = "stories.db"):
-        self.db_path = db_path
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
     def create_chapter(self, novel_id: int, chapter_number: int, 
                       chapter_title: str, content: str = "",
                       outline: str = "", status: str = "draft") -> int:
         """创建新章节"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        word_count = len(content)
+            word_count = len(content)
         
-        cursor.execute("""
-            INSERT INTO chapters 
-            (novel_id, chapter_number, chapter_title, content, word_count, outline, status, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (novel_id, chapter_number, chapter_title, content, word_count, outline, status, datetime.now()))
+            cursor.execute("""
+                INSERT INTO chapters 
+                (novel_id, chapter_number, chapter_title, preview, content_hash, word_count,
+                 outline, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (novel_id, chapter_number, chapter_title, make_preview(content), content_hash(content),
+                  word_count, outline, status, datetime.now()))
         
-        chapter_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            chapter_id = cursor.lastrowid
+            self._save_content(conn, 'chapters', chapter_id, content)
         
         return chapter_id
     
+    def create_chapters_bulk(self, novel_id: int, chapters: List[Dict[str, Any]]) -> List[int]:
+        """在一个事务中批量创建章节
+        
+        Args:
+            novel_id: 小说 ID
+            chapters: 章节列表，每项包含 chapter_number / chapter_title / content，
+                可选 outline / status（默认 'draft'）
+        
+        Returns:
+            新章节 ID 列表（与 chapters 顺序一致）。在外层 connection() 中调用时与其他写入共享事务
+        """
+        if not chapters:
+            return []
+        
+        now = datetime.now()
+        with self.connection() as conn:
+            chapter_ids = []
+            for ch in chapters:
+                content = ch.get('content') or ""
+                cursor = conn.execute("""
+                    INSERT INTO chapters 
+                    (novel_id, chapter_number, chapter_title, preview, content_hash, word_count,
+                     outline, status, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (novel_id, ch['chapter_number'], ch.get('chapter_title', ''), make_preview(content),
+                      content_hash(content), len(content), ch.get('outline', ''),
+                      ch.get('status', 'draft'), now))
+                chapter_ids.append(cursor.lastrowid)
+            
+            content_table, key_column = CONTENT_TABLES['chapters']
+            conn.executemany(f"""
+                INSERT INTO {content_table} ({key_column}, content) VALUES (?, ?)
+            """, [(chapter_id, self.encode_column(content_table, 'content', ch.get('content')))
+                  for chapter_id, ch in zip(chapter_ids, chapters)])
+        
+        return chapter_ids
+    
     def update_chapter(self, chapter_id: int, chapter_title: Optional[str] = None,
                       content: Optional[str] = None, outline: Optional[str] = None,
                       status: Optional[str] = None) -> bool:
         """更新章节"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        updates = []
-        params = []
+            updates = []
+            params = []
         
-        if chapter_title is not None:
-            updates.append("chapter_title = ?")
-            params.append(chapter_title)
+            if chapter_title is not None:
+                updates.append("chapter_title = ?")
+                params.append(chapter_title)
         
-        if content is not None:
-            updates.append("content = ?")
-            params.append(content)
-            updates.append("word_count = ?")
-            params.append(len(content))
+            if content is not None:
+                updates.append("preview = ?")
+                params.append(make_preview(content))
+                updates.append("content_hash = ?")
+                params.append(content_hash(content))
+                updates.append("word_count = ?")
+                params.append(len(content))
         
-        if outline is not None:
-            updates.append("outline = ?")
-            params.append(outline)
+            if outline is not None:
+                updates.append("outline = ?")
+                params.append(outline)
         
-        if status is not None:
-            updates.append("status = ?")
-            params.append(status)
+            if status is not None:
+                updates.append("status = ?")
+                params.append(status)
         
-        if not updates:
-            return False
+            if not updates:
+                return False
         
-        updates.append("updated_at = ?")
-        params.append(datetime.now())
-        params.append(chapter_id)
+            updates.append("updated_at = ?")
+            params.append(datetime.now())
+            params.append(chapter_id)
         
-        query = f"UPDATE chapters SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+            query = f"UPDATE chapters SET {', '.join(updates)} WHERE id = ?"
+            cursor.execute(query, params)
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
+            if success and content is not None:
+                self._save_content(conn, 'chapters', chapter_id, content)
         
         return success
     
     def delete_chapter(self, chapter_id: int, soft: bool = True) -> bool:
         """删除章节"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        if soft:
-            cursor.execute("""
-                UPDATE chapters SET is_deleted = 1, updated_at = ?
-                WHERE id = ?
-            """, (datetime.now(), chapter_id))
-        else:
-            cursor.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+            if soft:
+                cursor.execute("""
+                    UPDATE chapters SET is_deleted = 1, updated_at = ?
+                    WHERE id = ?
+                """, (datetime.now(), chapter_id))
+            else:
+                cursor.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
         
         return success
     
     def get_chapter(self, chapter_id: int) -> Optional[Dict]:
         """获取单个章节"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM chapters WHERE id = ? AND is_deleted = 0
-        """, (chapter_id,))
+            cursor.execute("""
+                SELECT ch.*, decompress(c.content) AS content
+                FROM chapters ch LEFT JOIN chapter_contents c ON c.chapter_id = ch.id
+                WHERE ch.id = ? AND ch.is_deleted = 0
+            """, (chapter_id,))
         
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
         
         return dict(row) if row else None
     
-    def list_chapters(self, novel_id: int, include_deleted: bool = False) -> List[Dict]:
-        """获取小说的所有章节（按序号排序）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def list_chapters(self, novel_id: int, include_deleted: bool = False,
+                      include_content: bool = False) -> List[Dict]:
+        """获取小说的所有章节（按序号排序）
+
+        默认只返回章节元数据与 preview，不读取正文；导出、快照等需要全文时传 include_content=True。
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        where_clause = "novel_id = ?"
-        if not include_deleted:
-            where_clause += " AND is_deleted = 0"
+            where_clause = "ch.novel_id = ?"
+            if not include_deleted:
+                where_clause += " AND ch.is_deleted = 0"
         
-        cursor.execute(f"""
-            SELECT * FROM chapters 
-            WHERE {where_clause}
-            ORDER BY chapter_number ASC
-        """, (novel_id,))
+            if include_content:
+                select_clause = "ch.*, decompress(c.content) AS content"
+                from_clause = "chapters ch LEFT JOIN chapter_contents c ON c.chapter_id = ch.id"
+            else:
+                select_clause = "ch.*"
+                from_clause = "chapters ch"
+        
+            cursor.execute(f"""
+                SELECT {select_clause} FROM {from_clause}
+                WHERE {where_clause}
+                ORDER BY ch.chapter_number ASC
+            """, (novel_id,))
         
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
+        
+        return [dict(row) for row in rows]
+    
+    def list_chapter_hashes(self, novel_id: int) -> List[Dict]:
+        """获取章节 ID、序号、标题与正文哈希（不含预览与正文，供索引等增量同步使用）"""
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT id, chapter_number, chapter_title, content_hash FROM chapters
+                WHERE novel_id = ? AND is_deleted = 0
+                ORDER BY chapter_number ASC
+            """, (novel_id,)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def iter_chapters(self, novel_id: int, include_content: bool = True,
+                      batch_size: int = 1) -> Iterator[Dict]:
+        """按章节序号逐批读取章节（导出等需要遍历全书正文时使用）
+        
+        以 (chapter_number, id) 游标分页，每批单独查询、不跨 yield 持有语句，
+        内存占用只与 batch_size 章的大小有关；遍历期间同一线程仍可正常读写数据库。
+        """
+        if include_content:
+            select_clause = "ch.*, decompress(c.content) AS content"
+            from_clause = "chapters ch LEFT JOIN chapter_contents c ON c.chapter_id = ch.id"
+        else:
+            select_clause = "ch.*"
+            from_clause = "chapters ch"
+        
+        last_number, last_id = None, 0
+        while True:
+            with self.connection() as conn:
+                if last_number is None:
+                    rows = conn.execute(f"""
+                        SELECT {select_clause} FROM {from_clause}
+                        WHERE ch.novel_id = ? AND ch.is_deleted = 0
+                        ORDER BY ch.chapter_number, ch.id LIMIT ?
+                    """, (novel_id, batch_size)).fetchall()
+                else:
+                    rows = conn.execute(f"""
+                        SELECT {select_clause} FROM {from_clause}
+                        WHERE ch.novel_id = ? AND ch.is_deleted = 0
+                          AND (ch.chapter_number, ch.id) > (?, ?)
+                        ORDER BY ch.chapter_number, ch.id LIMIT ?
+                    """, (novel_id, last_number, last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last_number, last_id = rows[-1]['chapter_number'], rows[-1]['id']
+    
+    def get_chapter_contents(self, chapter_ids: List[int]) -> Dict[int, str]:
+        """按章节 ID 批量读取正文"""
+        contents = {}
+        with self.connection() as conn:
+            for start in range(0, len(chapter_ids), 500):
+                batch = chapter_ids[start:start + 500]
+                rows = conn.execute(f"""
+                    SELECT chapter_id, decompress(content) AS content FROM chapter_contents
+                    WHERE chapter_id IN ({', '.join('?' * len(batch))})
+                """, batch).fetchall()
+                contents.update((row['chapter_id'], row['content']) for row in rows)
+        return contents
+    
+    def search_chapters(self, search_query: str, novel_id: Optional[int] = None,
+                        limit: int = 20, offset: int = 0) -> List[Dict]:
+        """全文搜索章节正文，按相关度排序并返回高亮片段"""
+        with self.connection() as conn:
+            fts_query = build_fts_query(search_query)
+            if not fts_query or not self.has_fts(conn, 'chapters_fts'):
+                search_pattern = f"%{search_query}%"
+                conditions = ["ch.is_deleted = 0", "(ch.chapter_title LIKE ? OR decompress(c.content) LIKE ?)"]
+                params: List[Any] = [search_pattern, search_pattern]
+                if novel_id is not None:
+                    conditions.append("ch.novel_id = ?")
+                    params.append(novel_id)
+                rows = conn.execute(f"""
+                    SELECT ch.id, ch.novel_id, ch.chapter_number, ch.chapter_title,
+                           decompress(c.content) AS content
+                    FROM chapters ch LEFT JOIN chapter_contents c ON c.chapter_id = ch.id
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY ch.novel_id, ch.chapter_number
+                    LIMIT ? OFFSET ?
+                """, params + [limit, offset]).fetchall()
+                hits = []
+                for row in rows:
+                    hit = dict(row)
+                    hit['snippet'] = make_snippet(hit.pop('content'), search_query)
+                    hit['rank'] = 0.0
+                    hits.append(hit)
+                return hits
+            
+            conditions = ["chapters_fts MATCH ?", "c.is_deleted = 0"]
+            params = [fts_query]
+            if novel_id is not None:
+                conditions.append("c.novel_id = ?")
+                params.append(novel_id)
+            
+            rows = conn.execute(f"""
+                SELECT c.id, c.novel_id, c.chapter_number, c.chapter_title,
+                       snippet(chapters_fts, 1, '**', '**', '…', 24) AS snippet,
+                       bm25(chapters_fts, 5.0, 1.0) AS rank
+                FROM chapters_fts
+                JOIN chapters c ON c.id = chapters_fts.rowid
+                WHERE {' AND '.join(conditions)}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, params + [limit, offset]).fetchall()
         
         return [dict(row) for row in rows]
     
     def reorder_chapters(self, chapter_ids_in_order: List[int]) -> bool:
         """调整章节顺序"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         try:
-            for new_number, chapter_id in enumerate(chapter_ids_in_order, start=1):
-                cursor.execute("""
+            with self.connection() as conn:
+                now = datetime.now()
+                conn.executemany("""
                     UPDATE chapters 
                     SET chapter_number = ?, updated_at = ?
                     WHERE id = ?
-                """, (new_number, datetime.now(), chapter_id))
-            
-            conn.commit()
+                """, [(new_number, now, chapter_id)
+                      for new_number, chapter_id in enumerate(chapter_ids_in_order, start=1)])
             return True
         except Exception as e:
-            conn.rollback()
             print(f"Error reordering chapters: {e}")
             return False
-        finally:
-            conn.close()
     
     def parse_chapters_from_content(self, content: str) -> List[Dict[str, Any]]:
         """从完整内容中解析章节（用于迁移）"""
@@ -816,72 +2065,290 @@ class ChapterManager:
         return chapters
 
 
-class NovelVersionManager:
-    """小说版本管理器"""
-    
-    def __init__(self, db_path: str = "stories.db"):
-        self.db_path = db_path
+class NovelVersionManager(BaseManager):
+    """小说版本管理器
+
+    新版本以清单形式存储（snapshot_format = 'manifest'）：novel_version_chapters 记录每章的
+    元数据与正文哈希，正文按哈希去重存入 snapshot_blobs，未修改的章节在各版本间共享。
+    旧版本（'json'）仍把全文存在 snapshot_data 中，读取接口对两种格式透明。
+    """
     
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    # IN 查询每批参数个数
+    BATCH_SIZE = 500
     
     def create_version(self, novel_id: int, version_name: str,
                       version_note: str = "", snapshot_data: Dict = None) -> int:
-        """创建新版本快照"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """创建新版本快照（整体 JSON 格式，新代码请使用 create_snapshot）"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        snapshot_json = json.dumps(snapshot_data, ensure_ascii=False) if snapshot_data else "{}"
+            snapshot_json = json.dumps(snapshot_data, ensure_ascii=False) if snapshot_data else "{}"
+            snapshot_value = self.encode_column('novel_versions', 'snapshot_data', snapshot_json)
         
-        cursor.execute("""
-            INSERT INTO novel_versions 
-            (novel_id, version_name, version_note, snapshot_data)
-            VALUES (?, ?, ?, ?)
-        """, (novel_id, version_name, version_note, snapshot_json))
+            cursor.execute("""
+                INSERT INTO novel_versions 
+                (novel_id, version_name, version_note, snapshot_data)
+                VALUES (?, ?, ?, ?)
+            """, (novel_id, version_name, version_note, snapshot_value))
+        
+            version_id = cursor.lastrowid
+        
+        return version_id
+    
+    def create_snapshot(self, novel_id: int, version_name: str, version_note: str = "",
+                        title: str = "", content: str = "",
+                        chapters: Optional[List[Dict]] = None) -> int:
+        """创建去重存储的版本快照
+        
+        Args:
+            novel_id: 小说 ID
+            version_name: 版本名
+            version_note: 版本说明
+            title: 小说标题
+            content: 小说正文（大纲）
+            chapters: 章节列表（list_chapters 的结果，无需包含正文）
         
-        version_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        Returns:
+            版本 ID。只有快照库中尚不存在的正文才会被读取和写入，
+            耗时与修改过的章节数成正比，而不是与全书篇幅成正比
+        """
+        chapters = chapters or []
+        with self.connection() as conn:
+            hashes = self._chapter_hashes(conn, chapters)
+            
+            # 只复制快照库中没有的正文（直接复制正文表中已压缩的数据，无需解压）
+            missing = self._missing_blobs(conn, set(hashes.values()))
+            copy_params = []
+            for ch in chapters:
+                chapter_hash = hashes[ch['id']]
+                if chapter_hash in missing:
+                    missing.discard(chapter_hash)
+                    copy_params.append((chapter_hash, ch.get('word_count') or 0, ch['id']))
+            conn.executemany("""
+                INSERT OR IGNORE INTO snapshot_blobs (content_hash, content, size)
+                SELECT ?, content, ? FROM chapter_contents WHERE chapter_id = ?
+            """, copy_params)
+            
+            novel_hash = content_hash(content)
+            conn.execute("""
+                INSERT OR IGNORE INTO snapshot_blobs (content_hash, content, size)
+                VALUES (?, ?, ?)
+            """, (novel_hash, self.encode_column('snapshot_blobs', 'content', content), len(content or "")))
+            
+            snapshot_json = json.dumps({'novel_id': novel_id, 'title': title}, ensure_ascii=False)
+            cursor = conn.execute("""
+                INSERT INTO novel_versions
+                (novel_id, version_name, version_note, snapshot_data, snapshot_format, content_hash)
+                VALUES (?, ?, ?, ?, 'manifest', ?)
+            """, (novel_id, version_name, version_note, snapshot_json, novel_hash))
+            version_id = cursor.lastrowid
+            
+            conn.executemany("""
+                INSERT INTO novel_version_chapters
+                (version_id, position, chapter_id, chapter_number, chapter_title, word_count, content_hash,
+                 status, outline)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(version_id, position, ch['id'], ch['chapter_number'], ch.get('chapter_title'),
+                   ch.get('word_count') or 0, hashes[ch['id']], ch.get('status'), ch.get('outline'))
+                  for position, ch in enumerate(chapters)])
         
         return version_id
     
+    def convert_json_version(self, version_id: int) -> bool:
+        """把旧的整体 JSON 快照转换为清单格式（正文写入去重的 snapshot_blobs）"""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT snapshot_data, snapshot_format FROM novel_versions WHERE id = ?
+            """, (version_id,)).fetchone()
+            if not row or row['snapshot_format'] == 'manifest':
+                return False
+            
+            snapshot = json.loads(decompress_text(row['snapshot_data']))
+            chapters = snapshot.get('chapters', [])
+            novel_content = snapshot.get('content', '')
+            
+            blobs = {content_hash(ch.get('content')): ch.get('content') or '' for ch in chapters}
+            blobs[content_hash(novel_content)] = novel_content or ''
+            conn.executemany("""
+                INSERT OR IGNORE INTO snapshot_blobs (content_hash, content, size)
+                VALUES (?, ?, ?)
+            """, [(blob_hash, self.encode_column('snapshot_blobs', 'content', text), len(text))
+                  for blob_hash, text in blobs.items()])
+            
+            conn.execute("DELETE FROM novel_version_chapters WHERE version_id = ?", (version_id,))
+            conn.executemany("""
+                INSERT INTO novel_version_chapters
+                (version_id, position, chapter_id, chapter_number, chapter_title, word_count, content_hash,
+                 status, outline)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(version_id, position, ch.get('id'), ch.get('chapter_number', position + 1),
+                   ch.get('chapter_title'), ch.get('word_count') or 0, content_hash(ch.get('content')),
+                   ch.get('status'), ch.get('outline'))
+                  for position, ch in enumerate(chapters)])
+            
+            snapshot_json = json.dumps(
+                {'novel_id': snapshot.get('novel_id'), 'title': snapshot.get('title', '')},
+                ensure_ascii=False
+            )
+            conn.execute("""
+                UPDATE novel_versions
+                SET snapshot_data = ?, snapshot_format = 'manifest', content_hash = ?
+                WHERE id = ?
+            """, (snapshot_json, content_hash(novel_content), version_id))
+        
+        return True
+    
+    def _chapter_hashes(self, conn: sqlite3.Connection, chapters: List[Dict]) -> Dict[int, str]:
+        """获取章节正文哈希；旧数据没有 content_hash 时读取正文补算并回写"""
+        hashes = {ch['id']: ch.get('content_hash') for ch in chapters}
+        missing_ids = [chapter_id for chapter_id, value in hashes.items() if not value]
+        for start in range(0, len(missing_ids), self.BATCH_SIZE):
+            batch = missing_ids[start:start + self.BATCH_SIZE]
+            rows = conn.execute(f"""
+                SELECT chapter_id, decompress(content) AS content FROM chapter_contents
+                WHERE chapter_id IN ({', '.join('?' * len(batch))})
+            """, batch).fetchall()
+            contents = {row['chapter_id']: row['content'] for row in rows}
+            updates = [(content_hash(contents.get(chapter_id)), chapter_id) for chapter_id in batch]
+            conn.executemany("UPDATE chapters SET content_hash = ? WHERE id = ?", updates)
+            hashes.update((chapter_id, value) for value, chapter_id in updates)
+        return hashes
+    
+    def _missing_blobs(self, conn: sqlite3.Connection, hashes) -> set:
+        """返回快照库中尚不存在的哈希"""
+        hashes = list(hashes)
+        existing = set()
+        for start in range(0, len(hashes), self.BATCH_SIZE):
+            batch = hashes[start:start + self.BATCH_SIZE]
+            rows = conn.execute(f"""
+                SELECT content_hash FROM snapshot_blobs
+                WHERE content_hash IN ({', '.join('?' * len(batch))})
+            """, batch).fetchall()
+            existing.update(row[0] for row in rows)
+        return set(hashes) - existing
+    
+    def get_snapshot_blobs(self, hashes) -> Dict[str, str]:
+        """按哈希批量读取快照正文"""
+        hashes = list(set(hashes))
+        blobs = {}
+        with self.connection() as conn:
+            for start in range(0, len(hashes), self.BATCH_SIZE):
+                batch = hashes[start:start + self.BATCH_SIZE]
+                rows = conn.execute(f"""
+                    SELECT content_hash, decompress(content) AS content FROM snapshot_blobs
+                    WHERE content_hash IN ({', '.join('?' * len(batch))})
+                """, batch).fetchall()
+                blobs.update((row['content_hash'], row['content']) for row in rows)
+        return blobs
+    
     def list_versions(self, novel_id: int) -> List[Dict]:
         """获取所有版本列表"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, novel_id, version_name, version_note, created_at, created_by
-            FROM novel_versions
-            WHERE novel_id = ?
-            ORDER BY created_at DESC
-        """, (novel_id,))
+            cursor.execute("""
+                SELECT id, novel_id, version_name, version_note, created_at, created_by
+                FROM novel_versions
+                WHERE novel_id = ?
+                ORDER BY created_at DESC
+            """, (novel_id,))
         
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
         
         return [dict(row) for row in rows]
     
-    def get_version(self, version_id: int) -> Optional[Dict]:
-        """获取指定版本内容"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_version_chapters(self, version_id: int) -> List[Dict]:
+        """获取版本的章节清单（每章带 content_hash；清单格式不含正文，旧 JSON 格式附带正文）"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT snapshot_format FROM novel_versions WHERE id = ?", (version_id,)
+            ).fetchone()
+            if not row:
+                return []
+            if row['snapshot_format'] == 'manifest':
+                rows = conn.execute("""
+                    SELECT chapter_id AS id, chapter_number, chapter_title, word_count, content_hash,
+                           status, outline
+                    FROM novel_version_chapters
+                    WHERE version_id = ?
+                    ORDER BY position
+                """, (version_id,)).fetchall()
+                return [dict(r) for r in rows]
+        
+        # 旧格式：从整体 JSON 中计算哈希
+        version = self.get_version(version_id)
+        chapters = []
+        for ch in version['snapshot_data'].get('chapters', []):
+            entry = dict(ch)
+            entry['content_hash'] = content_hash(ch.get('content'))
+            chapters.append(entry)
+        return chapters
+    
+    def get_version(self, version_id: int, include_content: bool = True) -> Optional[Dict]:
+        """获取指定版本内容
         
-        cursor.execute("""
-            SELECT * FROM novel_versions WHERE id = ?
-        """, (version_id,))
+        Args:
+            version_id: 版本 ID
+            include_content: 是否加载各章正文（为 False 时只加载章节清单与小说正文）
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        row = cursor.fetchone()
-        conn.close()
+            cursor.execute("""
+                SELECT * FROM novel_versions WHERE id = ?
+            """, (version_id,))
+        
+            row = cursor.fetchone()
+        
+        if not row:
+            return None
+        
+        version = dict(row)
+        snapshot = json.loads(decompress_text(version['snapshot_data']))
+        if version.get('snapshot_format') == 'manifest':
+            chapters = self.get_version_chapters(version_id)
+            hashes = [version['content_hash']]
+            if include_content:
+                hashes.extend(ch['content_hash'] for ch in chapters)
+            blobs = self.get_snapshot_blobs(hashes)
+            snapshot['content'] = blobs.get(version['content_hash'], '')
+            if include_content:
+                for ch in chapters:
+                    ch['content'] = blobs.get(ch['content_hash'], '')
+            snapshot['chapters'] = chapters
+        version['snapshot_data'] = snapshot
+        return version
+    
+    def diff_version_chapters(self, version_id_1: int, version_id_2: int) -> Dict[str, List]:
+        """按章节号对比两个版本，只加载有变化的章节正文
         
-        if row:
-            version = dict(row)
-            version['snapshot_data'] = json.loads(version['snapshot_data'])
-            return version
-        return None
+        Returns:
+            {'added': [...], 'removed': [...], 'changed': [(旧章节, 新章节), ...], 'unchanged': int}
+        """
+        chapters1 = {ch['chapter_number']: ch for ch in self.get_version_chapters(version_id_1)}
+        chapters2 = {ch['chapter_number']: ch for ch in self.get_version_chapters(version_id_2)}
+        
+        added = [chapters2[n] for n in sorted(chapters2.keys() - chapters1.keys())]
+        removed = [chapters1[n] for n in sorted(chapters1.keys() - chapters2.keys())]
+        changed = [
+            (chapters1[n], chapters2[n]) for n in sorted(chapters1.keys() & chapters2.keys())
+            if chapters1[n]['content_hash'] != chapters2[n]['content_hash']
+            or chapters1[n].get('chapter_title') != chapters2[n].get('chapter_title')
+        ]
+        
+        blobs = self.get_snapshot_blobs(
+            [ch['content_hash'] for ch in added + removed]
+            + [ch['content_hash'] for pair in changed for ch in pair]
+        )
+        for ch in added + removed + [ch for pair in changed for ch in pair]:
+            ch['content'] = blobs.get(ch['content_hash'], ch.get('content', ''))
+        
+        return {
+            'added': added,
+            'removed': removed,
+            'changed': changed,
+            'unchanged': len(chapters1.keys() & chapters2.keys()) - len(changed),
+        }
     
     def compare_versions(self, version_id_1: int, version_id_2: int) -> Dict:
         """版本对比（返回差异）"""
@@ -912,133 +2379,676 @@ class NovelVersionManager:
         }
     
     def restore_version(self, version_id: int) -> bool:
-        """恢复到指定版本"""
-        # 这个方法需要配合 DatabaseManager 和 ChapterManager 使用
-        # 实现在具体使用时完成
-        pass
+        """恢复到指定版本
+        
+        在一个事务内把 novels / chapters 改写为快照状态：与当前章节逐条比较，只写入有变化的行，
+        正文直接从 snapshot_blobs 复制（无需解压），快照中没有的章节软删除，
+        novel_metadata 由章节触发器随之更新。WAL 模式下读者在提交前始终看到旧数据。
+        章节状态与大纲按清单还原（清单中没有记录的旧版本保留当前值）。
+        
+        Returns:
+            是否成功
+        """
+        try:
+            with self.connection() as conn:
+                # 先取得写锁再读取：延迟事务读取后再升级为写事务，遇到并发写入会失败（SQLITE_BUSY_SNAPSHOT）
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT novel_id, snapshot_format FROM novel_versions WHERE id = ?", (version_id,)
+                ).fetchone()
+                if not row:
+                    return False
+                novel_id = row['novel_id']
+                if row['snapshot_format'] != 'manifest':
+                    self.convert_json_version(version_id)
+                
+                version = conn.execute(
+                    "SELECT snapshot_data, content_hash FROM novel_versions WHERE id = ?", (version_id,)
+                ).fetchone()
+                snapshot = json.loads(decompress_text(version['snapshot_data']))
+                targets = self.get_version_chapters(version_id)
+                now = datetime.now()
+                
+                self._restore_novel(conn, novel_id, snapshot.get('title'), version['content_hash'], now)
+                
+                current = {
+                    r['id']: dict(r) for r in conn.execute("""
+                        SELECT id, novel_id, chapter_number, chapter_title, word_count,
+                               content_hash, is_deleted, status, outline
+                        FROM chapters WHERE novel_id = ?
+                    """, (novel_id,))
+                }
+                
+                updates, content_copies, inserts = [], [], []
+                kept_ids = set()
+                for target in targets:
+                    existing = current.get(target['id'])
+                    if existing is None:
+                        inserts.append(target)
+                        continue
+                    kept_ids.add(existing['id'])
+                    content_changed = existing['content_hash'] != target['content_hash']
+                    status = target.get('status') or existing['status']
+                    outline = existing['outline'] if target.get('outline') is None else target['outline']
+                    if (content_changed or existing['is_deleted']
+                            or existing['chapter_number'] != target['chapter_number']
+                            or existing['chapter_title'] != target['chapter_title']
+                            or existing['word_count'] != target['word_count']
+                            or existing['status'] != status or existing['outline'] != outline):
+                        updates.append((target['chapter_number'], target['chapter_title'],
+                                        target['word_count'], target['content_hash'],
+                                        PREVIEW_LENGTH, target['content_hash'], status, outline,
+                                        now, existing['id']))
+                    if content_changed:
+                        content_copies.append((existing['id'], target['content_hash']))
+                
+                # 快照之后被硬删除的章节：沿用原 ID 重新插入（ID 已被占用时分配新 ID）
+                for target in inserts:
+                    taken = target['id'] is not None and conn.execute(
+                        "SELECT 1 FROM chapters WHERE id = ?", (target['id'],)
+                    ).fetchone()
+                    cursor = conn.execute("""
+                        INSERT INTO chapters
+                        (id, novel_id, chapter_number, chapter_title, word_count, content_hash,
+                         preview, status, outline, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?,
+                                (SELECT substr(decompress(content), 1, ?) FROM snapshot_blobs
+                                 WHERE content_hash = ?),
+                                ?, ?, ?)
+                    """, (None if taken else target['id'], novel_id, target['chapter_number'],
+                          target['chapter_title'], target['word_count'], target['content_hash'],
+                          PREVIEW_LENGTH, target['content_hash'], target.get('status') or 'published',
+                          target.get('outline') or '', now))
+                    content_copies.append((cursor.lastrowid, target['content_hash']))
+                
+                conn.executemany("""
+                    UPDATE chapters
+                    SET chapter_number = ?, chapter_title = ?, word_count = ?, content_hash = ?,
+                        preview = (SELECT substr(decompress(content), 1, ?) FROM snapshot_blobs
+                                   WHERE content_hash = ?),
+                        status = ?, outline = ?, is_deleted = 0, updated_at = ?
+                    WHERE id = ?
+                """, updates)
+                conn.executemany("""
+                    INSERT INTO chapter_contents (chapter_id, content)
+                    SELECT ?, content FROM snapshot_blobs WHERE content_hash = ?
+                    ON CONFLICT(chapter_id) DO UPDATE SET content = excluded.content
+                """, content_copies)
+                conn.executemany(
+                    "UPDATE chapters SET is_deleted = 1, updated_at = ? WHERE id = ?",
+                    [(now, chapter_id) for chapter_id, ch in current.items()
+                     if chapter_id not in kept_ids and not ch['is_deleted']]
+                )
+            return True
+        except Exception as e:
+            print(f"Error restoring version: {e}")
+            return False
+    
+    def _restore_novel(self, conn: sqlite3.Connection, novel_id: int, title: Optional[str],
+                       novel_hash: Optional[str], now: datetime):
+        """恢复小说标题与正文（正文未变化时不写入）"""
+        current = conn.execute("""
+            SELECT n.title, decompress(c.content) AS content
+            FROM novels n LEFT JOIN novel_contents c ON c.novel_id = n.id
+            WHERE n.id = ?
+        """, (novel_id,)).fetchone()
+        if not current:
+            raise ValueError(f"小说 {novel_id} 不存在")
+        
+        if title and title != current['title']:
+            conn.execute("UPDATE novels SET title = ?, updated_at = ? WHERE id = ?",
+                         (title, now, novel_id))
+        if novel_hash and content_hash(current['content']) != novel_hash:
+            blob = conn.execute(
+                "SELECT decompress(content) FROM snapshot_blobs WHERE content_hash = ?", (novel_hash,)
+            ).fetchone()
+            if blob:
+                conn.execute("UPDATE novels SET preview = ?, updated_at = ? WHERE id = ?",
+                             (make_preview(blob[0]), now, novel_id))
+                self._save_content(conn, 'novels', novel_id, blob[0])
 
 
-class NovelStatsManager:
-    """小说统计管理器"""
+class RenderCacheManager(BaseManager):
+    """章节渲染缓存 - 按 (正文哈希, 渲染方式) 保存已渲染的 HTML，正文不变时导出无需重新渲染"""
     
-    def __init__(self, db_path: str = "stories.db"):
-        self.db_path = db_path
+    BATCH_SIZE = 500
     
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def get_rendered(self, hashes, renderer: str) -> Dict[str, str]:
+        """批量读取已缓存的渲染结果（未命中的哈希不在返回值中）"""
+        hashes = list(hashes)
+        rendered = {}
+        with self.connection() as conn:
+            for start in range(0, len(hashes), self.BATCH_SIZE):
+                batch = hashes[start:start + self.BATCH_SIZE]
+                rows = conn.execute(f"""
+                    SELECT content_hash, html FROM chapter_html_cache
+                    WHERE renderer = ? AND content_hash IN ({', '.join('?' * len(batch))})
+                """, [renderer] + batch).fetchall()
+                rendered.update((row['content_hash'], decompress_text(row['html'])) for row in rows)
+        return rendered
     
-    def calculate_novel_stats(self, novel_id: int) -> Dict:
-        """计算小说统计信息"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def save_rendered(self, items: Dict[str, str], renderer: str):
+        """保存渲染结果 {正文哈希: HTML}"""
+        if not items:
+            return
+        with self.connection() as conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO chapter_html_cache (content_hash, renderer, html, created_at)
+                VALUES (?, ?, ?, ?)
+            """, [(value_hash, renderer, self.encode_column('chapter_html_cache', 'html', html), datetime.now())
+                  for value_hash, html in items.items()])
+    
+    def prune(self) -> int:
+        """删除已不对应任何章节正文的缓存（章节改写或删除后遗留），返回删除行数"""
+        with self.connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM chapter_html_cache
+                WHERE content_hash NOT IN (
+                    SELECT content_hash FROM chapters WHERE content_hash IS NOT NULL
+                )
+            """)
+            return cursor.rowcount
+
+
+class ExportArtifactManager(BaseManager):
+    """导出文件缓存 - 按内容指纹保存已生成的导出文件，重复下载直接读取磁盘
+    
+    指纹由调用方根据小说、各章正文哈希、格式与选项计算，内容变化后指纹随之变化，
+    同一小说同一类导出的旧文件在写入新文件时删除；总大小超过上限时按最近访问时间淘汰。
+    """
+    
+    MAX_TOTAL_BYTES = 512 * 1024 * 1024
+    
+    def __init__(self, db_path: str = "stories.db", cache_dir: Optional[str] = None,
+                 max_total_bytes: Optional[int] = None):
+        super().__init__(db_path)
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "export_cache")
+        self.max_total_bytes = self.MAX_TOTAL_BYTES if max_total_bytes is None else max_total_bytes
+    
+    def get(self, fingerprint: str) -> Optional[str]:
+        """按指纹获取缓存文件路径并刷新访问时间（文件已丢失时清除记录并返回 None）"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT file_path FROM export_artifacts WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if not row:
+                return None
+            if not os.path.exists(row['file_path']):
+                conn.execute("DELETE FROM export_artifacts WHERE fingerprint = ?", (fingerprint,))
+                return None
+            conn.execute(
+                "UPDATE export_artifacts SET last_accessed = ? WHERE fingerprint = ?",
+                (datetime.now(), fingerprint)
+            )
+        return row['file_path']
+    
+    def put(self, fingerprint: str, novel_id: int, kind: str, source_path: str) -> str:
+        """把生成好的文件移入缓存目录并登记，返回缓存后的路径
         
-        # 统计章节数和总字数（使用 COALESCE 处理 NULL 值）
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_chapters,
-                COALESCE(SUM(word_count), 0) as total_words,
-                COALESCE(AVG(word_count), 0) as avg_words_per_chapter
-            FROM chapters
-            WHERE novel_id = ? AND is_deleted = 0
-        """, (novel_id,))
-        
-        row = cursor.fetchone()
-        if row:
-            stats = dict(row)
-            # 确保数值类型正确（SQLite 可能返回字符串）
-            stats['total_chapters'] = int(stats.get('total_chapters', 0) or 0)
-            stats['total_words'] = int(stats.get('total_words', 0) or 0)
-            avg_words = stats.get('avg_words_per_chapter')
-            if avg_words is not None:
-                stats['avg_words_per_chapter'] = float(avg_words) if avg_words else 0.0
+        Args:
+            fingerprint: 内容指纹
+            novel_id: 小说 ID
+            kind: 导出类别（格式与选项，如 markdown+outline），同类旧文件会被替换
+            source_path: 已生成的文件（会被移动）
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        extension = os.path.splitext(source_path)[1]
+        file_path = os.path.join(self.cache_dir, f"{fingerprint}{extension}")
+        os.replace(source_path, file_path)
+        now = datetime.now()
+        
+        with self.connection() as conn:
+            stale = conn.execute("""
+                SELECT fingerprint, file_path FROM export_artifacts
+                WHERE novel_id = ? AND kind = ? AND fingerprint != ?
+            """, (novel_id, kind, fingerprint)).fetchall()
+            conn.execute("""
+                INSERT OR REPLACE INTO export_artifacts
+                (fingerprint, novel_id, kind, file_path, size, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (fingerprint, novel_id, kind, file_path, os.path.getsize(file_path), now, now))
+            self._remove(conn, stale)
+        
+        self.evict()
+        return file_path
+    
+    def evict(self, max_total_bytes: Optional[int] = None) -> int:
+        """按最近访问时间淘汰，直到总大小不超过上限，返回淘汰的文件数"""
+        limit = self.max_total_bytes if max_total_bytes is None else max_total_bytes
+        with self.connection() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM export_artifacts").fetchone()[0]
+            if total <= limit:
+                return 0
+            victims = []
+            for row in conn.execute("""
+                SELECT fingerprint, file_path, size FROM export_artifacts
+                ORDER BY last_accessed ASC
+            """).fetchall():
+                if total <= limit:
+                    break
+                victims.append(row)
+                total -= row['size']
+            self._remove(conn, victims)
+        return len(victims)
+    
+    def invalidate_novel(self, novel_id: int) -> int:
+        """删除某部小说的全部缓存文件，返回删除数量"""
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT fingerprint, file_path FROM export_artifacts WHERE novel_id = ?", (novel_id,)
+            ).fetchall()
+            self._remove(conn, rows)
+        return len(rows)
+    
+    def _remove(self, conn: sqlite3.Connection, rows):
+        """删除缓存记录及对应文件"""
+        conn.executemany(
+            "DELETE FROM export_artifacts WHERE fingerprint = ?", [(row['fingerprint'],) for row in rows]
+        )
+        for row in rows:
+            try:
+                os.remove(row['file_path'])
+            except OSError:
+                pass
+
+
+class LLMCacheManager(BaseManager):
+    """LLM 响应缓存 - 按 (模型, 消息, 参数) 的哈希保存响应，支持过期时间与按总大小淘汰
+    
+    命中/未命中次数持久化在 llm_cache_stats 中，多个执行进程共享同一份统计。
+    """
+    
+    MAX_TOTAL_BYTES = 200 * 1024 * 1024
+    
+    def __init__(self, db_path: str = "stories.db", max_total_bytes: Optional[int] = None):
+        super().__init__(db_path)
+        self.max_total_bytes = max_total_bytes or self.MAX_TOTAL_BYTES
+    
+    @staticmethod
+    def make_key(model: str, messages, params: Optional[Dict] = None) -> str:
+        """计算缓存键（参数中值为 None 的项不参与计算）"""
+        payload = {
+            'model': model,
+            'messages': messages,
+            'params': {k: v for k, v in sorted((params or {}).items()) if v is not None},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        """读取缓存（过期的条目视为未命中并删除），同时记录命中统计"""
+        now = datetime.now()
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row and row['expires_at'] is not None and str(row['expires_at']) <= str(now):
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+                row = None
+            if row is None:
+                conn.execute("UPDATE llm_cache_stats SET misses = misses + 1 WHERE id = 1")
+                return None
+            conn.execute("""
+                UPDATE llm_cache SET hit_count = hit_count + 1, last_accessed = ? WHERE cache_key = ?
+            """, (now, cache_key))
+            conn.execute("UPDATE llm_cache_stats SET hits = hits + 1 WHERE id = 1")
+        return decompress_text(row['response'])
+    
+    def put(self, cache_key: str, model: str, response: str, ttl_seconds: Optional[float] = None):
+        """写入缓存，超过总大小上限时淘汰最久未访问的条目"""
+        now = datetime.now()
+        expires_at = datetime.fromtimestamp(now.timestamp() + ttl_seconds) if ttl_seconds else None
+        data = self.encode_column('llm_cache', 'response', response)
+        with self.connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_cache
+                    (cache_key, model, response, size, hit_count, created_at, last_accessed, expires_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+            """, (cache_key, model, data, len(data), now, now, expires_at))
+            self.evict()
+    
+    def evict(self) -> int:
+        """删除过期条目，并按最近访问时间淘汰到总大小上限以内，返回删除条数"""
+        with self.connection() as conn:
+            removed = conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (datetime.now(),)
+            ).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total <= self.max_total_bytes:
+                return removed
+            for row in conn.execute(
+                "SELECT cache_key, size FROM llm_cache ORDER BY last_accessed, created_at"
+            ).fetchall():
+                if total <= self.max_total_bytes:
+                    break
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (row['cache_key'],))
+                total -= row['size']
+                removed += 1
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中统计与缓存占用"""
+        with self.connection() as conn:
+            counters = conn.execute("SELECT hits, misses FROM llm_cache_stats WHERE id = 1").fetchone()
+            usage = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        hits, misses = (counters['hits'], counters['misses']) if counters else (0, 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': usage[0],
+            'total_bytes': usage[1],
+        }
+    
+    def clear(self) -> int:
+        """清空缓存与统计，返回删除条数"""
+        with self.connection() as conn:
+            removed = conn.execute("DELETE FROM llm_cache").rowcount
+            conn.execute("UPDATE llm_cache_stats SET hits = 0, misses = 0 WHERE id = 1")
+        return removed
+
+
+class ChapterSummaryManager(BaseManager):
+    """章节摘要 - 每章摘要（chapter）及其逐级汇总（arc 段落、volume 卷）
+
+    source_hash 记录生成摘要时的来源：章节摘要为正文哈希，汇总为下级摘要的哈希，
+    来源变化（章节被改写、下级摘要重新生成）后视为过期，需要重新生成。
+    """
+    
+    LEVELS = ('chapter', 'arc', 'volume')
+    
+    def save_summary(self, novel_id: int, level: str, start_chapter: int, end_chapter: int,
+                     summary: str, source_hash: str):
+        """保存摘要（同一小说、层级与起始章节只保留一条）"""
+        if level not in self.LEVELS:
+            raise ValueError(f"未知的摘要层级: {level}")
+        now = datetime.now()
+        with self.connection() as conn:
+            conn.execute("""
+                INSERT INTO chapter_summaries
+                (novel_id, level, start_chapter, end_chapter, summary, source_hash, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(novel_id, level, start_chapter) DO UPDATE SET
+                    end_chapter = excluded.end_chapter,
+                    summary = excluded.summary,
+                    source_hash = excluded.source_hash,
+                    updated_at = excluded.updated_at
+            """, (novel_id, level, start_chapter, end_chapter, summary, source_hash, now, now))
+    
+    def list_summaries(self, novel_id: int, level: Optional[str] = None,
+                       before_chapter: Optional[int] = None) -> List[Dict]:
+        """按起始章节顺序获取摘要（before_chapter 只返回结束于该章之前的摘要）"""
+        where = ["novel_id = ?"]
+        params: List[Any] = [novel_id]
+        if level:
+            where.append("level = ?")
+            params.append(level)
+        if before_chapter is not None:
+            where.append("end_chapter < ?")
+            params.append(before_chapter)
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT * FROM chapter_summaries WHERE {' AND '.join(where)}
+                ORDER BY start_chapter ASC
+            """, params).fetchall()
+        return [dict(row) for row in rows]
+    
+    def pending_chapters(self, novel_id: int) -> List[Dict]:
+        """缺少摘要或摘要已过期（正文已改写）的章节（只含元数据）"""
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT ch.id, ch.chapter_number, ch.chapter_title, COALESCE(ch.content_hash, '') AS content_hash
+                FROM chapters ch
+                LEFT JOIN chapter_summaries s
+                    ON s.novel_id = ch.novel_id AND s.level = 'chapter' AND s.start_chapter = ch.chapter_number
+                WHERE ch.novel_id = ? AND ch.is_deleted = 0
+                  AND (s.id IS NULL OR s.source_hash != COALESCE(ch.content_hash, ''))
+                ORDER BY ch.chapter_number ASC
+            """, (novel_id,)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def prune(self, novel_id: int) -> int:
+        """删除已不存在的章节的摘要，以及不再完整覆盖的汇总，返回删除行数"""
+        with self.connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM chapter_summaries
+                WHERE novel_id = ? AND level = 'chapter' AND start_chapter NOT IN (
+                    SELECT chapter_number FROM chapters WHERE novel_id = ? AND is_deleted = 0
+                )
+            """, (novel_id, novel_id))
+            deleted = cursor.rowcount
+            cursor = conn.execute("""
+                DELETE FROM chapter_summaries
+                WHERE novel_id = ? AND level != 'chapter' AND (end_chapter - start_chapter + 1) > (
+                    SELECT COUNT(*) FROM chapter_summaries c
+                    WHERE c.novel_id = chapter_summaries.novel_id AND c.level = 'chapter'
+                      AND c.start_chapter BETWEEN chapter_summaries.start_chapter AND chapter_summaries.end_chapter
+                )
+            """, (novel_id,))
+            return deleted + cursor.rowcount
+
+
+class JobConflictError(ValueError):
+    """同一 scope 已有参数不同的未完成任务"""
+
+    def __init__(self, scope: str, job_id: int):
+        super().__init__(f"{scope} 已有未完成的任务（ID: {job_id}），请等待其完成后再提交")
+        self.scope = scope
+        self.job_id = job_id
+
+
+class JobManager(BaseManager):
+    """后台任务队列 - 任务状态持久化在 jobs 表，页面刷新或断线重连后仍可查询"""
+    
+    ACTIVE_STATUSES = ('queued', 'running')
+    
+    def enqueue(self, job_type: str, params: Optional[Dict] = None, scope: Optional[str] = None) -> int:
+        """提交任务
+        
+        Args:
+            job_type: 任务类型（对应 JobService 中注册的处理函数）
+            params: 任务参数（需可 JSON 序列化）
+            scope: 任务归属（如 "novel:12:outline"），页面按 scope 查找并展示任务；
+                同一 scope 已有参数相同的未完成任务时不重复提交，直接返回该任务 ID
+        
+        Returns:
+            任务 ID
+
+        Raises:
+            JobConflictError: 同一 scope 已有参数不同的未完成任务
+        """
+        with self.connection() as conn:
+            if scope is not None:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("""
+                    SELECT id, params FROM jobs WHERE scope = ? AND status IN ('queued', 'running')
+                    ORDER BY id DESC LIMIT 1
+                """, (scope,)).fetchone()
+                if row:
+                    # 参数统一经 JSON 往返后比较（元组与列表视为相同）
+                    if json.loads(row['params'] or '{}') != json.loads(json.dumps(params or {})):
+                        raise JobConflictError(scope, row['id'])
+                    return row['id']
+            cursor = conn.execute("""
+                INSERT INTO jobs (job_type, scope, params, status, message, created_at)
+                VALUES (?, ?, ?, 'queued', '排队中', ?)
+            """, (job_type, scope, json.dumps(params or {}, ensure_ascii=False), datetime.now()))
+            return cursor.lastrowid
+    
+    def claim_next(self, worker: str) -> Optional[Dict]:
+        """领取最早排队的任务（多个执行进程同时领取时只有一个成功）"""
+        now = datetime.now()
+        with self.connection() as conn:
+            row = conn.execute("""
+                UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?,
+                    message = '执行中'
+                WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                  AND status = 'queued'
+                RETURNING *
+            """, (worker, now, now)).fetchone()
+        return self._to_dict(row) if row else None
+    
+    def update_progress(self, job_id: int, progress: Optional[float] = None,
+                        message: Optional[str] = None):
+        """更新进度（同时刷新心跳）"""
+        with self.connection() as conn:
+            conn.execute("""
+                UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message),
+                    heartbeat_at = ?
+                WHERE id = ? AND status = 'running'
+            """, (progress, message, datetime.now(), job_id))
+    
+    def finish(self, job_id: int, result: Optional[Dict] = None, error: str = ""):
+        """记录任务结果：error 为空表示成功"""
+        with self.connection() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, progress = CASE WHEN ? = '' THEN 1 ELSE progress END,
+                    message = ?, result = ?, error = ?, finished_at = ?
+                WHERE id = ?
+            """, ('failed' if error else 'succeeded', error, '失败' if error else '完成',
+                  json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                  error, datetime.now(), job_id))
+    
+    def cancel(self, job_id: int) -> bool:
+        """取消尚未开始的任务"""
+        with self.connection() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'cancelled', message = '已取消', finished_at = ?
+                WHERE id = ? AND status = 'queued'
+            """, (datetime.now(), job_id))
+            return cursor.rowcount > 0
+    
+    def fail_stale(self, timeout_seconds: float) -> int:
+        """把心跳超时的运行中任务标记为失败（执行进程异常退出），返回处理数量"""
+        deadline = datetime.fromtimestamp(datetime.now().timestamp() - timeout_seconds)
+        with self.connection() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'failed', message = '失败', error = '执行进程已退出，任务中断',
+                    finished_at = ?
+                WHERE status = 'running' AND heartbeat_at < ?
+            """, (datetime.now(), deadline))
+            return cursor.rowcount
+    
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """获取任务"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+    
+    def latest_job(self, scope: str) -> Optional[Dict]:
+        """获取 scope 下最新的任务"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE scope = ? ORDER BY id DESC LIMIT 1", (scope,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+    
+    def mark_seen(self, job_id: int):
+        """标记已在页面上展示过结果"""
+        with self.connection() as conn:
+            conn.execute("UPDATE jobs SET seen_at = ? WHERE id = ? AND seen_at IS NULL",
+                         (datetime.now(), job_id))
+    
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """按提交时间倒序列出任务"""
+        with self.connection() as conn:
+            if status:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+                ).fetchall()
             else:
-                stats['avg_words_per_chapter'] = 0.0
-        else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+    
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        """解析 params / result 的 JSON"""
+        job = dict(row)
+        for key in ('params', 'result'):
+            if job.get(key):
+                try:
+                    job[key] = json.loads(job[key])
+                except (TypeError, ValueError):
+                    pass
+        return job
+
+
+class NovelStatsManager(BaseManager):
+    """小说统计管理器"""
+    
+    def calculate_novel_stats(self, novel_id: int) -> Dict:
+        """读取小说统计信息（由章节触发器增量维护，不扫描章节表）"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute("""
+                SELECT total_chapters, total_words FROM novel_metadata WHERE novel_id = ?
+            """, (novel_id,))
+            row = cursor.fetchone()
+            total_chapters = int(row['total_chapters'] or 0) if row else 0
+            total_words = int(row['total_words'] or 0) if row else 0
+            
             stats = {
-                'total_chapters': 0,
-                'total_words': 0,
-                'avg_words_per_chapter': 0.0
+                'total_chapters': total_chapters,
+                'total_words': total_words,
+                'avg_words_per_chapter': total_words / total_chapters if total_chapters else 0.0
             }
         
-        # 统计各状态章节数
-        cursor.execute("""
-            SELECT status, COUNT(*) as count
-            FROM chapters
-            WHERE novel_id = ? AND is_deleted = 0
-            GROUP BY status
-        """, (novel_id,))
+            # 各状态章节数
+            cursor.execute("""
+                SELECT status, total FROM novel_status_counts
+                WHERE novel_id = ? AND total > 0
+            """, (novel_id,))
         
-        status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
-        stats['status_counts'] = status_counts
+            stats['status_counts'] = {row['status']: row['total'] for row in cursor.fetchall()}
         
-        conn.close()
         return stats
     
     def update_novel_metadata(self, novel_id: int) -> bool:
-        """更新小说元数据"""
-        stats = self.calculate_novel_stats(novel_id)
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """按章节表重新校准小说统计
         
-        # 检查是否已存在元数据记录
-        cursor.execute("SELECT id FROM novel_metadata WHERE novel_id = ?", (novel_id,))
-        exists = cursor.fetchone()
-        
-        if exists:
-            cursor.execute("""
-                UPDATE novel_metadata
-                SET total_chapters = ?, total_words = ?, last_updated = ?
-                WHERE novel_id = ?
-            """, (stats['total_chapters'], stats['total_words'] or 0, datetime.now(), novel_id))
-        else:
-            cursor.execute("""
-                INSERT INTO novel_metadata (novel_id, total_chapters, total_words, last_updated)
-                VALUES (?, ?, ?, ?)
-            """, (novel_id, stats['total_chapters'], stats['total_words'] or 0, datetime.now()))
+        统计已由触发器实时维护，常规写入后无需调用；仅在数据被外部工具直接修改后用于修复。
+        """
+        with self.connection() as conn:
+            self._rebuild_novel_stats(conn.cursor(), novel_id)
         
-        conn.commit()
-        conn.close()
         return True
     
     def get_writing_timeline(self, novel_id: int) -> List[Dict]:
         """获取写作时间线"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as chapters_created,
-                SUM(word_count) as words_written
-            FROM chapters
-            WHERE novel_id = ? AND is_deleted = 0
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        """, (novel_id,))
-        
-        timeline = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+            cursor.execute("""
+                SELECT 
+                    DATE(created_at) as date,
+                    COUNT(*) as chapters_created,
+                    SUM(word_count) as words_written
+                FROM chapters
+                WHERE novel_id = ? AND is_deleted = 0
+                GROUP BY DATE(created_at)
+                ORDER BY date ASC
+            """, (novel_id,))
+        
+            timeline = [dict(row) for row in cursor.fetchall()]
         
         return timeline
     
     def get_word_count_chart(self, novel_id: int) -> Dict:
         """获取字数统计图表数据"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT chapter_number, chapter_title, word_count
-            FROM chapters
-            WHERE novel_id = ? AND is_deleted = 0
-            ORDER BY chapter_number ASC
-        """, (novel_id,))
+            cursor.execute("""
+                SELECT chapter_number, chapter_title, word_count
+                FROM chapters
+                WHERE novel_id = ? AND is_deleted = 0
+                ORDER BY chapter_number ASC
+            """, (novel_id,))
         
-        chapters = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+            chapters = [dict(row) for row in cursor.fetchall()]
         
         return {
             'chapters': [ch['chapter_number'] for ch in chapters],
@@ -1047,94 +3057,78 @@ class NovelStatsManager:
         }
 
 
-class OutlineManager:
+class OutlineManager(BaseManager):
     """大纲管理器 - 管理小说大纲及版本"""
     
-    def __init__(self, db_path: str = "stories.db"):
-        self.db_path = db_path
-    
-    def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
     def save_outline(self, novel_id: int, content: str) -> int:
         """保存新版本大纲（自动停用旧版本）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        # 1. 获取当前最大版本号
-        cursor.execute("SELECT MAX(version) FROM novel_outlines WHERE novel_id = ?", (novel_id,))
-        result = cursor.fetchone()
-        current_max_version = result[0] if result[0] is not None else 0
-        new_version = current_max_version + 1
+            # 1. 获取当前最大版本号
+            cursor.execute("SELECT MAX(version) FROM novel_outlines WHERE novel_id = ?", (novel_id,))
+            result = cursor.fetchone()
+            current_max_version = result[0] if result[0] is not None else 0
+            new_version = current_max_version + 1
         
-        # 2. 将所有旧版本设为非激活
-        cursor.execute("UPDATE novel_outlines SET is_active = 0 WHERE novel_id = ?", (novel_id,))
+            # 2. 将所有旧版本设为非激活
+            cursor.execute("UPDATE novel_outlines SET is_active = 0 WHERE novel_id = ?", (novel_id,))
         
-        # 3. 插入新版本
-        cursor.execute("""
-            INSERT INTO novel_outlines (novel_id, version, content, is_active, created_at)
-            VALUES (?, ?, ?, 1, ?)
-        """, (novel_id, new_version, content, datetime.now()))
+            # 3. 插入新版本
+            cursor.execute("""
+                INSERT INTO novel_outlines (novel_id, version, content, is_active, created_at)
+                VALUES (?, ?, ?, 1, ?)
+            """, (novel_id, new_version, content, datetime.now()))
         
-        outline_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            outline_id = cursor.lastrowid
         
         return outline_id
     
     def get_latest_outline(self, novel_id: int) -> Optional[Dict]:
         """获取当前激活的大纲"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM novel_outlines 
-            WHERE novel_id = ? AND is_active = 1
-            ORDER BY version DESC
-            LIMIT 1
-        """, (novel_id,))
+            cursor.execute("""
+                SELECT * FROM novel_outlines 
+                WHERE novel_id = ? AND is_active = 1
+                ORDER BY version DESC
+                LIMIT 1
+            """, (novel_id,))
         
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
         
         return dict(row) if row else None
     
     def get_outline_history(self, novel_id: int) -> List[Dict]:
         """获取大纲历史版本列表"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM novel_outlines 
-            WHERE novel_id = ?
-            ORDER BY version DESC
-        """, (novel_id,))
+            cursor.execute("""
+                SELECT * FROM novel_outlines 
+                WHERE novel_id = ?
+                ORDER BY version DESC
+            """, (novel_id,))
         
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
         
         return [dict(row) for row in rows]
     
     def restore_outline_version(self, novel_id: int, version: int) -> bool:
         """恢复到指定版本的大纲"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        # 检查版本是否存在
-        cursor.execute("SELECT id FROM novel_outlines WHERE novel_id = ? AND version = ?", (novel_id, version))
-        if not cursor.fetchone():
-            conn.close()
-            return False
+            # 检查版本是否存在
+            cursor.execute("SELECT id FROM novel_outlines WHERE novel_id = ? AND version = ?", (novel_id, version))
+            if not cursor.fetchone():
+                return False
             
-        # 更新激活状态
-        cursor.execute("UPDATE novel_outlines SET is_active = 0 WHERE novel_id = ?", (novel_id,))
-        cursor.execute("UPDATE novel_outlines SET is_active = 1 WHERE novel_id = ? AND version = ?", (novel_id, version))
+            # 更新激活状态
+            cursor.execute("UPDATE novel_outlines SET is_active = 0 WHERE novel_id = ?", (novel_id,))
+            cursor.execute("UPDATE novel_outlines SET is_active = 1 WHERE novel_id = ? AND version = ?", (novel_id, version))
         
-        conn.commit()
-        conn.close()
         return True
     
     # ==================== 按段管理的新方法 ====================
@@ -1143,130 +3137,120 @@ class OutlineManager:
                                title: str = "", summary: str = "",
                                status: str = "active", priority: int = 0) -> int:
         """创建大纲段"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        # 自动计算 segment_order（取最大值+1）
-        cursor.execute("SELECT MAX(segment_order) FROM outline_segments WHERE novel_id = ?", (novel_id,))
-        result = cursor.fetchone()
-        max_order = result[0] if result[0] is not None else 0
-        segment_order = max_order + 1
+            # 自动计算 segment_order（取最大值+1）
+            cursor.execute("SELECT MAX(segment_order) FROM outline_segments WHERE novel_id = ?", (novel_id,))
+            result = cursor.fetchone()
+            max_order = result[0] if result[0] is not None else 0
+            segment_order = max_order + 1
         
-        cursor.execute("""
-            INSERT INTO outline_segments 
-            (novel_id, segment_order, start_chapter, end_chapter, title, summary, status, priority, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (novel_id, segment_order, start_chapter, end_chapter, title, summary, status, priority, datetime.now()))
+            cursor.execute("""
+                INSERT INTO outline_segments 
+                (novel_id, segment_order, start_chapter, end_chapter, title, summary, status, priority, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (novel_id, segment_order, start_chapter, end_chapter, title, summary, status, priority, datetime.now()))
         
-        segment_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            segment_id = cursor.lastrowid
         
         return segment_id
     
     def get_outline_segment(self, segment_id: int) -> Optional[Dict]:
         """获取单个大纲段"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM outline_segments WHERE id = ? AND is_deleted = 0
-        """, (segment_id,))
+            cursor.execute("""
+                SELECT * FROM outline_segments WHERE id = ? AND is_deleted = 0
+            """, (segment_id,))
         
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
         
         return dict(row) if row else None
     
     def list_outline_segments(self, novel_id: int, include_deleted: bool = False) -> List[Dict]:
         """列出所有大纲段（按 segment_order 排序）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        where_clause = "novel_id = ?"
-        if not include_deleted:
-            where_clause += " AND is_deleted = 0"
+            where_clause = "novel_id = ?"
+            if not include_deleted:
+                where_clause += " AND is_deleted = 0"
         
-        cursor.execute(f"""
-            SELECT * FROM outline_segments 
-            WHERE {where_clause}
-            ORDER BY segment_order ASC, start_chapter ASC
-        """, (novel_id,))
+            cursor.execute(f"""
+                SELECT * FROM outline_segments 
+                WHERE {where_clause}
+                ORDER BY segment_order ASC, start_chapter ASC
+            """, (novel_id,))
         
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
         
         return [dict(row) for row in rows]
     
     def update_outline_segment(self, segment_id: int, **kwargs) -> bool:
         """更新大纲段"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        allowed_fields = ['segment_order', 'start_chapter', 'end_chapter', 'title', 'summary', 'status', 'priority']
-        updates = []
-        params = []
+            allowed_fields = ['segment_order', 'start_chapter', 'end_chapter', 'title', 'summary', 'status', 'priority']
+            updates = []
+            params = []
         
-        for field in allowed_fields:
-            if field in kwargs:
-                updates.append(f"{field} = ?")
-                params.append(kwargs[field])
+            for field in allowed_fields:
+                if field in kwargs:
+                    updates.append(f"{field} = ?")
+                    params.append(kwargs[field])
         
-        if not updates:
-            conn.close()
-            return False
+            if not updates:
+                return False
         
-        updates.append("updated_at = ?")
-        params.append(datetime.now())
-        params.append(segment_id)
+            updates.append("updated_at = ?")
+            params.append(datetime.now())
+            params.append(segment_id)
         
-        query = f"UPDATE outline_segments SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+            query = f"UPDATE outline_segments SET {', '.join(updates)} WHERE id = ?"
+            cursor.execute(query, params)
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
         
         return success
     
     def delete_outline_segment(self, segment_id: int, soft: bool = True) -> bool:
         """删除大纲段（默认软删除）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        if soft:
-            cursor.execute("""
-                UPDATE outline_segments SET is_deleted = 1, updated_at = ?
-                WHERE id = ?
-            """, (datetime.now(), segment_id))
-        else:
-            cursor.execute("DELETE FROM outline_segments WHERE id = ?", (segment_id,))
+            if soft:
+                cursor.execute("""
+                    UPDATE outline_segments SET is_deleted = 1, updated_at = ?
+                    WHERE id = ?
+                """, (datetime.now(), segment_id))
+            else:
+                cursor.execute("DELETE FROM outline_segments WHERE id = ?", (segment_id,))
         
-        success = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+            success = cursor.rowcount > 0
         
         return success
     
     def get_segments_by_chapter_range(self, novel_id: int, 
                                       start_chapter: int, end_chapter: int) -> List[Dict]:
         """根据章节范围查询大纲段（查询与指定范围有重叠的所有段）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT * FROM outline_segments 
-            WHERE novel_id = ? 
-              AND is_deleted = 0
-              AND (
-                  (start_chapter <= ? AND end_chapter >= ?)
-                  OR (start_chapter >= ? AND start_chapter <= ?)
-              )
-            ORDER BY segment_order ASC, start_chapter ASC
-        """, (novel_id, end_chapter, start_chapter, start_chapter, end_chapter))
-        
-        rows = cursor.fetchall()
-        conn.close()
+            cursor.execute("""
+                SELECT * FROM outline_segments 
+                WHERE novel_id = ? 
+                  AND is_deleted = 0
+                  AND (
+                      (start_chapter <= ? AND end_chapter >= ?)
+                      OR (start_chapter >= ? AND start_chapter <= ?)
+                  )
+                ORDER BY segment_order ASC, start_chapter ASC
+            """, (novel_id, end_chapter, start_chapter, start_chapter, end_chapter))
+        
+            rows = cursor.fetchall()
         
         return [dict(row) for row in rows]
     
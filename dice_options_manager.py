@@ -4,11 +4,12 @@
 管理随机骰子的选项数据，支持从 LLM 获取新选项并存储到 SQLite 数据库。
 """
 
-import sqlite3
 import json
 from typing import Dict, List, Optional
-from openai import OpenAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from database import ensure_schema
+from llm_cache import LLMCache
+from llm_clients import client_from_config
 
 
 class DiceOptionsManager:
@@ -22,24 +23,7 @@ class DiceOptionsManager:
             db_path: 数据库文件路径（默认使用主数据库 stories.db）
         """
         self.db_path = db_path
-        self._init_database()
-
-    def _init_database(self):
-        """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS dice_options (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT NOT NULL UNIQUE,
-                options TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        conn.commit()
-        conn.close()
+        self.pool = ensure_schema(db_path)  # dice_options 表由结构迁移创建
 
     def get_options(self, category: str) -> Optional[List[str]]:
         """
@@ -51,16 +35,11 @@ class DiceOptionsManager:
         Returns:
             选项列表，如果不存在则返回 None
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT options FROM dice_options WHERE category = ?",
-            (category,)
-        )
-
-        result = cursor.fetchone()
-        conn.close()
+        with self.pool.connection() as conn:
+            result = conn.execute(
+                "SELECT options FROM dice_options WHERE category = ?",
+                (category,)
+            ).fetchone()
 
         if result:
             return json.loads(result[0])
@@ -74,16 +53,11 @@ class DiceOptionsManager:
             category: 类别名称
             options: 选项列表
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT OR REPLACE INTO dice_options (category, options, updated_at)
-            VALUES (?, ?, CURRENT_TIMESTAMP)
-        """, (category, json.dumps(options, ensure_ascii=False)))
-
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO dice_options (category, options, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, (category, json.dumps(options, ensure_ascii=False)))
 
     def get_all_categories(self) -> List[str]:
         """
@@ -92,12 +66,8 @@ class DiceOptionsManager:
         Returns:
             类别列表
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT category FROM dice_options")
-        results = cursor.fetchall()
-        conn.close()
+        with self.pool.connection() as conn:
+            results = conn.execute("SELECT category FROM dice_options").fetchall()
 
         return [row[0] for row in results]
 
@@ -115,10 +85,7 @@ class DiceOptionsManager:
             选项列表
         """
         llm_config = config.get("llm", {})
-        client = OpenAI(
-            api_key=llm_config.get("api_key"),
-            base_url=llm_config.get("base_url")
-        )
+        client = client_from_config(config)
 
         # 优先使用骰子选项专用模型配置，如果没有则使用默认模型
         dice_options_config = config.get("dice_options", {})
@@ -231,16 +198,17 @@ class DiceOptionsManager:
 
         prompt = prompts.get(category, f"请生成 {count} 个适合小说创作的 {category} 选项。")
 
-        response = client.chat.completions.create(
-            model=model,
+        # 分批请求的提示词相同，批次号参与缓存键，避免各批命中同一条缓存
+        content = LLMCache(config).chat(
+            client,
+            model,
             messages=[
                 {"role": "system", "content": "你是一个专业的小说创作顾问，擅长提供创意灵感。"},
                 {"role": "user", "content": prompt}
             ],
+            cache_tag=batch_index,
             temperature=0.9
-        )
-
-        content = response.choices[0].message.content.strip()
+        ).strip()
 
         # 解析返回的选项列表
         options = [line.strip() for line in content.split('\n') if line.strip() and not line.strip().startswith('#')]
@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 """
 初始化新表结构
-运行此脚本以在现有数据库中创建新的 outline_segments 表
+运行此脚本以把现有数据库升级到最新结构版本（PRAGMA user_version），应用启动时也会自动执行
 """
 import sys
-from database import DatabaseManager
+from database import SchemaManager
 
 def main():
     print("初始化数据库新表...")
     
     try:
-        db_manager = DatabaseManager()
+        schema_manager = SchemaManager()
+        applied = schema_manager.migrate()
         print("✅ 数据库初始化完成！")
-        print("   新表 outline_segments 已创建（如果不存在）")
+        if applied:
+            print(f"   已执行迁移版本: {', '.join(str(v) for v in applied)}")
+        print(f"   当前结构版本: {schema_manager.current_version()}")
         return 0
     except Exception as e:
         print(f"❌ 初始化失败: {str(e)}")
@@ -0,0 +1,137 @@
+"""
+LLM 响应缓存
+
+按 (模型, 消息, 温度等参数) 缓存 LLM 响应，相同请求直接返回已保存的结果，
+适合开发调试与重放（重新生成企划书、反复运行细纲、调试 Crew 等）。默认关闭，在 config.yaml 中开启：
+
+    llm_cache:
+      enabled: true
+      ttl_hours: 168       # 过期时间，0 表示不过期
+      max_size_mb: 200     # 总大小上限，超过后淘汰最久未使用的条目
+      bypass: false        # 为 true 时不读取缓存（仍写入新结果）
+
+环境变量 STORY_LLM_CACHE=1/0 覆盖 enabled，STORY_LLM_CACHE_BYPASS=1 等同 bypass；
+代码中可用 `with bypass_llm_cache():` 让一段调用跳过缓存。
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from database import LLMCacheManager
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# 影响 CrewAI LLM 输出的参数（调用时读取，Agent 会在执行前设置 stop 等属性）
+CREWAI_LLM_PARAMS = ('temperature', 'top_p', 'max_tokens', 'max_completion_tokens', 'stop', 'seed',
+                     'presence_penalty', 'frequency_penalty', 'response_format')
+
+
+def _env_flag(name: str) -> Optional[bool]:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@contextmanager
+def bypass_llm_cache():
+    """在此范围内的 LLM 调用不读取缓存（新结果仍会写入）"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class LLMCache:
+    """LLM 响应缓存"""
+
+    def __init__(self, config: Optional[Dict] = None, db_path: str = "stories.db"):
+        cache_config = (config or {}).get("llm_cache") or {}
+        enabled = _env_flag("STORY_LLM_CACHE")
+        self.enabled = bool(cache_config.get("enabled", False)) if enabled is None else enabled
+        bypass = _env_flag("STORY_LLM_CACHE_BYPASS")
+        self.bypass = bool(cache_config.get("bypass", False)) if bypass is None else bypass
+        ttl_hours = cache_config.get("ttl_hours", 168)
+        self.ttl_seconds = ttl_hours * 3600 if ttl_hours else None
+        self.db_path = db_path
+        self.max_total_bytes = int(cache_config.get("max_size_mb", 200) * 1024 * 1024)
+        self._manager = None
+
+    @property
+    def manager(self) -> LLMCacheManager:
+        # 延迟创建，未开启缓存时不访问数据库
+        if self._manager is None:
+            self._manager = LLMCacheManager(self.db_path, max_total_bytes=self.max_total_bytes)
+        return self._manager
+
+    def cached_call(self, model: str, messages: Any, params: Optional[Dict],
+                    call: Callable[[], Any]) -> Any:
+        """
+        带缓存地执行一次 LLM 调用
+
+        Args:
+            model: 模型名称
+            messages: 消息列表（或提示词字符串）
+            params: 影响输出的其他参数
+            call: 未命中时实际调用 LLM 的函数
+
+        Returns:
+            LLM 响应（只缓存非空字符串结果）
+        """
+        if not self.enabled:
+            return call()
+
+        cache_key = LLMCacheManager.make_key(model, messages, params)
+        if not (self.bypass or _bypass.get()):
+            cached = self.manager.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = call()
+        if isinstance(response, str) and response.strip():
+            self.manager.put(cache_key, model, response, self.ttl_seconds)
+        return response
+
+    def chat(self, client, model: str, messages: List[Dict], cache_tag: Any = None, **params) -> str:
+        """
+        OpenAI 兼容接口的对话补全（返回消息内容）
+
+        Args:
+            client: OpenAI 客户端
+            model: 模型名称
+            messages: 消息列表
+            cache_tag: 只参与缓存键计算、不发送给接口的标记（如分批请求的批次号）
+            **params: temperature 等请求参数
+        """
+        def call():
+            response = client.chat.completions.create(model=model, messages=messages, **params)
+            return response.choices[0].message.content
+
+        key_params = dict(params, cache_tag=cache_tag) if cache_tag is not None else params
+        return self.cached_call(model, messages, key_params, call)
+
+    def wrap_crewai_llm(self, llm):
+        """让 CrewAI LLM 实例的 call 走缓存（带工具调用的请求不缓存）"""
+        if not self.enabled:
+            return llm
+        original_call = llm.call
+
+        def call(messages, *args, **kwargs):
+            tools = kwargs.get('tools') or (args[0] if args else None)
+            if tools or kwargs.get('available_functions') or kwargs.get('response_model'):
+                return original_call(messages, *args, **kwargs)
+            params = {name: getattr(llm, name, None) for name in CREWAI_LLM_PARAMS}
+            return self.cached_call(
+                getattr(llm, 'model', ''), messages, params, lambda: original_call(messages, *args, **kwargs)
+            )
+
+        # CrewAI 的 LLM 可能是 pydantic 模型，直接写入实例属性以覆盖方法
+        object.__setattr__(llm, 'call', call)
+        return llm
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计与缓存占用"""
+        return self.manager.stats()
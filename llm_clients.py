@@ -0,0 +1,69 @@
+"""
+LLM 客户端复用
+
+进程内按 (base_url, api_key) 共享 OpenAI 客户端。客户端自带 HTTP 连接池并保持长连接，
+复用同一个实例后，后续请求不再重复建立 TCP/TLS 连接，也省去客户端本身的构造开销。
+OpenAI 客户端是线程安全的，可在线程池中并发使用。
+
+CrewAI 的 Agent 带有执行状态，不能跨线程共享，reusable_agent 按线程复用 Agent 实例。
+"""
+
+import functools
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from openai import OpenAI
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_lock = threading.Lock()
+# Agent 实例按线程复用：同一线程内的多次运行共用，并发的运行各自持有实例
+_agent_pool = threading.local()
+
+
+def get_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> OpenAI:
+    """
+    获取共享的 OpenAI 客户端（同一接口地址与密钥只创建一次）
+
+    Args:
+        base_url: 接口地址
+        api_key: API 密钥
+
+    Returns:
+        OpenAI 客户端
+    """
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = OpenAI(base_url=base_url, api_key=api_key)
+    return client
+
+
+def client_from_config(config: Dict) -> OpenAI:
+    """按 config.yaml 中 llm 配置获取共享客户端"""
+    llm_config = (config or {}).get("llm", {})
+    return get_openai_client(llm_config.get("base_url"), llm_config.get("api_key"))
+
+
+def close_clients():
+    """关闭并清空所有共享客户端（释放连接池）"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+def reusable_agent(factory: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """同一线程内复用 Agent 实例，避免每次运行重新构造"""
+    @functools.wraps(factory)
+    def wrapper(self):
+        agents = getattr(_agent_pool, 'agents', None)
+        if agents is None:
+            agents = _agent_pool.agents = {}
+        if factory.__name__ not in agents:
+            agents[factory.__name__] = factory(self)
+        return agents[factory.__name__]
+    return wrapper
@@ -1,8 +1,9 @@
 import random
 import yaml
 import os
-from openai import OpenAI
 from dice_options_manager import DiceOptionsManager
+from llm_cache import LLMCache
+from llm_clients import client_from_config
 
 def load_config(config_path="config.yaml"):
     """加载配置文件"""
@@ -262,12 +263,10 @@ class StoryLLM:
     def __init__(self, config):
         self.config = config
         llm_config = config.get("llm", {})
-        self.client = OpenAI(
-            base_url=llm_config.get("base_url"),
-            api_key=llm_config.get("api_key")
-        )
+        self.client = client_from_config(config)
         self.model = llm_config.get("model", "gpt-3.5-turbo")
         self.history_manager = HistoryManager()
+        self.llm_cache = LLMCache(config)
 
     def generate_story_package(self, elements):
         """生成角色卡和故事梗概"""
@@ -321,15 +320,15 @@ class StoryLLM:
 """
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            content = self.llm_cache.chat(
+                self.client,
+                self.model,
                 messages=[
                     {"role": "system", "content": "你是一个专业的创意写作助手，擅长构建引人入胜的小说大纲和鲜活的角色。"},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.8
             )
-            content = response.choices[0].message.content
             # 自动保存到历史记录
             self.history_manager.save_record(elements, content)
             return content
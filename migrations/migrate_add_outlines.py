@@ -1,5 +1,9 @@
-import sqlite3
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
 
 def migrate():
     db_path = "stories.db"
@@ -8,7 +12,8 @@ def migrate():
         print("Database not found, skipping migration.")
         return
 
-    conn = sqlite3.connect(db_path)
+    # 通过连接池创建连接（注册了压缩正文表触发器所需的 decompress 函数）
+    conn = ConnectionPool.get(db_path).create_connection()
     cursor = conn.cursor()
 
     try:
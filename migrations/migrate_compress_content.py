@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+数据迁移脚本：重新压缩章节正文与版本快照
+
+按 COMPRESSED_COLUMNS 配置（或 --codec 指定的编码）重写 chapter_contents.content、
+novel_versions.snapshot_data 与 snapshot_blobs.content，完成后 VACUUM 回收空间。
+读取时透明解压，未迁移的旧数据仍可正常读取，因此可以随时中断、重复执行。
+
+用法:
+    python migrations/migrate_compress_content.py                 # 按当前配置压缩
+    python migrations/migrate_compress_content.py --train-dict    # 先训练 zstd 字典（需 zstandard）
+    python migrations/migrate_compress_content.py --benchmark     # 只评估各编码的压缩率与解压耗时
+    python migrations/migrate_compress_content.py --codec none    # 解压回明文
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from database import DatabaseManager
+from utils.compression import (
+    compress_text, decompress_text, get_codec, train_zstd_dictionary, zstd_available
+)
+
+# (表, 主键列, 压缩列)
+TARGETS = (
+    ('chapter_contents', 'chapter_id', 'content'),
+    ('novel_versions', 'id', 'snapshot_data'),
+    ('snapshot_blobs', 'content_hash', 'content'),
+)
+
+BATCH_SIZE = 200
+
+
+def _iter_rows(manager, table, key_column, column):
+    """按主键分批读取，避免一次性载入整库正文"""
+    last_id = 0
+    while True:
+        with manager.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {key_column} AS row_id, {column} AS value FROM {table}
+                WHERE {key_column} > ? ORDER BY {key_column} LIMIT ?
+            """, (last_id, BATCH_SIZE)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['row_id']
+
+
+def _sample_texts(manager, limit=2000):
+    """抽取章节正文样本（训练字典与评估用）"""
+    with manager.connection() as conn:
+        rows = conn.execute(
+            "SELECT decompress(content) FROM chapter_contents ORDER BY random() LIMIT ?", (limit,)
+        ).fetchall()
+    return [row[0] for row in rows if row[0]]
+
+
+def benchmark(manager):
+    """评估各编码的压缩率与解压耗时"""
+    samples = _sample_texts(manager, limit=500)
+    if not samples:
+        print("没有章节正文可供评估")
+        return
+
+    raw_bytes = sum(len(text.encode('utf-8')) for text in samples)
+    print(f"样本: {len(samples)} 章，共 {raw_bytes / 1024 / 1024:.2f} MB")
+
+    codecs = ['zlib'] + (['zstd'] if zstd_available() else [])
+    for codec in codecs:
+        encoded = [compress_text(text, codec) for text in samples]
+        stored = sum(len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
+                     for value in encoded)
+        start = time.perf_counter()
+        for value in encoded:
+            decompress_text(value)
+        elapsed = time.perf_counter() - start
+        print(f"  {codec:5s} 压缩率 {raw_bytes / stored:.2f}x，"
+              f"解压 {elapsed / len(samples) * 1e6:.0f} µs/章，"
+              f"{raw_bytes / 1024 / 1024 / elapsed:.0f} MB/s")
+
+
+def migrate_compress_content(db_path="stories.db", codec=None, train_dict=False):
+    """
+    重新压缩章节正文与版本快照
+
+    Args:
+        db_path: 数据库路径
+        codec: 目标编码（None 表示按 COMPRESSED_COLUMNS 配置）
+        train_dict: 是否先用现有正文训练 zstd 字典
+    """
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    print("=" * 60)
+    print("正文压缩迁移工具")
+    print("=" * 60)
+
+    manager = DatabaseManager(db_path)
+
+    if codec and codec != 'none' and get_codec(codec) is None:
+        print(f"编码 {codec} 不可用（zstd 需要 pip install zstandard）")
+        return
+
+    if train_dict:
+        dictionary = train_zstd_dictionary(_sample_texts(manager))
+        if dictionary:
+            dict_id = manager.add_zstd_dictionary(dictionary)
+            print(f"✅ 已训练 zstd 字典 #{dict_id}（{len(dictionary) // 1024} KB）")
+        else:
+            print("⚠️ 未能训练 zstd 字典（需要 zstandard 且至少 8 章正文），继续使用当前编码")
+
+    size_before = os.path.getsize(db_path)
+
+    for table, key_column, column in TARGETS:
+        target_codec = codec or manager.codec_for(table, column)
+        rewritten = 0
+        for rows in _iter_rows(manager, table, key_column, column):
+            updates = [(compress_text(decompress_text(row['value']), target_codec), row['row_id'])
+                       for row in rows]
+            with manager.connection() as conn:
+                conn.executemany(
+                    f"UPDATE {table} SET {column} = ? WHERE {key_column} = ?", updates
+                )
+            rewritten += len(updates)
+        print(f"✅ {table}.{column}: 已按 {target_codec} 重写 {rewritten} 行")
+
+    with manager.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    vacuum_conn = manager.get_connection()
+    try:
+        vacuum_conn.execute("VACUUM")
+    finally:
+        vacuum_conn.close()
+
+    size_after = os.path.getsize(db_path)
+    print(f"数据库大小: {size_before / 1024 / 1024:.2f} MB -> {size_after / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重新压缩章节正文与版本快照")
+    parser.add_argument("--db", default="stories.db", help="数据库路径")
+    parser.add_argument("--codec", choices=["zlib", "zstd", "none"], help="目标编码（默认按配置）")
+    parser.add_argument("--train-dict", action="store_true", help="先训练 zstd 字典")
+    parser.add_argument("--benchmark", action="store_true", help="只评估压缩率与解压耗时")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(DatabaseManager(args.db))
+    else:
+        migrate_compress_content(args.db, codec=args.codec, train_dict=args.train_dict)
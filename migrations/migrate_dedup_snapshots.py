@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+数据迁移脚本：将整体 JSON 格式的版本快照转换为去重存储的清单格式
+
+转换后每个版本只保存章节清单与正文哈希，正文按哈希存入 snapshot_blobs，
+相同的章节正文在各版本间只保存一份。读取接口对两种格式透明，可重复执行。
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, NovelVersionManager
+
+
+def migrate_dedup_snapshots(db_path: str = "stories.db"):
+    """
+    转换所有旧格式版本快照
+
+    Args:
+        db_path: 数据库路径
+    """
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    print("=" * 60)
+    print("版本快照去重迁移工具")
+    print("=" * 60)
+
+    manager = DatabaseManager(db_path)
+    version_manager = NovelVersionManager(db_path)
+    size_before = os.path.getsize(db_path)
+
+    with manager.connection() as conn:
+        version_ids = [row[0] for row in conn.execute("""
+            SELECT id FROM novel_versions
+            WHERE snapshot_format IS NULL OR snapshot_format != 'manifest'
+            ORDER BY id
+        """)]
+
+    converted = 0
+    for version_id in version_ids:
+        try:
+            if version_manager.convert_json_version(version_id):
+                converted += 1
+        except Exception as e:
+            print(f"❌ 版本 {version_id} 转换失败: {e}")
+    print(f"✅ 已转换 {converted} / {len(version_ids)} 个版本")
+
+    with manager.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    vacuum_conn = manager.get_connection()
+    try:
+        vacuum_conn.execute("VACUUM")
+    finally:
+        vacuum_conn.close()
+
+    size_after = os.path.getsize(db_path)
+    print(f"数据库大小: {size_before / 1024 / 1024:.2f} MB -> {size_after / 1024 / 1024:.2f} MB")
+
+
+if __name__ == "__main__":
+    migrate_dedup_snapshots(sys.argv[1] if len(sys.argv) > 1 else "stories.db")
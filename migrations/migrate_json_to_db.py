@@ -75,14 +75,15 @@ def migrate_json_to_db(json_dir: str = "history", db_path: str = "stories.db"):
                 if len(chapters) > 1:  # 只有当解析出多个章节时才创建章节记录
                     print(f"  解析出 {len(chapters)} 个章节，创建章节记录...")
                     
-                    for chapter in chapters:
-                        chapter_manager.create_chapter(
-                            novel_id=story_id,
-                            chapter_number=chapter['chapter_number'],
-                            chapter_title=chapter['chapter_title'],
-                            content=chapter['content'].strip(),
-                            status='published'
-                        )
+                    chapter_manager.create_chapters_bulk(story_id, [
+                        {
+                            'chapter_number': chapter['chapter_number'],
+                            'chapter_title': chapter['chapter_title'],
+                            'content': chapter['content'].strip(),
+                            'status': 'published'
+                        }
+                        for chapter in chapters
+                    ])
             
             print(f"✓ 已迁移: {os.path.basename(json_file)} -> Story ID: {story_id}")
             migrated_count += 1
@@ -8,10 +8,11 @@ import os
 # 添加父目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import sqlite3
 import json
 from datetime import datetime
 
+from database import ConnectionPool
+
 
 def migrate_outlines_to_segments(db_path: str = "stories.db", dry_run: bool = False):
     """
@@ -21,8 +22,8 @@ def migrate_outlines_to_segments(db_path: str = "stories.db", dry_run: bool = Fa
         db_path: 数据库路径
         dry_run: 如果为 True，只显示将要迁移的数据，不实际执行
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    # 通过连接池创建连接（注册了压缩正文表触发器所需的 decompress 函数）
+    conn = ConnectionPool.get(db_path).create_connection()
     cursor = conn.cursor()
     
     print("=" * 60)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+数据迁移脚本：将 stories / novels / chapters 的 content 列拆分到独立的正文表
+
+主表只保留元数据和 200 字的 preview，正文移入 story_contents / novel_contents /
+chapter_contents。拆分逻辑在结构迁移 v1（SchemaManager）中执行，应用启动时会自动完成，
+本脚本用于手动迁移并核对结果。
+"""
+import sys
+import os
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import CONTENT_TABLES, ConnectionPool, DatabaseManager
+
+
+def migrate_split_content(db_path: str = "stories.db"):
+    """
+    拆分正文列并核对迁移结果
+
+    Args:
+        db_path: 数据库路径
+    """
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found.")
+        return
+
+    print("=" * 60)
+    print("正文分表迁移工具")
+    print("=" * 60)
+
+    DatabaseManager(db_path)
+
+    # 通过连接池创建连接（注册了压缩正文表触发器所需的 decompress 函数）
+    conn = ConnectionPool.get(db_path).create_connection()
+    cursor = conn.cursor()
+    try:
+        for table, (content_table, key_column) in CONTENT_TABLES.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = {row[1] for row in cursor.fetchall()}
+
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            total_rows = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM {table} t
+                LEFT JOIN {content_table} c ON c.{key_column} = t.id
+                WHERE c.{key_column} IS NULL
+            """)
+            missing = cursor.fetchone()[0]
+
+            status = "✅" if 'content' not in columns and missing == 0 else "⚠️"
+            print(f"{status} {table}: {total_rows} 行，缺少正文 {missing} 行"
+                  f"{'，content 列仍存在' if 'content' in columns else ''}")
+    finally:
+        conn.close()
+
+    print("迁移完成。")
+
+
+if __name__ == "__main__":
+    migrate_split_content(sys.argv[1] if len(sys.argv) > 1 else "stories.db")
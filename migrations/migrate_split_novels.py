@@ -1,7 +1,11 @@
-import sqlite3
 import json
 from datetime import datetime
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
 
 DB_PATH = "stories.db"
 
@@ -10,8 +14,8 @@ def migrate():
         print(f"Database {DB_PATH} not found.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    # 通过连接池创建连接（注册了压缩正文表触发器所需的 decompress 函数）
+    conn = ConnectionPool.get(DB_PATH).create_connection()
     cursor = conn.cursor()
 
     # 1. Check if 'novels' table already exists
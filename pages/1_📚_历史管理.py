@@ -32,6 +32,9 @@ if 'selected_records' not in st.session_state:
     st.session_state.selected_records = []
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 1
+if 'page_cursors' not in st.session_state:
+    # 第 N 页的起始游标为 page_cursors[N-1]（第一页为 None）
+    st.session_state.page_cursors = [None]
 
 st.title("📚 历史记录管理")
 st.markdown("管理所有生成的故事记录，支持搜索、筛选、删除和导出。")
@@ -103,36 +106,62 @@ with col_actions:
 with col_page_size:
     page_size = st.selectbox("每页显示", [10, 20, 50, 100], index=1)
 
+# 筛选条件变化时回到第一页
+list_filter_key = (search_query, selected_type, order_by, page_size)
+if st.session_state.get('list_filter_key') != list_filter_key:
+    st.session_state.list_filter_key = list_filter_key
+    st.session_state.current_page = 1
+    st.session_state.page_cursors = [None]
+
 # 查询数据
-stories, total_count = story_service.get_story_list(
-    story_type=selected_type,
-    search_query=search_query if search_query else None,
-    page=st.session_state.current_page,
-    page_size=page_size,
-    order_by=order_by
-)
+if search_query:
+    # 全文搜索：按相关度排序，并显示命中片段
+    stories, total_count = story_service.search_records(
+        search_query,
+        story_type=selected_type,
+        page=st.session_state.current_page,
+        page_size=page_size
+    )
+else:
+    # 按时间排序时使用游标分页，翻到任意页都只查询一页数据
+    page_cursors = st.session_state.page_cursors
+    page_index = st.session_state.current_page - 1
+    stories, total_count = story_service.get_story_list(
+        story_type=selected_type,
+        page=st.session_state.current_page,
+        page_size=page_size,
+        order_by=order_by,
+        cursor=page_cursors[page_index] if page_index < len(page_cursors) else None
+    )
 
 # 计算总页数
 total_pages = (total_count + page_size - 1) // page_size
 
 # 显示结果
 st.markdown(f"### 📝 共找到 {total_count} 条记录")
+if search_query:
+    st.caption("搜索结果按相关度排序")
 
 if stories:
     # 表格展示
     for story in stories:
+        # 搜索结果可能同时包含 stories 与 novels 两张表的记录，id 可能重复
+        is_novel_hit = story.get('view_type') == 'novel'
+        key_suffix = f"novel_{story['id']}" if is_novel_hit else story['id']
+
         with st.container():
             col_check, col_info, col_actions = st.columns([0.5, 6, 2])
 
-            # 复选框
+            # 复选框（小说记录请在小说管理中删除）
             with col_check:
-                is_selected = story['id'] in st.session_state.selected_records
-                if st.checkbox("选择", key=f"check_{story['id']}", value=is_selected, label_visibility="hidden"):
-                    if story['id'] not in st.session_state.selected_records:
-                        st.session_state.selected_records.append(story['id'])
-                else:
-                    if story['id'] in st.session_state.selected_records:
-                        st.session_state.selected_records.remove(story['id'])
+                if not is_novel_hit:
+                    is_selected = story['id'] in st.session_state.selected_records
+                    if st.checkbox("选择", key=f"check_{key_suffix}", value=is_selected, label_visibility="hidden"):
+                        if story['id'] not in st.session_state.selected_records:
+                            st.session_state.selected_records.append(story['id'])
+                    else:
+                        if story['id'] in st.session_state.selected_records:
+                            st.session_state.selected_records.remove(story['id'])
 
             # 记录信息
             with col_info:
@@ -144,10 +173,12 @@ if stories:
                 type_label = type_name.get(story['type'], story['type'])
 
                 st.markdown(f"**{emoji} {story['title']}** `{type_label}` • ID: {story['id']}")
-                st.caption(f"📅 {story['created_at']} | 主题: {story['topic'][:100]}")
+                st.caption(f"📅 {story['created_at']} | 主题: {(story.get('topic') or '')[:100]}")
 
-                # 内容预览
-                if story.get('content_preview'):
+                # 搜索命中片段 / 内容预览
+                if story.get('snippet'):
+                    st.markdown(f"> {story['snippet']}")
+                elif story.get('content_preview'):
                     with st.expander("预览"):
                         st.text(story['content_preview'][:300] + "...")
 
@@ -155,17 +186,17 @@ if stories:
             with col_actions:
                 col_view, col_del = st.columns(2)
 
-                if col_view.button("查看", key=f"view_{story['id']}"):
+                if col_view.button("查看", key=f"view_{key_suffix}"):
                     # 确保 story_id 是整数类型
                     story_id = int(story['id']) if story.get('id') is not None else None
                     if story_id is not None:
                         st.session_state.view_story_id = story_id
-                        st.session_state.view_story_type = 'story'  # 明确设置查看类型
+                        st.session_state.view_story_type = story.get('view_type', 'story')  # 明确设置查看类型
                         st.switch_page("pages/2_📖_历史详情.py")
                     else:
                         st.error("无效的故事ID")
 
-                if col_del.button("删除", key=f"del_{story['id']}"):
+                if not is_novel_hit and col_del.button("删除", key=f"del_{key_suffix}"):
                     if story_service.delete_story(story['id']):
                         st.success("已删除")
                         st.rerun()
@@ -187,6 +218,11 @@ if stories:
 
         with col_next:
             if st.button("下一页 ➡️", disabled=st.session_state.current_page >= total_pages):
+                # 记录下一页的起始游标（丢弃之后的旧游标）
+                st.session_state.page_cursors = (
+                    st.session_state.page_cursors[:st.session_state.current_page]
+                    + [story_service.get_page_cursor(stories)]
+                )
                 st.session_state.current_page += 1
                 st.rerun()
 
@@ -12,7 +12,8 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.novel_length_config import get_display_options
-from services import StoryService, WritingService
+from services import StoryService, WritingService, JobService
+from utils.job_view import follow_job, submit_job
 
 # 页面配置
 st.set_page_config(
@@ -26,7 +27,8 @@ st.set_page_config(
 def get_services():
     return {
         'story': StoryService(),
-        'writing': WritingService()
+        'writing': WritingService(),
+        'jobs': JobService()
     }
 
 services = get_services()
@@ -268,6 +270,18 @@ with col_actions[3]:
         st.switch_page("pages/1_📚_历史管理.py")
 
 # 重新生成企划书
+# 重新生成企划书的后台任务（刷新页面后继续显示进度）
+finished = follow_job(services['jobs'], f"story:{story_id}:regenerate", label="AI 写作团队正在重新创作企划书")
+if finished:
+    if finished['status'] == 'succeeded':
+        # 清除重新生成状态并跳转到新生成的记录
+        st.session_state.pop('regenerate_story_id', None)
+        st.session_state.pop('regenerate_story_type', None)
+        st.session_state.view_story_id = finished['result']['story_id']
+        st.rerun()
+    elif finished['status'] == 'failed':
+        st.error(f"重新生成失败: {finished['error']}")
+
 if st.session_state.get('regenerate_story_id') == story_id:
     regenerate_type = st.session_state.get('regenerate_story_type', 'base')
     
@@ -360,68 +374,22 @@ if st.session_state.get('regenerate_story_id') == story_id:
                 if not original_topic.strip():
                     st.warning("⚠️ 无法提取原始主题，请手动输入")
                 else:
-                    try:
-                        # Monkeypatch signal.signal to ignore 'main thread' errors
-                        import signal
-                        _original_signal = signal.signal
-                        def _safe_signal(sig, handler):
-                            try:
-                                return _original_signal(sig, handler)
-                            except ValueError as e:
-                                if "main thread" in str(e):
-                                    return None
-                                raise e
-                        signal.signal = _safe_signal
-                        
-                        # 动态导入 CrewAI 相关库
-                        from crew_agents import StoryAgents
-                        from crew_tasks import StoryTasks
-                        from crewai import Crew, Process
-                        from logic import load_config
-                        
-                        config = load_config("config.yaml")
-                        if not config:
-                            st.error("请先配置 config.yaml")
-                        else:
-                            from services import ProposalService
-                            proposal_service = ProposalService()
-                            
-                            with st.spinner("AI 写作团队正在重新创作企划书... (这可能需要几分钟)"):
-                                result = proposal_service.generate_proposal(
-                                    topic=original_topic,
-                                    target_word_count=target_word_count,
-                                    brainstorm_rounds=brainstorm_rounds
-                                )
-                                
-                                if result['success']:
-                                    new_story_id = result['story_id']
-                                    
-                                    # 创建关联关系
-                                    from database import DatabaseManager
-                                    db_manager = DatabaseManager()
-                                    db_manager.create_relation(
-                                        parent_id=story_id,
-                                        child_id=new_story_id
-                                    )
-                                    
-                                    st.success(f"✅ 企划书重新生成成功！新记录 ID: {new_story_id}")
-                                    st.info("正在跳转到新生成的企划书...")
-                                    
-                                    # 清除重新生成状态
-                                    del st.session_state.regenerate_story_id
-                                    del st.session_state.regenerate_story_type
-                                    
-                                    # 跳转到新生成的记录
-                                    st.session_state.view_story_id = new_story_id
-                                    st.rerun()
-                                else:
-                                    st.error(f"重新生成失败: {result['error']}")
+                    from logic import load_config
                     
-                    except Exception as e:
-                        st.error(f"重新生成失败: {str(e)}")
-                        import traceback
-                        with st.expander("查看详细错误信息"):
-                            st.code(traceback.format_exc(), language="python")
+                    if not load_config("config.yaml"):
+                        st.error("请先配置 config.yaml")
+                    else:
+                        # 后台任务生成新企划书并记录与当前记录的关联关系
+                        if submit_job(
+                            services['jobs'],
+                            'generate_proposal',
+                            scope=f"story:{story_id}:regenerate",
+                            topic=original_topic,
+                            target_word_count=target_word_count,
+                            brainstorm_rounds=brainstorm_rounds,
+                            parent_story_id=story_id
+                        ):
+                            st.rerun()
         
         with col_regen_btn2:
             if st.button("❌ 取消", key="btn_cancel_regenerate"):
@@ -542,7 +510,9 @@ if story.get('type') in ['base', 'crew_ai']:
                         'source_type': story.get('type', 'base'),
                         'is_outline_only': True,
                         'category_key': category.key if category else 'unknown'
-                    }
+                    },
+                    unique_title=True,
+                    title_suffix=f" ({novel_length})"
                 )
 
                 st.success(f"✅ 小说记录创建成功！ID: {novel_id}")
@@ -583,7 +553,7 @@ if novel_records:
                         st.caption(f"篇幅: {metadata['length']}")
 
                 # 内容预览
-                preview_text = novel.get('content', '')[:200]
+                preview_text = novel.get('preview') or ''
                 st.text(preview_text + "..." if len(preview_text) >= 200 else preview_text)
 
             with col_novel_action:
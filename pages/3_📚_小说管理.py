@@ -10,14 +10,16 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services import NovelService, WritingService
+from services import NovelService, WritingService, ExportService, JobService
 from database import DatabaseManager
+from utils.job_view import follow_job, is_job_active, submit_job
 
 st.set_page_config(page_title="小说管理", page_icon="📚", layout="wide")
 
 @st.cache_resource
 def get_services():
-    return {'novel': NovelService(), 'writing': WritingService(), 'db': DatabaseManager()}
+    return {'novel': NovelService(), 'writing': WritingService(), 'export': ExportService(),
+            'jobs': JobService(), 'db': DatabaseManager()}
 
 services = get_services()
 st.title("📚 小说管理")
@@ -107,8 +109,36 @@ with col_s3:
 with col_s4:
     st.metric("章节数", workflow_status['chapter_count'])
 
+# 后台生成任务（刷新页面后继续显示进度）
+job_service = services['jobs']
+workflow_jobs = [
+    ('outline', "正在生成大纲"),
+    ('detailed_outline', "正在生成细纲"),
+    ('chapters', "正在撰写正文"),
+]
+for job_kind, job_label in workflow_jobs:
+    finished = follow_job(job_service, f"novel:{selected_novel_id}:{job_kind}", label=job_label)
+    if not finished:
+        continue
+    if finished['status'] == 'failed':
+        st.error(f"{job_label.replace('正在', '')}失败: {finished['error']}")
+    elif finished['status'] == 'succeeded':
+        if job_kind == 'outline':
+            st.success("✅ 大纲生成成功！")
+        elif job_kind == 'detailed_outline':
+            st.success(f"✅ 细纲生成成功！共生成 {finished['result']['segments_created']} 个段")
+        else:
+            st.success(f"✅ 成功撰写 {finished['result']['chapters_written']} 章！")
+
+workflow_running = any(
+    is_job_active(job_service.latest_job(f"novel:{selected_novel_id}:{job_kind}"))
+    for job_kind, _ in workflow_jobs
+)
+
 # 分步骤操作按钮
-if not workflow_status['has_outline']:
+if workflow_running:
+    st.info("⏳ 后台任务执行中，完成后即可进行下一步操作（可以关闭或刷新页面，任务不会中断）")
+elif not workflow_status['has_outline']:
     # 检查是否有企划书源
     source_story_id = current_novel.get('source_story_id')
     if source_story_id and orchestration.can_generate_outline(source_story_id):
@@ -116,33 +146,27 @@ if not workflow_status['has_outline']:
         col_btn1, col_btn2 = st.columns([1, 4])
         with col_btn1:
             if st.button("📋 生成大纲", type="primary", key="btn_gen_outline_top"):
-                from services import OutlineService
-                outline_service = OutlineService()
+                # 获取篇幅信息
+                metadata = current_novel.get('metadata', {})
+                if isinstance(metadata, str):
+                    import json
+                    try:
+                        metadata = json.loads(metadata)
+                    except:
+                        metadata = {}
+                target_length = metadata.get('length', '短篇小说 (1-10万字)')
                 
-                with st.spinner("正在生成大纲... (这可能需要几分钟)"):
-                    # 获取篇幅信息
-                    metadata = current_novel.get('metadata', {})
-                    if isinstance(metadata, str):
-                        import json
-                        try:
-                            metadata = json.loads(metadata)
-                        except:
-                            metadata = {}
-                    target_length = metadata.get('length', '短篇小说 (1-10万字)')
-                    
-                    result = outline_service.generate_outline_from_proposal(
-                        story_id=source_story_id,
-                        target_word_count=target_length,
-                        novel_title=current_novel['title']
-                    )
-                    
-                    if result['success']:
-                        st.success("✅ 大纲生成成功！")
-                        # 更新当前小说的 content 字段
-                        services['novel'].update_novel(selected_novel_id, content=result['outline_content'])
-                        st.rerun()
-                    else:
-                        st.error(f"生成失败: {result['error']}")
+                # 生成后由后台任务更新当前小说的 content 字段
+                if submit_job(
+                    job_service,
+                    'generate_outline',
+                    scope=f"novel:{selected_novel_id}:outline",
+                    story_id=source_story_id,
+                    target_word_count=target_length,
+                    novel_title=current_novel['title'],
+                    update_novel_id=selected_novel_id
+                ):
+                    st.rerun()
 
 elif workflow_status['has_outline'] and not workflow_status['has_detailed_outline']:
     st.info("💡 **下一步操作**：生成详细细纲（场景节拍表）")
@@ -157,20 +181,14 @@ elif workflow_status['has_outline'] and not workflow_status['has_detailed_outlin
             if detail_start > detail_end:
                 st.error("起始章节不能大于结束章节")
             else:
-                from services import DetailedOutlineService
-                detailed_outline_service = DetailedOutlineService()
-                
-                with st.spinner(f"正在生成第 {detail_start}-{detail_end} 章的细纲..."):
-                    result = detailed_outline_service.generate_detailed_outline(
-                        novel_id=selected_novel_id,
-                        chapter_range=(detail_start, detail_end)
-                    )
-                    
-                    if result['success']:
-                        st.success(f"✅ 细纲生成成功！共生成 {result['segments_created']} 个段")
-                        st.rerun()
-                    else:
-                        st.error(f"生成失败: {result['error']}")
+                if submit_job(
+                    job_service,
+                    'generate_detailed_outline',
+                    scope=f"novel:{selected_novel_id}:detailed_outline",
+                    novel_id=selected_novel_id,
+                    chapter_range=[detail_start, detail_end]
+                ):
+                    st.rerun()
 
 elif workflow_status['has_detailed_outline'] and workflow_status['chapter_count'] == 0:
     st.info("💡 **下一步操作**：开始撰写正文")
@@ -182,21 +200,15 @@ elif workflow_status['has_detailed_outline'] and workflow_status['chapter_count'
     with col_btn3:
         st.markdown("<div style='padding-top: 28px;'></div>", unsafe_allow_html=True)
         if st.button("✍️ 撰写正文", type="primary", key="btn_gen_chapter_top"):
-            from services import ChapterWritingService
-            chapter_service = ChapterWritingService()
-            
-            with st.spinner(f"正在撰写第 {write_start}-{write_start + write_num - 1} 章..."):
-                result = chapter_service.write_chapters(
-                    novel_id=selected_novel_id,
-                    num_chapters=write_num,
-                    start_chapter=write_start
-                )
-                
-                if result['success']:
-                    st.success(f"✅ 成功撰写 {result['chapters_written']} 章！")
-                    st.rerun()
-                else:
-                    st.error(f"撰写失败: {result['error']}")
+            if submit_job(
+                job_service,
+                'write_chapters',
+                scope=f"novel:{selected_novel_id}:chapters",
+                novel_id=selected_novel_id,
+                num_chapters=write_num,
+                start_chapter=write_start
+            ):
+                st.rerun()
 
 st.markdown("---")
 
@@ -234,27 +246,30 @@ with tabs[0]:
         st.caption("本次续写使用的大纲内容（可编辑优化）：")
         manual_outline = st.text_area("大纲指令", value=outline_preview, height=150, help="你可以修改这里的大纲内容，指导本次写作。如果不填写，将自动使用数据库中的大纲。")
 
-        if st.button("🚀 开始智能续写"):
-            try:
-                with st.spinner("写作团队正在撰写..."):
-                    # 传递 manual_outline 和 start_chapter
-                    count = services['writing'].continue_writing_chapters(
-                        selected_novel_id, 
-                        num_chapters_to_write,
-                        start_chapter=start_chapter_input,
-                        outline_content=manual_outline if manual_outline.strip() else None
-                    )
-                    st.success(f"成功续写 {count} 章！")
-                    st.rerun()
-            except Exception as e:
-                st.error(f"续写失败: {e}")
-                # debug info
-                import traceback
-                st.code(traceback.format_exc())
+        write_scope = f"novel:{selected_novel_id}:write"
+        if st.button("🚀 开始智能续写", disabled=is_job_active(job_service.latest_job(write_scope))):
+            # 后台撰写：页面刷新或断线不会中断生成
+            if submit_job(
+                job_service,
+                'write_chapters',
+                scope=write_scope,
+                novel_id=selected_novel_id,
+                num_chapters=num_chapters_to_write,
+                start_chapter=start_chapter_input,
+                outline_content=manual_outline if manual_outline.strip() else None
+            ):
+                st.rerun()
+
+        finished = follow_job(job_service, write_scope, label="智能续写")
+        if finished:
+            if finished['status'] == 'succeeded':
+                st.success(f"成功续写 {(finished.get('result') or {}).get('chapters_written', 0)} 章！")
+            else:
+                st.error(f"续写失败: {finished.get('error')}")
 
     # 连续智能续写功能
     with st.expander("🔄 连续智能续写", expanded=False):
-        st.info("💡 自动循环逐章续写，每次续写1章，自动读取对应章节的大纲。适合批量生成多章内容。")
+        st.info("💡 按章节大纲连续续写多章：后续章节的规划与素材准备和前面章节的写作同时进行，完成一章保存一章。任务在后台执行，可以关闭或刷新页面。")
         
         col_cont1, col_cont2 = st.columns(2)
         with col_cont1:
@@ -270,7 +285,7 @@ with tabs[0]:
                 "总续写章数", 
                 1, 50, 
                 5, 
-                help="总共要续写多少章（将逐章完成）",
+                help="总共要续写多少章（完成一章保存一章）",
                 key="continuous_total_chapters"
             )
         
@@ -284,86 +299,43 @@ with tabs[0]:
             continuous_start_chapter, 
             end_chapter_continuous
         )
+        covered = {n for seg in continuous_segments
+                   for n in range(seg['start_chapter'], seg['end_chapter'] + 1)}
+        missing_chapters = [n for n in range(continuous_start_chapter, end_chapter_continuous + 1)
+                            if n not in covered]
         if not continuous_segments:
-            st.warning("⚠️ 未找到对应章节的大纲，续写将使用默认大纲。建议先在大纲管理页面生成大纲。")
+            st.warning("⚠️ 未找到对应章节的大纲，无法续写。请先在大纲管理页面生成细纲。")
+        elif missing_chapters:
+            st.warning(f"⚠️ 第 {missing_chapters} 章没有大纲，这些章节将被跳过并记为失败。建议先在大纲管理页面生成细纲。")
         
-        if st.button("🚀 开始连续续写", type="primary", key="btn_continuous_writing"):
-            try:
-                # 创建进度条和状态容器
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                success_count = 0
-                failed_chapters = []
-                
-                # 循环逐章续写
-                for i in range(total_chapters_to_write):
-                    current_chapter = continuous_start_chapter + i
-                    progress = (i + 1) / total_chapters_to_write
-                    
-                    # 更新进度和状态
-                    progress_bar.progress(progress)
-                    status_text.info(f"📝 正在续写第 {current_chapter} 章... ({i + 1}/{total_chapters_to_write})")
-                    
-                    try:
-                        # 获取当前章节对应的大纲
-                        chapter_segments = services['novel'].get_segments_by_chapter_range(
-                            selected_novel_id, 
-                            current_chapter, 
-                            current_chapter
-                        )
-                        
-                        outline_for_chapter = None
-                        if chapter_segments:
-                            # 拼接当前章节的大纲
-                            for seg in chapter_segments:
-                                if seg['start_chapter'] <= current_chapter <= seg['end_chapter']:
-                                    outline_for_chapter = f"【第{seg['start_chapter']}-{seg['end_chapter']}章 {seg['title']}】\n{seg['summary']}"
-                                    break
-                        
-                        # 续写1章
-                        count = services['writing'].continue_writing_chapters(
-                            selected_novel_id,
-                            num_chapters=1,  # 每次只续写1章
-                            start_chapter=current_chapter,
-                            outline_content=outline_for_chapter
-                        )
-                        
-                        if count > 0:
-                            success_count += 1
-                            status_text.success(f"✅ 第 {current_chapter} 章续写成功！({i + 1}/{total_chapters_to_write})")
-                        else:
-                            failed_chapters.append(current_chapter)
-                            status_text.warning(f"⚠️ 第 {current_chapter} 章续写失败（可能已存在）")
-                    
-                    except Exception as e:
-                        failed_chapters.append(current_chapter)
-                        status_text.warning(f"⚠️ 第 {current_chapter} 章续写失败: {str(e)}，继续下一章...")
-                        # 自动继续，不中断流程
-                        continue
-                
-                # 完成总结
-                progress_bar.progress(1.0)
-                if success_count == total_chapters_to_write:
-                    status_text.success(f"🎉 全部完成！成功续写 {success_count} 章！")
-                elif success_count > 0:
-                    status_text.warning(
-                        f"⚠️ 部分完成：成功 {success_count} 章，失败 {len(failed_chapters)} 章。"
-                        + (f"失败的章节：{failed_chapters}" if failed_chapters else "")
-                    )
-                else:
-                    status_text.error(f"❌ 全部失败！失败的章节：{failed_chapters}")
-                
-                # 等待3秒后刷新页面
-                import time
-                time.sleep(2)
+        continuous_scope = f"novel:{selected_novel_id}:continuous"
+        if st.button("🚀 开始连续续写", type="primary", key="btn_continuous_writing",
+                     disabled=not continuous_segments or is_job_active(job_service.latest_job(continuous_scope))):
+            # 后台流水线撰写：后续章节的分析与素材准备和前面章节的写作并行，完成一章保存一章
+            if submit_job(
+                job_service,
+                'continue_writing',
+                scope=continuous_scope,
+                novel_id=selected_novel_id,
+                num_chapters=total_chapters_to_write,
+                start_chapter=continuous_start_chapter
+            ):
                 st.rerun()
-                
-            except Exception as e:
-                st.error(f"连续续写失败: {e}")
-                import traceback
-                with st.expander("查看详细错误信息"):
-                    st.code(traceback.format_exc(), language="python")
+
+        finished = follow_job(job_service, continuous_scope, label="连续续写")
+        if finished:
+            result = finished.get('result') or {}
+            success_count = result.get('chapters_written', 0)
+            failed_chapters = result.get('failed_chapters', [])
+            if finished['status'] == 'succeeded' and not failed_chapters:
+                st.success(f"🎉 全部完成！成功续写 {success_count} 章！")
+            elif success_count > 0:
+                st.warning(
+                    f"⚠️ 部分完成：成功 {success_count} 章，失败 {len(failed_chapters)} 章。"
+                    + (f"失败的章节：{failed_chapters}" if failed_chapters else "")
+                )
+            else:
+                st.error(f"❌ 续写失败：{finished.get('error') or failed_chapters}")
 
     st.markdown("---")
     if chapters:
@@ -601,6 +573,13 @@ with tabs[3]:
         for v in versions:
             with st.expander(f"🏷️ {v['version_name']} - {v['created_at']}"):
                 st.text(v.get('version_note', ''))
+                if st.button("↩️ 恢复到此版本", key=f"restore_version_{v['id']}",
+                             help="恢复前会自动为当前内容创建快照"):
+                    if services['novel'].restore_version(v['id']):
+                        st.success("已恢复到该版本！")
+                        st.rerun()
+                    else:
+                        st.error("恢复失败")
 
 # Tab 5: 导出
 with tabs[4]:
@@ -608,14 +587,34 @@ with tabs[4]:
     fmt = st.selectbox("格式", ["Markdown (.md)", "纯文本 (.txt)"], key="export_fmt")
     include_outline = st.checkbox("包含大纲", key="export_include_outline")
     if st.button("📥 导出正文"):
-        if fmt == "Markdown (.md)":
-            content = services['novel'].export_to_markdown(selected_novel_id, include_outline)
-            if content:
-                st.download_button("📥 下载", content, f"{current_novel['title']}.md", "text/markdown", key="dl_novel_md")
-        else:
-            content = services['novel'].export_to_txt(selected_novel_id, include_outline)
-            if content:
-                st.download_button("📥 下载", content, f"{current_novel['title']}.txt", "text/plain", key="dl_novel_txt")
+        ext, mime = ("md", "text/markdown") if fmt == "Markdown (.md)" else ("txt", "text/plain")
+        # 内容未变化时直接复用已生成的文件；新生成时逐章写入，避免在内存中拼接整本书
+        export_path = services['novel'].get_export_artifact(
+            selected_novel_id, "markdown" if ext == "md" else "txt", include_outline
+        )
+        if export_path:
+            with open(export_path, "rb") as f:
+                st.download_button("📥 下载", f, f"{current_novel['title']}.{ext}", mime, key=f"dl_novel_{ext}")
+
+    st.markdown("---")
+    st.subheader("📚 电子书导出")
+    st.caption("后台渲染，已渲染过且未修改的章节直接复用缓存。")
+    book_fmt = st.selectbox("电子书格式", ["EPUB (.epub)", "PDF (.pdf)"], key="book_export_fmt")
+    book_ext = "epub" if book_fmt.startswith("EPUB") else "pdf"
+    job_key = f"export_job_{selected_novel_id}_{book_ext}"
+    if st.button("📚 开始导出", key="start_book_export"):
+        st.session_state[job_key] = services['export'].start_export_job(selected_novel_id, book_ext)
+    job = services['export'].get_export_job(st.session_state[job_key]) if job_key in st.session_state else None
+    if job:
+        if job['status'] == 'running':
+            st.progress(job['progress'], text=job['message'])
+            st.button("🔄 刷新进度", key="refresh_book_export")
+        elif job['status'] == 'done' and job['path'] and os.path.exists(job['path']):
+            mime = "application/epub+zip" if book_ext == "epub" else "application/pdf"
+            with open(job['path'], "rb") as f:
+                st.download_button("📥 下载电子书", f, f"{current_novel['title']}.{book_ext}", mime, key="dl_book")
+        elif job['status'] == 'failed':
+            st.error(job['error'])
 
     st.markdown("---")
     st.subheader("📋 大纲导出")
@@ -625,15 +624,15 @@ with tabs[4]:
         st.info("当前小说暂无大纲，请先在大纲管理标签中生成大纲后再导出。")
     else:
         outline_fmt = st.selectbox("大纲格式", ["Markdown (.md)", "纯文本 (.txt)"], key="outline_export_fmt")
-        outline_content = (
-            services['novel'].export_outline_to_markdown(selected_novel_id)
-            if outline_fmt == "Markdown (.md)"
-            else services['novel'].export_outline_to_txt(selected_novel_id)
+        ext = "md" if outline_fmt == "Markdown (.md)" else "txt"
+        # 每次页面刷新都需要填充下载按钮，大纲未变化时直接读取缓存文件
+        outline_path = services['novel'].get_outline_artifact(
+            selected_novel_id, "markdown" if ext == "md" else "txt"
         )
-        if outline_content:
-            ext = "md" if outline_fmt == "Markdown (.md)" else "txt"
+        if outline_path:
             mime = "text/markdown" if ext == "md" else "text/plain"
-            st.download_button("📥 下载大纲", outline_content, f"{current_novel['title']}_大纲.{ext}", mime, key="dl_outline")
+            with open(outline_path, "rb") as f:
+                st.download_button("📥 下载大纲", f, f"{current_novel['title']}_大纲.{ext}", mime, key="dl_outline")
 
 # Tab 6: 设置
 with tabs[5]:
@@ -39,7 +39,7 @@ if 'compare_version_id' not in st.session_state:
 
 # 获取当前版本
 version_id = st.session_state.compare_version_id
-current_version = novel_service.get_version_detail(version_id)
+current_version = novel_service.get_version_detail(version_id, include_content=False)
 
 if not current_version:
     st.error("版本不存在")
@@ -89,8 +89,8 @@ if st.session_state.get('comparing', False):
     v1_id = st.session_state.compare_v1
     v2_id = st.session_state.compare_v2
 
-    v1 = novel_service.get_version_detail(v1_id)
-    v2 = novel_service.get_version_detail(v2_id)
+    v1 = novel_service.get_version_detail(v1_id, include_content=False)
+    v2 = novel_service.get_version_detail(v2_id, include_content=False)
 
     if v1 and v2:
         st.markdown("---")
@@ -153,6 +153,31 @@ if st.session_state.get('comparing', False):
 
             st.components.v1.html(html_diff, height=600, scrolling=True)
 
+        # 章节变化（只加载有变化的章节正文）
+        st.markdown("---")
+        st.subheader("📄 章节变化")
+
+        chapter_diff = novel_service.compare_version_chapters(v1_id, v2_id)
+        st.caption(
+            f"新增 {len(chapter_diff['added'])} 章 | 删除 {len(chapter_diff['removed'])} 章 | "
+            f"修改 {len(chapter_diff['changed'])} 章 | 未变化 {chapter_diff['unchanged']} 章"
+        )
+
+        for old_ch, new_ch in chapter_diff['changed']:
+            with st.expander(f"✏️ 第 {new_ch['chapter_number']} 章 {new_ch.get('chapter_title') or ''}"):
+                chapter_lines = VersionDiff.generate_unified_diff(
+                    old_ch['content'], new_ch['content'],
+                    name1=v1['version_name'],
+                    name2=v2['version_name']
+                )
+                st.code(VersionDiff.format_diff_for_display(chapter_lines), language="diff")
+
+        for ch in chapter_diff['added']:
+            st.markdown(f"➕ 第 {ch['chapter_number']} 章 {ch.get('chapter_title') or ''}（{ch.get('word_count', 0)} 字）")
+
+        for ch in chapter_diff['removed']:
+            st.markdown(f"➖ 第 {ch['chapter_number']} 章 {ch.get('chapter_title') or ''}（{ch.get('word_count', 0)} 字）")
+
 # 底部操作
 st.markdown("---")
 
@@ -0,0 +1,343 @@
+"""
+本地 OpenAI 兼容桩服务（离线压测 / 调试用）
+
+实现 /v1/chat/completions（支持 stream）与 /v1/models，按提示词生成符合各解析器格式的输出：
+- 正文撰写："## 第X章 标题"（汉字数字，每章约一千字）
+- 细纲："### 第X章 标题"
+- 大纲扩展：JSON 段数组（start_chapter / end_chapter / title / summary）
+- 骰子选项：每行一个选项
+- 其他：Markdown 文档
+
+可配置首字延迟、输出速度，以及按比例注入错误或超时；请求头 X-Stub-Error: 500 / 429 / timeout
+可对单个请求强制注入。
+
+用法：
+    python scripts/stub_llm_server.py --port 8765 --profile fast
+
+config.yaml 中指向桩服务：
+    llm:
+      base_url: "http://127.0.0.1:8765/v1"
+      api_key: "stub"
+      model: "stub-model"
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# 延迟配置：(首字延迟秒数, 每秒输出 token 数，0 表示不限速)
+PROFILES = {
+    'instant': (0.0, 0),
+    'fast': (0.05, 2000),
+    'realistic': (0.8, 60),
+    'slow': (3.0, 20),
+}
+
+# 大约每个 token 对应的中文字符数
+CHARS_PER_TOKEN = 1.5
+
+CHINESE_DIGITS = "零一二三四五六七八九"
+
+
+def to_chinese_num(num: int) -> str:
+    """阿拉伯数字转汉字数字（与 crew_tasks 中章节编号一致）"""
+    if num < 10:
+        return CHINESE_DIGITS[num]
+    if num < 20:
+        return "十" + (CHINESE_DIGITS[num % 10] if num % 10 else "")
+    if num < 100:
+        return CHINESE_DIGITS[num // 10] + "十" + (CHINESE_DIGITS[num % 10] if num % 10 else "")
+    if num < 1000:
+        rest = num % 100
+        text = CHINESE_DIGITS[num // 100] + "百"
+        if rest == 0:
+            return text
+        if rest < 10:
+            return text + "零" + CHINESE_DIGITS[rest]
+        return text + (CHINESE_DIGITS[rest // 10] + "十" + (CHINESE_DIGITS[rest % 10] if rest % 10 else ""))
+    return str(num)
+
+
+def _paragraphs(seed: str, count: int) -> str:
+    """生成确定性的占位段落（同一提示词输出相同）"""
+    rng = random.Random(seed)
+    sentences = [
+        "夜色沉沉，城门外的风裹着细雪扑在脸上。",
+        "她握紧袖中的玉佩，指尖传来一丝温热。",
+        "远处传来更鼓声，街巷里只剩零星的灯火。",
+        "他没有回头，只是把那封信压在了茶盏下面。",
+        "这一局棋，从一开始就没有退路。",
+        "老掌柜眯着眼睛打量来人，半晌才慢慢开口。",
+        "雨水顺着屋檐落下，在石阶上溅起细碎的水花。",
+        "她忽然明白，所谓巧合不过是有人早已布好的局。",
+    ]
+    return "\n\n".join(
+        "".join(rng.choice(sentences) for _ in range(6)) for _ in range(count)
+    )
+
+
+def _prompt_text(messages: List[Dict]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list):
+            content = "".join(part.get('text', '') for part in content if isinstance(part, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def _chapter_range(prompt: str, default: Tuple[int, int] = (1, 3)) -> Tuple[int, int]:
+    match = re.search(r"第\s*(\d+)\s*[-~到至]\s*(\d+)\s*章", prompt)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    start = re.search(r"从第\s*(\d+)\s*章开始", prompt)
+    count = re.search(r"只生成指定的\s*(\d+)\s*章", prompt) or re.search(r"包含\s*(\d+)\s*章", prompt)
+    if start or count:
+        first = int(start.group(1)) if start else default[0]
+        return first, first + (int(count.group(1)) if count else 1) - 1
+    return default
+
+
+def render_response(messages: List[Dict]) -> str:
+    """按提示词选择输出模板"""
+    prompt = _prompt_text(messages)
+
+    if "JSON 数组" in prompt or "JSON数组" in prompt:
+        start, end = _chapter_range(prompt, (1, 10))
+        segments = []
+        for first in range(start, end + 1, 5):
+            last = min(first + 4, end)
+            segments.append({
+                'start_chapter': first,
+                'end_chapter': last,
+                'title': f"第{first}-{last}章 暗流涌动",
+                'summary': _paragraphs(f"{prompt}-{first}", 1),
+            })
+        return json.dumps(segments, ensure_ascii=False, indent=2)
+
+    if "细纲" in prompt:
+        start, end = _chapter_range(prompt)
+        return "\n\n".join(
+            f"### 第{n}章 风起青萍\n\n- 场景一：{_paragraphs(f'{prompt}-{n}-a', 1)}\n"
+            f"- 场景二：{_paragraphs(f'{prompt}-{n}-b', 1)}\n- 章末钩子：门外响起了第三次敲门声。"
+            for n in range(start, end + 1)
+        )
+
+    generate_count = re.search(r"请生成\s*(\d+)\s*个", prompt)
+    if generate_count and "每行一个" in prompt:
+        rng = random.Random(prompt)
+        return "\n".join(
+            f"桩服务选项{n + 1}-{rng.randint(1000, 9999)} (Stub Option {n + 1})"
+            for n in range(int(generate_count.group(1)))
+        )
+
+    if "章" in prompt and ("正文" in prompt or "撰写" in prompt or "修订" in prompt):
+        start, end = _chapter_range(prompt, (1, 1))
+        return "\n\n".join(
+            f"## 第{to_chinese_num(n)}章 雪夜来客\n\n{_paragraphs(f'{prompt}-{n}', 8)}"
+            for n in range(start, end + 1)
+        )
+
+    return "# 桩服务输出\n\n## 概要\n\n" + _paragraphs(prompt, 3) + "\n\n## 细节\n\n" + _paragraphs(prompt + "#", 2)
+
+
+class StubConfig:
+    """桩服务运行参数"""
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, timeout_seconds: float = 600.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self) -> Optional[str]:
+        """按比例决定本次请求是否注入故障"""
+        with self.lock:
+            self.requests += 1
+            value = self.random.random()
+        if value < self.timeout_rate:
+            return 'timeout'
+        if value < self.timeout_rate + self.error_rate:
+            return '500'
+        return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI 兼容接口"""
+
+    server_version = "StubLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def config(self) -> StubConfig:
+        return self.server.stub_config
+
+    def log_message(self, format, *args):
+        if getattr(self.server, 'verbose', False):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/v1/models', '/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'stub-model', 'object': 'model'}]})
+        elif self.path.rstrip('/') == '/health':
+            self._send_json(200, {'status': 'ok', 'requests': self.config.requests})
+        else:
+            self._send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'invalid JSON', 'type': 'invalid_request_error'}})
+            return
+
+        fault = self.headers.get('X-Stub-Error') or self.config.roll()
+        if fault == 'timeout':
+            time.sleep(self.config.timeout_seconds)
+            self.close_connection = True
+            return
+        if fault in ('500', '429', '503'):
+            self._send_json(int(fault), {'error': {'message': f'stub injected error {fault}', 'type': 'server_error'}})
+            return
+
+        model = request.get('model', 'stub-model')
+        messages = request.get('messages') or []
+        content = render_response(messages)
+        prompt_tokens = int(len(_prompt_text(messages)) / CHARS_PER_TOKEN) + 1
+        completion_tokens = int(len(content) / CHARS_PER_TOKEN) + 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        time.sleep(self.config.latency)
+        if request.get('stream'):
+            self._stream(completion_id, model, content, prompt_tokens, completion_tokens)
+            return
+
+        if self.config.tokens_per_second:
+            time.sleep(completion_tokens / self.config.tokens_per_second)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream(self, completion_id: str, model: str, content: str,
+                prompt_tokens: int, completion_tokens: int):
+        """按 token 速度分块输出 SSE"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta: Dict, finish_reason: Optional[str] = None, usage: Optional[Dict] = None):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            if usage:
+                chunk['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        chunk_chars = 8
+        delay = (chunk_chars / CHARS_PER_TOKEN) / self.config.tokens_per_second if self.config.tokens_per_second else 0
+        send({'role': 'assistant', 'content': ''})
+        for start in range(0, len(content), chunk_chars):
+            send({'content': content[start:start + chunk_chars]})
+            if delay:
+                time.sleep(delay)
+        send({}, finish_reason='stop', usage={
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8765, config: Optional[StubConfig] = None,
+                  verbose: bool = False) -> ThreadingHTTPServer:
+    """创建桩服务（port 为 0 时自动分配端口，测试中使用）"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.stub_config = config or StubConfig()
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast", help="延迟配置")
+    parser.add_argument("--latency", type=float, help="首字延迟（秒），覆盖 profile")
+    parser.add_argument("--tps", type=float, help="每秒输出 token 数（0 不限速），覆盖 profile")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 错误的请求比例")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="不响应（超时）的请求比例")
+    parser.add_argument("--timeout-seconds", type=float, default=600.0, help="超时请求的挂起时长")
+    parser.add_argument("--seed", type=int, help="故障注入的随机种子")
+    parser.add_argument("--verbose", action="store_true", help="打印请求日志")
+    args = parser.parse_args()
+
+    latency, tps = PROFILES[args.profile]
+    config = StubConfig(
+        latency=latency if args.latency is None else args.latency,
+        tokens_per_second=tps if args.tps is None else args.tps,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, config, verbose=args.verbose)
+    print(f"桩服务已启动：http://{args.host}:{server.server_port}/v1 "
+          f"(首字延迟 {config.latency}s，速度 {config.tokens_per_second or '不限'} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,10 @@ from .outline_service import OutlineService
 from .detailed_outline_service import DetailedOutlineService
 from .chapter_writing_service import ChapterWritingService
 from .crew_orchestration_service import CrewOrchestrationService
+from .export_service import ExportService
+from .job_service import JobService
+from .summary_service import SummaryService
+from .retrieval_service import RetrievalService
 
 __all__ = [
     'StoryService',
@@ -24,4 +28,8 @@ __all__ = [
     'DetailedOutlineService',
     'ChapterWritingService',
     'CrewOrchestrationService',
+    'ExportService',
+    'JobService',
+    'SummaryService',
+    'RetrievalService',
 ]
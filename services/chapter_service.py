@@ -67,16 +67,8 @@ class ChapterService:
         if not updates:
             return False
 
-        # 更新章节
-        success = self.chapter_manager.update_chapter(chapter_id, **updates)
-
-        if success:
-            # 更新小说元数据
-            chapter = self.chapter_manager.get_chapter(chapter_id)
-            if chapter:
-                self.stats_manager.update_novel_metadata(chapter['novel_id'])
-
-        return success
+        # 更新章节（小说统计由数据库触发器同步更新）
+        return self.chapter_manager.update_chapter(chapter_id, **updates)
 
     def get_adjacent_chapters(
         self,
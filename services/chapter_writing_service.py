@@ -4,22 +4,41 @@
 将 writing_service.py 中的章节撰写 Crew 逻辑独立出来。
 """
 
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 import signal
 import json
 import re
 from database import DatabaseManager, NovelManager, ChapterManager, OutlineManager, NovelStatsManager
+from services.job_service import JobService
+from services.retrieval_service import RetrievalService
+from services.summary_service import SummaryService
+from services.task_graph import TaskGraph, kickoff_crew
+from utils.context_budget import ContextBudget, model_context_budget
+from utils.formatting import format_novel_text
 
 
 class ChapterWritingService:
     """章节撰写服务类"""
 
-    def __init__(self):
+    # 撰写提示词中各段上下文的上限（token），合计再受模型的上下文预算约束
+    OUTLINE_MIN_TOKENS = 1500
+    PREVIOUS_CHAPTER_MAX_TOKENS = 800
+    STORY_CONTEXT_MAX_TOKENS = 3000
+    RELATED_PASSAGES_MAX_TOKENS = 1200
+
+    def __init__(self, in_job_worker: bool = False):
+        """
+        Args:
+            in_job_worker: 是否在后台任务执行进程中运行（此时后续任务由本进程领取，无需再启动执行进程）
+        """
+        self.in_job_worker = in_job_worker
         self.db_manager = DatabaseManager()
         self.novel_manager = NovelManager()
         self.chapter_manager = ChapterManager()
         self.outline_manager = OutlineManager()
         self.stats_manager = NovelStatsManager()
+        self.summary_service = SummaryService()
+        self.retrieval_service = RetrievalService()
 
     @staticmethod
     def _setup_signal_patch():
@@ -88,12 +107,12 @@ class ChapterWritingService:
                 if start_chapter > 1:
                     prev_ch = next((c for c in current_chapters if c['chapter_number'] == start_chapter - 1), None)
                     if prev_ch:
-                        last_chapter_content = prev_ch.get('content', '')
+                        last_chapter_content = self._get_chapter_content(prev_ch['id'])
             else:
                 next_chapter_num = 1
                 if current_chapters:
                     last_chapter = current_chapters[-1]
-                    last_chapter_content = last_chapter.get('content', '')
+                    last_chapter_content = self._get_chapter_content(last_chapter['id'])
                     next_chapter_num = last_chapter.get('chapter_number', 0) + 1
 
             end_chapter_num = next_chapter_num + num_chapters - 1
@@ -140,209 +159,495 @@ class ChapterWritingService:
 
             # 获取企划书信息
             novel = self.novel_manager.get_novel(novel_id)
-            story_context = ""
-            if novel and novel.get('source_story_id'):
-                source_story = self.db_manager.get_story(novel['source_story_id'])
-                if source_story and source_story.get('content'):
-                    story_context = source_story['content']
-                    # 截取前3000字
-                    if len(story_context) > 3000:
-                        story_context = story_context[:3000] + "...\n(内容已截断)"
+            story_context = self._get_story_context(novel)
+            story_so_far = self.summary_service.story_so_far(novel_id, next_chapter_num)
+            # 用待写章节的大纲检索相关的前文片段（人物、道具、伏笔的早先出场）
+            related_passages = self.retrieval_service.related_passages(novel_id, outline_text, next_chapter_num)
 
             # 设置环境
             self._setup_signal_patch()
             self._disable_crewai_events_errors()
 
             # 动态导入 CrewAI 相关库
-            from crew_agents import StoryAgents
-            from crew_tasks import StoryTasks
             from crewai import Crew, Process
 
-            # 创建 Agents 和 Tasks
-            agents = StoryAgents()
-            tasks = StoryTasks()
-
-            # 实例化撰写 Crew 所需的 Agents
-            chief_editor = agents.chief_editor()
-            character_builder = agents.character_builder()
-            scene_painter = agents.scene_painter()
-            punchline_king = agents.punchline_king()
-            story_writer = agents.story_writer()
-            creative_critic = agents.creative_critic()
-            continuity_coordinator = agents.continuity_coordinator()
-            consistency_checker = agents.consistency_checker()
-            format_editor = agents.format_editor()
-
-            # 创建任务流
-            task_plan = tasks.outline_analysis_task(
-                chief_editor,
-                outline_content=outline_text,
+            crew_agents = self._create_writing_agents()
+            chapter_tasks = self._create_writing_tasks(
+                crew_agents,
+                outline_text=outline_text,
                 previous_chapter_content=last_chapter_content,
                 num_chapters=num_chapters,
-                story_context=story_context
-            )
-
-            task_char = tasks.character_enrichment_task(character_builder, context_outline=task_plan)
-            task_scene = tasks.scene_enrichment_task(scene_painter, context_outline=task_plan)
-            task_punchline = tasks.punchline_injection_task(punchline_king, context_outline=task_plan)
-
-            # 阶段1：写手撰写初稿
-            task_writing = tasks.full_story_writing_task(
-                story_writer,
-                context_materials=[task_plan, task_char, task_scene, task_punchline],
-                num_chapters=num_chapters,
                 chapter_start_num=next_chapter_num,
-                use_chinese_numerals=True
+                story_context=story_context,
+                story_so_far=story_so_far,
+                related_passages=related_passages
             )
 
-            # 阶段2：创意批判专家提出意见（盲审同行评审）
-            task_critique = tasks.creative_critique_task(
-                creative_critic,
-                context_draft=task_writing,
-                num_chapters=num_chapters,
-                chapter_start_num=next_chapter_num,
-                use_chinese_numerals=True
+            # 组建 Crew
+            writing_crew = Crew(
+                agents=list(crew_agents.values()),
+                tasks=list(chapter_tasks.values()),
+                process=Process.sequential,
+                verbose=True
             )
 
-            # 阶段3：写手根据意见自行修订（保留独特文风）
-            task_revision = tasks.story_revision_task(
-                story_writer,
-                context_draft=task_writing,
-                context_critique=task_critique,
-                num_chapters=num_chapters,
-                chapter_start_num=next_chapter_num,
-                use_chinese_numerals=True
+            # 执行（角色、场景、爆梗三个任务只依赖分析任务，并发执行；
+            # 写手收到的素材总量不超过其模型的上下文预算）
+            result = kickoff_crew(
+                writing_crew,
+                context_tokens=self._agent_context_tokens('story_writer'),
+                material_tasks=self._material_tasks(chapter_tasks)
             )
 
-            # 阶段4：编辑润色（逻辑、文风统一）
-            task_edit = tasks.copy_editing_task(
-                consistency_checker,
-                context_draft=task_revision,
-                num_chapters=num_chapters,
-                chapter_start_num=next_chapter_num,
-                use_chinese_numerals=True
+            new_chapters = self._collect_chapters(
+                result, chapter_tasks, next_chapter_num, num_chapters, target_segments
             )
+            self._save_written_chapters(novel_id, novel, new_chapters)
 
-            task_format = tasks.format_editing_task(
-                format_editor,
-                context_draft=task_edit,
-                num_chapters=num_chapters,
-                chapter_start_num=next_chapter_num,
-                use_chinese_numerals=True
-            )
+            return {
+                'chapters_written': len(new_chapters),
+                'success': True,
+                'error': ''
+            }
 
-            # 组建 Crew
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            return {
+                'chapters_written': 0,
+                'success': False,
+                'error': f"{str(e)}\n\n{error_detail}"
+            }
+
+    def write_chapters_pipelined(
+        self,
+        novel_id: int,
+        num_chapters: int,
+        start_chapter: int = None,
+        max_workers: int = 4,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        流水线连续撰写多章（每章一轮完整的撰写 Crew）
+
+        所有章节的任务组成一张依赖图：后续章节的分析与素材任务只依赖大纲，
+        与前面章节的写作并行；只有初稿需要等待上一章修订完成（衔接上一章正文），
+        编辑润色与格式整理再与下一章的写作重叠。每个 Agent 同一时间只执行一个任务，
+        相当于流水线的一个工位，章节完成一章保存一章。
+
+        Args:
+            novel_id: 小说 ID
+            num_chapters: 要撰写的章节数
+            start_chapter: 起始章节号（可选，如果不填则自动接续）
+            max_workers: 最多同时请求 LLM 的任务数
+            progress_callback: 进度回调 (已完成章数, 总章数, 说明)
+
+        Returns:
+            {
+                'chapters_written': int,
+                'failed_chapters': List[int],
+                'success': bool,
+                'error': str
+            }
+        """
+        current_chapters = self.chapter_manager.list_chapters(novel_id)
+        if start_chapter:
+            first_chapter = start_chapter
+            prev_ch = next((c for c in current_chapters if c['chapter_number'] == start_chapter - 1), None)
+        else:
+            prev_ch = current_chapters[-1] if current_chapters else None
+            first_chapter = prev_ch['chapter_number'] + 1 if prev_ch else 1
+        last_chapter = first_chapter + num_chapters - 1
+
+        written = []
+        failed = []
+        try:
+            last_chapter_content = self._get_chapter_content(prev_ch['id']) if prev_ch else ""
+            segments = self.outline_manager.get_segments_by_chapter_range(novel_id, first_chapter, last_chapter)
+            novel = self.novel_manager.get_novel(novel_id)
+            story_context = self._get_story_context(novel)
+            # 前情提要只需提供给第一章，后续章节通过上一章的写作规划衔接
+            story_so_far = self.summary_service.story_so_far(novel_id, first_chapter)
+
+            self._setup_signal_patch()
+            self._disable_crewai_events_errors()
+
+            from crewai import Crew, Process
+
+            # 各章共用同一组 Agent
+            crew_agents = self._create_writing_agents()
+            chapter_plans = []
+            previous_tasks = None
+            for chapter_num in range(first_chapter, last_chapter + 1):
+                segment = next(
+                    (seg for seg in segments if seg['start_chapter'] <= chapter_num <= seg['end_chapter']),
+                    None
+                )
+                if not segment:
+                    # 没有大纲的章节跳过，下一章衔接最近一章
+                    failed.append(chapter_num)
+                    continue
+
+                outline_text = f"【第{segment['start_chapter']}-{segment['end_chapter']}章 {segment['title']}】\n{segment['summary']}"
+                if previous_tasks is None:
+                    previous_content = last_chapter_content
+                else:
+                    previous_content = "（上一章正在撰写中，请参考上下文中上一章的写作规划保持衔接）"
+
+                chapter_tasks = self._create_writing_tasks(
+                    crew_agents,
+                    outline_text=outline_text,
+                    previous_chapter_content=previous_content,
+                    num_chapters=1,
+                    chapter_start_num=chapter_num,
+                    story_context=story_context,
+                    story_so_far=story_so_far if previous_tasks is None else "",
+                    related_passages=self.retrieval_service.related_passages(novel_id, outline_text, chapter_num)
+                )
+                # 分析任务只参考上一章的规划，可以提前进行；
+                # 初稿需要上一章修订后的正文，是唯一跨章节等待的步骤
+                chapter_tasks['plan'].context = [previous_tasks['plan']] if previous_tasks else []
+                if previous_tasks:
+                    chapter_tasks['writing'].context = list(chapter_tasks['writing'].context) + [previous_tasks['revision']]
+                chapter_plans.append((chapter_num, segment, chapter_tasks))
+                previous_tasks = chapter_tasks
+
+            if not chapter_plans:
+                return {
+                    'chapters_written': 0,
+                    'failed_chapters': failed,
+                    'success': False,
+                    'error': f"未找到第 {first_chapter}-{last_chapter} 章的大纲规划"
+                }
+
+            all_tasks = [task for _, _, chapter_tasks in chapter_plans for task in chapter_tasks.values()]
             writing_crew = Crew(
-                agents=[
-                    chief_editor,
-                    character_builder,
-                    scene_painter,
-                    punchline_king,
-                    story_writer,
-                    creative_critic,
-                    continuity_coordinator,
-                    consistency_checker,
-                    format_editor
-                ],
-                tasks=[
-                    task_plan,
-                    task_char,
-                    task_scene,
-                    task_punchline,
-                    task_writing,
-                    task_critique,
-                    task_revision,
-                    task_edit,
-                    task_format
-                ],
+                agents=list(crew_agents.values()),
+                tasks=all_tasks,
                 process=Process.sequential,
                 verbose=True
             )
+            for agent in writing_crew.agents:
+                agent.crew = writing_crew
+
+            # 每章最后一个任务完成即保存
+            final_tasks = {id(list(chapter_tasks.values())[-1]): (chapter_num, segment, chapter_tasks)
+                           for chapter_num, segment, chapter_tasks in chapter_plans}
+
+            def on_task_done(index, output):
+                plan = final_tasks.get(id(all_tasks[index]))
+                if plan is None:
+                    return
+                chapter_num, segment, chapter_tasks = plan
+                new_chapters = self._collect_chapters(output, chapter_tasks, chapter_num, 1, [segment])
+                self._save_written_chapters(novel_id, self.novel_manager.get_novel(novel_id), new_chapters)
+                written.append(chapter_num)
+                if progress_callback:
+                    progress_callback(len(written), len(chapter_plans), f"第 {chapter_num} 章已完成")
+
+            if progress_callback:
+                progress_callback(0, len(chapter_plans), f"开始撰写第 {first_chapter}-{last_chapter} 章")
+            TaskGraph(
+                all_tasks,
+                max_workers=max_workers,
+                context_tokens=self._agent_context_tokens('story_writer'),
+                material_tasks=[task for _, _, chapter_tasks in chapter_plans
+                                for task in self._material_tasks(chapter_tasks)]
+            ).run(on_task_done=on_task_done)
 
-            # 执行
-            result = writing_crew.kickoff()
+            return {
+                'chapters_written': len(written),
+                'failed_chapters': failed,
+                'success': True,
+                'error': ''
+            }
 
-            # 处理结果
-            generated_content = self._extract_content_from_result(result, task_format)
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            # 已完成的章节已经保存，其余章节记为失败
+            done = set(written) | set(failed)
+            failed.extend(n for n in range(first_chapter, last_chapter + 1) if n not in done)
+            return {
+                'chapters_written': len(written),
+                'failed_chapters': sorted(failed),
+                'success': False,
+                'error': f"{str(e)}\n\n{error_detail}"
+            }
 
-            # 如果格式编辑输出无效，回退到修订后的输出
-            if not generated_content or len(generated_content.strip()) < 500:
-                generated_content = self._extract_content_from_result(result, task_revision)
-            
-            # 如果修订输出也无效，回退到编辑润色的输出
-            if not generated_content or len(generated_content.strip()) < 500:
-                generated_content = self._extract_content_from_result(result, task_edit)
+    def _get_story_context(self, novel: Optional[Dict]) -> str:
+        """企划书内容（按 token 预算裁剪见 _budget_writing_context）"""
+        story_context = ""
+        if novel and novel.get('source_story_id'):
+            source_story = self.db_manager.get_story(novel['source_story_id'])
+            if source_story and source_story.get('content'):
+                story_context = source_story['content']
+        return story_context
 
-            # 解析并保存章节
-            parsed_new_chapters = self.chapter_manager.parse_chapters_from_content(generated_content)
+    @staticmethod
+    def _material_tasks(chapter_tasks: Dict[str, Any]) -> List[Any]:
+        """输出可按预算压缩的素材任务（初稿、修订等正文必须完整传递）"""
+        return [chapter_tasks[key] for key in ('plan', 'char', 'scene', 'punchline')]
 
-            # 限制章节数量
-            if parsed_new_chapters and len(parsed_new_chapters) > num_chapters:
-                parsed_new_chapters = parsed_new_chapters[:num_chapters]
+    @staticmethod
+    def _agent_context_tokens(agent_name: str) -> int:
+        """Agent 所用模型的上下文预算"""
+        from crew_agents import config, get_agent_model
+
+        return model_context_budget(config, get_agent_model(agent_name))
+
+    @classmethod
+    def _budget_writing_context(
+        cls,
+        outline_text: str,
+        previous_chapter_content: str,
+        story_context: str,
+        story_so_far: str = "",
+        related_passages: str = ""
+    ) -> Dict[str, str]:
+        """按 token 预算裁剪大纲、前情提要、上一章正文、相关前文与企划书（企划书与相关前文最先压缩，大纲最后）"""
+        from crew_agents import config, get_agent_model
+
+        budget = ContextBudget.for_model(config, get_agent_model('chief_editor'))
+        budget.add('outline', outline_text, priority=3, min_tokens=cls.OUTLINE_MIN_TOKENS)
+        # 衔接只需要上一章的结尾
+        budget.add('previous', previous_chapter_content, priority=2, min_tokens=300,
+                   max_tokens=cls.PREVIOUS_CHAPTER_MAX_TOKENS, keep='tail')
+        budget.add('so_far', story_so_far, priority=2, min_tokens=300, keep='tail')
+        budget.add('story', story_context, priority=1, min_tokens=500,
+                   max_tokens=cls.STORY_CONTEXT_MAX_TOKENS)
+        budget.add('related', related_passages, priority=1, max_tokens=cls.RELATED_PASSAGES_MAX_TOKENS)
+        return budget.allocate()
 
-            count = 0
-            if parsed_new_chapters:
-                for ch in parsed_new_chapters:
-                    actual_ch_num = next_chapter_num + count
+    @staticmethod
+    def _use_llm_format() -> bool:
+        """是否保留格式编辑 LLM 环节（默认由本地规则整理格式，见 utils/formatting.py）"""
+        from crew_agents import config
 
-                    # 查找对应的大纲段
-                    matching_segment = next(
-                        (seg for seg in target_segments
-                         if seg['start_chapter'] <= actual_ch_num <= seg['end_chapter']),
-                        None
-                    )
-                    
-                    # 生成简要大纲描述（而非细纲的完整内容）
-                    # 使用细纲的标题作为大纲描述，或者从内容中提取前200字
-                    if matching_segment:
-                        ch_outline_str = matching_segment.get('title', '')
-                        # 如果标题太短，补充一些摘要信息（限制长度）
-                        if len(ch_outline_str) < 10 and matching_segment.get('summary'):
-                            summary_preview = matching_segment['summary'][:200].strip()
-                            ch_outline_str = f"{ch_outline_str}: {summary_preview}" if ch_outline_str else summary_preview
-                    else:
-                        ch_outline_str = ''
-
-                    # 处理章节标题
-                    chapter_title = self._process_chapter_title(
-                        ch.get('chapter_title', ''),
-                        matching_segment,
-                        ch.get('content', ''),
-                        actual_ch_num
-                    )
+        return bool((config.get('formatting') or {}).get('use_llm_editor', False))
 
-                    self.chapter_manager.create_chapter(
-                        novel_id=novel_id,
-                        chapter_number=actual_ch_num,
-                        chapter_title=chapter_title,
-                        content=ch['content'],
-                        outline=ch_outline_str,
-                        status='published'
-                    )
-                    count += 1
+    @staticmethod
+    def _edit_mode() -> str:
+        """修订与润色的输出方式：patch 只输出修改处并在本地应用（默认），full 输出完整正文"""
+        from crew_agents import config
+
+        mode = (config.get('editing') or {}).get('mode', 'patch')
+        return mode if mode in ('patch', 'full') else 'patch'
+
+    @classmethod
+    def _create_writing_agents(cls) -> Dict[str, Any]:
+        """实例化撰写 Crew 所需的 Agents"""
+        from crew_agents import StoryAgents
+
+        agents = StoryAgents()
+        crew_agents = {
+            'chief_editor': agents.chief_editor(),
+            'character_builder': agents.character_builder(),
+            'scene_painter': agents.scene_painter(),
+            'punchline_king': agents.punchline_king(),
+            'story_writer': agents.story_writer(),
+            'creative_critic': agents.creative_critic(),
+            'continuity_coordinator': agents.continuity_coordinator(),
+            'consistency_checker': agents.consistency_checker(),
+        }
+        if cls._use_llm_format():
+            crew_agents['format_editor'] = agents.format_editor()
+        return crew_agents
+
+    @classmethod
+    def _create_writing_tasks(
+        cls,
+        crew_agents: Dict[str, Any],
+        outline_text: str,
+        previous_chapter_content: str,
+        num_chapters: int,
+        chapter_start_num: int,
+        story_context: str,
+        story_so_far: str = "",
+        related_passages: str = ""
+    ) -> Dict[str, Any]:
+        """创建撰写任务流（按执行顺序）"""
+        from crew_tasks import StoryTasks
+
+        tasks = StoryTasks()
+        edit_mode = cls._edit_mode()
+        context = cls._budget_writing_context(
+            outline_text, previous_chapter_content, story_context, story_so_far, related_passages
+        )
+
+        task_plan = tasks.outline_analysis_task(
+            crew_agents['chief_editor'],
+            outline_content=context['outline'],
+            previous_chapter_content=context['previous'],
+            num_chapters=num_chapters,
+            story_context=context['story'],
+            story_so_far=context['so_far'],
+            related_passages=context['related']
+        )
+
+        task_char = tasks.character_enrichment_task(crew_agents['character_builder'], context_outline=task_plan)
+        task_scene = tasks.scene_enrichment_task(crew_agents['scene_painter'], context_outline=task_plan)
+        task_punchline = tasks.punchline_injection_task(crew_agents['punchline_king'], context_outline=task_plan)
+
+        # 阶段1：写手撰写初稿
+        task_writing = tasks.full_story_writing_task(
+            crew_agents['story_writer'],
+            context_materials=[task_plan, task_char, task_scene, task_punchline],
+            num_chapters=num_chapters,
+            chapter_start_num=chapter_start_num,
+            use_chinese_numerals=True
+        )
+
+        # 阶段2：创意批判专家提出意见（盲审同行评审）
+        task_critique = tasks.creative_critique_task(
+            crew_agents['creative_critic'],
+            context_draft=task_writing,
+            num_chapters=num_chapters,
+            chapter_start_num=chapter_start_num,
+            use_chinese_numerals=True
+        )
+
+        # 阶段3：写手根据意见自行修订（保留独特文风）
+        task_revision = tasks.story_revision_task(
+            crew_agents['story_writer'],
+            context_draft=task_writing,
+            context_critique=task_critique,
+            num_chapters=num_chapters,
+            chapter_start_num=chapter_start_num,
+            use_chinese_numerals=True,
+            edit_mode=edit_mode
+        )
+
+        # 阶段4：编辑润色（逻辑、文风统一）
+        task_edit = tasks.copy_editing_task(
+            crew_agents['consistency_checker'],
+            context_draft=task_revision,
+            num_chapters=num_chapters,
+            chapter_start_num=chapter_start_num,
+            use_chinese_numerals=True,
+            edit_mode=edit_mode
+        )
+
+        chapter_tasks = {
+            'plan': task_plan,
+            'char': task_char,
+            'scene': task_scene,
+            'punchline': task_punchline,
+            'writing': task_writing,
+            'critique': task_critique,
+            'revision': task_revision,
+            'edit': task_edit,
+        }
+
+        # 格式整理默认在本地完成（_collect_chapters），配置开启时才交给格式编辑专家
+        if 'format_editor' in crew_agents:
+            chapter_tasks['format'] = tasks.format_editing_task(
+                crew_agents['format_editor'],
+                context_draft=task_edit,
+                num_chapters=num_chapters,
+                chapter_start_num=chapter_start_num,
+                use_chinese_numerals=True
+            )
+        return chapter_tasks
 
-                self.stats_manager.update_novel_metadata(novel_id)
-            else:
-                # 未能解析出章节，作为单章保存
-                # 使用简要描述而非完整细纲
-                if target_segments:
-                    outline_str = target_segments[0].get('title', '')
-                    if len(outline_str) < 10 and target_segments[0].get('summary'):
-                        outline_str = target_segments[0]['summary'][:200].strip()
+    def _collect_chapters(
+        self,
+        result,
+        chapter_tasks: Dict[str, Any],
+        next_chapter_num: int,
+        num_chapters: int,
+        target_segments: List[Dict]
+    ) -> List[Dict]:
+        """从 Crew 输出中解析章节，整理成待保存的章节列表"""
+        # 处理结果
+        generated_content = self._extract_content_from_result(
+            result, chapter_tasks.get('format', chapter_tasks['edit'])
+        )
+
+        # 如果最终输出无效，回退到修订后的输出
+        if not generated_content or len(generated_content.strip()) < 500:
+            generated_content = self._extract_content_from_result(result, chapter_tasks['revision'])
+
+        # 如果修订输出也无效，回退到编辑润色的输出
+        if not generated_content or len(generated_content.strip()) < 500:
+            generated_content = self._extract_content_from_result(result, chapter_tasks['edit'])
+
+        # 本地整理格式（标题层级、段落长度、标点、章末分隔线），确保章节可以正确解析
+        generated_content = format_novel_text(generated_content or "")
+
+        # 解析并保存章节
+        parsed_new_chapters = self.chapter_manager.parse_chapters_from_content(generated_content)
+
+        # 限制章节数量
+        if parsed_new_chapters and len(parsed_new_chapters) > num_chapters:
+            parsed_new_chapters = parsed_new_chapters[:num_chapters]
+
+        # 先整理出全部章节，再在一个事务中统一写入（不在事务中调用 LLM）
+        new_chapters = []
+        if parsed_new_chapters:
+            for ch in parsed_new_chapters:
+                actual_ch_num = next_chapter_num + len(new_chapters)
+
+                # 查找对应的大纲段
+                matching_segment = next(
+                    (seg for seg in target_segments
+                     if seg['start_chapter'] <= actual_ch_num <= seg['end_chapter']),
+                    None
+                )
+                
+                # 生成简要大纲描述（而非细纲的完整内容）
+                # 使用细纲的标题作为大纲描述，或者从内容中提取前200字
+                if matching_segment:
+                    ch_outline_str = matching_segment.get('title', '')
+                    # 如果标题太短，补充一些摘要信息（限制长度）
+                    if len(ch_outline_str) < 10 and matching_segment.get('summary'):
+                        summary_preview = matching_segment['summary'][:200].strip()
+                        ch_outline_str = f"{ch_outline_str}: {summary_preview}" if ch_outline_str else summary_preview
                 else:
-                    outline_str = ''
-                    
-                self.chapter_manager.create_chapter(
-                    novel_id=novel_id,
-                    chapter_number=next_chapter_num,
-                    chapter_title=f"第{self._num_to_chinese(next_chapter_num)}章 (待整理)",
-                    content=generated_content,
-                    outline=outline_str,
-                    status='draft'
+                    ch_outline_str = ''
+
+                # 处理章节标题
+                chapter_title = self._process_chapter_title(
+                    ch.get('chapter_title', ''),
+                    matching_segment,
+                    ch.get('content', ''),
+                    actual_ch_num
                 )
-                count = 1
 
-            # 更新小说元数据
+                new_chapters.append({
+                    'chapter_number': actual_ch_num,
+                    'chapter_title': chapter_title,
+                    'content': ch['content'],
+                    'outline': ch_outline_str,
+                    'status': 'published'
+                })
+        else:
+            # 未能解析出章节，作为单章保存
+            # 使用简要描述而非完整细纲
+            if target_segments:
+                outline_str = target_segments[0].get('title', '')
+                if len(outline_str) < 10 and target_segments[0].get('summary'):
+                    outline_str = target_segments[0]['summary'][:200].strip()
+            else:
+                outline_str = ''
+                
+            new_chapters.append({
+                'chapter_number': next_chapter_num,
+                'chapter_title': f"第{self._num_to_chinese(next_chapter_num)}章 (待整理)",
+                'content': generated_content,
+                'outline': outline_str,
+                'status': 'draft'
+            })
+        return new_chapters
+
+    def _save_written_chapters(self, novel_id: int, novel: Optional[Dict], new_chapters: List[Dict]):
+        """保存章节并记录写作进度"""
+        if not new_chapters:
+            return
+        # 章节、统计与 workflow_stage 在同一事务中写入，任一步失败全部回滚
+        with self.chapter_manager.connection():
+            self.chapter_manager.create_chapters_bulk(novel_id, new_chapters)
+
             if novel:
                 metadata = novel.get('metadata', {})
                 if isinstance(metadata, str):
@@ -352,7 +657,7 @@ class ChapterWritingService:
                         metadata = {}
                 
                 metadata['workflow_stage'] = 'writing'
-                metadata['last_chapter_written'] = next_chapter_num + count - 1
+                metadata['last_chapter_written'] = new_chapters[-1]['chapter_number']
                 metadata['last_writing_at'] = self._get_current_timestamp()
                 
                 self.novel_manager.update_novel(
@@ -360,20 +665,18 @@ class ChapterWritingService:
                     metadata=metadata
                 )
 
-            return {
-                'chapters_written': count,
-                'success': True,
-                'error': ''
-            }
-
-        except Exception as e:
-            import traceback
-            error_detail = traceback.format_exc()
-            return {
-                'chapters_written': 0,
-                'success': False,
-                'error': f"{str(e)}\n\n{error_detail}"
-            }
+        self.retrieval_service.refresh(novel_id)
+        # 后台生成新章节的摘要（同一小说已有未完成的摘要任务时复用该任务）；
+        # 在页面等非执行进程中同步撰写时，确保有执行进程领取该任务
+        JobService().submit(
+            'summarize_chapters', scope=f"novel:{novel_id}:summaries",
+            start_workers=not self.in_job_worker, novel_id=novel_id
+        )
+
+    def _get_chapter_content(self, chapter_id: int) -> str:
+        """按需读取单章正文（章节列表不含正文）"""
+        chapter = self.chapter_manager.get_chapter(chapter_id)
+        return chapter.get('content', '') if chapter else ''
 
     def _extract_content_from_result(self, result, task):
         """从 CrewAI 结果中提取内容"""
@@ -9,11 +9,16 @@ import signal
 import json
 import re
 from database import DatabaseManager, NovelManager, OutlineManager
+from utils.context_budget import ContextBudget
 
 
 class DetailedOutlineService:
     """细纲生成服务类"""
 
+    # 细纲提示词中大纲与企划书的上限（token），合计再受模型的上下文预算约束
+    OUTLINE_MAX_TOKENS = 4000
+    PROPOSAL_MAX_TOKENS = 3000
+
     def __init__(self):
         self.db_manager = DatabaseManager()
         self.novel_manager = NovelManager()
@@ -97,9 +102,6 @@ class DetailedOutlineService:
                 source_story = self.db_manager.get_story(novel['source_story_id'])
                 if source_story:
                     proposal_content = source_story.get('content', '')
-                    # 截取前5000字（增加长度以确保关键信息完整）
-                    if len(proposal_content) > 5000:
-                        proposal_content = proposal_content[:5000] + "...\n(内容已截断，但请确保遵循企划书的核心设定)"
 
             # 确定章节范围
             if chapter_range:
@@ -136,12 +138,20 @@ class DetailedOutlineService:
             narrative_planner = agents.narrative_planner()
             scene_weaver = agents.scene_weaver()
 
+            # 按 token 预算裁剪大纲与企划书（企划书先压缩）
+            from crew_agents import config, get_agent_model
+
+            budget = ContextBudget.for_model(config, get_agent_model('scene_weaver'))
+            budget.add('outline', outline_content, priority=2, min_tokens=1500, max_tokens=self.OUTLINE_MAX_TOKENS)
+            budget.add('proposal', proposal_content, priority=1, min_tokens=1000, max_tokens=self.PROPOSAL_MAX_TOKENS)
+            context = budget.allocate()
+
             # 创建任务：为指定章节范围生成细纲
             task_detailed = tasks.detailed_outline_task(
                 scene_weaver,
                 chapter_range=(start_chapter, end_chapter),
-                outline_content=outline_content,
-                proposal_content=proposal_content,
+                outline_content=context['outline'],
+                proposal_content=context['proposal'],
                 custom_prompt=custom_prompt
             )
 
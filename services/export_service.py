@@ -0,0 +1,223 @@
+"""
+电子书导出业务服务
+
+EPUB / PDF 导出：章节 HTML 在进程池中并行渲染，并按正文哈希缓存，
+再次导出时只重新渲染修改过的章节。导出可作为后台任务运行并查询进度。
+"""
+
+import os
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from typing import Callable, Dict, List, Optional
+
+from database import NovelManager, ChapterManager, RenderCacheManager, ExportArtifactManager, content_hash
+from utils.export import ExportManager, export_fingerprint, render_cache_key, render_chapter_html
+
+
+# 进度回调：(已完成数, 总数, 说明)
+ProgressCallback = Callable[[int, int, str], None]
+
+
+class ExportService:
+    """电子书导出业务服务类"""
+
+    # 待渲染章节少于该数量时直接在当前进程渲染（避免进程池启动开销）
+    PARALLEL_THRESHOLD = 16
+    CHUNK_SIZE = 8
+
+    # 后台导出任务状态（进程内共享）
+    _jobs: Dict[str, Dict] = {}
+    _jobs_lock = threading.Lock()
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.novel_manager = NovelManager()
+        self.chapter_manager = ChapterManager()
+        self.render_cache = RenderCacheManager()
+        self.export_manager = ExportManager()
+        self.artifact_manager = ExportArtifactManager()
+        self.max_workers = max_workers
+
+    # ========== 章节渲染 ==========
+
+    def render_chapters(
+        self,
+        chapters: List[Dict],
+        renderer: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> List[str]:
+        """
+        渲染各章 HTML（命中缓存的章节不读取正文、不重新渲染）
+
+        Args:
+            chapters: 章节列表（list_chapters 的结果，无需包含正文）
+            renderer: epub 或 pdf
+            progress_callback: 进度回调
+
+        Returns:
+            与 chapters 一一对应的 HTML 片段
+        """
+        cache_key = render_cache_key(renderer)
+        total = len(chapters)
+
+        # 旧数据可能没有 content_hash，读取正文补算
+        contents = self.chapter_manager.get_chapter_contents(
+            [ch['id'] for ch in chapters if not ch.get('content_hash')]
+        )
+        hashes = [ch.get('content_hash') or content_hash(contents.get(ch['id'])) for ch in chapters]
+
+        hash_counts = Counter(hashes)
+        rendered = self.render_cache.get_rendered(hash_counts, cache_key)
+        missing = {}
+        for ch, value_hash in zip(chapters, hashes):
+            if value_hash not in rendered and value_hash not in missing:
+                missing[value_hash] = ch['id']
+
+        done = total - sum(hash_counts[value_hash] for value_hash in missing)
+        if progress_callback:
+            progress_callback(done, total, f"已复用 {done} 章缓存，待渲染 {len(missing)} 章")
+
+        if missing:
+            contents.update(self.chapter_manager.get_chapter_contents(
+                [chapter_id for chapter_id in missing.values() if chapter_id not in contents]
+            ))
+            missing_hashes = list(missing)
+            texts = [contents.get(missing[value_hash]) or "" for value_hash in missing_hashes]
+
+            new_html = {}
+            for value_hash, html in zip(missing_hashes, self._render_many(texts, renderer)):
+                new_html[value_hash] = html
+                done += hash_counts[value_hash]
+                if progress_callback:
+                    progress_callback(done, total, f"已渲染 {len(new_html)}/{len(missing_hashes)} 章")
+
+            self.render_cache.save_rendered(new_html, cache_key)
+            rendered.update(new_html)
+
+        return [rendered[value_hash] for value_hash in hashes]
+
+    def _render_many(self, texts: List[str], renderer: str):
+        """逐个产出渲染结果，章节较多时使用进程池并行"""
+        if len(texts) < self.PARALLEL_THRESHOLD:
+            for text in texts:
+                yield render_chapter_html(text, renderer)
+            return
+
+        results = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                for html in executor.map(render_chapter_html, texts, repeat(renderer),
+                                         chunksize=self.CHUNK_SIZE):
+                    results.append(html)
+                    yield html
+        except (BrokenProcessPool, OSError) as e:
+            # 进程池不可用（受限环境等）时回退到串行渲染
+            print(f"进程池渲染失败，改为串行: {e}")
+            for text in texts[len(results):]:
+                yield render_chapter_html(text, renderer)
+
+    # ========== 导出 ==========
+
+    def export_book(
+        self,
+        novel_id: int,
+        fmt: str = "epub",
+        output_path: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Optional[str]:
+        """
+        导出 EPUB / PDF
+
+        Args:
+            novel_id: 小说ID
+            fmt: epub 或 pdf
+            output_path: 输出路径（默认使用导出文件缓存，内容未变化时直接返回缓存文件）
+            progress_callback: 进度回调
+
+        Returns:
+            输出文件路径；小说不存在或缺少导出依赖时返回 None
+        """
+        novel = self.novel_manager.get_novel(novel_id)
+        if not novel:
+            return None
+
+        chapters = self.chapter_manager.list_chapters(novel_id)
+
+        fingerprint = None
+        if output_path is None:
+            fingerprint = export_fingerprint(novel, chapters, fmt)
+            cached = self.artifact_manager.get(fingerprint)
+            if cached:
+                if progress_callback:
+                    progress_callback(len(chapters), len(chapters), "内容未变化，使用已生成的文件")
+                return cached
+
+        rendered_html = self.render_chapters(chapters, fmt, progress_callback)
+
+        if output_path is None:
+            fd, output_path = tempfile.mkstemp(prefix=f"novel_{novel_id}_", suffix=f".{fmt}")
+            os.close(fd)
+
+        if progress_callback:
+            progress_callback(len(chapters), len(chapters), f"正在生成 {fmt.upper()} 文件")
+
+        metadata = {'id': novel_id, 'created_at': novel['created_at']}
+        export = self.export_manager.export_to_pdf if fmt == "pdf" else self.export_manager.export_to_epub
+        if not export(novel['title'], chapters, metadata, output_path, rendered_html=rendered_html):
+            os.remove(output_path)
+            return None
+        if fingerprint:
+            return self.artifact_manager.put(fingerprint, novel_id, fmt, output_path)
+        return output_path
+
+    # ========== 后台任务 ==========
+
+    def start_export_job(self, novel_id: int, fmt: str = "epub") -> str:
+        """
+        在后台线程中导出，立即返回任务ID（用 get_export_job 查询进度）
+
+        Returns:
+            任务ID
+        """
+        job_id = uuid.uuid4().hex
+        with self._jobs_lock:
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'novel_id': novel_id,
+                'format': fmt,
+                'status': 'running',  # running / done / failed
+                'progress': 0.0,
+                'message': '准备导出',
+                'path': None,
+                'error': ''
+            }
+
+        def update(**fields):
+            with self._jobs_lock:
+                self._jobs[job_id].update(fields)
+
+        def on_progress(done: int, total: int, message: str):
+            update(progress=done / total if total else 1.0, message=message)
+
+        def run():
+            try:
+                path = self.export_book(novel_id, fmt, progress_callback=on_progress)
+                if path:
+                    update(status='done', progress=1.0, message='导出完成', path=path)
+                else:
+                    update(status='failed', error='导出失败（小说不存在或缺少 ebooklib / weasyprint）')
+            except Exception as e:
+                update(status='failed', error=str(e))
+
+        threading.Thread(target=run, name=f"export-{job_id[:8]}", daemon=True).start()
+        return job_id
+
+    def get_export_job(self, job_id: str) -> Optional[Dict]:
+        """获取后台导出任务状态"""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
@@ -0,0 +1,274 @@
+"""
+后台任务业务服务
+
+企划书、大纲、细纲、正文等 Crew 生成耗时数分钟，若在 Streamlit 脚本中同步执行，
+页面刷新或断线重连会中断生成并丢失结果。这里把任务写入 jobs 表，由独立的执行进程
+领取执行并记录进度与结果，页面只负责提交任务和轮询状态。
+
+执行进程默认由页面在首次提交任务时启动，也可以单独运行：
+    python -m services.job_service --workers 2
+"""
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from database import JobManager
+
+
+# 进度回调：(进度 0~1, 说明)
+ReportCallback = Callable[[Optional[float], Optional[str]], None]
+
+
+# ========== 任务处理函数 ==========
+# 在执行进程中调用，Crew 相关的服务在函数内导入，避免页面进程加载 crewai
+
+def _generate_proposal(report: ReportCallback, topic: str, target_word_count: str,
+                       brainstorm_rounds: int = 3, parent_story_id: int = None) -> Dict[str, Any]:
+    """生成企划书（parent_story_id 不为空时记录为该企划书的重新生成版本）"""
+    from services.proposal_service import ProposalService
+    from database import DatabaseManager
+
+    report(0.05, "创意团队脑暴中")
+    result = ProposalService().generate_proposal(topic, target_word_count, brainstorm_rounds)
+    if result.get('success') and parent_story_id and result.get('story_id'):
+        DatabaseManager().create_relation(parent_id=parent_story_id, child_id=result['story_id'])
+    return result
+
+
+def _generate_outline(report: ReportCallback, story_id: int, target_word_count: str,
+                      novel_title: str = None, update_novel_id: int = None) -> Dict[str, Any]:
+    """从企划书生成大纲（update_novel_id 不为空时把大纲写回该小说）"""
+    from services.outline_service import OutlineService
+
+    report(0.05, "正在生成大纲")
+    result = OutlineService().generate_outline_from_proposal(story_id, target_word_count, novel_title)
+    if result.get('success') and update_novel_id:
+        from database import NovelManager
+        NovelManager().update_novel(update_novel_id, content=result['outline_content'])
+    return result
+
+
+def _generate_detailed_outline(report: ReportCallback, novel_id: int, chapter_range=None,
+                               chapters_per_block: int = 5, custom_prompt: str = None) -> Dict[str, Any]:
+    """生成细纲"""
+    from services.detailed_outline_service import DetailedOutlineService
+
+    report(0.05, "正在生成细纲")
+    return DetailedOutlineService().generate_detailed_outline(
+        novel_id,
+        chapter_range=tuple(chapter_range) if chapter_range else None,
+        chapters_per_block=chapters_per_block,
+        custom_prompt=custom_prompt
+    )
+
+
+def _write_chapters(report: ReportCallback, novel_id: int, num_chapters: int,
+                    start_chapter: int = None, outline_content: str = None) -> Dict[str, Any]:
+    """撰写正文"""
+    from services.chapter_writing_service import ChapterWritingService
+
+    report(0.05, f"正在撰写 {num_chapters} 章")
+    return ChapterWritingService(in_job_worker=True).write_chapters(novel_id, num_chapters, start_chapter, outline_content)
+
+
+def _continue_writing(report: ReportCallback, novel_id: int, num_chapters: int,
+                      start_chapter: int = None) -> Dict[str, Any]:
+    """连续续写多章（流水线撰写，完成一章保存一章）"""
+    from services.chapter_writing_service import ChapterWritingService
+
+    def on_progress(done: int, total: int, message: str):
+        report(done / total if total else 1.0, message)
+
+    return ChapterWritingService(in_job_worker=True).write_chapters_pipelined(
+        novel_id, num_chapters, start_chapter, progress_callback=on_progress
+    )
+
+
+def _summarize_chapters(report: ReportCallback, novel_id: int) -> Dict[str, Any]:
+    """为新章节生成摘要并更新逐级汇总（章节保存后自动提交）"""
+    from services.summary_service import SummaryService
+
+    def on_progress(done: int, total: int, message: str):
+        report(done / total if total else 1.0, message)
+
+    return SummaryService().update_summaries(novel_id, progress_callback=on_progress)
+
+
+JOB_HANDLERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    'generate_proposal': _generate_proposal,
+    'generate_outline': _generate_outline,
+    'generate_detailed_outline': _generate_detailed_outline,
+    'write_chapters': _write_chapters,
+    'continue_writing': _continue_writing,
+    'summarize_chapters': _summarize_chapters,
+}
+
+
+# ========== 执行进程 ==========
+
+class _Heartbeat:
+    """执行进程内唯一的心跳线程：定时刷新正在执行的任务的心跳，页面据此判断执行进程是否仍然存活"""
+
+    def __init__(self):
+        self._jobs: Dict[Any, JobManager] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, manager: JobManager, job_id: int):
+        with self._lock:
+            self._jobs[(manager.db_path, job_id)] = manager
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="job-heartbeat", daemon=True)
+                self._thread.start()
+
+    def untrack(self, manager: JobManager, job_id: int):
+        # 与刷新共用一把锁：返回后不会再有该任务的心跳写入
+        with self._lock:
+            self._jobs.pop((manager.db_path, job_id), None)
+
+    def _run(self):
+        while True:
+            time.sleep(JobService.HEARTBEAT_INTERVAL)
+            with self._lock:
+                for (_, job_id), manager in self._jobs.items():
+                    try:
+                        manager.update_progress(job_id)
+                    except Exception as e:
+                        print(f"刷新任务 {job_id} 心跳失败: {e}")
+
+
+_heartbeat = _Heartbeat()
+
+
+def execute_job(manager: JobManager, job: Dict):
+    """执行一个已领取的任务并记录结果"""
+    handler = JOB_HANDLERS.get(job['job_type'])
+    if handler is None:
+        manager.finish(job['id'], error=f"未知的任务类型: {job['job_type']}")
+        return
+
+    def report(progress: Optional[float] = None, message: Optional[str] = None):
+        manager.update_progress(job['id'], progress, message)
+
+    _heartbeat.track(manager, job['id'])
+    try:
+        result = handler(report, **(job['params'] or {}))
+        error = ""
+        if isinstance(result, dict) and result.get('success') is False:
+            error = result.get('error') or "任务失败"
+    except Exception as e:
+        result, error = None, str(e)
+    finally:
+        _heartbeat.untrack(manager, job['id'])
+    manager.finish(job['id'], result, error=error)
+
+
+def run_worker(db_path: str = "stories.db", poll_interval: float = 1.0):
+    """执行进程主循环：领取排队任务逐个执行"""
+    manager = JobManager(db_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        manager.fail_stale(JobService.STALE_TIMEOUT)
+        job = manager.claim_next(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        execute_job(manager, job)
+
+
+class JobService:
+    """后台任务业务服务类"""
+
+    HEARTBEAT_INTERVAL = 10
+    # 超过该时长没有心跳的运行中任务视为执行进程已退出
+    STALE_TIMEOUT = 120
+    DEFAULT_WORKERS = 2
+
+    # 当前进程启动的执行进程
+    _workers = []
+    _workers_lock = threading.Lock()
+
+    def __init__(self, db_path: str = "stories.db"):
+        self.db_path = db_path
+        self.job_manager = JobManager(db_path)
+
+    def submit(self, job_type: str, scope: str = None, start_workers: bool = True, **params) -> int:
+        """
+        提交后台任务
+
+        Args:
+            job_type: 任务类型（JOB_HANDLERS 的键）
+            scope: 任务归属，页面按 scope 查找任务；同一 scope 已有参数相同的未完成任务时返回该任务
+            start_workers: 是否确保本机执行进程已启动
+            **params: 传给处理函数的参数
+
+        Returns:
+            任务 ID
+
+        Raises:
+            JobConflictError: 同一 scope 已有参数不同的未完成任务
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {job_type}")
+        job_id = self.job_manager.enqueue(job_type, params, scope=scope)
+        if start_workers:
+            self.ensure_workers()
+        return job_id
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """获取任务状态"""
+        return self.job_manager.get_job(job_id)
+
+    def latest_job(self, scope: str) -> Optional[Dict]:
+        """获取 scope 下最新的任务"""
+        return self.job_manager.latest_job(scope)
+
+    def mark_seen(self, job_id: int):
+        """标记任务结果已展示"""
+        self.job_manager.mark_seen(job_id)
+
+    def cancel(self, job_id: int) -> bool:
+        """取消尚未开始的任务"""
+        return self.job_manager.cancel(job_id)
+
+    def ensure_workers(self, count: int = None):
+        """确保本进程启动的执行进程数量（退出的进程会被重新拉起）"""
+        count = count or int(os.getenv("JOB_WORKERS", self.DEFAULT_WORKERS))
+        with self._workers_lock:
+            self._workers[:] = [p for p in self._workers if p.is_alive()]
+            context = multiprocessing.get_context("spawn")
+            while len(self._workers) < count:
+                process = context.Process(
+                    target=run_worker, args=(self.db_path,), name="story-job-worker", daemon=True
+                )
+                process.start()
+                self._workers.append(process)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="运行后台任务执行进程")
+    parser.add_argument("--workers", type=int, default=JobService.DEFAULT_WORKERS, help="执行进程数量")
+    parser.add_argument("--db", default="stories.db", help="数据库路径")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker(args.db)
+        return
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.db,), name=f"story-job-worker-{i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,14 @@
 处理小说管理、版本控制、统计分析等业务逻辑。
 """
 
-from typing import Dict, List, Optional, Any, Tuple
+import os
+import tempfile
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from database import (
     NovelManager, ChapterManager, NovelStatsManager,
-    NovelVersionManager, OutlineManager
+    NovelVersionManager, OutlineManager, ExportArtifactManager
 )
-from utils.export import ExportManager
+from utils.export import ExportManager, export_fingerprint
 from utils.stats import StatsHelper
 
 
@@ -23,11 +25,20 @@ class NovelService:
         self.version_manager = NovelVersionManager()
         self.outline_manager = OutlineManager()
         self.export_manager = ExportManager()
+        self.artifact_manager = ExportArtifactManager()
 
     # ========== 小说基本操作 ==========
 
-    def get_novel_list(self, page: int = 1, page_size: int = 100) -> Tuple[List[Dict], int]:
-        """获取小说列表"""
+    def get_novel_list(
+        self,
+        page: int = 1,
+        page_size: int = 100,
+        cursor: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[Dict], int]:
+        """获取小说列表（第一页或传入游标时使用游标分页）"""
+        if cursor is not None or page == 1:
+            novels = self.novel_manager.list_novels_after(cursor=cursor, page_size=page_size)
+            return novels, self.novel_manager.count_novels()
         return self.novel_manager.list_novels(page=page, page_size=page_size)
 
     def get_novel_detail(self, novel_id: int) -> Optional[Dict]:
@@ -76,23 +87,11 @@ class NovelService:
             status=status
         )
 
-        if chapter_id:
-            # 更新统计信息
-            self.stats_manager.update_novel_metadata(novel_id)
-
         return chapter_id
 
     def update_chapter(self, chapter_id: int, **kwargs) -> bool:
         """更新章节"""
-        success = self.chapter_manager.update_chapter(chapter_id, **kwargs)
-
-        if success:
-            # 获取章节所属小说ID并更新统计
-            chapter = self.chapter_manager.get_chapter(chapter_id)
-            if chapter:
-                self.stats_manager.update_novel_metadata(chapter['novel_id'])
-
-        return success
+        return self.chapter_manager.update_chapter(chapter_id, **kwargs)
 
     def delete_chapter(self, chapter_id: int) -> bool:
         """删除章节"""
@@ -100,12 +99,7 @@ class NovelService:
         if not chapter:
             return False
 
-        success = self.chapter_manager.delete_chapter(chapter_id)
-
-        if success:
-            self.stats_manager.update_novel_metadata(chapter['novel_id'])
-
-        return success
+        return self.chapter_manager.delete_chapter(chapter_id)
 
     def parse_chapters_from_content(self, content: str) -> List[Dict]:
         """从内容解析章节"""
@@ -176,7 +170,7 @@ class NovelService:
         return self.stats_manager.get_writing_timeline(novel_id)
 
     def update_novel_metadata(self, novel_id: int) -> bool:
-        """更新小说元数据"""
+        """按章节表重新校准小说统计（统计由触发器实时维护，仅用于修复）"""
         return self.stats_manager.update_novel_metadata(novel_id)
 
     # ========== 版本控制 ==========
@@ -185,9 +179,9 @@ class NovelService:
         """获取版本列表"""
         return self.version_manager.list_versions(novel_id)
 
-    def get_version_detail(self, version_id: int) -> Optional[Dict]:
-        """获取版本详情"""
-        return self.version_manager.get_version(version_id)
+    def get_version_detail(self, version_id: int, include_content: bool = True) -> Optional[Dict]:
+        """获取版本详情（include_content=False 时不加载各章正文）"""
+        return self.version_manager.get_version(version_id, include_content=include_content)
 
     def create_version_snapshot(
         self,
@@ -195,51 +189,71 @@ class NovelService:
         version_name: str,
         version_note: str = ""
     ) -> Optional[int]:
-        """创建版本快照"""
-        # 获取小说和章节数据
+        """创建版本快照（章节正文按哈希去重，只写入有变化的章节）"""
         novel = self.novel_manager.get_novel(novel_id)
         if not novel:
             return None
 
         chapters = self.chapter_manager.list_chapters(novel_id)
 
-        # 准备快照数据
-        snapshot_data = {
-            'novel_id': novel_id,
-            'title': novel['title'],
-            'content': novel['content'],
-            'chapters': [
-                {
-                    'id': ch['id'],
-                    'chapter_number': ch['chapter_number'],
-                    'chapter_title': ch['chapter_title'],
-                    'content': ch['content'],
-                    'word_count': ch['word_count']
-                }
-                for ch in chapters
-            ]
-        }
-
-        return self.version_manager.create_version(
+        return self.version_manager.create_snapshot(
             novel_id=novel_id,
             version_name=version_name,
             version_note=version_note,
-            snapshot_data=snapshot_data
+            title=novel['title'],
+            content=novel['content'],
+            chapters=chapters
         )
 
+    def restore_version(self, version_id: int, backup: bool = True) -> bool:
+        """
+        恢复到指定版本
+
+        Args:
+            version_id: 版本ID
+            backup: 恢复前是否自动为当前内容创建快照
+
+        Returns:
+            是否成功
+        """
+        version = self.version_manager.get_version(version_id, include_content=False)
+        if not version:
+            return False
+
+        if backup:
+            self.create_version_snapshot(
+                version['novel_id'],
+                f"恢复前备份 ({version['version_name']})",
+                f"恢复到版本「{version['version_name']}」前自动创建"
+            )
+
+        return self.version_manager.restore_version(version_id)
+
+    def compare_version_chapters(self, version_id_1: int, version_id_2: int) -> Dict[str, List]:
+        """逐章对比两个版本（只加载有变化的章节正文）"""
+        return self.version_manager.diff_version_chapters(version_id_1, version_id_2)
+
     # ========== 导出功能 ==========
 
-    def export_to_markdown(
+    def iter_export(
         self,
         novel_id: int,
+        fmt: str = "markdown",
         include_outline: bool = False
-    ) -> Optional[str]:
-        """导出为 Markdown"""
+    ) -> Optional[Iterator[str]]:
+        """逐章生成导出文本（fmt 为 markdown 或 txt），正文按章从数据库流式读取"""
         novel = self.novel_manager.get_novel(novel_id)
         if not novel:
             return None
 
-        chapters = self.chapter_manager.list_chapters(novel_id)
+        chapters = self.chapter_manager.iter_chapters(novel_id, include_content=True)
+
+        if fmt == "txt":
+            return self.export_manager.iter_txt(
+                title=novel['title'],
+                chapters=chapters,
+                include_outline=include_outline
+            )
 
         metadata = {
             'id': novel_id,
@@ -247,30 +261,112 @@ class NovelService:
             'tags': []
         }
 
-        return self.export_manager.export_to_markdown(
+        return self.export_manager.iter_markdown(
             title=novel['title'],
             chapters=chapters,
             include_outline=include_outline,
             metadata=metadata
         )
 
-    def export_to_txt(
+    def export_to_file(
         self,
         novel_id: int,
+        fmt: str = "markdown",
+        include_outline: bool = False,
+        output_path: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        导出到文件（边读边写，不在内存中拼接整本书）
+
+        Args:
+            novel_id: 小说ID
+            fmt: markdown 或 txt
+            include_outline: 是否包含章节大纲
+            output_path: 输出路径（默认写入临时文件，调用方负责删除）
+
+        Returns:
+            输出文件路径，小说不存在时返回 None
+        """
+        chunks = self.iter_export(novel_id, fmt, include_outline)
+        if chunks is None:
+            return None
+
+        if output_path is None:
+            suffix = ".txt" if fmt == "txt" else ".md"
+            fd, output_path = tempfile.mkstemp(prefix=f"novel_{novel_id}_", suffix=suffix)
+            os.close(fd)
+
+        return self.export_manager.write_to_file(chunks, output_path)
+
+    def get_export_artifact(
+        self,
+        novel_id: int,
+        fmt: str = "markdown",
         include_outline: bool = False
     ) -> Optional[str]:
-        """导出为纯文本"""
+        """
+        获取正文导出文件（内容未变化时直接返回缓存文件，不重新生成）
+
+        Args:
+            novel_id: 小说ID
+            fmt: markdown 或 txt
+            include_outline: 是否包含章节大纲
+
+        Returns:
+            缓存文件路径（调用方只读，不要删除），小说不存在时返回 None
+        """
         novel = self.novel_manager.get_novel(novel_id)
         if not novel:
             return None
 
-        chapters = self.chapter_manager.list_chapters(novel_id)
+        kind = f"{fmt}+outline" if include_outline else fmt
+        fingerprint = export_fingerprint(novel, self.chapter_manager.list_chapters(novel_id), kind)
+        cached = self.artifact_manager.get(fingerprint)
+        if cached:
+            return cached
 
-        return self.export_manager.export_to_txt(
-            title=novel['title'],
-            chapters=chapters,
-            include_outline=include_outline
-        )
+        path = self.export_to_file(novel_id, fmt, include_outline)
+        return self.artifact_manager.put(fingerprint, novel_id, kind, path) if path else None
+
+    def get_outline_artifact(self, novel_id: int, fmt: str = "markdown") -> Optional[str]:
+        """获取大纲导出文件（大纲段未变化时直接返回缓存文件）。无大纲时返回 None。"""
+        novel = self.novel_manager.get_novel(novel_id)
+        if not novel:
+            return None
+        segments = self.outline_manager.list_outline_segments(novel_id)
+        if not segments:
+            return None
+
+        kind = f"outline-{fmt}"
+        fingerprint = export_fingerprint(novel, segments, kind)
+        cached = self.artifact_manager.get(fingerprint)
+        if cached:
+            return cached
+
+        from utils.export import _outline_segments_to_lines
+        lines = _outline_segments_to_lines(novel["title"], segments, as_markdown=(fmt == "markdown"))
+        fd, path = tempfile.mkstemp(prefix=f"outline_{novel_id}_", suffix=".txt" if fmt == "txt" else ".md")
+        os.close(fd)
+        self.export_manager.write_to_file(["\n".join(lines)], path)
+        return self.artifact_manager.put(fingerprint, novel_id, kind, path)
+
+    def export_to_markdown(
+        self,
+        novel_id: int,
+        include_outline: bool = False
+    ) -> Optional[str]:
+        """导出为 Markdown"""
+        chunks = self.iter_export(novel_id, "markdown", include_outline)
+        return ''.join(chunks) if chunks is not None else None
+
+    def export_to_txt(
+        self,
+        novel_id: int,
+        include_outline: bool = False
+    ) -> Optional[str]:
+        """导出为纯文本"""
+        chunks = self.iter_export(novel_id, "txt", include_outline)
+        return ''.join(chunks) if chunks is not None else None
 
     def export_outline_to_markdown(self, novel_id: int) -> Optional[str]:
         """仅导出大纲为 Markdown。无大纲时返回 None。"""
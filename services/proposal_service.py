@@ -8,6 +8,7 @@ from typing import Dict, Any
 import signal
 from database import DatabaseManager
 from logic import HistoryManager
+from services.task_graph import kickoff_crew
 
 
 class ProposalService:
@@ -118,15 +119,10 @@ class ProposalService:
                 target_word_count=target_word_count
             )
 
-            # 阶段4：角色、场景、高潮设计（可并发）
+            # 阶段4：角色、场景、高潮设计（都只依赖剧情大纲，由依赖图调度并发执行）
             task_character = tasks.character_design_task(character_builder, context_plot=task_plot)
-            task_character.async_execution = True
-
             task_scene = tasks.scene_enhancement_task(scene_painter, context_plot=task_plot)
-            task_scene.async_execution = True
-
             task_climax = tasks.climax_optimization_task(climax_optimizer, context_plot=task_plot)
-            task_climax.async_execution = True
 
             # 阶段5：整合企划书
             full_context = [task_market, task_brainstorm, task_plot, task_character, task_scene, task_climax]
@@ -178,7 +174,7 @@ class ProposalService:
             )
 
             # 执行
-            result = crew.kickoff()
+            result = kickoff_crew(crew)
 
             # 提取内容
             if hasattr(result, 'raw'):
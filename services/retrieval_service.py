@@ -0,0 +1,166 @@
+"""
+章节检索服务
+
+为每部小说在进程内维护一份已写章节的片段索引（见 utils/retrieval.py），撰写新章节时
+用大纲检索相关的前文片段，让写作团队能找回很早之前出场的人物、道具与伏笔。
+
+索引按章节的 content_hash 增量同步：只有新增或改写的章节需要重新切分、建索引，
+删除的章节移出索引；章节保存后立即同步，其他进程在下次检索时同步。
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from database import ChapterManager
+from utils.retrieval import PassageIndex, split_passages
+
+
+class _NovelIndex:
+    """一部小说的片段索引及其对应的章节版本"""
+
+    def __init__(self, use_vectors: Optional[bool] = None):
+        self.index = PassageIndex(use_vectors)
+        # 片段 ID -> (章节 ID, 片段文本)
+        self.passages: Dict[int, Tuple[int, str]] = {}
+        # 章节 ID -> {'hash', 'number', 'title', 'passages'}
+        self.chapters: Dict[int, Dict] = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+
+class RetrievalService:
+    """章节检索服务类"""
+
+    # 冷启动等需要重建较多章节时改为分批顺序读取正文
+    BATCH_READ_THRESHOLD = 20
+
+    # 进程内共享的索引：(数据库路径, 小说 ID) -> _NovelIndex
+    _indexes: Dict[Tuple[str, int], _NovelIndex] = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, db_path: str = "stories.db", use_vectors: Optional[bool] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            use_vectors: 是否同时使用哈希向量索引，默认在安装了 numpy 时启用
+        """
+        self.db_path = db_path
+        self.use_vectors = use_vectors
+        self.chapter_manager = ChapterManager(db_path)
+
+    def _get_index(self, novel_id: int, create: bool = True) -> Optional[_NovelIndex]:
+        key = (self.db_path, novel_id)
+        with self._indexes_lock:
+            if key not in self._indexes and create:
+                self._indexes[key] = _NovelIndex(self.use_vectors)
+            return self._indexes.get(key)
+
+    def sync(self, novel_id: int) -> int:
+        """
+        按章节哈希增量同步索引
+
+        Returns:
+            重新建索引的章节数
+        """
+        novel_index = self._get_index(novel_id)
+        with novel_index.lock:
+            return self._sync(novel_id, novel_index)
+
+    def refresh(self, novel_id: int) -> int:
+        """章节保存后调用：本进程已加载该小说的索引时立即同步，否则等首次检索时再建"""
+        novel_index = self._get_index(novel_id, create=False)
+        if novel_index is None:
+            return 0
+        with novel_index.lock:
+            return self._sync(novel_id, novel_index)
+
+    def _sync(self, novel_id: int, novel_index: _NovelIndex) -> int:
+        current = {ch['id']: ch for ch in self.chapter_manager.list_chapter_hashes(novel_id)}
+
+        for chapter_id in [cid for cid in novel_index.chapters if cid not in current]:
+            self._remove_chapter(novel_index, chapter_id)
+
+        changed = []
+        for chapter_id, chapter in current.items():
+            indexed = novel_index.chapters.get(chapter_id)
+            if indexed is None or indexed['hash'] != (chapter.get('content_hash') or ''):
+                changed.append(chapter_id)
+            else:
+                # 只调整了序号或标题时不需要重新建索引
+                indexed['number'] = chapter['chapter_number']
+                indexed['title'] = chapter.get('chapter_title') or ''
+        if not changed:
+            return 0
+
+        if len(changed) > self.BATCH_READ_THRESHOLD:
+            wanted = set(changed)
+            chapters = (ch for ch in self.chapter_manager.iter_chapters(novel_id, batch_size=50)
+                        if ch['id'] in wanted)
+        else:
+            chapters = (self.chapter_manager.get_chapter(chapter_id) for chapter_id in changed)
+
+        for chapter in chapters:
+            if chapter is None:
+                continue
+            self._remove_chapter(novel_index, chapter['id'])
+            passage_ids = []
+            for text in split_passages(chapter.get('content') or ''):
+                passage_id = novel_index.next_id
+                novel_index.next_id += 1
+                novel_index.passages[passage_id] = (chapter['id'], text)
+                novel_index.index.add(passage_id, text)
+                passage_ids.append(passage_id)
+            novel_index.chapters[chapter['id']] = {
+                'hash': chapter.get('content_hash') or '',
+                'number': chapter['chapter_number'],
+                'title': chapter.get('chapter_title') or '',
+                'passages': passage_ids,
+            }
+        return len(changed)
+
+    @staticmethod
+    def _remove_chapter(novel_index: _NovelIndex, chapter_id: int):
+        indexed = novel_index.chapters.pop(chapter_id, None)
+        for passage_id in (indexed or {}).get('passages', []):
+            novel_index.passages.pop(passage_id, None)
+            novel_index.index.remove(passage_id)
+
+    def search(self, novel_id: int, query: str, k: int = 5,
+               before_chapter: Optional[int] = None, exclude_recent: int = 0) -> List[Dict]:
+        """
+        检索与查询相关的前文片段
+
+        Args:
+            novel_id: 小说 ID
+            query: 查询文本（如待写章节的大纲）
+            k: 返回片段数
+            before_chapter: 只检索该章之前的章节
+            exclude_recent: 排除 before_chapter 之前最近的若干章（这些章节已通过其他方式提供）
+
+        Returns:
+            [{'chapter_number', 'chapter_title', 'text'}]，按相关度排序
+        """
+        novel_index = self._get_index(novel_id)
+        with novel_index.lock:
+            self._sync(novel_id, novel_index)
+            allowed = None
+            if before_chapter is not None:
+                last_allowed = before_chapter - exclude_recent
+                allowed = [pid for ch in novel_index.chapters.values() if ch['number'] < last_allowed
+                           for pid in ch['passages']]
+            hits = novel_index.index.search(query, k, allowed)
+            results = []
+            for passage_id in hits:
+                chapter_id, text = novel_index.passages[passage_id]
+                chapter = novel_index.chapters[chapter_id]
+                results.append({'chapter_number': chapter['number'], 'chapter_title': chapter['title'],
+                                'text': text})
+        return results
+
+    def related_passages(self, novel_id: int, query: str, before_chapter: int, k: int = 5) -> str:
+        """检索相关前文片段并按章节顺序格式化（排除紧邻的上一章）"""
+        if not query or not query.strip():
+            return ""
+        results = self.search(novel_id, query, k, before_chapter=before_chapter, exclude_recent=1)
+        results.sort(key=lambda r: r['chapter_number'])
+        return "\n\n".join(f"【第{r['chapter_number']}章 {r['chapter_title']}】\n{r['text']}" for r in results)
@@ -11,6 +11,12 @@ from database import DatabaseManager, NovelManager
 class StoryService:
     """历史记录业务服务类"""
 
+    # 支持游标分页的排序方式 -> 是否正序
+    KEYSET_ORDERS = {
+        "created_at DESC": False,
+        "created_at ASC": True,
+    }
+
     def __init__(self):
         self.db_manager = DatabaseManager()
         self.novel_manager = NovelManager()
@@ -21,21 +27,37 @@ class StoryService:
         search_query: Optional[str] = None,
         page: int = 1,
         page_size: int = 20,
-        order_by: str = "created_at DESC"
+        order_by: str = "created_at DESC",
+        cursor: Optional[Tuple[str, int]] = None
     ) -> Tuple[List[Dict], int]:
         """
         获取故事列表
 
+        按时间排序且无搜索条件时使用游标分页：第一页传 cursor=None，
+        之后传上一页最后一条记录的 (created_at, id)，翻页代价与页码无关。
+        其他排序方式或带搜索条件时回退到 page/OFFSET 分页。
+
         Args:
             story_type: 类型筛选 (base/crew_ai/full_novel)
             search_query: 搜索关键词
             page: 页码
             page_size: 每页数量
             order_by: 排序方式
+            cursor: 游标，上一页最后一条记录的 (created_at, id)
 
         Returns:
             (stories, total_count)
         """
+        keyset_order = self.KEYSET_ORDERS.get(order_by)
+        if keyset_order is not None and not search_query and (cursor is not None or page == 1):
+            stories = self.db_manager.list_stories_after(
+                story_type=story_type,
+                cursor=cursor,
+                page_size=page_size,
+                ascending=keyset_order
+            )
+            return stories, self.db_manager.count_stories(story_type)
+
         return self.db_manager.list_stories(
             story_type=story_type,
             search_query=search_query,
@@ -44,6 +66,53 @@ class StoryService:
             order_by=order_by
         )
 
+    @staticmethod
+    def get_page_cursor(stories: List[Dict]) -> Optional[Tuple[str, int]]:
+        """取当前页最后一条记录作为下一页的游标"""
+        if not stories:
+            return None
+        last = stories[-1]
+        return (last['created_at'], last['id'])
+
+    def search_records(
+        self,
+        search_query: str,
+        story_type: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20
+    ) -> Tuple[List[Dict], int]:
+        """
+        全文搜索历史记录（企划书/灵感与小说），按相关度排序
+
+        Args:
+            search_query: 搜索关键词
+            story_type: 类型筛选 (base/crew_ai/full_novel)
+            page: 页码
+            page_size: 每页数量
+
+        Returns:
+            (hits, total_count)，每条命中带 snippet 高亮片段，
+            view_type 字段标记详情页的查看类型 (story/novel)
+        """
+        # 两个来源各取前 page * page_size 条，合并排序后再分页
+        window = page * page_size
+        hits, total_count = self.db_manager.search_stories(
+            search_query, story_type=story_type, limit=window
+        )
+        for hit in hits:
+            hit['view_type'] = 'story'
+
+        if story_type in (None, 'full_novel'):
+            novel_hits, novel_total = self.novel_manager.search_novels(search_query, limit=window)
+            for hit in novel_hits:
+                hit['view_type'] = 'novel'
+            hits.extend(novel_hits)
+            total_count += novel_total
+
+        hits.sort(key=lambda hit: hit['rank'])
+        offset = (page - 1) * page_size
+        return hits[offset:offset + page_size], total_count
+
     def get_story_detail(self, story_id: int, view_type: str = 'story') -> Optional[Dict]:
         """
         获取故事详情
@@ -185,12 +254,10 @@ class StoryService:
         stats = {}
 
         # 总记录数
-        _, total = self.db_manager.list_stories(page_size=1)
-        stats['total'] = total
+        stats['total'] = self.db_manager.count_stories()
 
         # 各类型统计
         for story_type, name in [("base", "灵感"), ("crew_ai", "企划"), ("full_novel", "小说")]:
-            _, count = self.db_manager.list_stories(story_type=story_type, page_size=1)
-            stats[name] = count
+            stats[name] = self.db_manager.count_stories(story_type)
 
         return stats
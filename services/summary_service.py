@@ -0,0 +1,172 @@
+"""
+章节摘要服务
+
+章节保存后由后台任务为每章生成摘要，并逐级汇总：每 10 章汇总为一个段落（arc），
+每 100 章汇总为一卷（volume）。续写时按「整卷 → 段落 → 单章」拼出前情提要，
+越早的剧情越概括，提要长度受 token 上限约束，不随章节数增长。
+"""
+
+import re
+from typing import Any, Callable, Dict, Optional
+
+from database import ChapterManager, ChapterSummaryManager, content_hash
+from utils.context_budget import ContextBudget
+
+
+class SummaryService:
+    """章节摘要服务类"""
+
+    ARC_CHAPTERS = 10
+    VOLUME_CHAPTERS = 100
+    # 前情提要的 token 上限
+    DIGEST_MAX_TOKENS = 1500
+
+    def __init__(self, db_path: str = "stories.db"):
+        self.chapter_manager = ChapterManager(db_path)
+        self.summary_manager = ChapterSummaryManager(db_path)
+
+    # ========== 前情提要 ==========
+
+    def story_so_far(self, novel_id: int, before_chapter: int, max_tokens: int = None) -> str:
+        """
+        拼接第 before_chapter 章之前的前情提要
+
+        已汇总的卷、段落替代其中的单章摘要；超出上限时先压缩最早的整卷摘要，
+        每一级都保留最近的内容。
+
+        Args:
+            novel_id: 小说 ID
+            before_chapter: 即将撰写的章节号
+            max_tokens: token 上限，默认 DIGEST_MAX_TOKENS
+
+        Returns:
+            前情提要文本（没有摘要时为空字符串）
+        """
+        summaries = self.summary_manager.list_summaries(novel_id, before_chapter=before_chapter)
+        by_level = {level: [s for s in summaries if s['level'] == level]
+                    for level in ChapterSummaryManager.LEVELS}
+
+        covered = 0
+        sections = {}
+        for level in ('volume', 'arc'):
+            lines = []
+            for summary in by_level[level]:
+                # 只使用与已覆盖范围连续的汇总，中间缺失的部分由下一级补上
+                if summary['start_chapter'] != covered + 1:
+                    break
+                lines.append(self._format_line(summary))
+                covered = summary['end_chapter']
+            sections[level] = lines
+        sections['chapter'] = [self._format_line(s) for s in by_level['chapter'] if s['start_chapter'] > covered]
+
+        budget = ContextBudget(max_tokens or self.DIGEST_MAX_TOKENS)
+        for priority, level in enumerate(('volume', 'arc', 'chapter'), start=1):
+            budget.add(level, "\n".join(sections[level]), priority=priority, keep='tail')
+        return "\n\n".join(text for text in budget.allocate().values() if text)
+
+    @staticmethod
+    def _format_line(summary: Dict) -> str:
+        if summary['start_chapter'] == summary['end_chapter']:
+            return f"【第{summary['start_chapter']}章】{summary['summary']}"
+        return f"【第{summary['start_chapter']}-{summary['end_chapter']}章】{summary['summary']}"
+
+    # ========== 生成摘要 ==========
+
+    def update_summaries(
+        self,
+        novel_id: int,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        为缺少摘要或已改写的章节生成摘要，再更新段落与卷的汇总
+
+        Args:
+            novel_id: 小说 ID
+            progress_callback: 进度回调 (已完成章数, 待处理章数, 说明)
+
+        Returns:
+            {
+                'chapters_summarized': int,
+                'rollups_updated': int,
+                'success': bool,
+                'error': str
+            }
+        """
+        self.summary_manager.prune(novel_id)
+        summarized = 0
+        # 执行期间新保存的章节在下一轮补上
+        for _ in range(3):
+            pending = self.summary_manager.pending_chapters(novel_id)
+            if not pending:
+                break
+            for chapter in pending:
+                detail = self.chapter_manager.get_chapter(chapter['id'])
+                content = (detail or {}).get('content') or ''
+                summary = self._summarize_chapter(chapter['chapter_number'], content) if content.strip() else ""
+                self.summary_manager.save_summary(
+                    novel_id, 'chapter', chapter['chapter_number'], chapter['chapter_number'],
+                    summary, chapter['content_hash']
+                )
+                summarized += 1
+                if progress_callback:
+                    progress_callback(summarized, len(pending), f"第 {chapter['chapter_number']} 章摘要已生成")
+
+        return {
+            'chapters_summarized': summarized,
+            'rollups_updated': self._roll_up(novel_id),
+            'success': True,
+            'error': ''
+        }
+
+    def _roll_up(self, novel_id: int) -> int:
+        """把完整的 10 章汇总为段落、完整的 100 章汇总为卷，返回新生成的汇总数"""
+        updated = 0
+        for level, child_level, size, level_name in (
+            ('arc', 'chapter', self.ARC_CHAPTERS, "段落"),
+            ('volume', 'arc', self.VOLUME_CHAPTERS, "卷"),
+        ):
+            children = self.summary_manager.list_summaries(novel_id, child_level)
+            existing = {s['start_chapter']: s for s in self.summary_manager.list_summaries(novel_id, level)}
+            last_chapter = max((s['end_chapter'] for s in children), default=0)
+            for start in range(1, last_chapter + 1, size):
+                end = start + size - 1
+                parts = [s for s in children if s['start_chapter'] >= start and s['end_chapter'] <= end]
+                if sum(s['end_chapter'] - s['start_chapter'] + 1 for s in parts) < size:
+                    continue
+                source_hash = content_hash("\n".join(s['summary'] for s in parts))
+                if start in existing and existing[start]['source_hash'] == source_hash:
+                    continue
+                text = "\n\n".join(self._format_line(s) for s in parts)
+                summary = self._summarize_rollup(text, start, end, level_name)
+                self.summary_manager.save_summary(novel_id, level, start, end, summary, source_hash)
+                updated += 1
+        return updated
+
+    def _summarize_chapter(self, chapter_number: int, content: str) -> str:
+        """由连续性协调员生成单章摘要"""
+        return self._run_summary_task(
+            lambda tasks, agent: tasks.chapter_summarize_task(agent, content, chapter_number)
+        )
+
+    def _summarize_rollup(self, summaries: str, start_chapter: int, end_chapter: int, level_name: str) -> str:
+        """由连续性协调员把下级摘要合并为段落或卷摘要"""
+        return self._run_summary_task(
+            lambda tasks, agent: tasks.summary_rollup_task(agent, summaries, start_chapter, end_chapter, level_name)
+        )
+
+    def _run_summary_task(self, build_task) -> str:
+        from crew_agents import StoryAgents
+        from crew_tasks import StoryTasks
+        from crewai import Crew, Process
+
+        agent = StoryAgents().continuity_coordinator()
+        task = build_task(StoryTasks(), agent)
+        result = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=False).kickoff()
+        return self._clean_summary(str(getattr(result, 'raw', result)))
+
+    @staticmethod
+    def _clean_summary(text: str) -> str:
+        """去掉输出中的代码块标记与摘要标题"""
+        text = re.sub(r"```\w*", "", text)
+        lines = [line for line in text.strip().splitlines() if not re.match(r"^\s*#+\s*第.*摘要\s*$", line)]
+        return "\n".join(lines).strip()
@@ -0,0 +1,177 @@
+"""
+Crew 任务依赖图调度
+
+CrewAI 的 sequential 流程按列表顺序逐个执行任务，即使后面的任务并不依赖前面的结果。
+这里根据每个任务的 context 推导依赖关系，依赖都已完成的任务立即在线程池中并发执行。
+例如写作 Crew 中角色心理、场景素材、爆梗金句三个任务都只依赖分析任务，可以同时请求 LLM。
+"""
+
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.context_budget import ContextBudget
+
+# 与 CrewAI 拼接上下文任务输出的分隔方式一致
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+
+def _execute_task(task, context: str):
+    """默认执行方式：与 Crew 顺序执行单个任务时相同"""
+    return task.execute_sync(agent=task.agent, context=context, tools=task.tools)
+
+
+class TaskGraph:
+    """按 context 依赖并发执行 CrewAI 任务"""
+
+    def __init__(self, tasks: List[Any], max_workers: Optional[int] = None,
+                 context_tokens: Optional[int] = None, material_tasks: Optional[Iterable[Any]] = None):
+        """
+        Args:
+            tasks: 任务列表（与传给 Crew 的顺序相同，context 只能引用排在前面的任务）
+            max_workers: 最多同时执行的任务数，默认不限制（同层任务全部并发）
+            context_tokens: 每个任务上下文中素材任务输出的 token 上限，超出时各素材输出平均压缩；默认不限制
+            material_tasks: 输出可以压缩的素材任务（规划、角色、场景等）。其他任务的输出（如正文草稿）
+                总是原样传递，不计入预算
+        """
+        self.tasks = list(tasks)
+        self.max_workers = max_workers or max(len(self.tasks), 1)
+        self.context_tokens = context_tokens
+        self.material_ids = {id(task) for task in material_tasks or ()}
+        self.dependencies = self._build_dependencies()
+        self.timings: Dict[int, float] = {}
+
+    def _build_dependencies(self) -> List[List[int]]:
+        """推导每个任务依赖的任务下标"""
+        index = {id(task): i for i, task in enumerate(self.tasks)}
+        dependencies = []
+        for i, task in enumerate(self.tasks):
+            context = getattr(task, 'context', None)
+            if not isinstance(context, (list, tuple)):
+                # 未指定 context 时 CrewAI 使用之前所有任务的输出
+                dependencies.append(list(range(i)))
+                continue
+            deps = sorted({index[id(t)] for t in context if id(t) in index})
+            if deps and deps[-1] >= i:
+                raise ValueError(f"第 {i + 1} 个任务的 context 引用了排在它之后的任务")
+            dependencies.append(deps)
+        return dependencies
+
+    def stages(self) -> List[List[int]]:
+        """按依赖深度分层，同一层的任务互不依赖（层数即关键路径上的任务数）"""
+        depth = []
+        for deps in self.dependencies:
+            depth.append(max((depth[d] + 1 for d in deps), default=0))
+        stages = [[] for _ in range(max(depth, default=-1) + 1)]
+        for i, level in enumerate(depth):
+            stages[level].append(i)
+        return stages
+
+    def _context_text(self, i: int, outputs: Dict[int, Any]) -> str:
+        """拼接任务的上下文（context 中不属于本图的任务使用其已有输出）"""
+        task = self.tasks[i]
+        context = getattr(task, 'context', None)
+        if not isinstance(context, (list, tuple)):
+            sources = [(self.tasks[d], outputs[d]) for d in range(i)]
+        else:
+            index = {id(t): j for j, t in enumerate(self.tasks)}
+            sources = [(t, outputs[index[id(t)]] if id(t) in index else getattr(t, 'output', None))
+                       for t in context]
+        sources = [(t, str(getattr(s, 'raw', s))) for t, s in sources if s is not None]
+        texts = [text for _, text in sources]
+        materials = [n for n, (t, _) in enumerate(sources) if id(t) in self.material_ids]
+        if self.context_tokens and materials:
+            # 只压缩素材输出，草稿等正文原样传递
+            budget = ContextBudget(self.context_tokens)
+            for n in materials:
+                budget.add(str(n), texts[n])
+            for key, text in budget.allocate().items():
+                texts[int(key)] = text
+        return CONTEXT_DIVIDER.join(texts)
+
+    def run(self, execute: Callable[[Any, str], Any] = _execute_task,
+            on_task_done: Optional[Callable[[int, Any], None]] = None) -> Any:
+        """
+        执行全部任务
+
+        Args:
+            execute: 执行单个任务的函数 (task, context) -> 输出
+            on_task_done: 每个任务完成后在调度线程中回调 (任务下标, 输出)
+
+        Returns:
+            最后一个任务的输出（与 Crew.kickoff 的结果一样带有 raw 属性）
+        """
+        if not self.tasks:
+            return None
+
+        outputs: Dict[int, Any] = {}
+        remaining = {i: set(deps) for i, deps in enumerate(self.dependencies)}
+        # 同一个 Agent 的执行器不是线程安全的，共用 Agent 的任务依次执行
+        busy_agents = set()
+
+        def agent_key(i: int) -> int:
+            return id(getattr(self.tasks[i], 'agent', None))
+
+        def run_one(i: int, context: str):
+            started = time.perf_counter()
+            output = execute(self.tasks[i], context)
+            self.timings[i] = time.perf_counter() - started
+            return output
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crew-task") as executor:
+            running = {}
+
+            def submit_ready():
+                # 按任务顺序提交，排在前面的任务（如前面章节）优先
+                for i in sorted(i for i, deps in remaining.items() if not deps):
+                    if len(running) >= self.max_workers:
+                        break
+                    if agent_key(i) in busy_agents:
+                        continue
+                    del remaining[i]
+                    busy_agents.add(agent_key(i))
+                    # 在调用方的上下文中执行（如 bypass_llm_cache 等上下文变量）
+                    running[executor.submit(contextvars.copy_context().run, run_one, i,
+                                            self._context_text(i, outputs))] = i
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    busy_agents.discard(agent_key(i))
+                    # 任一任务失败即停止调度，异常原样抛出
+                    outputs[i] = future.result()
+                    for deps in remaining.values():
+                        deps.discard(i)
+                    if on_task_done:
+                        on_task_done(i, outputs[i])
+                submit_ready()
+
+        return outputs[len(self.tasks) - 1]
+
+
+def kickoff_crew(crew, max_workers: Optional[int] = None, context_tokens: Optional[int] = None,
+                 material_tasks: Optional[Iterable[Any]] = None):
+    """
+    按依赖图执行 Crew 中的任务（替代 crew.kickoff）
+
+    任务之间没有可并发的部分时直接使用 crew.kickoff，保持 CrewAI 原有行为
+    （此时 context_tokens 不生效）。context_tokens 与 material_tasks 见 TaskGraph。
+    """
+    graph = TaskGraph(crew.tasks, max_workers=max_workers, context_tokens=context_tokens,
+                      material_tasks=material_tasks)
+    if all(len(stage) == 1 for stage in graph.stages()):
+        return crew.kickoff()
+
+    # Crew.kickoff 会把 Agent 关联到 Crew（读取记忆、训练等配置），这里保持一致；
+    # Agent 实例会在多次运行间复用，因此总是关联到本次的 Crew
+    for agent in crew.agents:
+        agent.crew = crew
+
+    started = time.perf_counter()
+    result = graph.run()
+    print(f"任务依赖图执行完成：{len(graph.tasks)} 个任务，关键路径 {len(graph.stages())} 步，"
+          f"耗时 {time.perf_counter() - started:.1f}s（逐个执行合计 {sum(graph.timings.values()):.1f}s）")
+    return result
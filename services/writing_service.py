@@ -139,34 +139,12 @@ class WritingService:
         if not base_title:
             base_title = f"未命名小说 ({novel_length})" if is_outline_only else "未命名小说"
         
-        # 检查重名并添加序号
-        final_title = base_title
-        counter = 1
-        max_attempts = 100  # 防止无限循环
-        
-        while counter <= max_attempts:
-            # 查询所有小说，然后精确匹配标题
-            all_novels, _ = self.novel_manager.list_novels(page_size=1000)  # 获取足够多的记录
-            # 过滤掉被排除的小说ID
-            if exclude_novel_id:
-                all_novels = [n for n in all_novels if n['id'] != exclude_novel_id]
-            
-            # 检查是否有完全匹配的标题
-            has_duplicate = any(n['title'] == final_title for n in all_novels)
-            
-            if not has_duplicate:
-                break
-            
-            # 如果有重名，添加序号
-            counter += 1
-            if is_outline_only and f"({novel_length})" in base_title:
-                # 如果标题包含篇幅，在篇幅前添加序号
-                final_title = base_title.replace(f"({novel_length})", f"({counter}) ({novel_length})")
-            else:
-                # 在标题末尾添加序号
-                final_title = f"{base_title} ({counter})"
-        
-        return final_title
+        # 检查重名并添加序号（篇幅后缀保持在末尾，如 "书名 (2) (长篇)"）
+        return self.novel_manager.allocate_title(
+            base_title,
+            title_suffix=f" ({novel_length})" if is_outline_only else "",
+            exclude_novel_id=exclude_novel_id
+        )
 
     @staticmethod
     def _setup_signal_patch():
@@ -272,137 +250,6 @@ class WritingService:
             raise RuntimeError(result['error'])
         
         return result['chapters_written']
-        self._disable_crewai_events_errors()
-
-        from crew_agents import StoryAgents
-        from crew_tasks import StoryTasks
-        from crewai import Crew, Process
-
-        # 召集写作团队
-        agents = StoryAgents()
-        tasks = StoryTasks()
-
-        chief_editor = agents.chief_editor()
-        character_builder = agents.character_builder()
-        scene_painter = agents.scene_painter()
-        punchline_king = agents.punchline_king()
-        story_writer = agents.story_writer()
-        consistency_checker = agents.consistency_checker()
-        format_editor = agents.format_editor()
-
-        # 创建任务流 - 使用大纲分析任务（已有大纲，不需要生成）
-        task_plan = tasks.outline_analysis_task(
-            chief_editor,
-            outline_content=outline_text,
-            previous_chapter_content=last_chapter_content,
-            num_chapters=num_chapters,
-            story_context=story_context
-        )
-
-        task_char = tasks.character_enrichment_task(character_builder, context_outline=task_plan)
-        
-        # 场景丰富和爆梗金句可以并发执行（都只依赖 task_plan）
-        task_scene = tasks.scene_enrichment_task(scene_painter, context_outline=task_plan)
-        # task_scene.async_execution = True  # 标记为异步执行，但在 sequential 模式下如果后续任务依赖它，必须同步等待
-        
-        task_punchline = tasks.punchline_injection_task(punchline_king, context_outline=task_plan)
-        # task_punchline.async_execution = True  # 标记为异步执行，同上
-
-        task_writing = tasks.full_story_writing_task(
-            story_writer,
-            context_materials=[task_plan, task_char, task_scene, task_punchline],
-            num_chapters=num_chapters,
-            chapter_start_num=next_chapter_num,
-            use_chinese_numerals=True
-        )
-
-        task_edit = tasks.copy_editing_task(
-            consistency_checker,
-            context_draft=task_writing,
-            num_chapters=num_chapters,
-            chapter_start_num=next_chapter_num,
-            use_chinese_numerals=True
-        )
-
-        # 格式编辑任务（在编辑润色之后）
-        task_format = tasks.format_editing_task(
-            format_editor,
-            context_draft=task_edit,
-            num_chapters=num_chapters,
-            chapter_start_num=next_chapter_num,
-            use_chinese_numerals=True
-        )
-
-        # 组建 Crew
-        writing_crew = Crew(
-            agents=[chief_editor, character_builder, scene_painter, punchline_king, story_writer, consistency_checker, format_editor],
-            tasks=[task_plan, task_char, task_scene, task_punchline, task_writing, task_edit, task_format],
-            process=Process.sequential,
-            verbose=True
-        )
-
-        result = writing_crew.kickoff()
-
-        # 处理结果 - 优先使用格式编辑后的输出
-        generated_content = self._extract_content_from_result(result, task_format)
-        
-        # 如果格式编辑输出无效，回退到编辑润色的输出
-        if not generated_content or len(generated_content.strip()) < 500:
-            generated_content = self._extract_content_from_result(result, task_edit)
-
-        # 解析并保存章节
-        parsed_new_chapters = self.chapter_manager.parse_chapters_from_content(generated_content)
-
-        # 限制章节数量
-        if parsed_new_chapters and len(parsed_new_chapters) > num_chapters:
-            parsed_new_chapters = parsed_new_chapters[:num_chapters]
-
-        count = 0
-        if parsed_new_chapters:
-            for ch in parsed_new_chapters:
-                actual_ch_num = next_chapter_num + count
-
-                # 查找对应的大纲段
-                matching_segment = next(
-                    (seg for seg in target_segments
-                     if seg['start_chapter'] <= actual_ch_num <= seg['end_chapter']),
-                    None
-                )
-                ch_outline_str = matching_segment['summary'] if matching_segment else ''
-
-                # 处理章节标题
-                chapter_title = self._process_chapter_title(
-                    ch.get('chapter_title', ''),
-                    matching_segment,
-                    ch.get('content', ''),
-                    actual_ch_num
-                )
-
-                self.chapter_manager.create_chapter(
-                    novel_id=novel_id,
-                    chapter_number=actual_ch_num,
-                    chapter_title=chapter_title,
-                    content=ch['content'],
-                    outline=ch_outline_str,
-                    status='published'
-                )
-                count += 1
-
-            self.stats_manager.update_novel_metadata(novel_id)
-        else:
-            # 未能解析出章节，作为单章保存
-            outline_str = target_segments[0]['summary'] if target_segments else ''
-            self.chapter_manager.create_chapter(
-                novel_id=novel_id,
-                chapter_number=next_chapter_num,
-                chapter_title=f"第{self.num_to_chinese(next_chapter_num)}章 (待整理)",
-                content=generated_content,
-                outline=outline_str,
-                status='draft'
-            )
-            count = 1
-
-        return count
 
     def _extract_content_from_result(self, result: Any, task_writing: Any) -> str:
         """从 CrewAI 结果中提取内容"""
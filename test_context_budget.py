@@ -0,0 +1,81 @@
+"""
+测试提示词上下文预算模块
+"""
+
+from utils.context_budget import (
+    ContextBudget,
+    TRUNCATED_TAIL,
+    count_tokens,
+    model_context_budget,
+    truncate_tokens
+)
+
+
+def test_count_and_truncate():
+    """测试 token 计数与截断"""
+    print("=" * 50)
+    print("测试 count_tokens() / truncate_tokens()")
+    print("=" * 50)
+
+    assert count_tokens("") == 0
+    assert count_tokens("雪夜来客") >= 4
+    assert count_tokens("hello world") < len("hello world")
+
+    text = "".join(f"第{i}段，夜色渐深，城门外传来马蹄声。\n" for i in range(200))
+    head = truncate_tokens(text, 100)
+    tail = truncate_tokens(text, 100, keep="tail")
+    assert count_tokens(head) <= 100 and head.startswith("第0段")
+    assert count_tokens(tail) <= 100 and tail.startswith(TRUNCATED_TAIL) and tail.endswith("第199段，夜色渐深，城门外传来马蹄声。\n")
+    assert truncate_tokens("短文本", 100) == "短文本"
+    print(f"✅ 原文 {count_tokens(text)} token，截断后不超过 100 token")
+
+
+def test_context_budget():
+    """测试按优先级分配预算"""
+    print("=" * 50)
+    print("测试 ContextBudget")
+    print("=" * 50)
+
+    outline = "大纲内容。" * 300
+    previous = "上一章正文。" * 300
+    story = "企划书内容。" * 300
+
+    # 预算充足：原样保留
+    result = ContextBudget(100000).add('outline', outline).add('story', story).allocate()
+    assert result == {'outline': outline, 'story': story}
+
+    # 预算不足：低优先级先压缩，高优先级完整保留，合计不超过预算
+    budget = ContextBudget(2500)
+    budget.add('outline', outline, priority=3, min_tokens=500)
+    budget.add('previous', previous, priority=2, min_tokens=200, max_tokens=400, keep='tail')
+    budget.add('story', story, priority=1, min_tokens=300)
+    result = budget.allocate()
+    assert result['outline'] == outline
+    assert count_tokens(result['previous']) <= 400 and result['previous'].startswith(TRUNCATED_TAIL)
+    assert sum(count_tokens(text) for text in result.values()) <= 2500
+    print("✅ 低优先级内容先压缩")
+
+    # 保底长度合计也超出：整段丢弃最低优先级
+    budget = ContextBudget(800)
+    budget.add('outline', outline, priority=2, min_tokens=600)
+    budget.add('story', story, priority=1, min_tokens=300)
+    result = budget.allocate()
+    assert result['story'] == "" and count_tokens(result['outline']) <= 800
+
+    # 同一优先级平均分配：短内容完整保留，余量给长内容
+    budget = ContextBudget(1000)
+    budget.add('a', "短素材。" * 10).add('b', outline).add('c', story)
+    result = budget.allocate()
+    assert result['a'] == "短素材。" * 10
+    assert abs(count_tokens(result['b']) - count_tokens(result['c'])) <= 10
+    print("✅ 丢弃与平均分配正常")
+
+    config = {'context_budget': {'default_tokens': 6000, 'models': {'big-model': 32000}}}
+    assert model_context_budget(config, 'big-model') == 32000
+    assert model_context_budget(config, 'other') == 6000
+    assert model_context_budget({}, 'other') == 8000
+
+
+if __name__ == "__main__":
+    test_count_and_truncate()
+    test_context_budget()
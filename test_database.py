@@ -0,0 +1,858 @@
+"""
+测试数据库层（连接池等）
+
+运行此脚本测试 database.py 中各 Manager 的基础功能，使用临时数据库，不影响 stories.db
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database import (
+    ConnectionPool, DatabaseManager, NovelManager, ChapterManager, NovelVersionManager, NovelStatsManager,
+    SchemaManager, RenderCacheManager, ExportArtifactManager, JobManager, JobConflictError, LLMCacheManager
+)
+from utils.compression import compress_text, decompress_text
+
+
+def _temp_db_path():
+    """创建临时数据库路径"""
+    return os.path.join(tempfile.mkdtemp(), "test_stories.db")
+
+
+def test_connection_pool():
+    """测试连接池复用与 PRAGMA 配置"""
+    print("=" * 50)
+    print("测试 ConnectionPool")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    db_manager = DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+
+    # 同一数据库的 Manager 共享连接池
+    assert db_manager.pool is novel_manager.pool
+    assert ConnectionPool.get(db_path) is db_manager.pool
+
+    # 同一线程内复用同一连接
+    with db_manager.connection() as conn1:
+        with novel_manager.connection() as conn2:
+            assert conn1 is conn2
+        journal_mode = conn1.execute("PRAGMA journal_mode").fetchone()[0]
+        assert journal_mode.lower() == "wal", journal_mode
+        assert conn1.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    # 不同线程使用不同连接
+    other = {}
+
+    def worker():
+        with db_manager.connection() as conn:
+            other['conn'] = conn
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    with db_manager.connection() as conn:
+        assert other['conn'] is not conn
+    print("✅ 连接复用正常")
+
+    # 线程结束后其连接随之关闭，短生命周期线程不会累积连接
+    for _ in range(50):
+        thread = threading.Thread(target=db_manager.count_stories)
+        thread.start()
+        thread.join()
+    assert db_manager.pool.open_connections() <= 2, db_manager.pool.open_connections()
+    print("✅ 线程结束后连接已关闭")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_nested_transaction_rollback():
+    """测试嵌套上下文共享事务，异常时整体回滚"""
+    print("=" * 50)
+    print("测试嵌套事务")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    novel_manager = NovelManager(db_path)
+    DatabaseManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    novel_id = novel_manager.save_novel("测试小说", "主题", "")
+
+    try:
+        with chapter_manager.connection():
+            chapter_manager.create_chapter(novel_id, 1, "第一章", "内容")
+            raise RuntimeError("模拟失败")
+    except RuntimeError:
+        pass
+
+    assert chapter_manager.list_chapters(novel_id) == []
+
+    with chapter_manager.connection():
+        chapter_manager.create_chapter(novel_id, 1, "第一章", "内容")
+        chapter_manager.create_chapter(novel_id, 2, "第二章", "内容")
+    assert len(chapter_manager.list_chapters(novel_id)) == 2
+    print("✅ 嵌套事务正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_full_text_search():
+    """测试 FTS5 全文搜索（触发器同步、排序、片段高亮、短词回退）"""
+    print("=" * 50)
+    print("测试全文搜索")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    db_manager = DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+
+    story_id = db_manager.save_story("crew_ai", "企划书 - 星海彼岸", "星际流浪", "主角在废弃的空间站醒来")
+    db_manager.save_story("base", "灵感 - 武侠", "江湖", "一把只能在雨天使用的伞")
+    novel_id = novel_manager.save_novel("雨夜长歌", "武侠", "大纲：雨天使用的伞是关键道具")
+    chapter_manager.create_chapter(novel_id, 1, "第一章 雨夜", "他撑开那把只能在雨天使用的伞。")
+
+    hits, total = db_manager.search_stories("废弃的空间站")
+    assert total == 1 and hits[0]['id'] == story_id
+    assert "**" in hits[0]['snippet'], hits[0]['snippet']
+
+    # 更新后索引同步
+    db_manager.update_story(story_id, content="主角在沉没的潜艇中醒来")
+    assert db_manager.search_stories("废弃的空间站")[1] == 0
+    assert db_manager.search_stories("沉没的潜艇")[1] == 1
+
+    # 软删除的记录不出现在结果中
+    db_manager.delete_story(story_id)
+    assert db_manager.search_stories("沉没的潜艇")[1] == 0
+
+    # 多个关键词为 AND 关系
+    assert novel_manager.search_novels("雨天使用 关键道具")[1] == 1
+    assert novel_manager.search_novels("雨天使用 空间站")[1] == 0
+
+    chapter_hits = chapter_manager.search_chapters("雨天使用的伞", novel_id=novel_id)
+    assert len(chapter_hits) == 1 and chapter_hits[0]['chapter_number'] == 1
+
+    # 少于 3 个字符回退到 LIKE
+    hits, total = db_manager.search_stories("雨天")
+    assert total == 1 and "**雨天**" in hits[0]['snippet']
+
+    # 列表查询的搜索条件同样使用全文索引
+    stories, total = db_manager.list_stories(search_query="只能在雨天")
+    assert total == 1
+    print("✅ 全文搜索正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_keyset_pagination():
+    """测试游标分页与触发器维护的记录数"""
+    print("=" * 50)
+    print("测试游标分页")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    db_manager = DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+
+    ids = [db_manager.save_story("base" if i % 2 else "crew_ai", f"记录{i}", "主题", "内容")
+           for i in range(25)]
+    novel_manager.save_novel("小说", "主题", "")
+
+    # 逐页翻到底，结果与 OFFSET 分页一致
+    expected, _ = db_manager.list_stories(page_size=100, order_by="created_at DESC, id DESC")
+    collected = []
+    cursor = None
+    while True:
+        page = db_manager.list_stories_after(cursor=cursor, page_size=10)
+        if not page:
+            break
+        collected.extend(page)
+        cursor = (page[-1]['created_at'], page[-1]['id'])
+    assert [s['id'] for s in collected] == [s['id'] for s in expected]
+    assert sorted(s['id'] for s in collected) == sorted(ids)
+
+    # 正序与类型筛选
+    page = db_manager.list_stories_after(story_type="base", page_size=5, ascending=True)
+    assert [s['id'] for s in page] == [i for n, i in enumerate(ids) if n % 2][:5]
+
+    # 计数随插入、软删除、恢复、硬删除同步变化
+    assert db_manager.count_stories() == 25
+    assert db_manager.count_stories("base") == 12
+    db_manager.delete_story(ids[1])
+    assert db_manager.count_stories("base") == 11
+    db_manager.hard_delete_story(ids[0])
+    assert db_manager.count_stories() == 23
+    assert novel_manager.count_novels() == 1
+    print("✅ 游标分页正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_content_split():
+    """测试正文分表：列表不读正文、详情带正文、旧库 content 列自动迁移"""
+    print("=" * 50)
+    print("测试正文分表")
+    print("=" * 50)
+
+    # 旧版结构：正文内联在主表中
+    db_path = _temp_db_path()
+    legacy = sqlite3.connect(db_path)
+    legacy.execute("""
+        CREATE TABLE stories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, title TEXT, topic TEXT,
+            content TEXT, metadata TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP, is_deleted INTEGER DEFAULT 0
+        )
+    """)
+    legacy.execute("INSERT INTO stories (type, title, topic, content) VALUES ('base', '旧记录', '主题', ?)",
+                   ("旧版正文内容" * 100,))
+    legacy.commit()
+    legacy.close()
+
+    db_manager = DatabaseManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    novel_manager = NovelManager(db_path)
+
+    with db_manager.connection() as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(stories)")}
+    assert 'content' not in columns and 'preview' in columns
+    story = db_manager.get_story(1)
+    assert story['content'] == "旧版正文内容" * 100
+    stories, _ = db_manager.list_stories()
+    assert stories[0]['content_preview'] == ("旧版正文内容" * 100)[:200]
+    assert db_manager.search_stories("旧版正文")[1] == 1
+
+    # 章节列表默认不含正文，需要时显式读取
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_id = chapter_manager.create_chapter(novel_id, 1, "第一章", "正文" * 500)
+    listed = chapter_manager.list_chapters(novel_id)
+    assert 'content' not in listed[0] and listed[0]['preview'] == ("正文" * 500)[:200]
+    assert chapter_manager.list_chapters(novel_id, include_content=True)[0]['content'] == "正文" * 500
+    chapter_manager.update_chapter(chapter_id, content="新的正文")
+    assert chapter_manager.get_chapter(chapter_id)['content'] == "新的正文"
+    assert chapter_manager.search_chapters("新的正文")[0]['id'] == chapter_id
+
+    # 统计查询走覆盖索引，不回表
+    with chapter_manager.connection() as conn:
+        plan = " ".join(row[-1] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT COUNT(*), SUM(word_count) FROM chapters WHERE novel_id = ? AND is_deleted = 0
+        """, (novel_id,)))
+    assert "COVERING INDEX idx_chapters_listing" in plan, plan
+
+    # 硬删除时正文行与索引一并清理
+    chapter_manager.delete_chapter(chapter_id, soft=False)
+    with chapter_manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chapter_contents").fetchone()[0] == 0
+    assert chapter_manager.search_chapters("新的正文") == []
+    print("✅ 正文分表正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_content_compression():
+    """测试章节正文与版本快照的透明压缩"""
+    print("=" * 50)
+    print("测试正文压缩")
+    print("=" * 50)
+
+    text = "江湖路远，他终于在雨夜里找到了那把伞。" * 200
+    assert isinstance(compress_text(text, "zlib"), bytes)
+    assert decompress_text(compress_text(text, "zlib")) == text
+    assert compress_text("短文本", "zlib") == "短文本"  # 过短不压缩
+    assert decompress_text("未压缩的旧数据") == "未压缩的旧数据"
+
+    db_path = _temp_db_path()
+    DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    version_manager = NovelVersionManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "")
+    chapter_id = chapter_manager.create_chapter(novel_id, 1, "第一章", text)
+    with chapter_manager.connection() as conn:
+        stored = conn.execute(
+            "SELECT content FROM chapter_contents WHERE chapter_id = ?", (chapter_id,)
+        ).fetchone()[0]
+    assert isinstance(stored, bytes) and len(stored) * 3 < len(text.encode("utf-8"))
+    assert chapter_manager.get_chapter(chapter_id)['content'] == text
+    assert chapter_manager.search_chapters("找到了那把伞")[0]['id'] == chapter_id
+
+    version_id = version_manager.create_version(novel_id, "v1", snapshot_data={'chapters': [text]})
+    assert version_manager.get_version(version_id)['snapshot_data'] == {'chapters': [text]}
+    print("✅ 正文压缩正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_deduplicated_snapshots():
+    """测试版本快照按内容哈希去重"""
+    print("=" * 50)
+    print("测试版本快照去重")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    version_manager = NovelVersionManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_ids = [chapter_manager.create_chapter(novel_id, i, f"第{i}章", f"第{i}章正文" * 100)
+                   for i in range(1, 11)]
+
+    def snapshot(name):
+        novel = novel_manager.get_novel(novel_id)
+        return version_manager.create_snapshot(
+            novel_id, name, title=novel['title'], content=novel['content'],
+            chapters=chapter_manager.list_chapters(novel_id)
+        )
+
+    def blob_count():
+        with version_manager.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM snapshot_blobs").fetchone()[0]
+
+    v1 = snapshot("v1")
+    assert blob_count() == 11  # 10 章 + 大纲
+    chapter_manager.update_chapter(chapter_ids[2], content="改写后的第三章")
+    v2 = snapshot("v2")
+    assert blob_count() == 12  # 只新增修改过的一章
+
+    version = version_manager.get_version(v1)
+    assert version['snapshot_data']['content'] == "大纲"
+    assert version['snapshot_data']['chapters'][2]['content'] == "第3章正文" * 100
+    assert 'content' not in version_manager.get_version(v2, include_content=False)['snapshot_data']['chapters'][0]
+
+    diff = version_manager.diff_version_chapters(v1, v2)
+    assert diff['unchanged'] == 9 and not diff['added'] and not diff['removed']
+    old_ch, new_ch = diff['changed'][0]
+    assert new_ch['content'] == "改写后的第三章" and old_ch['content'] == "第3章正文" * 100
+
+    # 旧的整体 JSON 快照转换为清单格式
+    legacy_id = version_manager.create_version(novel_id, "legacy", snapshot_data={
+        'novel_id': novel_id, 'title': "小说", 'content': "大纲",
+        'chapters': [{'id': chapter_ids[0], 'chapter_number': 1, 'chapter_title': "第1章",
+                      'content': "第1章正文" * 100, 'word_count': 500}]
+    })
+    assert version_manager.diff_version_chapters(legacy_id, v1)['unchanged'] == 1
+    assert version_manager.convert_json_version(legacy_id)
+    assert blob_count() == 12
+    assert version_manager.get_version(legacy_id)['snapshot_data']['chapters'][0]['content'] == "第1章正文" * 100
+    print("✅ 版本快照去重正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_restore_version():
+    """测试版本恢复（增量写入、软删除、硬删除章节重建、状态与大纲、元数据更新）"""
+    print("=" * 50)
+    print("测试版本恢复")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    version_manager = NovelVersionManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "原始大纲")
+    with chapter_manager.connection():
+        chapter_ids = [chapter_manager.create_chapter(novel_id, i, f"第{i}章", f"第{i}章的正文内容" * 50)
+                       for i in range(1, 1201)]
+    chapter_manager.update_chapter(chapter_ids[0], outline="第一章大纲", status="published")
+    chapter_manager.update_chapter(chapter_ids[2], outline="第三章大纲")
+
+    def snapshot(name):
+        novel = novel_manager.get_novel(novel_id)
+        return version_manager.create_snapshot(
+            novel_id, name, title=novel['title'], content=novel['content'],
+            chapters=chapter_manager.list_chapters(novel_id)
+        )
+
+    version_id = snapshot("v1")
+    original = chapter_manager.list_chapters(novel_id, include_content=True)
+
+    # 快照后的各种修改
+    novel_manager.update_novel(novel_id, title="改名后的小说", content="新的大纲")
+    chapter_manager.update_chapter(chapter_ids[0], chapter_title="新标题", content="改写的第一章",
+                                   outline="", status="draft")
+    chapter_manager.delete_chapter(chapter_ids[1])
+    chapter_manager.delete_chapter(chapter_ids[2], soft=False)
+    chapter_manager.create_chapter(novel_id, 1201, "新增章节", "快照之后新增的内容")
+
+    start = time.perf_counter()
+    assert version_manager.restore_version(version_id)
+    elapsed = time.perf_counter() - start
+    print(f"恢复 1200 章耗时 {elapsed * 1000:.0f} ms")
+
+    restored = chapter_manager.list_chapters(novel_id, include_content=True)
+    strip = lambda chapters: [(ch['chapter_number'], ch['chapter_title'], ch['content'], ch['preview'],
+                               ch['status'], ch['outline']) for ch in chapters]
+    assert strip(restored) == strip(original)
+    novel = novel_manager.get_novel(novel_id)
+    assert novel['title'] == "小说" and novel['content'] == "原始大纲"
+    assert chapter_manager.search_chapters("快照之后新增") == []
+    assert chapter_manager.search_chapters("改写的第一章") == []
+
+    with version_manager.connection() as conn:
+        metadata = conn.execute(
+            "SELECT total_chapters, total_words FROM novel_metadata WHERE novel_id = ?", (novel_id,)
+        ).fetchone()
+    assert metadata['total_chapters'] == 1200
+    assert metadata['total_words'] == sum(ch['word_count'] for ch in original)
+
+    assert not version_manager.restore_version(99999)
+    print("✅ 版本恢复正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_create_chapters_bulk():
+    """测试批量创建章节（单事务写入、失败整体回滚、元数据增量更新）"""
+    print("=" * 50)
+    print("测试批量创建章节")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_manager.create_chapter(novel_id, 1, "第1章", "已有正文")
+
+    chapters = [{'chapter_number': i, 'chapter_title': f"第{i}章", 'content': f"第{i}章正文" * 100,
+                 'outline': f"第{i}章大纲", 'status': 'published'} for i in range(2, 6)]
+    chapter_ids = chapter_manager.create_chapters_bulk(novel_id, chapters)
+    assert len(chapter_ids) == 4
+    chapter = chapter_manager.get_chapter(chapter_ids[-1])
+    assert chapter['content'] == "第5章正文" * 100 and chapter['outline'] == "第5章大纲"
+
+    def metadata():
+        with chapter_manager.connection() as conn:
+            return tuple(conn.execute(
+                "SELECT total_chapters, total_words FROM novel_metadata WHERE novel_id = ?", (novel_id,)
+            ).fetchone())
+
+    expected = (5, sum(ch['word_count'] for ch in chapter_manager.list_chapters(novel_id)))
+    assert metadata() == expected
+
+    # 与其他写入组合成一个事务，后续失败时章节和元数据一起回滚
+    try:
+        with chapter_manager.connection():
+            chapter_manager.create_chapters_bulk(novel_id, [
+                {'chapter_number': 6, 'chapter_title': "第6章", 'content': "不应保存"}
+            ])
+            novel_manager.update_novel(novel_id, metadata={'workflow_stage': 'writing'})
+            raise RuntimeError("模拟失败")
+    except RuntimeError:
+        pass
+    assert len(chapter_manager.list_chapters(novel_id)) == 5
+    assert metadata() == expected
+    assert novel_manager.get_novel(novel_id)['metadata'] != {'workflow_stage': 'writing'}
+    assert chapter_manager.create_chapters_bulk(novel_id, []) == []
+    print("✅ 批量创建章节正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_novel_stats_triggers():
+    """测试触发器维护的小说统计与全量重新聚合结果一致"""
+    print("=" * 50)
+    print("测试小说统计增量维护")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    DatabaseManager(db_path)
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    stats_manager = NovelStatsManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    other_id = novel_manager.save_novel("另一部", "主题", "大纲")
+
+    def expected():
+        chapters = chapter_manager.list_chapters(novel_id)
+        status_counts = {}
+        for ch in chapters:
+            status_counts[ch['status']] = status_counts.get(ch['status'], 0) + 1
+        return len(chapters), sum(ch['word_count'] for ch in chapters), status_counts
+
+    def actual():
+        stats = stats_manager.calculate_novel_stats(novel_id)
+        return stats['total_chapters'], stats['total_words'], stats['status_counts']
+
+    assert actual() == (0, 0, {})
+
+    chapter_ids = [chapter_manager.create_chapter(novel_id, i, f"第{i}章", "正" * (i * 100)) for i in range(1, 6)]
+    chapter_manager.create_chapters_bulk(novel_id, [
+        {'chapter_number': 6, 'chapter_title': "第6章", 'content': "新" * 50, 'status': 'published'}
+    ])
+    assert actual() == expected() == (6, 1550, {'draft': 5, 'published': 1})
+
+    chapter_manager.update_chapter(chapter_ids[0], content="短", status='published')
+    chapter_manager.delete_chapter(chapter_ids[1])
+    chapter_manager.delete_chapter(chapter_ids[2], soft=False)
+    chapter_manager.create_chapter(other_id, 1, "第1章", "其他小说")
+    assert actual() == expected()
+    assert stats_manager.calculate_novel_stats(novel_id)['avg_words_per_chapter'] == expected()[1] / 4
+
+    # 手动校准与触发器结果一致
+    before = actual()
+    assert stats_manager.update_novel_metadata(novel_id)
+    assert actual() == before
+    print("✅ 小说统计增量维护正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_schema_migrations():
+    """测试基于 user_version 的结构迁移（只执行一次、可重复执行、构造 Manager 不再执行 DDL）"""
+    print("=" * 50)
+    print("测试结构迁移")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    schema_manager = SchemaManager(db_path)
+    assert schema_manager.migrate() == [version for version, _, _ in SchemaManager.MIGRATIONS]
+    assert schema_manager.current_version() == SchemaManager.latest_version()
+    assert schema_manager.migrate() == []
+
+    def schema_cookie():
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute("PRAGMA schema_version").fetchone()[0]
+        finally:
+            conn.close()
+
+    # 模拟新进程：重新检查版本，但不修改任何表结构
+    ConnectionPool.close_all_pools()
+    before = schema_cookie()
+    NovelManager(db_path)
+    ChapterManager(db_path)
+    DatabaseManager(db_path)
+    assert ConnectionPool.get(db_path).schema_ready
+    assert schema_cookie() == before
+
+    # 旧库（user_version = 0）重新执行全部迁移，已有数据保留
+    novel_id = NovelManager(db_path).save_novel("小说", "主题", "大纲")
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA user_version = 0")
+    conn.close()
+    ConnectionPool.close_all_pools()
+    assert NovelManager(db_path).get_novel(novel_id)['content'] == "大纲"
+    assert SchemaManager(db_path).current_version() == SchemaManager.latest_version()
+    print("✅ 结构迁移正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_allocate_title():
+    """测试不重名标题分配（序号位置、排除自身、并发保存）"""
+    print("=" * 50)
+    print("测试标题分配")
+    print("=" * 50)
+
+    db_path = _temp_db_path()
+    novel_manager = NovelManager(db_path)
+
+    assert novel_manager.allocate_title("书名 (长篇)", title_suffix=" (长篇)") == "书名 (长篇)"
+    first_id = novel_manager.save_novel("书名 (长篇)", "", "", unique_title=True, title_suffix=" (长篇)")
+    novel_manager.save_novel("书名 (长篇)", "", "", unique_title=True, title_suffix=" (长篇)")
+    novel_manager.save_novel("书名续集 (长篇)", "", "")
+    assert novel_manager.allocate_title("书名 (长篇)", title_suffix=" (长篇)") == "书名 (3) (长篇)"
+    assert novel_manager.allocate_title("书名 (2) (长篇)", title_suffix=" (长篇)") == "书名 (3) (长篇)"
+    assert novel_manager.allocate_title("书名 (长篇)", title_suffix=" (长篇)",
+                                        exclude_novel_id=first_id) == "书名 (长篇)"
+    assert novel_manager.allocate_title("书名") == "书名"
+
+    # 多个线程同时保存同名小说，标题互不重复
+    errors = []
+
+    def worker():
+        try:
+            novel_manager.save_novel("并发", "", "", unique_title=True)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    with novel_manager.connection() as conn:
+        titles = [row['title'] for row in conn.execute("SELECT title FROM novels WHERE title LIKE '并发%'")]
+    assert sorted(titles) == sorted(["并发"] + [f"并发 ({n})" for n in range(2, 9)])
+    print("✅ 标题分配正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_iter_chapters_export():
+    """测试逐章读取与流式导出（结果与整本加载一致）"""
+    print("=" * 50)
+    print("测试流式导出")
+    print("=" * 50)
+
+    from utils.export import ExportManager
+
+    db_path = _temp_db_path()
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_manager.create_chapters_bulk(novel_id, [
+        {'chapter_number': number, 'chapter_title': f"第{number}章", 'content': f"第{number}章正文" * 80}
+        for number in (3, 1, 2, 2, 5)
+    ])
+    chapter_manager.delete_chapter(chapter_manager.list_chapters(novel_id)[-1]['id'])
+
+    chapters = chapter_manager.list_chapters(novel_id, include_content=True)
+    streamed = list(chapter_manager.iter_chapters(novel_id))
+    assert [(ch['id'], ch['content']) for ch in streamed] == [(ch['id'], ch['content']) for ch in chapters]
+    assert len(list(chapter_manager.iter_chapters(novel_id, batch_size=3))) == 4
+
+    export_path = os.path.join(tempfile.mkdtemp(), "novel.md")
+    ExportManager.write_to_file(
+        ExportManager.iter_markdown("小说", chapter_manager.iter_chapters(novel_id), True), export_path
+    )
+    with open(export_path, encoding='utf-8') as f:
+        assert f.read() == ExportManager.export_to_markdown("小说", chapters, True)
+    os.remove(export_path)
+    print("✅ 流式导出正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_render_cache():
+    """测试章节渲染缓存（按正文哈希命中、改写后失效、清理遗留缓存）"""
+    print("=" * 50)
+    print("测试章节渲染缓存")
+    print("=" * 50)
+
+    from utils.export import render_cache_key, render_chapter_html
+
+    db_path = _temp_db_path()
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    render_cache = RenderCacheManager(db_path)
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_id = chapter_manager.create_chapter(novel_id, 1, "第1章", "第一段\n\n第二段" * 100)
+    chapter = chapter_manager.list_chapters(novel_id)[0]
+    key = render_cache_key("pdf")
+
+    assert render_cache.get_rendered([chapter['content_hash']], key) == {}
+    html = render_chapter_html(chapter_manager.get_chapter(chapter_id)['content'], "pdf")
+    assert html.startswith("<p>第一段</p>")
+    render_cache.save_rendered({chapter['content_hash']: html}, key)
+    assert render_cache.get_rendered([chapter['content_hash']], key) == {chapter['content_hash']: html}
+    assert render_cache.get_rendered([chapter['content_hash']], render_cache_key("epub")) == {}
+
+    # 改写后哈希变化，旧缓存不再命中并可被清理
+    chapter_manager.update_chapter(chapter_id, content="改写后的正文")
+    new_hash = chapter_manager.list_chapters(novel_id)[0]['content_hash']
+    assert render_cache.get_rendered([new_hash], key) == {}
+    assert render_cache.prune() == 1
+    print("✅ 章节渲染缓存正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_export_artifacts():
+    """测试导出文件缓存（指纹随章节变化、同类旧文件替换、按访问时间淘汰）"""
+    print("=" * 50)
+    print("测试导出文件缓存")
+    print("=" * 50)
+
+    from utils.export import export_fingerprint
+
+    db_path = _temp_db_path()
+    novel_manager = NovelManager(db_path)
+    chapter_manager = ChapterManager(db_path)
+    artifacts = ExportArtifactManager(db_path, max_total_bytes=250)
+
+    def make_file(text):
+        fd, path = tempfile.mkstemp(suffix=".md")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    novel_id = novel_manager.save_novel("小说", "主题", "大纲")
+    chapter_id = chapter_manager.create_chapter(novel_id, 1, "第1章", "正文")
+    novel = novel_manager.get_novel(novel_id)
+    fingerprint = export_fingerprint(novel, chapter_manager.list_chapters(novel_id), "markdown")
+    assert fingerprint == export_fingerprint(novel, chapter_manager.list_chapters(novel_id), "markdown")
+    assert fingerprint != export_fingerprint(novel, chapter_manager.list_chapters(novel_id), "txt")
+
+    assert artifacts.get(fingerprint) is None
+    path = artifacts.put(fingerprint, novel_id, "markdown", make_file("a" * 100))
+    assert artifacts.get(fingerprint) == path and os.path.exists(path)
+
+    # 章节修改后指纹变化，新文件替换同类旧文件
+    chapter_manager.update_chapter(chapter_id, content="改写")
+    new_fingerprint = export_fingerprint(novel, chapter_manager.list_chapters(novel_id), "markdown")
+    assert new_fingerprint != fingerprint
+    new_path = artifacts.put(new_fingerprint, novel_id, "markdown", make_file("b" * 100))
+    assert artifacts.get(fingerprint) is None and not os.path.exists(path)
+
+    # 超过总大小上限时淘汰最久未访问的文件
+    txt_path = artifacts.put("txt-fingerprint", novel_id, "txt", make_file("c" * 100))
+    artifacts.get(new_fingerprint)
+    artifacts.put("outline-fingerprint", novel_id, "outline-markdown", make_file("d" * 100))
+    assert artifacts.get("txt-fingerprint") is None and not os.path.exists(txt_path)
+    assert artifacts.get(new_fingerprint) == new_path
+
+    assert artifacts.invalidate_novel(novel_id) == 2
+    print("✅ 导出文件缓存正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_job_queue():
+    """测试后台任务队列（同 scope 去重、并发领取、结果记录、心跳超时）"""
+    print("=" * 50)
+    print("测试后台任务队列")
+    print("=" * 50)
+
+    from services.job_service import JOB_HANDLERS, execute_job
+
+    db_path = _temp_db_path()
+    jobs = JobManager(db_path)
+
+    first = jobs.enqueue("write_chapters", {'novel_id': 1, 'num_chapters': 2}, scope="novel:1:chapters")
+    assert jobs.enqueue("write_chapters", {'novel_id': 1, 'num_chapters': 2}, scope="novel:1:chapters") == first
+    # 参数不同的请求不会被静默合并到已有任务
+    try:
+        jobs.enqueue("write_chapters", {'novel_id': 1, 'num_chapters': 5}, scope="novel:1:chapters")
+        assert False, "应拒绝参数不同的任务"
+    except JobConflictError as e:
+        assert e.job_id == first
+    second = jobs.enqueue("generate_outline", {'story_id': 3}, scope="story:3:outline")
+    third = jobs.enqueue("generate_proposal", {'topic': "主题"})
+    assert jobs.cancel(third) and jobs.get_job(third)['status'] == 'cancelled'
+
+    # 多个执行进程同时领取，每个任务只会被领取一次
+    claimed = []
+
+    def claim(name):
+        job = JobManager(db_path).claim_next(name)
+        if job:
+            claimed.append(job['id'])
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == [first, second]
+    assert jobs.claim_next("worker-x") is None
+
+    job = jobs.get_job(first)
+    assert job['status'] == 'running' and job['params'] == {'novel_id': 1, 'num_chapters': 2}
+    jobs.update_progress(first, 0.5, "撰写中")
+    jobs.finish(first, {'chapters_written': 2, 'success': True})
+    job = jobs.latest_job("novel:1:chapters")
+    assert job['status'] == 'succeeded' and job['progress'] == 1
+    assert job['result']['chapters_written'] == 2
+
+    # 执行进程退出后心跳停止，任务标记为失败
+    time.sleep(0.05)
+    assert jobs.fail_stale(0.01) == 1
+    assert jobs.get_job(second)['status'] == 'failed'
+
+    # 处理函数返回 success=False 时记录为失败
+    JOB_HANDLERS['test_failure'] = lambda report, reason: {'success': False, 'error': reason}
+    try:
+        failing = jobs.enqueue("test_failure", {'reason': "大纲为空"})
+        execute_job(jobs, jobs.claim_next("worker-y"))
+        job = jobs.get_job(failing)
+        assert job['status'] == 'failed' and job['error'] == "大纲为空"
+    finally:
+        del JOB_HANDLERS['test_failure']
+
+    jobs.mark_seen(failing)
+    assert jobs.get_job(failing)['seen_at'] is not None
+    print("✅ 后台任务队列正常")
+
+    ConnectionPool.close_all_pools()
+
+
+def test_llm_cache():
+    """测试 LLM 响应缓存（参数参与缓存键、过期、按大小淘汰、跳过读取、命中统计）"""
+    print("=" * 50)
+    print("测试 LLM 响应缓存")
+    print("=" * 50)
+
+    from llm_cache import LLMCache, bypass_llm_cache
+
+    db_path = _temp_db_path()
+    cache = LLMCache({'llm_cache': {'enabled': True}}, db_path=db_path)
+    calls = []
+
+    def fake_call(text):
+        def call():
+            calls.append(text)
+            return text
+        return call
+
+    messages = [{"role": "user", "content": "写一个开头"}]
+    assert cache.cached_call("model-a", messages, {'temperature': 0.8}, fake_call("第一次")) == "第一次"
+    assert cache.cached_call("model-a", messages, {'temperature': 0.8}, fake_call("第二次")) == "第一次"
+    # 模型或参数不同则不命中
+    assert cache.cached_call("model-a", messages, {'temperature': 0.2}, fake_call("低温")) == "低温"
+    assert cache.cached_call("model-b", messages, {'temperature': 0.8}, fake_call("换模型")) == "换模型"
+    with bypass_llm_cache():
+        assert cache.cached_call("model-a", messages, {'temperature': 0.8}, fake_call("刷新")) == "刷新"
+    assert cache.cached_call("model-a", messages, {'temperature': 0.8}, fake_call("第三次")) == "刷新"
+    assert calls == ["第一次", "低温", "换模型", "刷新"]
+
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 3 and stats['entries'] == 3
+
+    manager = LLMCacheManager(db_path, max_total_bytes=10 ** 6)
+    manager.put("expired", "model-a", "旧结果", ttl_seconds=0.01)
+    time.sleep(0.05)
+    assert manager.get("expired") is None
+
+    # 超过总大小上限时淘汰最久未访问的条目
+    manager.clear()
+    entry_size = len(manager.encode_column('llm_cache', 'response', "甲" * 100))
+    small = LLMCacheManager(db_path, max_total_bytes=entry_size * 2)
+    small.put("a", "model-a", "甲" * 100)
+    small.put("b", "model-a", "甲" * 100)
+    time.sleep(0.01)
+    assert small.get("a") is not None
+    small.put("c", "model-a", "甲" * 100)
+    assert small.get("b") is None and small.get("a") is not None and small.get("c") is not None
+
+    disabled = LLMCache({}, db_path=db_path)
+    assert disabled.cached_call("model-a", messages, {'temperature': 0.8}, fake_call("未开启")) == "未开启"
+    print("✅ LLM 响应缓存正常")
+
+    ConnectionPool.close_all_pools()
+
+
+if __name__ == "__main__":
+    test_connection_pool()
+    test_nested_transaction_rollback()
+    test_full_text_search()
+    test_keyset_pagination()
+    test_content_split()
+    test_content_compression()
+    test_deduplicated_snapshots()
+    test_restore_version()
+    test_create_chapters_bulk()
+    test_novel_stats_triggers()
+    test_schema_migrations()
+    test_allocate_title()
+    test_iter_chapters_export()
+    test_render_cache()
+    test_export_artifacts()
+    test_job_queue()
+    test_llm_cache()
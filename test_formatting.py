@@ -0,0 +1,111 @@
+"""
+测试本地正文格式整理
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from database import ChapterManager
+from utils.formatting import (
+    PARAGRAPH_MAX, PARAGRAPH_MIN, SPLIT_THRESHOLD,
+    format_novel_text, normalize_punctuation, to_chinese_numeral
+)
+
+
+def test_headings_and_punctuation():
+    """测试标题层级、标点与分隔线"""
+    print("=" * 50)
+    print("测试标题与标点")
+    print("=" * 50)
+
+    assert [to_chinese_numeral(n) for n in (1, 10, 12, 20, 105, 1010)] == \
+        ["一", "十", "十二", "二十", "一百零五", "一千零一十"]
+    assert normalize_punctuation('他说:"走吧..."') == "他说：“走吧……”"
+    assert normalize_punctuation("「你好」,她笑了--然后转身.") == "“你好”，她笑了——然后转身。"
+    assert normalize_punctuation("版本 3.5 发布") == "版本 3.5 发布"
+    # 已规范的省略号、破折号保持不变，重复整理结果不变
+    normalized = "“好……”他说——不行。"
+    assert normalize_punctuation(normalized) == normalized
+    assert format_novel_text(normalized).strip() == normalized
+    for text in (normalized, '他说:"走吧..."', "一…二—三"):
+        assert normalize_punctuation(normalize_punctuation(text)) == normalize_punctuation(text)
+
+    raw = "```markdown\n# 第1章：初入江湖\n## 夜色\n他走进客栈,要了一壶酒.\n---\n第12章 归途\n#### 内心独白\n结尾。\n```"
+    formatted = format_novel_text(raw)
+    blocks = formatted.strip().split("\n\n")
+    assert blocks[0] == "## 第一章 初入江湖"
+    assert blocks[1] == "### 夜色"
+    assert blocks[2] == "他走进客栈，要了一壶酒。"
+    assert blocks[3:5] == ["---", "## 第十二章 归途"]
+    assert blocks[5] == "#### 内心独白"
+    assert blocks[-1] == "---" and "```" not in formatted
+    assert format_novel_text(formatted) == formatted
+    print("✅ 标题层级、引号与标点规范化正常")
+
+
+def test_paragraph_bounds():
+    """测试长段在句末拆分、短叙述段合并"""
+    print("=" * 50)
+    print("测试段落长度")
+    print("=" * 50)
+
+    long_paragraph = "".join(f"他沿着山路走了很久，第{i}次回头望向来时的方向。" for i in range(20))
+    dialogue = "“你真的要走？”她拉住他的衣袖，“外面的雨还没有停。”"
+    raw = "\n".join([
+        "## 第一章 离别",
+        long_paragraph,
+        "天色暗了。",
+        "风起了。",
+        "远处传来钟声。",
+        dialogue,
+        "**绝不回头。**",
+    ])
+    blocks = format_novel_text(raw).strip().split("\n\n")
+    body = [b for b in blocks if not b.startswith("#") and b != "---"]
+
+    # 长段在句末拆开，内容不增不减
+    long_parts = body[:-3]
+    assert len(long_parts) > 1 and "".join(long_parts) == long_paragraph
+    assert all(PARAGRAPH_MIN <= len(p) <= SPLIT_THRESHOLD and p.endswith("。") for p in long_parts)
+    # 短叙述段合并；对话与强调保持独立
+    assert body[-3] == "天色暗了。风起了。远处传来钟声。"
+    assert body[-2] == dialogue and body[-1] == "**绝不回头。**"
+
+    # 引号内的句末不拆分
+    quoted = "“" + "这是很长的一句话。" * 30 + "”"
+    assert format_novel_text(quoted).strip() == quoted
+    print(f"✅ 长段拆为 {len(long_parts)} 段（{PARAGRAPH_MIN}~{PARAGRAPH_MAX} 字），短段合并")
+
+
+def test_parse_and_speed():
+    """测试整理结果可被章节解析，且耗时为毫秒级"""
+    print("=" * 50)
+    print("测试章节解析与耗时")
+    print("=" * 50)
+
+    rng = random.Random(3)
+    chars = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小"
+    chapters = []
+    for n in range(1, 4):
+        paragraphs = ["".join(rng.choice(chars) for _ in range(rng.randint(10, 400))) + "。" for _ in range(40)]
+        chapters.append(f"第{n}章 标题{n}\n## 小节\n" + "\n".join(paragraphs))
+    raw = "\n\n".join(chapters)
+
+    started = time.perf_counter()
+    formatted = format_novel_text(raw)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert elapsed_ms < 200, f"整理耗时 {elapsed_ms:.1f}ms"
+
+    db_path = os.path.join(tempfile.mkdtemp(), "formatting.db")
+    parsed = ChapterManager(db_path).parse_chapters_from_content(formatted)
+    assert [ch['chapter_title'] for ch in parsed] == ["标题1", "标题2", "标题3"]
+    assert all(ch['content'].rstrip().endswith("---") for ch in parsed)
+    print(f"✅ {len(raw)} 字整理耗时 {elapsed_ms:.1f}ms，解析出 {len(parsed)} 章")
+
+
+if __name__ == "__main__":
+    test_headings_and_punctuation()
+    test_paragraph_bounds()
+    test_parse_and_speed()
@@ -0,0 +1,117 @@
+"""
+测试本地检索索引与章节检索服务
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from database import ChapterManager, NovelManager
+from services.retrieval_service import RetrievalService
+from utils.retrieval import BM25Index, PassageIndex, np, split_passages, tokenize
+
+# 生成填充正文用的常用字
+COMMON_CHARS = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+
+
+def _filler(rng, length):
+    return "".join(rng.choice(COMMON_CHARS) for _ in range(length))
+
+
+def test_bm25_index():
+    """测试分词、切分片段与 BM25 增量索引"""
+    print("=" * 50)
+    print("测试 BM25 索引")
+    print("=" * 50)
+
+    assert tokenize("青铜罗盘 v2") == ["青铜", "铜罗", "罗盘", "v", "2"]
+    passages = split_passages("第一段。\n\n" + "长" * 900 + "\n第三段。", size=400)
+    assert all(len(p) <= 400 for p in passages) and passages[0] == "第一段。"
+
+    index = BM25Index()
+    index.add(1, "沈砚秋在古庙中拾到一枚青铜罗盘。")
+    index.add(2, "城门外的集市热闹非凡，小贩叫卖声不断。")
+    index.add(3, "夜里下起了雨，客栈里只剩几位旅人。")
+    assert index.search("青铜罗盘指向何方", k=1)[0][0] == 1
+    assert index.search("青铜罗盘", allowed=[2, 3]) == []
+    index.remove(1)
+    assert index.search("青铜罗盘") == [] and len(index) == 2
+    print("✅ 检索、过滤与删除正常")
+
+
+def test_retrieval_service():
+    """测试章节检索：远距离召回、增量同步与毫秒级查询"""
+    print("=" * 50)
+    print("测试章节检索服务")
+    print("=" * 50)
+
+    rng = random.Random(7)
+    db_path = os.path.join(tempfile.mkdtemp(), "retrieval.db")
+    novel_id = NovelManager(db_path).save_novel("长篇", "主题", "大纲")
+    chapter_manager = ChapterManager(db_path)
+    chapters = [{'chapter_number': n, 'chapter_title': f"章{n}",
+                 'content': "\n".join(_filler(rng, 400) for _ in range(5))}
+                for n in range(1, 1001)]
+    chapters[4]['content'] += "\n沈砚秋在古庙的香炉下拾到一枚青铜罗盘，罗盘背面刻着“归墟”二字。"
+    chapter_manager.create_chapters_bulk(novel_id, chapters)
+    total_chars = sum(len(ch['content']) for ch in chapters)
+
+    service = RetrievalService(db_path)
+    started = time.perf_counter()
+    assert service.sync(novel_id) == 1000
+    build_seconds = time.perf_counter() - started
+
+    query = "沈砚秋带着青铜罗盘回到归墟，寻找当年的真相"
+    results = service.search(novel_id, query, k=3, before_chapter=1001)
+    assert results[0]['chapter_number'] == 5 and "青铜罗盘" in results[0]['text']
+
+    started = time.perf_counter()
+    for _ in range(20):
+        service.search(novel_id, query, k=5, before_chapter=1001)
+    query_ms = (time.perf_counter() - started) / 20 * 1000
+    assert query_ms < 100, f"单次检索 {query_ms:.1f}ms"
+    print(f"✅ {total_chars} 字建索引 {build_seconds:.1f}s，单次检索 {query_ms:.1f}ms，召回第 5 章")
+
+    # 排除紧邻的章节
+    assert not any(r['chapter_number'] == 5 for r in service.search(novel_id, query, before_chapter=6, exclude_recent=1))
+
+    # 新实例共享进程内索引，只同步改写与删除的章节
+    chapter_ids = {ch['chapter_number']: ch['id'] for ch in chapter_manager.list_chapters(novel_id)}
+    chapter_manager.update_chapter(chapter_ids[800], content="沈砚秋终于找到了另一枚青铜罗盘，两枚罗盘合二为一。")
+    chapter_manager.delete_chapter(chapter_ids[5])
+    assert RetrievalService(db_path).refresh(novel_id) == 1
+    results = service.search(novel_id, query, k=3, before_chapter=1001)
+    assert results[0]['chapter_number'] == 800
+    assert all(r['chapter_number'] != 5 for r in results)
+
+    digest = service.related_passages(novel_id, query, before_chapter=1001, k=2)
+    assert digest.startswith("【第") and "青铜罗盘" in digest
+    print("✅ 增量同步改写与删除的章节")
+
+
+def test_vector_index():
+    """测试哈希向量索引与融合检索（未安装 numpy 时跳过）"""
+    print("=" * 50)
+    print("测试哈希向量索引")
+    print("=" * 50)
+
+    if np is None:
+        print("⚠️ 未安装 numpy，跳过")
+        return
+
+    index = PassageIndex(use_vectors=True)
+    index.add(1, "沈砚秋在古庙中拾到一枚青铜罗盘。")
+    index.add(2, "城门外的集市热闹非凡，小贩叫卖声不断。")
+    index.add(3, "夜里下起了雨，客栈里只剩几位旅人。")
+    assert index.vectors.search("青铜罗盘", k=1)[0][0] == 1
+    assert index.search("青铜罗盘指向何方", k=1) == [1]
+    index.remove(1)
+    assert 1 not in index.search("青铜罗盘", k=3)
+    print("✅ 向量检索与融合正常")
+
+
+if __name__ == "__main__":
+    test_bm25_index()
+    test_retrieval_service()
+    test_vector_index()
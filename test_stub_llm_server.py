@@ -0,0 +1,138 @@
+"""
+测试本地 OpenAI 兼容桩服务
+
+启动桩服务后用 openai 客户端与项目中的解析器验证输出格式、流式输出与故障注入
+"""
+
+import os
+import tempfile
+import threading
+
+from openai import OpenAI, InternalServerError
+
+from database import ChapterManager
+from dice_options_manager import DiceOptionsManager
+from llm_clients import client_from_config, close_clients, get_openai_client, reusable_agent
+from scripts.stub_llm_server import StubConfig, create_server
+
+
+def _start_server(config=None):
+    server = create_server(port=0, config=config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def test_stub_llm_server():
+    """测试正文、流式输出、骰子选项与错误注入"""
+    print("=" * 50)
+    print("测试桩服务")
+    print("=" * 50)
+
+    server, base_url = _start_server()
+    try:
+        client = OpenAI(base_url=base_url, api_key="stub", max_retries=0)
+        messages = [{"role": "user", "content": "请撰写正文，只生成指定的 2 章，从第3章开始。"}]
+
+        response = client.chat.completions.create(model="stub-model", messages=messages)
+        content = response.choices[0].message.content
+        chapters = ChapterManager(os.path.join(tempfile.mkdtemp(), "stub.db")).parse_chapters_from_content(content)
+        assert len(chapters) == 2 and all(len(ch['content']) > 500 for ch in chapters)
+        assert "## 第三章" in content and "## 第四章" in content
+        assert response.usage.completion_tokens > 0
+
+        # 流式输出拼接后与非流式一致
+        stream = client.chat.completions.create(model="stub-model", messages=messages, stream=True)
+        streamed = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        assert streamed == content
+        print(f"✅ 正文输出可解析为 {len(chapters)} 章，流式输出一致")
+
+        config = {'llm': {'base_url': base_url, 'api_key': "stub", 'model': "stub-model"}}
+        dice = DiceOptionsManager(os.path.join(tempfile.mkdtemp(), "dice.db"))
+        options = dice._fetch_single_batch(config, "genres", 5)
+        assert len(options) == 5
+
+        try:
+            client.chat.completions.create(model="stub-model", messages=messages,
+                                           extra_headers={"X-Stub-Error": "500"})
+            assert False, "应返回 500"
+        except InternalServerError:
+            pass
+        print("✅ 骰子选项与错误注入正常")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # 按比例注入错误
+    server, base_url = _start_server(StubConfig(error_rate=1.0, seed=1))
+    try:
+        client = OpenAI(base_url=base_url, api_key="stub", max_retries=0)
+        try:
+            client.chat.completions.create(model="stub-model", messages=[{"role": "user", "content": "你好"}])
+            assert False, "应返回 500"
+        except InternalServerError:
+            pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_reuse():
+    """测试共享客户端：相同配置返回同一实例，多次请求复用同一个连接"""
+    print("=" * 50)
+    print("测试客户端复用")
+    print("=" * 50)
+
+    server, base_url = _start_server()
+    connections = []
+    process_request = server.process_request
+
+    def counting_process_request(request, client_address):
+        connections.append(client_address)
+        process_request(request, client_address)
+
+    server.process_request = counting_process_request
+    try:
+        config = {'llm': {'base_url': base_url, 'api_key': "stub", 'model': "stub-model"}}
+        client = client_from_config(config)
+        assert client is get_openai_client(base_url, "stub")
+        assert client is not get_openai_client(base_url, "other-key")
+
+        dice = DiceOptionsManager(os.path.join(tempfile.mkdtemp(), "dice.db"))
+        for _ in range(3):
+            assert len(dice._fetch_single_batch(config, "genres", 3)) == 3
+        assert len(connections) == 1, f"建立了 {len(connections)} 个连接"
+        print("✅ 3 次请求复用 1 个连接")
+    finally:
+        close_clients()
+        server.shutdown()
+        server.server_close()
+
+
+def test_agent_reuse():
+    """测试 Agent 工厂：同一线程内返回同一实例，其他线程各自构造"""
+    print("=" * 50)
+    print("测试 Agent 复用")
+    print("=" * 50)
+
+    class DummyAgents:
+        @reusable_agent
+        def writer(self):
+            return object()
+
+    agents = DummyAgents()
+    agent = agents.writer()
+    assert agents.writer() is agent and DummyAgents().writer() is agent
+    assert DummyAgents.writer.__name__ == "writer"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.extend([agents.writer(), agents.writer()]))
+    thread.start()
+    thread.join()
+    assert other[0] is other[1] and other[0] is not agent
+    print("✅ 同一线程复用 Agent，不同线程各自持有")
+
+
+if __name__ == "__main__":
+    test_stub_llm_server()
+    test_client_reuse()
+    test_agent_reuse()
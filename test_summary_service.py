@@ -0,0 +1,103 @@
+"""
+测试章节摘要与逐级汇总
+
+摘要生成替换为本地函数（不调用 LLM），验证待处理章节、汇总、过期重建与前情提要长度
+"""
+
+import os
+import tempfile
+
+from database import ChapterManager, ChapterSummaryManager, NovelManager
+from services.summary_service import SummaryService
+from utils.context_budget import count_tokens
+
+
+class FakeSummaryService(SummaryService):
+    """用正文开头代替 LLM 摘要"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.rollups = []
+
+    def _summarize_chapter(self, chapter_number, content):
+        return content[:40]
+
+    def _summarize_rollup(self, summaries, start_chapter, end_chapter, level_name):
+        self.rollups.append((start_chapter, end_chapter))
+        return f"{level_name}{start_chapter}-{end_chapter}：" + summaries[-60:]
+
+
+def _create_novel(db_path, num_chapters):
+    novel_id = NovelManager(db_path).save_novel("长篇", "主题", "大纲")
+    ChapterManager(db_path).create_chapters_bulk(novel_id, [
+        {'chapter_number': n, 'chapter_title': f"第{n}章",
+         'content': f"第{n}章正文：主角在第{n}个城镇遭遇新的对手，埋下伏笔{n}。" * 20}
+        for n in range(1, num_chapters + 1)
+    ])
+    return novel_id
+
+
+def test_summary_rollup():
+    """测试摘要生成、段落汇总与章节改写后的重建"""
+    print("=" * 50)
+    print("测试章节摘要与汇总")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "summary.db")
+    novel_id = _create_novel(db_path, 25)
+    service = FakeSummaryService(db_path)
+
+    result = service.update_summaries(novel_id)
+    assert result['chapters_summarized'] == 25 and result['rollups_updated'] == 2
+    assert service.rollups == [(1, 10), (11, 20)]
+    assert not ChapterSummaryManager(db_path).pending_chapters(novel_id)
+
+    # 已汇总的段落替代单章摘要，之后的章节逐章列出
+    digest = service.story_so_far(novel_id, 26)
+    assert "【第1-10章】" in digest and "【第11-20章】" in digest
+    assert "【第21章】" in digest and "【第25章】" in digest and "【第5章】" not in digest
+    assert "【第25章】" not in service.story_so_far(novel_id, 25)
+    print("✅ 25 章生成 2 个段落汇总，前情提要按层级拼接")
+
+    # 没有变化时不重复生成
+    service.rollups.clear()
+    assert service.update_summaries(novel_id)['chapters_summarized'] == 0 and not service.rollups
+
+    # 改写第 3 章：章节摘要过期，所在段落重新汇总
+    chapter_manager = ChapterManager(db_path)
+    chapter = next(c for c in chapter_manager.list_chapters(novel_id) if c['chapter_number'] == 3)
+    chapter_manager.update_chapter(chapter['id'], content="第3章改写：主角提前揭开了身世之谜。")
+    result = service.update_summaries(novel_id)
+    assert result['chapters_summarized'] == 1 and service.rollups == [(1, 10)]
+
+    # 删除第 5 章：章节摘要与不再完整的段落汇总被清理
+    chapter = next(c for c in chapter_manager.list_chapters(novel_id) if c['chapter_number'] == 5)
+    chapter_manager.delete_chapter(chapter['id'])
+    assert ChapterSummaryManager(db_path).prune(novel_id) == 2
+    assert "【第1-10章】" not in service.story_so_far(novel_id, 26)
+    print("✅ 改写、删除章节后只重建或清理相关摘要")
+
+
+def test_story_so_far_bounded():
+    """测试千章小说的前情提要长度有上限"""
+    print("=" * 50)
+    print("测试前情提要长度")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "summary.db")
+    novel_id = _create_novel(db_path, 1005)
+    service = FakeSummaryService(db_path)
+    service.update_summaries(novel_id)
+
+    levels = [s['level'] for s in ChapterSummaryManager(db_path).list_summaries(novel_id)]
+    assert levels.count('arc') == 100 and levels.count('volume') == 10
+
+    digest = service.story_so_far(novel_id, 1006)
+    assert count_tokens(digest) <= SummaryService.DIGEST_MAX_TOKENS
+    assert "【第1001章】" in digest and "【第1005章】" in digest
+    print(f"✅ 1005 章的前情提要 {count_tokens(digest)} token")
+
+
+if __name__ == "__main__":
+    test_summary_rollup()
+    test_story_so_far_bounded()
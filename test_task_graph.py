@@ -0,0 +1,165 @@
+"""
+测试 Crew 任务依赖图调度
+
+使用模拟任务（不调用 LLM），验证依赖推导、上下文拼接与并发执行
+"""
+
+import threading
+import time
+
+from services.task_graph import TaskGraph, CONTEXT_DIVIDER
+from utils.context_budget import count_tokens
+
+
+class FakeTask:
+    """模拟 CrewAI Task：只保留调度用到的属性"""
+
+    def __init__(self, name, context=None, agent=None):
+        self.name = name
+        self.context = context
+        self.agent = agent or object()
+        self.tools = []
+        self.output = None
+
+
+class FakeOutput:
+    def __init__(self, raw):
+        self.raw = raw
+
+
+def test_task_graph():
+    """测试写作 Crew 的任务结构：三个素材任务并发，关键路径缩短"""
+    print("=" * 50)
+    print("测试任务依赖图")
+    print("=" * 50)
+
+    plan = FakeTask("plan", context=[])
+    char = FakeTask("char", context=[plan])
+    scene = FakeTask("scene", context=[plan])
+    punch = FakeTask("punch", context=[plan])
+    writing = FakeTask("writing", context=[plan, char, scene, punch])
+    edit = FakeTask("edit", context=[writing])
+    graph = TaskGraph([plan, char, scene, punch, writing, edit])
+
+    assert graph.stages() == [[0], [1, 2, 3], [4], [5]]
+
+    contexts = {}
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def execute(task, context):
+        with lock:
+            active.append(task.name)
+            peak.append(len(active))
+        contexts[task.name] = context
+        time.sleep(0.1)
+        with lock:
+            active.remove(task.name)
+        return FakeOutput(f"<{task.name}>")
+
+    started = time.perf_counter()
+    result = graph.run(execute)
+    elapsed = time.perf_counter() - started
+
+    assert result.raw == "<edit>"
+    assert max(peak) == 3
+    assert elapsed < 0.5, f"并发执行耗时 {elapsed:.2f}s"
+    assert contexts["plan"] == ""
+    assert contexts["writing"] == CONTEXT_DIVIDER.join(["<plan>", "<char>", "<scene>", "<punch>"])
+    print(f"✅ 6 个任务分 {len(graph.stages())} 步完成，耗时 {elapsed:.2f}s")
+
+    # 未指定 context 的任务与 CrewAI 一致：依赖之前所有任务
+    first = FakeTask("first")
+    second = FakeTask("second")
+    assert TaskGraph([first, second]).stages() == [[0], [1]]
+
+    # 共用 Agent 的任务不会同时执行
+    agent = object()
+    shared = [FakeTask(f"shared-{i}", context=[], agent=agent) for i in range(3)]
+    active.clear()
+    peak.clear()
+    TaskGraph(shared).run(execute)
+    assert max(peak) == 1
+    print("✅ 依赖推导与 Agent 串行化正常")
+
+    # 上下文预算：多个上游输出合计超出时平均压缩
+    sources = [FakeTask(f"source-{i}", context=[]) for i in range(3)]
+    sink = FakeTask("sink", context=sources)
+    received = {}
+
+    def execute_long(task, context):
+        received[task.name] = context
+        return FakeOutput("素材内容。" * 500)
+
+    TaskGraph(sources + [sink], context_tokens=600, material_tasks=sources).run(execute_long)
+    assert count_tokens(received["sink"]) <= 600 + 3 * count_tokens(CONTEXT_DIVIDER)
+    assert received["sink"].count(CONTEXT_DIVIDER) == 2
+    print("✅ 上下文按预算压缩")
+
+    # 预算只作用于素材输出：长篇初稿完整传给批评与修订任务
+    draft = "".join(f"## 第{n}章 标题\n\n" + "他沿着山路走了很久，回头望向来时的方向。" * 150 + "\n\n"
+                    for n in range(1, 4))
+    plan = FakeTask("plan", context=[])
+    writing = FakeTask("writing", context=[plan])
+    critique = FakeTask("critique", context=[writing])
+    revision = FakeTask("revision", context=[writing, critique])
+    received.clear()
+
+    def execute_draft(task, context):
+        received[task.name] = context
+        if task.name == "writing":
+            return FakeOutput(draft)
+        return FakeOutput("素材内容。" * 2000)
+
+    TaskGraph([plan, writing, critique, revision], context_tokens=600,
+              material_tasks=[plan]).run(execute_draft)
+    assert count_tokens(received["writing"]) <= 600
+    assert received["critique"] == draft
+    assert received["revision"].startswith(draft + CONTEXT_DIVIDER)
+    print(f"✅ {len(draft)} 字初稿完整传给修订任务")
+
+
+def test_chapter_pipeline():
+    """测试多章流水线：后续章节的规划提前进行，只有初稿等待上一章修订"""
+    print("=" * 50)
+    print("测试多章流水线")
+    print("=" * 50)
+
+    agents = {name: object() for name in ("plan", "enrich", "writer", "critic", "edit")}
+    all_tasks = []
+    previous = None
+    for n in range(1, 6):
+        plan = FakeTask(f"plan-{n}", context=[previous['plan']] if previous else [], agent=agents["plan"])
+        enrich = FakeTask(f"enrich-{n}", context=[plan], agent=agents["enrich"])
+        writing_context = [plan, enrich] + ([previous['revision']] if previous else [])
+        writing = FakeTask(f"writing-{n}", context=writing_context, agent=agents["writer"])
+        critique = FakeTask(f"critique-{n}", context=[writing], agent=agents["critic"])
+        revision = FakeTask(f"revision-{n}", context=[writing, critique], agent=agents["writer"])
+        edit = FakeTask(f"edit-{n}", context=[revision], agent=agents["edit"])
+        previous = {'plan': plan, 'revision': revision}
+        all_tasks.extend([plan, enrich, writing, critique, revision, edit])
+
+    def execute(task, context):
+        time.sleep(0.05)
+        return FakeOutput(f"<{task.name}>")
+
+    finished = []
+
+    def on_task_done(index, output):
+        if all_tasks[index].name.startswith("edit-"):
+            finished.append(all_tasks[index].name)
+
+    started = time.perf_counter()
+    TaskGraph(all_tasks, max_workers=4).run(execute, on_task_done=on_task_done)
+    elapsed = time.perf_counter() - started
+
+    # 逐章执行需要 5 × 6 步；流水线只有写手工位（初稿 + 修订）串行
+    assert finished == [f"edit-{n}" for n in range(1, 6)]
+    assert elapsed < 0.05 * 30 * 0.85, f"流水线耗时 {elapsed:.2f}s"
+    print(f"✅ 5 章流水线耗时 {elapsed:.2f}s（逐章执行约 {0.05 * 30:.2f}s）")
+
+
+if __name__ == "__main__":
+    test_task_graph()
+    test_chapter_pipeline()
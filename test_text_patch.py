@@ -0,0 +1,97 @@
+"""
+测试修订、润色补丁的解析与应用
+"""
+
+import time
+from types import SimpleNamespace
+
+from utils.text_patch import apply_edits, parse_edits, patch_guardrail
+
+DRAFT = """## 第一章 雨夜
+
+沈砚秋推开客栈的门，雨水顺着斗笠滴落。
+
+掌柜抬头看了他一眼，又低头拨起了算盘。
+
+“一间上房。”沈砚秋说。
+
+## 第二章 古庙
+
+天亮时雨停了，他沿着山路走向古庙。
+"""
+
+
+def test_parse_and_apply():
+    """测试补丁解析、锚点定位与冲突处理"""
+    print("=" * 50)
+    print("测试补丁解析与应用")
+    print("=" * 50)
+
+    output = '说明文字\n```json\n{"edits": [{"anchor": "又低头拨起了算盘", "replacement": "又低头拨弄起算盘"}]}\n```'
+    assert parse_edits(output) == [{'anchor': "又低头拨起了算盘", 'replacement': "又低头拨弄起算盘"}]
+    assert parse_edits('[{"anchor": "雨停了", "replacement": null}]') == [{'anchor': "雨停了", 'replacement': ""}]
+    assert parse_edits(DRAFT) is None
+
+    result = apply_edits(DRAFT, [
+        {'anchor': "他沿着山路走向古庙。", 'replacement': "他踩着泥泞的山路走向古庙。"},
+        # 忽略空白差异
+        {'anchor': "雨水顺着 斗笠\n滴落", 'replacement': "雨水顺着斗笠不停滴落"},
+        # 不唯一、找不到、重叠的锚点跳过
+        {'anchor': "沈砚秋", 'replacement': "沈公子"},
+        {'anchor': "不存在的句子", 'replacement': "x"},
+        {'anchor': "山路走向", 'replacement': "x"},
+    ])
+    assert result.applied == 2 and len(result.failed) == 3
+    assert "雨水顺着斗笠不停滴落。" in result.text and "他踩着泥泞的山路走向古庙。" in result.text
+    assert result.text.count("沈砚秋") == 2
+    print("✅ 锚点定位、跳过无效修改正常")
+
+
+def test_guardrail():
+    """测试 guardrail：应用补丁、接受完整正文、无效补丁回退"""
+    print("=" * 50)
+    print("测试补丁 guardrail")
+    print("=" * 50)
+
+    source = SimpleNamespace(output=SimpleNamespace(raw=DRAFT))
+    guardrail = patch_guardrail(source)
+
+    ok, text = guardrail(SimpleNamespace(raw='{"edits": [{"anchor": "一间上房。", "replacement": "要一间上房。"}]}'))
+    assert ok and "“要一间上房。”" in text and text.startswith("## 第一章")
+    ok, text = guardrail(SimpleNamespace(raw='{"edits": []}'))
+    assert ok and text == DRAFT
+
+    # LLM 直接输出完整正文时采用
+    rewritten = DRAFT.replace("掌柜", "店家")
+    assert guardrail(SimpleNamespace(raw=rewritten)) == (True, rewritten)
+
+    # 删除章节标题、锚点大多无效时要求重新输出完整正文，再次失败时保留原文
+    ok, feedback = guardrail(SimpleNamespace(raw='{"edits": [{"anchor": "## 第二章 古庙", "replacement": ""}]}'))
+    assert not ok and "完整" in feedback
+    ok, text = guardrail(SimpleNamespace(raw='{"edits": [{"anchor": "找不到", "replacement": "x"}]}'))
+    assert ok and text == DRAFT
+    print("✅ 补丁应用、完整正文与回退正常")
+
+
+def test_patch_speed():
+    """测试应用耗时只随修改处数量增长"""
+    print("=" * 50)
+    print("测试补丁应用耗时")
+    print("=" * 50)
+
+    paragraphs = [f"第{i}段：他沿着山路走了很久，回头望向来时的方向。" for i in range(20000)]
+    draft = "## 第一章 长夜\n\n" + "\n\n".join(paragraphs)
+    edits = [{'anchor': f"第{i}段：他沿着山路", 'replacement': f"第{i}段：他踏着山路"} for i in range(0, 20000, 1000)]
+
+    started = time.perf_counter()
+    result = apply_edits(draft, edits)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert result.applied == len(edits) and not result.failed
+    assert elapsed_ms < 200, f"应用耗时 {elapsed_ms:.1f}ms"
+    print(f"✅ {len(draft)} 字正文应用 {len(edits)} 处修改耗时 {elapsed_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_parse_and_apply()
+    test_guardrail()
+    test_patch_speed()
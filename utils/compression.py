@@ -0,0 +1,160 @@
+"""
+正文压缩模块 - 为大字段提供可插拔的透明压缩
+
+压缩后的值以 BLOB 存储，格式为 MAGIC + 编码标记 + 编码私有头 + 压缩数据；
+未压缩的旧数据仍是 TEXT，读取时原样返回，因此新旧数据可以混存，无需一次性迁移。
+
+内置两种编码：
+- zlib：标准库实现，始终可用
+- zstd：需要安装 zstandard，可使用针对中文小说训练的字典，短章节的压缩率明显更高
+"""
+import struct
+import zlib
+from typing import Dict, List, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# 压缩值的前缀（UTF-8 文本不会以 0xFF 开头，不会与未压缩数据混淆）
+MAGIC = b"\xffC"
+
+# 小于该字节数的文本不压缩（压缩头和字典开销抵消收益）
+MIN_COMPRESS_SIZE = 256
+
+
+class Codec:
+    """压缩编码基类"""
+
+    name = ""
+    tag = b""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class ZlibCodec(Codec):
+    """zlib 编码（标准库）"""
+
+    name = "zlib"
+    tag = b"z"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec(Codec):
+    """zstd 编码，可选使用训练字典
+
+    编码私有头为 4 字节字典 ID（0 表示不使用字典），解压时按 ID 查找已注册的字典。
+    """
+
+    name = "zstd"
+    tag = b"s"
+
+    def __init__(self, level: int = 9):
+        if zstandard is None:
+            raise RuntimeError("需要安装 zstandard 库: pip install zstandard")
+        self.level = level
+        self._dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self.default_dict_id = 0
+
+    def add_dictionary(self, dict_id: int, data: bytes, make_default: bool = True):
+        """注册训练好的字典"""
+        self._dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+        if make_default:
+            self.default_dict_id = max(self.default_dict_id, dict_id)
+
+    def compress(self, data: bytes) -> bytes:
+        dict_id = self.default_dict_id
+        dictionary = self._dictionaries.get(dict_id)
+        compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        return struct.pack(">I", dict_id) + compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        dict_id = struct.unpack(">I", data[:4])[0]
+        dictionary = self._dictionaries.get(dict_id) if dict_id else None
+        if dict_id and dictionary is None:
+            raise ValueError(f"缺少 zstd 字典 #{dict_id}，无法解压")
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor.decompress(data[4:])
+
+
+_codecs: Dict[str, Codec] = {}
+_codecs_by_tag: Dict[bytes, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    """注册压缩编码（同名覆盖）"""
+    _codecs[codec.name] = codec
+    _codecs_by_tag[codec.tag] = codec
+
+
+def get_codec(name: str) -> Optional[Codec]:
+    """按名称获取编码，未注册或依赖缺失时返回 None"""
+    return _codecs.get(name)
+
+
+def zstd_available() -> bool:
+    """zstd 编码是否可用"""
+    return "zstd" in _codecs
+
+
+register_codec(ZlibCodec())
+if zstandard is not None:
+    register_codec(ZstdCodec())
+
+
+def compress_text(text: Optional[str], codec: str = "zlib") -> Union[str, bytes]:
+    """压缩文本
+
+    codec 为 'none'、编码不可用或文本过短时原样返回字符串。
+    """
+    text = text or ""
+    encoder = get_codec(codec)
+    data = text.encode("utf-8")
+    if encoder is None or len(data) < MIN_COMPRESS_SIZE:
+        return text
+    return MAGIC + encoder.tag + encoder.compress(data)
+
+
+def decompress_text(value: Union[str, bytes, None]) -> str:
+    """解压文本（未压缩的 TEXT 原样返回）"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode("utf-8")
+    tag = value[len(MAGIC):len(MAGIC) + 1]
+    decoder = _codecs_by_tag.get(tag)
+    if decoder is None:
+        if tag == ZstdCodec.tag:
+            raise RuntimeError("数据使用 zstd 压缩，需要安装 zstandard 库: pip install zstandard")
+        raise ValueError(f"未知的压缩编码标记: {tag!r}")
+    return decoder.decompress(value[len(MAGIC) + 1:]).decode("utf-8")
+
+
+def train_zstd_dictionary(samples: List[str], dict_size: int = 112640) -> Optional[bytes]:
+    """用已有正文训练 zstd 字典（zstandard 不可用或样本不足时返回 None）"""
+    if zstandard is None:
+        return None
+    encoded = [sample.encode("utf-8") for sample in samples if sample]
+    if len(encoded) < 8:
+        return None
+    try:
+        return zstandard.train_dictionary(dict_size, encoded).as_bytes()
+    except zstandard.ZstdError:
+        return None
@@ -0,0 +1,183 @@
+"""
+提示词上下文预算
+
+按 token 数（而不是字符数）裁剪注入提示词的企划书、大纲、上一章正文、素材等内容，
+使每次请求的输入长度有上限且可预估。
+
+- 计数：安装了 tiktoken 时使用模型对应的分词器，否则按字符类别估算
+  （中日韩字符约 1 token/字，英文单词约 4 字符/token）
+- 分配：每段内容有优先级、保底与上限。总量超出预算时，先把低优先级内容压缩到保底长度，
+  仍然超出则整段丢弃；剩余预算按优先级从高到低补足，同一优先级的内容平均分配
+
+预算在 config.yaml 中按模型配置：
+
+    context_budget:
+      default_tokens: 8000
+      models:
+        deepseek-chat: 16000
+"""
+import re
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# 未配置时注入提示词的上下文总预算（token）
+DEFAULT_CONTEXT_TOKENS = 8000
+
+TRUNCATED_HEAD = "\n...(内容已截断)"
+TRUNCATED_TAIL = "(前文略)...\n"
+
+_TOKEN_PATTERN = re.compile(
+    r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿　-〿＀-￯]"
+    r"|[A-Za-z]+|\d|[^\sA-Za-z\d]"
+)
+
+_encodings = {}
+
+
+def _get_encoding(model: Optional[str]):
+    """模型对应的 tiktoken 编码（未知模型使用 cl100k_base）"""
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except (KeyError, ValueError):
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """统计文本的 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum((len(piece) + 3) // 4 if piece[0].isascii() and piece[0].isalpha() else 1
+               for piece in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None, keep: str = "head") -> str:
+    """
+    把文本截断到 max_tokens 以内（含截断标记）
+
+    Args:
+        text: 原文
+        max_tokens: token 上限
+        model: 模型名称（决定分词器）
+        keep: head 保留开头，tail 保留结尾（如上一章正文，衔接只需要结尾）
+    """
+    if not text or count_tokens(text, model) <= max_tokens:
+        return text or ""
+    marker = TRUNCATED_HEAD if keep == "head" else TRUNCATED_TAIL
+    limit = max_tokens - count_tokens(marker, model)
+    if limit <= 0:
+        return ""
+
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        kept = encoding.decode(tokens[:limit] if keep == "head" else tokens[-limit:])
+    else:
+        # 估算分词不可逆，二分查找保留的字符数
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            piece = text[:mid] if keep == "head" else text[-mid:]
+            if count_tokens(piece, model) <= limit:
+                low = mid
+            else:
+                high = mid - 1
+        kept = text[:low] if keep == "head" else text[len(text) - low:]
+    return kept + marker if keep == "head" else marker + kept
+
+
+def model_context_budget(config: Optional[Dict], model: Optional[str] = None) -> int:
+    """读取模型的上下文预算（config.yaml 中 context_budget 段）"""
+    budget_config = (config or {}).get("context_budget") or {}
+    models = budget_config.get("models") or {}
+    if model and model in models:
+        return int(models[model])
+    return int(budget_config.get("default_tokens", DEFAULT_CONTEXT_TOKENS))
+
+
+class ContextBudget:
+    """在多段上下文之间分配 token 预算"""
+
+    def __init__(self, total_tokens: int, model: Optional[str] = None):
+        """
+        Args:
+            total_tokens: 所有内容合计的 token 上限
+            model: 模型名称（决定分词器）
+        """
+        self.total_tokens = total_tokens
+        self.model = model
+        self.sections: List[Dict] = []
+
+    @classmethod
+    def for_model(cls, config: Optional[Dict], model: Optional[str] = None) -> "ContextBudget":
+        """按 config.yaml 中该模型的预算创建"""
+        return cls(model_context_budget(config, model), model)
+
+    def add(self, name: str, text: str, priority: int = 1, min_tokens: int = 0,
+            max_tokens: Optional[int] = None, keep: str = "head") -> "ContextBudget":
+        """
+        添加一段内容
+
+        Args:
+            name: 名称（allocate 结果的键）
+            text: 内容
+            priority: 优先级，数值越大越重要，预算不足时最后被压缩
+            min_tokens: 保底长度，压缩时至少保留这么多（预算仍不足则整段丢弃）
+            max_tokens: 单段上限（预算充足时也不超过）
+            keep: 截断时保留开头（head）还是结尾（tail）
+        """
+        tokens = count_tokens(text, self.model)
+        if max_tokens is not None:
+            tokens = min(tokens, max_tokens)
+        self.sections.append({
+            'name': name, 'text': text or "", 'priority': priority, 'tokens': tokens,
+            'min_tokens': min(min_tokens, tokens), 'keep': keep,
+        })
+        return self
+
+    def _allocations(self) -> List[int]:
+        """每段分到的 token 数"""
+        allocations = [s['min_tokens'] for s in self.sections]
+        # 保底长度合计仍超出预算：从最低优先级（同级后添加的先）开始整段丢弃
+        drop_order = sorted(range(len(self.sections)), key=lambda i: (self.sections[i]['priority'], -i))
+        for i in drop_order:
+            if sum(allocations) <= self.total_tokens:
+                break
+            allocations[i] = 0
+            self.sections[i]['dropped'] = True
+
+        remaining = self.total_tokens - sum(allocations)
+        for priority in sorted({s['priority'] for s in self.sections}, reverse=True):
+            group = [i for i, s in enumerate(self.sections)
+                     if s['priority'] == priority and not s.get('dropped')]
+            # 同一优先级平均分配：需求小的先满足，余量再分给其余内容
+            group.sort(key=lambda i: self.sections[i]['tokens'] - allocations[i])
+            for n, i in enumerate(group):
+                share = remaining // (len(group) - n)
+                extra = min(self.sections[i]['tokens'] - allocations[i], share)
+                allocations[i] += extra
+                remaining -= extra
+        return allocations
+
+    def allocate(self) -> Dict[str, str]:
+        """按预算裁剪各段内容，返回 {名称: 裁剪后的内容}（被丢弃的内容为空字符串）"""
+        for section in self.sections:
+            section.pop('dropped', None)
+        result = {}
+        for section, allocation in zip(self.sections, self._allocations()):
+            if allocation <= 0:
+                result[section['name']] = ""
+            else:
+                result[section['name']] = truncate_tokens(section['text'], allocation, self.model, section['keep'])
+        return result
@@ -1,10 +1,60 @@
 """
 导出功能模块 - 支持多种格式导出小说
 """
-from typing import List, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import hashlib
+import importlib.util
+import json
 import re
 
 
+# 章节 HTML 渲染规则变化时递增，使已缓存的渲染结果失效
+RENDER_VERSION = 1
+
+
+def render_chapter_html(content: str, renderer: str = "epub") -> str:
+    """把单章正文渲染为 HTML 片段（可在进程池中并行执行，因此为模块级函数）
+
+    renderer 为 epub 时按 Markdown 转换，为 pdf 时按段落生成 <p>。
+    """
+    content = content or ""
+    if renderer == "pdf":
+        return '\n'.join(f'<p>{para.strip()}</p>' for para in content.split('\n') if para.strip())
+    return ExportManager._markdown_to_html(content)
+
+
+def render_cache_key(renderer: str) -> str:
+    """渲染结果的缓存标识（渲染方式、规则版本以及是否使用 markdown 库都会影响输出）"""
+    engine = "markdown" if importlib.util.find_spec("markdown") else "plain"
+    return f"{renderer}:{RENDER_VERSION}:{engine}"
+
+
+def export_fingerprint(novel: Dict, items: List[Dict], kind: str,
+                       options: Optional[Dict[str, Any]] = None) -> str:
+    """计算导出内容指纹（导出文件缓存的键）
+
+    items 为章节或大纲段列表（无需包含正文）：章节取正文哈希，其余字段取全部标量值，
+    任何影响导出结果的改动都会使指纹变化。
+    """
+    def item_key(item: Dict):
+        if 'content_hash' in item:
+            fields = ('id', 'chapter_number', 'chapter_title', 'content_hash', 'outline')
+            return [item.get(field) for field in fields] + (
+                [] if item.get('content_hash') else [str(item.get('updated_at'))]
+            )
+        return sorted((k, str(v)) for k, v in item.items())
+
+    payload = {
+        'novel': [novel.get('id'), novel.get('title'), str(novel.get('created_at'))],
+        'kind': kind,
+        'options': options or {},
+        'render_version': RENDER_VERSION,
+        'items': [item_key(item) for item in items],
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
 def _outline_segments_to_lines(title: str, segments: List[Dict], as_markdown: bool) -> List[str]:
     """将大纲段列表格式化为文本行。segments 每项含 start_chapter, end_chapter, title, summary。"""
     lines = []
@@ -33,20 +83,22 @@ class ExportManager:
     """导出管理器"""
     
     @staticmethod
-    def export_to_markdown(title: str, chapters: List[Dict], 
-                          include_outline: bool = False,
-                          metadata: Optional[Dict] = None) -> str:
+    def iter_markdown(title: str, chapters: Iterable[Dict],
+                      include_outline: bool = False,
+                      metadata: Optional[Dict] = None) -> Iterator[str]:
         """
-        导出为 Markdown 格式
+        逐章生成 Markdown 文本块（拼接结果与 export_to_markdown 相同）
+        
+        chapters 可以是逐章读取数据库的生成器，内存占用只与单章大小有关。
         
         Args:
             title: 小说标题
-            chapters: 章节列表
+            chapters: 章节列表或可迭代对象
             include_outline: 是否包含大纲
             metadata: 元数据信息
         
-        Returns:
-            Markdown 格式的文本
+        Yields:
+            Markdown 文本块
         """
         lines = []
         
@@ -68,6 +120,7 @@ class ExportManager:
         # 标题
         lines.append(f"# {title}")
         lines.append("")
+        yield '\n'.join(lines)
         
         # 章节内容
         for chapter in chapters:
@@ -76,8 +129,7 @@ class ExportManager:
             outline = chapter.get('outline', '')
             
             # 章节标题
-            lines.append(f"## {chapter_title}")
-            lines.append("")
+            lines = [f"## {chapter_title}", ""]
             
             # 大纲（如果需要）
             if include_outline and outline:
@@ -91,29 +143,42 @@ class ExportManager:
             lines.append(content.strip())
             lines.append("")
             lines.append("")
-        
-        return '\n'.join(lines)
+            yield '\n' + '\n'.join(lines)
     
     @staticmethod
-    def export_to_txt(title: str, chapters: List[Dict],
-                     include_outline: bool = False) -> str:
+    def export_to_markdown(title: str, chapters: Iterable[Dict], 
+                          include_outline: bool = False,
+                          metadata: Optional[Dict] = None) -> str:
         """
-        导出为纯文本格式
+        导出为 Markdown 格式
         
         Args:
             title: 小说标题
             chapters: 章节列表
             include_outline: 是否包含大纲
+            metadata: 元数据信息
         
         Returns:
-            纯文本格式
+            Markdown 格式的文本
         """
-        lines = []
+        return ''.join(ExportManager.iter_markdown(title, chapters, include_outline, metadata))
+    
+    @staticmethod
+    def iter_txt(title: str, chapters: Iterable[Dict],
+                 include_outline: bool = False) -> Iterator[str]:
+        """
+        逐章生成纯文本块（拼接结果与 export_to_txt 相同）
+        
+        Args:
+            title: 小说标题
+            chapters: 章节列表或可迭代对象
+            include_outline: 是否包含大纲
         
+        Yields:
+            纯文本块
+        """
         # 标题
-        lines.append(title)
-        lines.append("=" * len(title))
-        lines.append("")
+        yield '\n'.join([title, "=" * len(title), ""])
         
         # 章节内容
         for chapter in chapters:
@@ -122,9 +187,7 @@ class ExportManager:
             outline = chapter.get('outline', '')
             
             # 章节标题
-            lines.append(chapter_title)
-            lines.append("-" * len(chapter_title))
-            lines.append("")
+            lines = [chapter_title, "-" * len(chapter_title), ""]
             
             # 大纲（如果需要）
             if include_outline and outline:
@@ -139,8 +202,40 @@ class ExportManager:
             lines.append(content_plain.strip())
             lines.append("")
             lines.append("")
+            yield '\n' + '\n'.join(lines)
+    
+    @staticmethod
+    def export_to_txt(title: str, chapters: Iterable[Dict],
+                     include_outline: bool = False) -> str:
+        """
+        导出为纯文本格式
         
-        return '\n'.join(lines)
+        Args:
+            title: 小说标题
+            chapters: 章节列表
+            include_outline: 是否包含大纲
+        
+        Returns:
+            纯文本格式
+        """
+        return ''.join(ExportManager.iter_txt(title, chapters, include_outline))
+    
+    @staticmethod
+    def write_to_file(chunks: Iterable[str], output_path: str) -> str:
+        """
+        把逐块生成的文本写入文件（UTF-8），边生成边写入
+        
+        Args:
+            chunks: iter_markdown / iter_txt 等生成的文本块
+            output_path: 输出文件路径
+        
+        Returns:
+            输出文件路径
+        """
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return output_path
     
     @staticmethod
     def _remove_markdown(text: str) -> str:
@@ -169,7 +264,8 @@ class ExportManager:
     @staticmethod
     def export_to_epub(title: str, chapters: List[Dict],
                       metadata: Optional[Dict] = None,
-                      output_path: str = "novel.epub") -> bool:
+                      output_path: str = "novel.epub",
+                      rendered_html: Optional[List[str]] = None) -> bool:
         """
         导出为 EPUB 格式
         
@@ -178,6 +274,7 @@ class ExportManager:
             chapters: 章节列表
             metadata: 元数据
             output_path: 输出文件路径
+            rendered_html: 已渲染的各章 HTML（与 chapters 一一对应，None 时逐章现场转换）
         
         Returns:
             是否成功
@@ -192,7 +289,7 @@ class ExportManager:
         book = epub.EpubBook()
         
         # 设置元数据
-        book.set_identifier(f'novel_{metadata.get("id", "unknown")}')
+        book.set_identifier(f'novel_{(metadata or {}).get("id", "unknown")}')
         book.set_title(title)
         book.set_language('zh')
         
@@ -217,7 +314,10 @@ class ExportManager:
             )
             
             # 设置章节内容（转换 Markdown 到 HTML）
-            html_content = ExportManager._markdown_to_html(content)
+            if rendered_html is not None:
+                html_content = rendered_html[idx - 1]
+            else:
+                html_content = render_chapter_html(content, "epub")
             epub_chapter.content = f'<h1>{chapter_title}</h1>{html_content}'
             
             book.add_item(epub_chapter)
@@ -283,7 +383,8 @@ class ExportManager:
     @staticmethod
     def export_to_pdf(title: str, chapters: List[Dict],
                      metadata: Optional[Dict] = None,
-                     output_path: str = "novel.pdf") -> bool:
+                     output_path: str = "novel.pdf",
+                     rendered_html: Optional[List[str]] = None) -> bool:
         """
         导出为 PDF 格式
         
@@ -292,6 +393,7 @@ class ExportManager:
             chapters: 章节列表
             metadata: 元数据
             output_path: 输出文件路径
+            rendered_html: 已渲染的各章 HTML（与 chapters 一一对应，None 时逐章现场转换）
         
         Returns:
             是否成功
@@ -304,7 +406,7 @@ class ExportManager:
             return False
         
         # 生成 HTML 内容
-        html_content = ExportManager._generate_pdf_html(title, chapters, metadata)
+        html_content = ExportManager._generate_pdf_html(title, chapters, metadata, rendered_html)
         
         # CSS 样式
         css_content = '''
@@ -353,7 +455,8 @@ class ExportManager:
     
     @staticmethod
     def _generate_pdf_html(title: str, chapters: List[Dict], 
-                          metadata: Optional[Dict] = None) -> str:
+                          metadata: Optional[Dict] = None,
+                          rendered_html: Optional[List[str]] = None) -> str:
         """生成用于 PDF 的 HTML 内容"""
         lines = ['<!DOCTYPE html>', '<html lang="zh">', '<head>',
                 '<meta charset="UTF-8">', '</head>', '<body>']
@@ -377,13 +480,13 @@ class ExportManager:
             chapter_title = chapter.get('chapter_title', f"第{chapter.get('chapter_number', '?')}章")
             lines.append(f'<h2>{chapter_title}</h2>')
             
-            content = chapter.get('content', '')
             # 转换段落
-            paragraphs = content.split('\n')
-            for para in paragraphs:
-                para = para.strip()
-                if para:
-                    lines.append(f'<p>{para}</p>')
+            if rendered_html is not None:
+                paragraphs_html = rendered_html[idx]
+            else:
+                paragraphs_html = render_chapter_html(chapter.get('content', ''), "pdf")
+            if paragraphs_html:
+                lines.append(paragraphs_html)
             
             lines.append('</div>')
         
@@ -0,0 +1,220 @@
+"""
+正文格式整理（本地规则）
+
+按格式编辑的规则在本地整理小说正文，结果确定、耗时为毫秒级，替代由 LLM 重新输出全文的格式编辑步骤：
+- 标题层级：章节标题统一为「## 第X章 标题」，其余标题降为 ###（内心独白等更深层级为 ####），
+  避免被章节解析误认为新的一章
+- 段落：每段之间空一行；超过 160 字的段落在句末（引号外）拆分为 60~140 字的段落，
+  不足 40 字的叙述段与相邻的短叙述段合并（对话、强调、标题不合并）
+- 标点：引号统一为中文引号，中文语境中的半角标点改为全角，省略号、破折号规范化
+- 每章末尾加 ---
+"""
+import math
+import re
+from typing import List, Optional
+
+PARAGRAPH_MIN = 40
+PARAGRAPH_MAX = 140
+# 超过该长度才拆分（对话、战斗等段落可以略长）
+SPLIT_THRESHOLD = 160
+
+SEPARATOR = "---"
+
+_CN_DIGITS = "零一二三四五六七八九"
+_CN_NUMERAL = "零〇一二两三四五六七八九十百千"
+
+_CHAPTER_HEADING = re.compile(
+    rf"^(?:#{{1,6}}\s*)?第\s*([{_CN_NUMERAL}\d]+)\s*章(?:\s*[：:、.．\-—]\s*|\s+|(?=\S)|$)(.*)$"
+)
+_HEADING = re.compile(r"^(#{1,6})\s*(.+?)\s*#*$")
+_SEPARATOR_LINE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+_CODE_FENCE = re.compile(r"^\s*```")
+
+_CJK = "㐀-鿿豈-﫿“”‘’「」『』（）《》"
+_HALF_TO_FULL = {',': '，', '?': '？', '!': '！', ':': '：', ';': '；', '(': '（', ')': '）'}
+# 句末：句号、问号、叹号、省略号，连同紧随的右引号、右括号
+_SENTENCE_END = re.compile(r"[。！？!?…]+[”’」』）)]*")
+
+
+def to_chinese_numeral(num: int) -> str:
+    """阿拉伯数字转汉字数字（1~9999，如 21 -> 二十一，105 -> 一百零五）"""
+    if num <= 0 or num >= 10000:
+        return str(num)
+    units = ["", "十", "百", "千"]
+    digits = [int(d) for d in str(num)]
+    result = ""
+    zero = False
+    for i, digit in enumerate(digits):
+        unit = units[len(digits) - 1 - i]
+        if digit == 0:
+            zero = bool(result)
+            continue
+        if zero:
+            result += "零"
+            zero = False
+        result += _CN_DIGITS[digit] + unit
+    # 十几 不写作 一十几
+    return result[1:] if result.startswith("一十") else result
+
+
+def normalize_punctuation(text: str) -> str:
+    """统一中文语境下的标点与引号"""
+    text = text.replace("「", "“").replace("」", "”").replace("『", "‘").replace("』", "’")
+    # 英文直引号按出现顺序交替为左右引号
+    parts = text.split('"')
+    if len(parts) > 1:
+        text = parts[0] + "".join(("“" if i % 2 else "”") + part for i, part in enumerate(parts[1:], start=1))
+    text = re.sub(r"\.{3,}|。{2,}|(?<!…)…(?!…)", "……", text)
+    text = re.sub(r"……(?:……)+", "……", text)
+    text = re.sub(r"(?<!-)-{2,}(?!-)|(?<!—)—(?!—)", "——", text)
+    # 中文后的半角句点改为句号（不影响小数与英文缩写）
+    text = re.sub(rf"(?<=[{_CJK}])\.(?=[{_CJK}]|$)", "。", text)
+    # 与中文相邻的半角标点改为全角
+    return re.sub(
+        rf"(?<=[{_CJK}])\s*([,?!:;()])|([,?!:;()])\s*(?=[{_CJK}])",
+        lambda m: _HALF_TO_FULL[m.group(1) or m.group(2)],
+        text
+    )
+
+
+def is_dialogue(paragraph: str) -> bool:
+    """对话段落：含引号，或以「**角色名：**」开头"""
+    return "“" in paragraph or bool(re.match(r"^\*\*[^*]{1,20}[：:]\*\*", paragraph))
+
+
+def is_emphasis(paragraph: str) -> bool:
+    """整段强调（内心独白、喊话等）"""
+    return bool(re.fullmatch(r"\*{1,2}[^*].*[^*]?\*{1,2}", paragraph))
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    """按句末标点切分句子（引号内的句末不切分）"""
+    sentences = []
+    start = 0
+    depth = 0
+    pos = 0
+    while pos < len(paragraph):
+        char = paragraph[pos]
+        if char in "“‘":
+            depth += 1
+        elif char in "”’" and depth:
+            depth -= 1
+        match = _SENTENCE_END.match(paragraph, pos)
+        if match and match.group(0)[0] == char:
+            end = match.end()
+            depth -= sum(1 for c in match.group(0) if c in "”’") if depth else 0
+            depth = max(depth, 0)
+            if depth == 0:
+                sentences.append(paragraph[start:end])
+                start = end
+            pos = end
+            continue
+        pos += 1
+    if start < len(paragraph):
+        sentences.append(paragraph[start:])
+    return [s for s in sentences if s.strip()]
+
+
+def split_paragraph(paragraph: str) -> List[str]:
+    """把过长的段落在句末拆成长度接近的若干段"""
+    if len(paragraph) <= SPLIT_THRESHOLD:
+        return [paragraph]
+    sentences = split_sentences(paragraph)
+    if len(sentences) <= 1:
+        return [paragraph]
+    target = len(paragraph) / math.ceil(len(paragraph) / PARAGRAPH_MAX)
+    parts = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) > max(target, PARAGRAPH_MIN) \
+                and len(current) + len(sentence) / 2 > target:
+            parts.append(current)
+            current = ""
+        current += sentence
+    if current:
+        # 末尾过短的一句并入上一段
+        if parts and len(current) < PARAGRAPH_MIN and len(parts[-1]) + len(current) <= SPLIT_THRESHOLD:
+            parts[-1] += current
+        else:
+            parts.append(current)
+    return parts
+
+
+def _mergeable(paragraph: str) -> bool:
+    return not (paragraph.startswith("#") or paragraph == SEPARATOR
+                or is_dialogue(paragraph) or is_emphasis(paragraph))
+
+
+def _normalize_heading(line: str, chapter_mode: bool, use_chinese_numerals: bool) -> Optional[str]:
+    """标题行规范化；不是标题时返回 None"""
+    chapter = _CHAPTER_HEADING.match(line)
+    if chapter and (line.startswith("#") or len(line) <= 40):
+        number, title = chapter.group(1), chapter.group(2).strip().strip("*").strip()
+        if use_chinese_numerals and number.isdigit():
+            number = to_chinese_numeral(int(number))
+        return f"## 第{number}章 {title}".rstrip()
+
+    heading = _HEADING.match(line)
+    if not heading:
+        return None
+    level = len(heading.group(1))
+    text = heading.group(2)
+    if level >= 4:
+        return f"#### {text}"
+    if chapter_mode or level == 3:
+        return f"### {text}"
+    return f"{heading.group(1)} {text}"
+
+
+def format_novel_text(content: str, use_chinese_numerals: bool = True) -> str:
+    """
+    按格式编辑规则整理小说正文（可包含多章）
+
+    Args:
+        content: 正文（Markdown）
+        use_chinese_numerals: 章节标题使用汉字数字
+
+    Returns:
+        整理后的正文，只改变格式，不增删内容
+    """
+    if not content or not content.strip():
+        return content or ""
+    lines = [line.strip() for line in content.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    lines = [line for line in lines if not _CODE_FENCE.match(line)]
+    chapter_mode = any(_CHAPTER_HEADING.match(line) for line in lines if line)
+
+    blocks: List[str] = []
+    for line in lines:
+        if not line:
+            continue
+        if _SEPARATOR_LINE.match(line):
+            # 分章模式下分隔线统一在每章末尾重新生成
+            if not chapter_mode:
+                blocks.append(SEPARATOR)
+            continue
+        heading = _normalize_heading(line, chapter_mode, use_chinese_numerals)
+        if heading is not None:
+            if heading.startswith("## ") and chapter_mode:
+                # 每章末尾加分隔线（第一章之前不加）
+                if any(b.startswith("## ") for b in blocks):
+                    blocks.append(SEPARATOR)
+            blocks.append(heading)
+            continue
+        blocks.extend(split_paragraph(normalize_punctuation(line)))
+
+    # 合并连续的过短叙述段（不并入相邻的正常段落）
+    merged: List[str] = []
+    short_run = False
+    for block in blocks:
+        short = _mergeable(block) and len(block) < PARAGRAPH_MIN
+        if short and short_run and len(merged[-1]) + len(block) <= PARAGRAPH_MAX:
+            merged[-1] += block
+            continue
+        merged.append(block)
+        short_run = short
+
+    if chapter_mode:
+        merged.append(SEPARATOR)
+    # 去掉重复的分隔线
+    result = [b for i, b in enumerate(merged) if not (b == SEPARATOR and i and merged[i - 1] == SEPARATOR)]
+    return "\n\n".join(result) + "\n"
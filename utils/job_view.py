@@ -0,0 +1,80 @@
+"""
+后台任务状态展示（Streamlit 页面共用）
+
+页面按 scope 查找最新任务：未完成时显示进度并定时刷新，完成后返回一次结果，
+页面据此提示成功或失败。任务状态保存在数据库中，刷新页面后仍能继续跟踪。
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+import streamlit as st
+
+from database import JobConflictError
+
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def is_job_active(job: Optional[Dict]) -> bool:
+    """任务是否仍在排队或执行中"""
+    return bool(job) and job['status'] in ACTIVE_STATUSES
+
+
+def submit_job(job_service, job_type: str, scope: str, **params) -> bool:
+    """
+    提交后台任务；scope 下已有参数不同的未完成任务时提示用户并拒绝提交
+
+    Returns:
+        是否已提交（或已有相同的任务在执行）
+    """
+    try:
+        job_service.submit(job_type, scope=scope, **params)
+        return True
+    except JobConflictError as e:
+        st.warning(f"⚠️ {e}")
+        return False
+
+
+def follow_job(job_service, scope: str, label: str = "任务", poll_interval: float = 2.0) -> Optional[Dict]:
+    """
+    跟踪 scope 下最新的任务
+
+    Args:
+        job_service: JobService 实例
+        scope: 提交任务时使用的 scope
+        label: 进度条前的任务名称
+        poll_interval: 轮询间隔（秒）
+
+    Returns:
+        刚结束且尚未展示过的任务（每个任务只返回一次），其余情况返回 None
+    """
+    job = job_service.latest_job(scope)
+    if not job or job.get('seen_at'):
+        return None
+
+    if is_job_active(job):
+        # 任务在后台执行：只局部刷新进度，结束后整页重跑以读取最新数据
+        @st.fragment(run_every=poll_interval)
+        def _poll():
+            current = job_service.get_job(job['id'])
+            if not is_job_active(current):
+                st.rerun(scope="app")
+            started = current.get('started_at') or current.get('created_at')
+            elapsed = ""
+            if started:
+                seconds = int((datetime.now() - datetime.fromisoformat(str(started))).total_seconds())
+                elapsed = f"（已用时 {seconds // 60} 分 {seconds % 60} 秒）"
+            st.progress(
+                min(max(current.get('progress') or 0.0, 0.0), 1.0),
+                text=f"⏳ {label}：{current.get('message') or ''}{elapsed}"
+            )
+            if current['status'] == 'queued' and st.button("取消", key=f"cancel_job_{current['id']}"):
+                job_service.cancel(current['id'])
+                st.rerun(scope="app")
+
+        _poll()
+        return None
+
+    job_service.mark_seen(job['id'])
+    return job
@@ -0,0 +1,241 @@
+"""
+本地检索索引
+
+在已写章节中查找与待写内容相关的片段（人物、道具、伏笔的前文），全部在本地完成，不依赖网络：
+- BM25Index：按中文二元组（bigram）与英文单词建立倒排索引，支持增量添加与删除
+- HashingVectorIndex：把 n-gram 哈希到固定维度的向量做余弦相似度（需要安装 numpy）
+
+两者都可用时按倒数排名融合（RRF）合并结果。
+"""
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+_WORD = re.compile(r"[A-Za-z]+|\d+")
+
+# 片段长度（字符），按段落合并到接近该长度
+PASSAGE_SIZE = 400
+# 查询只使用区分度最高的若干个词，长查询的耗时保持在毫秒级
+MAX_QUERY_TERMS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为检索词：中日韩文字取二元组（单字成词时取单字），英文与数字取整词"""
+    if not text:
+        return []
+    terms = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    terms.extend(word.lower() for word in _WORD.findall(text))
+    return terms
+
+
+def split_passages(content: str, size: int = PASSAGE_SIZE) -> List[str]:
+    """按段落把正文合并为长度接近 size 的片段（超长段落按长度切开）"""
+    passages = []
+    current = ""
+    for paragraph in (p.strip() for p in (content or "").split("\n")):
+        if not paragraph:
+            continue
+        while len(paragraph) > size:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(paragraph[:size])
+            paragraph = paragraph[size:]
+        if current and len(current) + len(paragraph) + 1 > size:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+class BM25Index:
+    """BM25 倒排索引（文档可增量添加、删除）"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_terms: Dict[int, Counter] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: int, text: str):
+        """添加文档（已存在时先删除旧内容）"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: int):
+        """删除文档"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """
+        检索与查询最相关的文档
+
+        Args:
+            query: 查询文本
+            k: 返回数量
+            allowed: 只在这些文档中检索（None 表示全部）
+
+        Returns:
+            [(文档 ID, 分数)]，按分数从高到低
+        """
+        if not self.doc_lengths:
+            return []
+        query_terms = Counter(t for t in tokenize(query) if t in self.postings)
+        # 只保留区分度最高的词（出现在大多数片段中的词对排序几乎没有贡献，却最耗时）
+        weighted = sorted(((self._idf(t) * (1 + math.log(tf)), t) for t, tf in query_terms.items()), reverse=True)
+        allowed = set(allowed) if allowed is not None else None
+        avg_length = self.total_length / len(self.doc_lengths)
+        scores: Dict[int, float] = defaultdict(float)
+        for _, term in weighted[:MAX_QUERY_TERMS]:
+            idf = self._idf(term)
+            for doc_id, tf in self.postings[term].items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HashingVectorIndex:
+    """哈希向量索引：n-gram 经 crc32 哈希到固定维度，按余弦相似度检索（需要 numpy）"""
+
+    def __init__(self, dim: int = 1024):
+        if np is None:
+            raise ImportError("HashingVectorIndex 需要安装 numpy")
+        self.dim = dim
+        self.rows: Dict[int, int] = {}
+        self._vectors: List = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._doc_ids = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def embed(self, text: str):
+        """文本向量（L2 归一化）"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, tf in Counter(tokenize(text)).items():
+            h = zlib.crc32(term.encode("utf-8"))
+            vector[h % self.dim] += (1.0 if h & 0x80000000 else -1.0) * (1 + math.log(tf))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, doc_id: int, text: str):
+        """添加文档（已存在时覆盖）"""
+        if doc_id in self.rows:
+            self._vectors[self.rows[doc_id]] = self.embed(text)
+        else:
+            self.rows[doc_id] = len(self._vectors)
+            self._vectors.append(self.embed(text))
+        self._matrix = None
+
+    def remove(self, doc_id: int):
+        """删除文档（向量置零，不再参与排序）"""
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self._vectors[row] = None
+            self._matrix = None
+
+    def _ensure_matrix(self):
+        if self._matrix is None:
+            live = [(doc_id, self._vectors[row]) for doc_id, row in self.rows.items()]
+            # 删除过的行不再保留，重新编号
+            self._vectors = [vector for _, vector in live]
+            self.rows = {doc_id: i for i, (doc_id, _) in enumerate(live)}
+            self._matrix = np.vstack(self._vectors) if live else np.zeros((0, self.dim), dtype=np.float32)
+            self._doc_ids = np.array([doc_id for doc_id, _ in live], dtype=np.int64)
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """按余弦相似度检索，参数与返回值同 BM25Index.search"""
+        self._ensure_matrix()
+        if not len(self._doc_ids):
+            return []
+        scores = self._matrix @ self.embed(query)
+        if allowed is not None:
+            mask = np.isin(self._doc_ids, np.fromiter(allowed, dtype=np.int64))
+            scores = np.where(mask, scores, -np.inf)
+        top = np.argsort(-scores)[:k]
+        return [(int(self._doc_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
+
+
+class PassageIndex:
+    """片段检索：BM25 与（可选的）哈希向量索引的组合"""
+
+    # 倒数排名融合的平滑常数
+    RRF_K = 60
+
+    def __init__(self, use_vectors: Optional[bool] = None):
+        """
+        Args:
+            use_vectors: 是否同时使用向量索引，默认在安装了 numpy 时启用
+        """
+        self.bm25 = BM25Index()
+        use_vectors = np is not None if use_vectors is None else use_vectors
+        self.vectors = HashingVectorIndex() if use_vectors else None
+
+    def __len__(self) -> int:
+        return len(self.bm25)
+
+    def add(self, doc_id: int, text: str):
+        self.bm25.add(doc_id, text)
+        if self.vectors is not None:
+            self.vectors.add(doc_id, text)
+
+    def remove(self, doc_id: int):
+        self.bm25.remove(doc_id)
+        if self.vectors is not None:
+            self.vectors.remove(doc_id)
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Iterable[int]] = None) -> List[int]:
+        """返回最相关的文档 ID 列表"""
+        allowed = list(allowed) if allowed is not None else None
+        bm25_hits = self.bm25.search(query, k * 3, allowed)
+        if self.vectors is None:
+            return [doc_id for doc_id, _ in bm25_hits[:k]]
+        fused: Dict[int, float] = defaultdict(float)
+        for hits in (bm25_hits, self.vectors.search(query, k * 3, allowed)):
+            for rank, (doc_id, _) in enumerate(hits):
+                fused[doc_id] += 1.0 / (self.RRF_K + rank + 1)
+        return [doc_id for doc_id, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]]
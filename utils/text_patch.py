@@ -0,0 +1,160 @@
+"""
+正文补丁（修订、润色只输出修改处）
+
+修订与润色通常只改动少数句子，让 LLM 重新输出整章正文既慢又贵。补丁模式下 LLM 只输出
+编辑操作（锚点原文 → 替换文本），在本地应用到上游正文上，耗时随修改处数量而不是章节长度增长：
+
+    {"edits": [{"anchor": "原文中逐字摘录的片段", "replacement": "替换后的文本"}]}
+
+锚点必须在原文中唯一出现（忽略空白差异）；补丁无法应用时要求 LLM 改为输出完整正文。
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 找不到或不唯一的锚点超过该比例时视为补丁无效
+MAX_FAILED_RATIO = 0.5
+
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+_CHAPTER_HEADING = re.compile(r"^#{1,2}\s*第[零〇一二两三四五六七八九十百千\d]+章", re.M)
+
+
+@dataclass
+class PatchResult:
+    """补丁应用结果"""
+    text: str
+    applied: int = 0
+    failed: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.applied + len(self.failed)
+
+
+def parse_edits(text: str) -> Optional[List[Dict[str, str]]]:
+    """
+    解析 LLM 输出的编辑操作
+
+    Returns:
+        [{'anchor', 'replacement'}]；输出不是补丁格式（如完整正文）时返回 None
+    """
+    if not text or not text.strip():
+        return None
+    candidates = [m.group(1) for m in _JSON_FENCE.finditer(text)]
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start >= 0:
+        candidates.append(text[start:max(text.rfind("}"), text.rfind("]")) + 1])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except (ValueError, TypeError):
+            continue
+        if isinstance(data, dict):
+            data = data.get("edits")
+        if not isinstance(data, list):
+            continue
+        edits = []
+        for item in data:
+            if isinstance(item, dict) and isinstance(item.get("anchor"), str) and item["anchor"].strip():
+                edits.append({'anchor': item["anchor"], 'replacement': str(item.get("replacement") or "")})
+        return edits
+    return None
+
+
+def _locate(text: str, anchor: str) -> Optional[Tuple[int, int]]:
+    """定位锚点（先精确匹配，再忽略空白差异）；找不到或出现多次时返回 None"""
+    pos = text.find(anchor)
+    if pos >= 0:
+        return (pos, pos + len(anchor)) if text.find(anchor, pos + 1) < 0 else None
+    chars = [re.escape(c) for c in anchor if not c.isspace()]
+    if not chars:
+        return None
+    matches = re.finditer(r"\s*".join(chars), text)
+    first = next(matches, None)
+    if first is None or next(matches, None) is not None:
+        return None
+    return first.span()
+
+
+def apply_edits(text: str, edits: List[Dict[str, str]]) -> PatchResult:
+    """
+    把编辑操作应用到正文
+
+    找不到、不唯一或与前面的修改处重叠的锚点跳过，记录在 failed 中。
+    """
+    spans = []
+    failed = []
+    for edit in edits:
+        span = _locate(text, edit['anchor'])
+        if span is None:
+            failed.append(edit)
+        else:
+            spans.append((span[0], span[1], edit))
+
+    spans.sort(key=lambda item: item[0])
+    pieces = []
+    cursor = 0
+    applied = 0
+    for start, end, edit in spans:
+        if start < cursor:
+            failed.append(edit)
+            continue
+        pieces.append(text[cursor:start])
+        pieces.append(edit['replacement'])
+        cursor = end
+        applied += 1
+    pieces.append(text[cursor:])
+    return PatchResult("".join(pieces), applied, failed)
+
+
+def _is_full_text(output: str, draft: str) -> bool:
+    """输出是否为完整正文（LLM 没有按补丁格式输出，或按要求改为完整输出）"""
+    return (len(output.strip()) >= len(draft.strip()) * 0.5
+            and len(_CHAPTER_HEADING.findall(output)) >= len(_CHAPTER_HEADING.findall(draft)))
+
+
+def patch_guardrail(source_task: Any, retries: int = 1) -> Callable[[Any], Tuple[bool, Any]]:
+    """
+    生成 CrewAI 任务的 guardrail：把任务输出的补丁应用到上游任务的正文，任务结果替换为应用后的完整正文
+
+    - 输出是完整正文时直接采用
+    - 补丁无效（大部分锚点找不到、删掉了章节标题）时要求 LLM 改为输出完整正文，最多重试 retries 次，
+      仍然无效时保留上游正文
+
+    Args:
+        source_task: 提供原文的上游任务（执行时读取其 output.raw）
+        retries: 要求重新输出的次数
+    """
+    attempts = {'failed': 0}
+
+    def guardrail(output) -> Tuple[bool, Any]:
+        raw = str(getattr(output, 'raw', output) or "")
+        draft = str(getattr(getattr(source_task, 'output', None), 'raw', "") or "")
+        if not draft.strip():
+            return True, raw
+
+        edits = parse_edits(raw)
+        if edits is None:
+            if _is_full_text(raw, draft):
+                return True, raw
+            problem = "输出既不是补丁 JSON，也不是完整正文"
+        else:
+            result = apply_edits(draft, edits)
+            headings_kept = len(_CHAPTER_HEADING.findall(result.text)) == len(_CHAPTER_HEADING.findall(draft))
+            if headings_kept and len(result.failed) <= result.total * MAX_FAILED_RATIO:
+                print(f"补丁编辑：应用 {result.applied}/{result.total} 处修改")
+                return True, result.text
+            if not headings_kept:
+                problem = "补丁删除或新增了章节标题"
+            else:
+                problem = f"{len(result.failed)}/{result.total} 处锚点在原文中找不到或不唯一"
+
+        attempts['failed'] += 1
+        if attempts['failed'] > retries:
+            print(f"补丁编辑无效（{problem}），保留原文")
+            return True, draft
+        return False, (f"{problem}。请不要再输出补丁，改为直接输出完整的正文"
+                       f"（每章以 ## 第X章 标题 开头，不要输出任何说明）。")
+
+    return guardrail